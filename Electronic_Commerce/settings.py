@@ -43,11 +43,15 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "corsheaders.middleware.CorsMiddleware",  # 添加CORS中间件，需要放在最前面
+    "comerge.middleware.QueryBudgetMiddleware",  # 请求指标与查询预算，尽量靠前以覆盖其它中间件的查询
+    "comerge.middleware.TracingMiddleware",  # 按采样率开启链路追踪
+    "comerge.middleware.AdmissionControlMiddleware",  # 下单路径过载时返回503，被拒绝的请求不进入视图
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "comerge.middleware.ReplicaPinningMiddleware",  # 写后读主库，放在会话中间件之后，会话写入不触发
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -86,6 +90,25 @@ DATABASES = {
 
     }
 }
+
+# 只读副本：在 DATABASES 中按需添加副本（如 "replica"），再把别名列在这里
+DATABASE_REPLICAS = []
+# 用户写入后读取固定到主库的秒数，应大于副本的复制延迟
+REPLICA_PIN_SECONDS = 5
+# 订单分片：订单和订单明细按 user_id 取模分布到这些数据库别名，未配置时全部在主库。
+# 分片数量上线后不能修改；各分片的自增ID相互独立、可能重复，主库数据（如库存日志）用订单号引用分片上的订单
+ORDER_SHARDS = []
+DATABASE_ROUTERS = [
+    'comerge.db_router.OrderShardRouter',  # 分片路由必须在读写分离路由之前
+    'comerge.db_router.ReplicaRouter',
+]
+# 按月分区（仅MySQL）：订单、订单明细、库存日志按 created_at 分区，由 rotate_partitions 命令定期维护
+PARTITIONING = {
+    "FUTURE_MONTHS": 3,  # 提前创建的未来月份分区数
+    "RETENTION_MONTHS": 24,  # 保留的月份数，更早的分区可导出后删除
+    "ORDER_NUMBER_RETENTION_DAYS": 7,  # 订单号唯一性表 order_numbers 的保留天数，须远大于时钟偏差
+}
+
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
@@ -97,6 +120,149 @@ CACHES = {
     }
 }
 
+# 缓存值编解码配置（CacheManager使用），NAME可选 pickle / compact
+CACHE_CODEC = {
+    "NAME": "compact",
+    "COMPRESSION": "zlib",  # 可选 zlib / lz4 / None
+    "COMPRESS_THRESHOLD": 1024,  # 超过该字节数才压缩
+}
+
+# 缓存统计配置：进程内累加，按条数或秒数批量合并到Redis
+CACHE_STATS = {
+    "ENABLED": True,
+    "FLUSH_EVERY": 200,
+    "FLUSH_INTERVAL": 10,
+}
+
+# 库存行锁竞争统计：按商品记录等待/持有时间，按窗口滚动汇总，hot_skus 命令或 /stats/locks/ 查看
+LOCK_STATS = {
+    "ENABLED": True,
+    "FLUSH_EVERY": 200,
+    "FLUSH_INTERVAL": 10,
+    "WINDOW_SECONDS": 60,
+    "WINDOWS": 5,  # 热点统计覆盖最近5个窗口
+    "TOP_K": 20,
+    "HOT_MIN_LOCKS": 20,  # 满足加锁次数与等待p95两个阈值的商品视为热点
+    "HOT_WAIT_P95_MS": 50,
+    "HOT_REFRESH": 10,
+}
+
+# 库存扣减策略：热点商品自动改用 HOT 策略（row_lock / conditional_update / actor / group_commit）
+STOCK_STRATEGY = {
+    "DEFAULT": "row_lock",
+    "HOT": "conditional_update",
+}
+
+# 库存执行器分区（actor 策略使用）：run_stock_executor 为每个地址启动一个进程，
+# 商品按一致性哈希归属分区，分区列表上线后不要随意调整
+STOCK_EXECUTOR = {
+    "PARTITIONS": [],  # 例如 ["127.0.0.1:7101", "127.0.0.1:7102"]
+    "TIMEOUT": 2.0,
+    "BATCH_SIZE": 200,
+    "BATCH_INTERVAL": 0.002,
+    "RELOAD_AFTER": 30,
+}
+
+# 库存合并提交（group_commit 策略使用）：同一商品 WINDOW_MS 内的扣减合并为一个事务；
+# 每个进程一个提交线程，所有热点商品的事务在该线程中串行提交
+GROUP_COMMIT = {
+    "WINDOW_MS": 2,  # 每个请求最多增加的延迟，建议2~5毫秒
+    "MAX_BATCH": 500,
+    "TIMEOUT": 5.0,
+}
+
+# 库存对账（reconcile_stock 命令）：按日志ID分批重放库存日志，每批 CHUNK_SIZE 行
+STOCK_RECONCILE = {
+    "CHUNK_SIZE": 200000,
+}
+
+# 销量汇总：watermark 由 rollup_sales 按各分片明细ID水位增量汇总（只汇总创建超过 SAFETY_LAG 秒的明细），
+# on_commit 在下单事务提交后立即累加；切换方式前先运行 backfill_sales_rollup 重建
+SALES_ROLLUP = {
+    "MODE": "watermark",
+    "CHUNK_SIZE": 5000,
+    "SAFETY_LAG": 60,
+}
+
+# 限流后端（DEFAULT_THROTTLE_RATES 的限额不变）：token_bucket 进程内令牌桶批量同步到Redis，
+# 限额可能略被超出；fixed_window 每个请求一次Redis INCR，限额精确
+THROTTLE_BACKEND = {
+    "MODE": "token_bucket",
+    "SYNC_EVERY": 20,
+    "SYNC_INTERVAL": 1.0,
+    "MAX_KEYS": 10000,
+}
+
+# 大表后台：未过滤列表的行数取表统计估算，过滤后的计数最多数到 COUNT_LIMIT
+ADMIN_LARGE_TABLE = {
+    "ESTIMATE_THRESHOLD": 100000,
+    "COUNT_LIMIT": 10000,
+}
+
+# 下单路径准入控制：进程内排队深度或p99延迟超过阈值时返回503和 Retry-After
+ADMISSION_CONTROL = {
+    "ENABLED": True,
+    "ROUTES": ["comerge:order-batch-create"],
+    "MAX_IN_FLIGHT": 64,
+    "P99_MS": 2000,
+    "WINDOW_SECONDS": 10,
+    "MIN_SAMPLES": 50,
+    "RETRY_AFTER": 1,
+    "P99_REFRESH_MS": 100,
+}
+
+# 商品批量导入接口的限制：请求体字节数（按 Content-Length）与单次导入行数
+PRODUCT_IMPORT = {
+    "MAX_BODY_BYTES": 20 * 1024 * 1024,
+    "MAX_ROWS": 50000,
+}
+
+# 缓存预热配置（warm_cache命令与启动预热共用）
+CACHE_WARMUP = {
+    "ON_STARTUP": False,  # 启动时是否在后台预热
+    "TOP_PRODUCTS": 500,  # 按近期销量预热的商品数
+    "TOP_KEYWORDS": 100,  # 按搜索频次预热的关键词数
+    "DAYS": 7,  # 销量统计天数
+    "CONCURRENCY": 4,
+    "BATCH_SIZE": 100,
+}
+
+# 请求性能指标与查询预算（QueryBudgetMiddleware）：响应头输出 Server-Timing，
+# 查询次数超出路由预算时记录警告，RAISE 为True时抛出异常（测试中开启）。
+# ROUTES 的键为路由名，或 "方法 路由名" 单独配置某个方法；值为None表示不限制。
+# 预算按单库部署配置；SHARD_SCALED 中的路由逐个分片查询，预算乘以订单分片数。
+QUERY_BUDGET = {
+    "ENABLED": True,
+    "SERVER_TIMING": True,
+    "RAISE": False,
+    "DEFAULT": 30,
+    "ROUTES": {
+        "comerge:product-list": 3,
+        "comerge:product-detail": 3,
+        "DELETE comerge:product-detail": 6,  # 级联检查订单明细与库存日志
+        "comerge:product-search": 3,
+        "comerge:product-stock-logs": 4,
+        "comerge:product-batch": 2,
+        "comerge:product-bulk-upsert": None,  # 查询次数随导入批次数增长
+        "comerge:order-list": 5,
+        "comerge:order-detail": 5,
+        "PUT comerge:order-detail": 7,
+        "PATCH comerge:order-detail": 7,
+        "DELETE comerge:order-detail": 8,
+        "comerge:order-batch-create": 310,  # 单次最多50个商品，每个商品加锁、扣库存、写日志和明细约6次查询
+    },
+    # 跨分片归并的订单列表每个分片计数、取主键、取对象并预取明细与商品；库存日志逐个分片加载订单
+    "SHARD_SCALED": ["comerge:order-list", "comerge:product-stock-logs"],
+}
+
+# 链路追踪：采样的请求记录服务、仓储、缓存方法的span，保存在进程内环形缓冲区，
+# 管理员通过 /debug/traces/ 查看最慢的追踪；请求头 X-Debug-Trace: 1 可强制追踪
+TRACING = {
+    "ENABLED": False,
+    "SAMPLE_RATE": 0.01,
+    "BUFFER_SIZE": 200,
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -145,6 +311,16 @@ REST_FRAMEWORK = {
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.BasicAuthentication',
     ],
+    # orjson渲染器/解析器，未安装orjson时自动退回标准库json
+    'DEFAULT_RENDERER_CLASSES': [
+        'comerge.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'comerge.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': [
@@ -153,8 +329,8 @@ REST_FRAMEWORK = {
         'rest_framework.filters.OrderingFilter',
     ],
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.UserRateThrottle',
-        'rest_framework.throttling.AnonRateThrottle',
+        'comerge.throttling.UserBucketThrottle',
+        'comerge.throttling.AnonBucketThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'user': '1000/hour',
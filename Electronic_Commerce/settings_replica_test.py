@@ -0,0 +1,28 @@
+"""
+主从路由测试配置：两个SQLite数据库分别充当主库和只读副本（不做复制，用于模拟复制延迟）
+
+python manage.py test comerge --settings=Electronic_Commerce.settings_replica_test
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "primary.sqlite3",
+    },
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "replica.sqlite3",
+    },
+}
+DATABASE_REPLICAS = ["replica"]
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+ALLOWED_HOSTS = ["*"]
@@ -0,0 +1,31 @@
+"""
+订单分片测试配置：主库存放商品等数据，三个SQLite库作为订单分片
+
+python manage.py test comerge --settings=Electronic_Commerce.settings_shard_test
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "primary.sqlite3",
+    },
+    **{
+        f"orders_{index}": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BASE_DIR / f"orders_{index}.sqlite3",
+        }
+        for index in range(3)
+    },
+}
+ORDER_SHARDS = ["orders_0", "orders_1", "orders_2"]
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    }
+}
+
+ALLOWED_HOSTS = ["*"]
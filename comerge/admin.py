@@ -1,14 +1,18 @@
 from django.contrib import admin
+from .admin_mixins import ORDER_NO_PATTERN, LargeTableAdminMixin, OrderShardAdminMixin
 from .models import Product, Order, OrderItem, StockLog
+from .business.product_service import ProductService
 
 
+# 四个后台都按大表模式运行（估算计数、键集分页、编号精确搜索），主键倒序与原先按创建时间倒序一致；
+# 订单与明细后台按 ?shard= 逐个分片浏览
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
+class ProductAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'name', 'price', 'stock_quantity', 'status', 'created_at')
     list_filter = ('status', 'created_at')
-    search_fields = ('name', 'keywords')
+    search_fields = ('id', 'name', 'keywords')
+    exact_search_fields = {'id': None}
     list_editable = ('price', 'stock_quantity', 'status')
-    ordering = ('-created_at',)
     
     fieldsets = (
         ('基本信息', {
@@ -23,20 +27,40 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     )
 
+    def save_model(self, request, obj, form, change):
+        # 修改时递增版本号并清除缓存，保证商品ETag随内容变化
+        if change:
+            obj.version += 1
+        super().save_model(request, obj, form, change)
+        ProductService().invalidate_product(obj.id)
+
+    def delete_model(self, request, obj):
+        product_id = obj.id
+        super().delete_model(request, obj)
+        ProductService().invalidate_product(product_id)
+
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
     extra = 0
+    raw_id_fields = ('product',)
     readonly_fields = ('created_at',)
 
+    def get_queryset(self, request):
+        # OrderItem.__str__ 读取订单号与商品名，避免每行两次查询
+        return super().get_queryset(request).select_related('order').prefetch_related('product')
+
 
 @admin.register(Order)
-class OrderAdmin(admin.ModelAdmin):
+class OrderAdmin(OrderShardAdminMixin, LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('order_no', 'user_id', 'total_amount', 'status', 'created_at')
     list_filter = ('status', 'created_at')
+    # 订单号与用户ID都有索引，只做精确匹配
     search_fields = ('order_no', 'user_id')
+    exact_search_fields = {'order_no': r'ORD\w+', 'user_id': None}
+    # 按用户ID搜索时切换到该用户所在的分片
+    search_user_shard = True
     readonly_fields = ('order_no', 'created_at', 'updated_at')
-    ordering = ('-created_at',)
     inlines = [OrderItemInline]
     
     fieldsets = (
@@ -51,25 +75,33 @@ class OrderAdmin(admin.ModelAdmin):
 
 
 @admin.register(OrderItem)
-class OrderItemAdmin(admin.ModelAdmin):
+class OrderItemAdmin(OrderShardAdminMixin, LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'order', 'product', 'quantity', 'unit_price', 'total_price', 'status')
     list_filter = ('status', 'created_at')
+    # 明细与订单同在一个分片可以连表，商品在主库，批量预取
+    list_select_related = ('order',)
+    list_prefetch_related = ('product',)
     search_fields = ('order__order_no', 'product__name')
+    exact_search_fields = {'order__order_no': r'ORD\w+', 'id': None}
+    raw_id_fields = ('order', 'product')
     readonly_fields = ('created_at',)
-    ordering = ('-created_at',)
 
 
 @admin.register(StockLog)
-class StockLogAdmin(admin.ModelAdmin):
-    list_display = ('id', 'product', 'order', 'change_type', 'quantity_before', 'quantity_after', 'change_quantity', 'created_at')
+class StockLogAdmin(LargeTableAdminMixin, admin.ModelAdmin):
+    # 日志在主库，关联的订单可能在任一分片，显示日志上记录的订单号
+    list_display = ('id', 'product', 'order_no', 'change_type', 'quantity_before', 'quantity_after', 'change_quantity', 'created_at')
     list_filter = ('change_type', 'created_at')
-    search_fields = ('product__name', 'order__order_no', 'reason')
-    readonly_fields = ('created_at',)
-    ordering = ('-created_at',)
+    # 日志与商品同在主库可以连表
+    list_select_related = ('product',)
+    search_fields = ('product__name', 'order_no', 'reason')
+    exact_search_fields = {'order_no': ORDER_NO_PATTERN, 'product_id': None}
+    raw_id_fields = ('product',)
+    readonly_fields = ('order_id', 'order_no', 'created_at')
     
     fieldsets = (
         ('变更信息', {
-            'fields': ('product', 'order', 'change_type', 'reason')
+            'fields': ('product', 'order_no', 'order_id', 'change_type', 'reason')
         }),
         ('数量信息', {
             'fields': ('quantity_before', 'quantity_after', 'change_quantity')
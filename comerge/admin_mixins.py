@@ -0,0 +1,284 @@
+"""
+大表后台
+订单、明细、库存日志表达到千万行后，后台列表页的精确 COUNT(*)、逐行外键查询和 LIKE 搜索
+都会全表扫描。LargeTableAdminMixin 提供：
+
+- 行数估算：未过滤的列表取数据库表统计中的行数，过滤后的计数以 COUNT_LIMIT 封顶
+- list_select_related / list_prefetch_related：同库外键连表，跨库（分片）外键批量预取
+- exact_search_fields：编号类字段按类型校验后走索引精确匹配，不再 LIKE
+- 键集分页：按主键倒序时用 ?cursor=<上一页最后一行的主键> 翻页，不用 OFFSET
+
+订单与明细后台另外混入 OrderShardAdminMixin，按 ?shard= 逐个分片浏览，按订单号搜索时直接到订单所在分片。
+"""
+
+import logging
+import re
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.utils import get_fields_from_path
+from django.contrib.admin.views.main import ORDER_VAR, SEARCH_VAR, ChangeList
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import connections, models
+from django.db.models import Q
+from django.http import QueryDict
+from django.utils.functional import cached_property
+
+from .business.order_service import OrderService
+from .db_router import use_shard
+from .utils.sharding import get_order_shards, is_sharded_model, shard_for_user
+
+logger = logging.getLogger(__name__)
+
+CURSOR_VAR = 'cursor'
+SHARD_VAR = 'shard'
+# 后台搜索框中按订单号处理的搜索词
+ORDER_NO_PATTERN = r'ORD\w+'
+
+DEFAULT_ADMIN_LARGE_TABLE = {
+    'ESTIMATE_THRESHOLD': 100000,  # 估算行数达到该值时不再精确计数
+    'COUNT_LIMIT': 10000,  # 过滤后的列表最多数到该值
+}
+
+
+def get_admin_large_table_config() -> Dict[str, Any]:
+    return {**DEFAULT_ADMIN_LARGE_TABLE, **getattr(settings, 'ADMIN_LARGE_TABLE', {})}
+
+
+def estimate_row_count(model, using: str) -> Optional[int]:
+    """从表统计信息估算行数（MySQL information_schema、PostgreSQL pg_class、SQLite sqlite_stat1），取不到时返回None"""
+    connection = connections[using]
+    table = model._meta.db_table
+    queries = {
+        'mysql': ("SELECT TABLE_ROWS FROM information_schema.TABLES "
+                  "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s"),
+        'postgresql': "SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)",
+        # ANALYZE 之后才有统计，每条记录的 stat 以表的行数开头
+        'sqlite': "SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1",
+    }
+    sql = queries.get(connection.vendor)
+    if sql is None:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except Exception as e:
+        logger.debug(f"Estimate row count of {table} failed: {e}")
+        return None
+    if row is None or row[0] is None:
+        return None
+    value = int(str(row[0]).split()[0])
+    # PostgreSQL 未分析过的表 reltuples 为 -1
+    return value if value >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """未过滤的大表用估算行数，其余计数以 COUNT_LIMIT 封顶；approximate 表示 count 不是精确值"""
+
+    approximate = False
+
+    @cached_property
+    def count(self) -> int:
+        config = get_admin_large_table_config()
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate >= config['ESTIMATE_THRESHOLD']:
+                self.approximate = True
+                return estimate
+        limit = config['COUNT_LIMIT']
+        count = queryset[:limit + 1].count()
+        if count > limit:
+            self.approximate = True
+            return limit
+        return count
+
+
+class KeysetChangeList(ChangeList):
+    """按主键倒序且未指定其它排序时用键集分页：每页一次按主键范围的查询，加一次 exists 判断是否有下一页"""
+
+    def get_queryset(self, request, exclude_parameters=None):
+        # 游标不是过滤条件，也不应出现在排序、过滤链接中
+        self.params.pop(CURSOR_VAR, None)
+        self.filter_params.pop(CURSOR_VAR, None)
+        return super().get_queryset(request, exclude_parameters)
+
+    @property
+    def keyset(self) -> bool:
+        return ORDER_VAR not in self.params and self.model_admin.keyset_ordering
+
+    def get_results(self, request):
+        if not self.keyset:
+            return super().get_results(request)
+
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        cursor = request.GET.get(CURSOR_VAR)
+        queryset = self.queryset
+        if cursor:
+            try:
+                queryset = queryset.filter(pk__lt=self.lookup_opts.pk.to_python(cursor))
+            except ValidationError:
+                queryset = queryset.none()
+        result_list = queryset[:self.list_per_page]
+        rows = list(result_list)
+        has_next = len(rows) == self.list_per_page and queryset.filter(pk__lt=rows[-1].pk).exists()
+
+        self.result_count = paginator.count
+        self.show_full_result_count = False
+        self.full_result_count = None
+        self.show_admin_actions = True
+        self.result_list = result_list
+        self.can_show_all = False
+        self.multi_page = has_next or bool(cursor)
+        self.paginator = paginator
+        self.next_cursor_url = self.get_query_string({CURSOR_VAR: rows[-1].pk}) if has_next else None
+        self.first_page_url = self.get_query_string(remove=[CURSOR_VAR]) if cursor else None
+
+
+class LargeTableAdminMixin:
+    """大表后台：估算计数、关联预取、精确编号搜索与键集分页
+
+    exact_search_fields 为 {字段路径: 正则或None}，None 时按字段类型校验（整数字段要求全是数字）；
+    搜索词能匹配任一精确字段时只做精确查询，否则对 search_fields 中的其余字段按默认方式搜索。
+    """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    ordering = ('-pk',)
+    keyset_ordering = True
+    list_prefetch_related = ()
+    exact_search_fields: Dict[str, Optional[str]] = {}
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        if self.list_prefetch_related:
+            queryset = queryset.prefetch_related(*self.list_prefetch_related)
+        return queryset
+
+    def get_search_results(self, request, queryset, search_term):
+        term = search_term.strip()
+        if term and self.exact_search_fields:
+            condition = Q()
+            for path, pattern in self.exact_search_fields.items():
+                value = self._exact_value(path, pattern, term)
+                if value is not None:
+                    condition |= Q(**{path: value})
+            if condition:
+                return queryset.filter(condition), False
+
+        # ModelAdmin 实例在线程间共享，用请求上的标记让 get_search_fields 排除精确字段
+        request._exclude_exact_search = True
+        try:
+            if term and not self.get_search_fields(request):
+                return queryset.none(), False
+            return super().get_search_results(request, queryset, search_term)
+        finally:
+            request._exclude_exact_search = False
+
+    def get_search_fields(self, request):
+        fields = super().get_search_fields(request)
+        if getattr(request, '_exclude_exact_search', False):
+            return [field for field in fields if field.lstrip('^=@') not in self.exact_search_fields]
+        return fields
+
+    def _exact_value(self, path: str, pattern: Optional[str], term: str):
+        if pattern is not None and not re.fullmatch(pattern, term):
+            return None
+        field = get_fields_from_path(self.model, path)[-1]
+        if field.is_relation:
+            field = field.target_field
+        if isinstance(field, (models.IntegerField, models.AutoField)):
+            return int(term) if term.isdigit() else None
+        return term
+
+
+class OrderShardListFilter(admin.SimpleListFilter):
+    """分片切换链接；查询集由 OrderShardAdminMixin 路由到分片，这里不再过滤"""
+
+    title = '分片'
+    parameter_name = SHARD_VAR
+
+    def __init__(self, request, params, model, model_admin):
+        self.current = model_admin.get_shard(request)
+        super().__init__(request, params, model, model_admin)
+
+    def lookups(self, request, model_admin):
+        return [(shard, shard) for shard in get_order_shards()]
+
+    def queryset(self, request, queryset):
+        return queryset
+
+    def choices(self, changelist):
+        for lookup, title in self.lookup_choices:
+            yield {
+                'selected': self.current == lookup,
+                'query_string': changelist.get_query_string({self.parameter_name: lookup}, [CURSOR_VAR, SEARCH_VAR]),
+                'display': title,
+            }
+
+
+class OrderShardAdminMixin:
+    """订单分片后台：列表、详情、修改、删除都在请求选择的分片上执行
+
+    分片之间没有统一的主键顺序，不做跨分片列表；有多个分片时列表页提供分片过滤器，
+    搜索词是订单号（search_user_shard 为True时也包括用户ID）时直接切换到它所在的分片。
+    视图在 use_shard() 中执行，内联明细、外键控件和删除前的关联收集都落到同一分片。
+    """
+
+    search_user_shard = False
+
+    def get_shard(self, request) -> str:
+        """本次请求浏览的分片，详情页从列表带过来的 _changelist_filters 中取；结果缓存在请求上"""
+        shard = getattr(request, '_order_shard', None)
+        if shard is None:
+            params = request.GET
+            if '_changelist_filters' in params:
+                params = QueryDict(params['_changelist_filters'])
+            shards = get_order_shards()
+            shard = self._search_shard(params.get(SEARCH_VAR, '').strip()) or params.get(SHARD_VAR)
+            shard = request._order_shard = shard if shard in shards else shards[0]
+        return shard
+
+    def _search_shard(self, term: str) -> Optional[str]:
+        if re.fullmatch(ORDER_NO_PATTERN, term):
+            return OrderService().find_order_shard(term)
+        if self.search_user_shard and term.isdigit():
+            return shard_for_user(int(term))
+        return None
+
+    def get_list_filter(self, request):
+        filters = list(super().get_list_filter(request))
+        if len(get_order_shards()) > 1:
+            filters.append(OrderShardListFilter)
+        return filters
+
+    def get_queryset(self, request):
+        queryset = super().get_queryset(request)
+        return queryset.using(self.get_shard(request)) if is_sharded_model(self.model) else queryset
+
+    def changelist_view(self, request, extra_context=None):
+        return self._on_shard(request, super().changelist_view, request, extra_context)
+
+    def changeform_view(self, request, object_id=None, form_url='', extra_context=None):
+        return self._on_shard(request, super().changeform_view, request, object_id, form_url, extra_context)
+
+    def delete_view(self, request, object_id, extra_context=None):
+        return self._on_shard(request, super().delete_view, request, object_id, extra_context)
+
+    def history_view(self, request, object_id, extra_context=None):
+        return self._on_shard(request, super().history_view, request, object_id, extra_context)
+
+    def _on_shard(self, request, view, *args):
+        with use_shard(self.get_shard(request)):
+            response = view(*args)
+            # TemplateResponse 延迟渲染，渲染时的关联查询也要落到同一分片
+            if hasattr(response, 'render') and not response.is_rendered:
+                response.render()
+            return response
@@ -1,6 +1,54 @@
+import logging
+import os
+import sys
+import threading
+
 from django.apps import AppConfig
 
+logger = logging.getLogger(__name__)
+
+# 启动预热只在这些服务器进程中运行（按启动程序名匹配）
+WEB_SERVERS = ('gunicorn', 'uwsgi', 'uvicorn', 'daphne', 'hypercorn', 'granian')
+
 
 class ComergeConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "comerge"
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .business.cache_warmup_service import get_warmup_config
+        from .utils.request_metrics import install_query_recorder
+
+        connection_created.connect(install_query_recorder, dispatch_uid='comerge_query_recorder')
+
+        config = get_warmup_config()
+        if config['ON_STARTUP'] and self._is_serving():
+            # 后台线程预热，不阻塞启动；ready() 中不直接访问数据库
+            threading.Thread(target=self._warm_cache, args=(config,), daemon=True).start()
+
+    @staticmethod
+    def _is_serving() -> bool:
+        """只在提供Web服务的进程中预热：runserver 的子进程或已知的WSGI/ASGI服务器，
+        跳过 migrate 等管理命令、runserver 的自动重载父进程以及 celery、脚本和测试进程"""
+        program = os.path.basename(sys.argv[0]) if sys.argv else ''
+        if program == 'manage.py':
+            return len(sys.argv) > 1 and sys.argv[1] == 'runserver' and os.environ.get('RUN_MAIN') == 'true'
+        # uWSGI 内嵌解释器时 argv[0] 不是 uwsgi，但会提供 uwsgi 模块
+        return any(server in program for server in WEB_SERVERS) or 'uwsgi' in sys.modules
+
+    @staticmethod
+    def _warm_cache(config):
+        from .business.cache_warmup_service import CacheWarmupService
+
+        try:
+            CacheWarmupService().warm(
+                top_products=config['TOP_PRODUCTS'],
+                top_keywords=config['TOP_KEYWORDS'],
+                days=config['DAYS'],
+                concurrency=config['CONCURRENCY'],
+                batch_size=config['BATCH_SIZE'],
+            )
+        except Exception as e:
+            logger.error(f"Startup cache warmup error: {e}")
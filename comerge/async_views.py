@@ -0,0 +1,168 @@
+"""
+异步视图
+在ASGI下直接运行于事件循环的只读接口：商品搜索、商品详情、订单详情。
+缓存读写走异步Redis客户端，未命中时使用Django的异步ORM查询；
+同步的DRF接口保持不变，两套接口共用缓存键、输出格式以及认证与限流配置。
+"""
+
+import functools
+import logging
+import math
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from rest_framework import exceptions, serializers
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from .business.order_service import OrderService
+from .business.product_service import ProductService
+from .renderers import ORJSONRenderer
+from .serializer import (
+    OrderSerializer, ProductListSerializer, ProductSearchSerializer, ProductSerializer,
+    fast_product_list_serializer, parse_fields_param
+)
+from .utils.etag import etag_matches, fields_etag_part, make_etag
+
+logger = logging.getLogger(__name__)
+
+_renderer = ORJSONRenderer()
+
+
+def _json_response(data, status: int = 200, etag: str = None) -> HttpResponse:
+    response = HttpResponse(_renderer.render(data), content_type='application/json', status=status)
+    if etag:
+        response['ETag'] = etag
+    return response
+
+
+def _not_modified(etag: str) -> HttpResponse:
+    response = HttpResponse(status=304)
+    response['ETag'] = etag
+    return response
+
+
+def _check_request(request) -> Optional[HttpResponse]:
+    """按DRF视图的默认认证类与限流类检查请求（同一个限流后端与限额），通过时返回None"""
+    authenticators = [auth_class() for auth_class in api_settings.DEFAULT_AUTHENTICATION_CLASSES]
+    drf_request = Request(request, authenticators=authenticators)
+    try:
+        drf_request.user  # 访问 user 时执行认证
+    except (exceptions.AuthenticationFailed, exceptions.NotAuthenticated) as e:
+        # 与DRF一致：首个认证类没有 WWW-Authenticate 时返回403
+        status = 401 if authenticators and authenticators[0].authenticate_header(drf_request) else 403
+        return _json_response({'code': status, 'message': str(e.detail)}, status)
+
+    throttles = [throttle_class() for throttle_class in api_settings.DEFAULT_THROTTLE_CLASSES]
+    waits = [throttle.wait() for throttle in throttles if not throttle.allow_request(drf_request, None)]
+    if not waits:
+        return None
+    response = _json_response({'code': 429, 'message': '请求过于频繁，请稍后重试'}, 429)
+    durations = [wait for wait in waits if wait is not None]
+    if durations:
+        response['Retry-After'] = str(math.ceil(max(durations)))
+    return response
+
+
+def drf_checked(view):
+    """异步视图不经过DRF的 APIView，在进入视图前执行同样的认证与限流（会话与限流计数为同步访问）"""
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        rejected = await sync_to_async(_check_request)(request)
+        if rejected is not None:
+            return rejected
+        return await view(request, *args, **kwargs)
+
+    return wrapper
+
+
+@drf_checked
+async def product_search(request):
+    """异步商品搜索API - GET ?keyword=&page=&size=&fields="""
+    try:
+        params = ProductSearchSerializer(data=request.GET)
+        if not params.is_valid():
+            return _json_response({'code': 400, 'message': '参数错误', 'errors': params.errors}, 400)
+
+        fields = parse_fields_param(request.GET.get('fields'), ProductListSerializer.Meta.fields)
+        fast_serializer = fast_product_list_serializer.narrow(fields)
+
+        validated_data = params.validated_data
+        result = await ProductService().asearch_products(
+            validated_data['keyword'],
+            validated_data['page'],
+            validated_data['size']
+        )
+        return _json_response({
+            'code': 200,
+            'message': '搜索成功',
+            'data': {
+                'products': fast_serializer.from_instances(result['products']),
+                'total': result['total'],
+                'page': result['page'],
+                'size': result['size'],
+                'total_pages': result['total_pages'],
+                'has_next': result['has_next'],
+                'has_previous': result['has_previous'],
+            }
+        })
+
+    except serializers.ValidationError as e:
+        return _json_response({'code': 400, 'message': '参数错误', 'errors': e.detail}, 400)
+    except ValueError as e:
+        return _json_response({'code': 400, 'message': str(e)}, 400)
+    except Exception as e:
+        logger.error(f"Async search products error: {e}")
+        return _json_response({'code': 500, 'message': '服务器内部错误'}, 500)
+
+
+@drf_checked
+async def product_detail(request, pk: int):
+    """异步商品详情API - 从详情缓存读取，ETag与同步接口一致"""
+    try:
+        fields = parse_fields_param(request.GET.get('fields'), ProductSerializer.Meta.fields)
+        product = await ProductService().aget_product(pk)
+        if product is None:
+            return _json_response({'code': 404, 'message': f"商品ID {pk} 不存在或已下架"}, 404)
+
+        etag = make_etag('product', 'json', fields_etag_part(fields), product.pk, product.version)
+        if etag_matches(request, etag):
+            return _not_modified(etag)
+        return _json_response(ProductSerializer(product, fields=fields).data, etag=etag)
+
+    except serializers.ValidationError as e:
+        return _json_response({'code': 400, 'message': '参数错误', 'errors': e.detail}, 400)
+    except Exception as e:
+        logger.error(f"Async get product error: {e}")
+        return _json_response({'code': 500, 'message': '服务器内部错误'}, 500)
+
+
+@drf_checked
+async def order_detail(request, order_no: str):
+    """异步订单详情API - 先只查询更新时间做条件GET校验，未命中再查询订单及明细"""
+    try:
+        fields = parse_fields_param(request.GET.get('fields'), OrderSerializer.Meta.fields)
+        order_service = OrderService()
+        fields_tag = fields_etag_part(fields)
+
+        updated_at = await order_service.aget_order_updated_at(order_no)
+        if updated_at is None:
+            return _json_response({'code': 404, 'message': f"订单 {order_no} 不存在"}, 404)
+        etag = make_etag('order', 'json', fields_tag, order_no, updated_at.strftime('%Y%m%d%H%M%S%f'))
+        if etag_matches(request, etag):
+            return _not_modified(etag)
+
+        order = await order_service.aget_order(order_no)
+        if order is None:
+            return _json_response({'code': 404, 'message': f"订单 {order_no} 不存在"}, 404)
+        etag = make_etag('order', 'json', fields_tag, order.order_no,
+                         order.updated_at.strftime('%Y%m%d%H%M%S%f'))
+        return _json_response(OrderSerializer(order, fields=fields).data, etag=etag)
+
+    except serializers.ValidationError as e:
+        return _json_response({'code': 400, 'message': '参数错误', 'errors': e.detail}, 400)
+    except Exception as e:
+        logger.error(f"Async get order error: {e}")
+        return _json_response({'code': 500, 'message': '服务器内部错误'}, 500)
@@ -0,0 +1,5 @@
+"""
+基准测试工具
+合成商品目录、并发负载执行与结果统计，供 bench_* 管理命令和 pytest-benchmark 模块共用。
+会写入大量数据，应在专用的压测数据库上运行。
+"""
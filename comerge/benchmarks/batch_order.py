@@ -0,0 +1,214 @@
+"""
+批量下单并发基准
+多个线程或进程并发调用 OrderService.create_batch_order，购物车中的商品按
+均匀、Zipf 或单一热点分布抽取，统计吞吐、延迟分位数、死锁/锁等待次数与重试次数；
+运行结束后核对每个商品的 当前库存 + 成功订单明细数量 == 初始库存，发现超卖或少扣。
+"""
+
+import bisect
+import itertools
+import multiprocessing
+import random
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from django.db import connections
+from django.db.models import Sum
+
+from comerge.business.order_service import OrderService
+from comerge.db_router import use_primary
+from comerge.models import OrderItem, Product
+from comerge.utils.sharding import get_order_shards
+
+from .stats import latency_percentiles, zipf_cum_weights
+
+DISTRIBUTIONS = ('uniform', 'zipf', 'hot')
+MODES = ('thread', 'process')
+
+# 各数据库锁冲突的错误信息（MySQL死锁/锁等待超时、SQLite锁、PostgreSQL串行化失败）
+LOCK_ERROR_MARKERS = (
+    'deadlock', 'lock wait timeout', 'database is locked', 'database table is locked', 'could not serialize',
+)
+
+
+def is_lock_error(message: str) -> bool:
+    message = (message or '').lower()
+    return any(marker in message for marker in LOCK_ERROR_MARKERS)
+
+
+class SkuSampler:
+    """按分布抽取商品：uniform 均匀，zipf 第k个商品的权重为 1/k^s，hot 全部落在第一个商品"""
+
+    def __init__(self, product_ids: Sequence[int], distribution: str = 'uniform', zipf_s: float = 1.1):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError(f"不支持的分布: {distribution}")
+        if not product_ids:
+            raise ValueError("商品列表不能为空")
+        self.product_ids = list(product_ids)
+        self.distribution = distribution
+        self._cum_weights = zipf_cum_weights(len(self.product_ids), zipf_s)
+
+    def sample(self, rng: random.Random) -> int:
+        if self.distribution == 'hot':
+            return self.product_ids[0]
+        if self.distribution == 'uniform':
+            return rng.choice(self.product_ids)
+        index = bisect.bisect(self._cum_weights, rng.random() * self._cum_weights[-1])
+        return self.product_ids[min(index, len(self.product_ids) - 1)]
+
+    def cart(self, rng: random.Random, size: int, max_quantity: int = 1) -> List[Dict[str, int]]:
+        """生成一个购物车，同一商品合并数量"""
+        quantities: Counter = Counter()
+        for _ in range(size):
+            quantities[self.sample(rng)] += rng.randint(1, max_quantity)
+        return [{'product_id': product_id, 'quantity': quantity} for product_id, quantity in quantities.items()]
+
+
+@dataclass
+class OrderOutcome:
+    """单次下单（含重试）的结果，latency 为包含重试在内的总耗时"""
+    order_no: str
+    status: str
+    latency: float
+    lock_errors: int = 0
+    retries: int = 0
+
+
+@dataclass
+class LoadReport:
+    distribution: str
+    mode: str
+    workers: int
+    elapsed: float
+    outcomes: List[OrderOutcome] = field(default_factory=list)
+
+    @property
+    def orders(self) -> int:
+        return len(self.outcomes)
+
+    @property
+    def throughput(self) -> float:
+        return self.orders / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def statuses(self) -> Counter:
+        return Counter(outcome.status for outcome in self.outcomes)
+
+    @property
+    def lock_errors(self) -> int:
+        return sum(outcome.lock_errors for outcome in self.outcomes)
+
+    @property
+    def retries(self) -> int:
+        return sum(outcome.retries for outcome in self.outcomes)
+
+    def latency_percentiles(self) -> Dict[str, float]:
+        return latency_percentiles([outcome.latency for outcome in self.outcomes])
+
+
+def place_order(service: OrderService, user_id: int, cart: List[Dict[str, int]],
+                max_retries: int = 3, backoff: float = 0.01) -> OrderOutcome:
+    """下一单；整单因锁冲突失败（事务已回滚）时退避后重试，单个商品的锁冲突只计数不重试"""
+    started = time.perf_counter()
+    lock_errors = retries = 0
+    while True:
+        try:
+            result = service.create_batch_order(user_id, cart)
+        except Exception as e:
+            result = {'order_no': '', 'status': 'failed', 'error': str(e), 'failed_items': []}
+        lock_errors += sum(is_lock_error(item.get('error_message')) for item in result['failed_items'])
+        order_failed_on_lock = result['status'] == 'failed' and is_lock_error(result.get('error'))
+        lock_errors += order_failed_on_lock
+        if order_failed_on_lock and retries < max_retries:
+            retries += 1
+            time.sleep(backoff * (2 ** retries) * random.random())
+            continue
+        return OrderOutcome(result['order_no'], result['status'], time.perf_counter() - started,
+                            lock_errors, retries)
+
+
+def _run_worker(plan: List[Tuple[int, List[Dict[str, int]]]], max_retries: int) -> List[OrderOutcome]:
+    """按计划顺序下单；线程结束时关闭本线程的数据库连接"""
+    service = OrderService()
+    try:
+        return [place_order(service, user_id, cart, max_retries) for user_id, cart in plan]
+    finally:
+        connections.close_all()
+
+
+def _init_process():
+    # spawn 方式启动的子进程需要重新初始化Django；fork 方式下已初始化
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        django.setup()
+
+
+def _run_process_worker(args) -> List[OrderOutcome]:
+    return _run_worker(*args)
+
+
+def build_plans(sampler: SkuSampler, workers: int, orders_per_worker: int, cart_size: int,
+                cart_max: Optional[int] = None, max_quantity: int = 1, seed: int = 42
+                ) -> List[List[Tuple[int, List[Dict[str, int]]]]]:
+    """预先生成每个worker的 (user_id, 购物车) 列表，使计时只包含下单本身；user_id 连续递增，订单均匀落到各分片"""
+    rng = random.Random(seed)
+    user_ids = itertools.count(1)
+    return [
+        [
+            (next(user_ids), sampler.cart(rng, rng.randint(cart_size, max(cart_size, cart_max or cart_size)),
+                                          max_quantity))
+            for _ in range(orders_per_worker)
+        ]
+        for _ in range(workers)
+    ]
+
+
+def run_load(plans: List[List[Tuple[int, List[Dict[str, int]]]]], distribution: str = 'uniform',
+             mode: str = 'thread', max_retries: int = 3) -> LoadReport:
+    """并发执行下单计划，每个计划对应一个线程或进程"""
+    if mode not in MODES:
+        raise ValueError(f"不支持的并发方式: {mode}")
+    started = time.perf_counter()
+    if mode == 'thread':
+        with ThreadPoolExecutor(max_workers=len(plans)) as executor:
+            results = list(executor.map(_run_worker, plans, [max_retries] * len(plans)))
+    else:
+        # 子进程不能复用父进程的数据库连接
+        connections.close_all()
+        with multiprocessing.Pool(len(plans), initializer=_init_process) as pool:
+            results = pool.map(_run_process_worker, [(plan, max_retries) for plan in plans])
+    elapsed = time.perf_counter() - started
+    return LoadReport(distribution, mode, len(plans), elapsed,
+                      [outcome for outcomes in results for outcome in outcomes])
+
+
+def snapshot_stock(product_ids: Sequence[int]) -> Dict[int, int]:
+    with use_primary():
+        return dict(Product.objects.filter(id__in=product_ids).values_list('id', 'stock_quantity'))
+
+
+def sold_quantities(product_ids: Sequence[int]) -> Dict[int, int]:
+    """各分片上成功订单明细的数量之和"""
+    sold: Counter = Counter()
+    for shard in get_order_shards():
+        rows = (OrderItem.objects.using(shard)
+                .filter(product_id__in=product_ids, status='success')
+                .values('product_id').annotate(total=Sum('quantity')))
+        for row in rows:
+            sold[row['product_id']] += row['total']
+    return dict(sold)
+
+
+def verify_stock(initial: Dict[int, int]) -> List[Tuple[int, int, int, int]]:
+    """核对库存守恒，返回不一致的商品：(商品ID, 初始库存, 当前库存, 已售数量)"""
+    current = snapshot_stock(list(initial))
+    sold = sold_quantities(list(initial))
+    return [
+        (product_id, stock, current.get(product_id, 0), sold.get(product_id, 0))
+        for product_id, stock in initial.items()
+        if current.get(product_id, 0) + sold.get(product_id, 0) != stock
+    ]
@@ -0,0 +1,40 @@
+"""
+批量下单 pytest-benchmark 基准
+依赖 pytest-django 与 pytest-benchmark，未安装时整个模块跳过；文件名不以 test 开头，
+manage.py test 不会收集。运行方式（在压测数据库上）：
+    pytest comerge/benchmarks/batch_order_test.py --ds=Electronic_Commerce.settings --benchmark-only
+"""
+
+import pytest
+
+pytest.importorskip('pytest_django')
+pytest.importorskip('pytest_benchmark')
+
+from comerge.benchmarks.batch_order import (  # noqa: E402
+    DISTRIBUTIONS, SkuSampler, build_plans, run_load, snapshot_stock, verify_stock,
+)
+from comerge.benchmarks.catalog import create_catalog, new_run_prefix  # noqa: E402
+
+WORKERS = 8
+ORDERS_PER_WORKER = 20
+CART_SIZE = 3
+
+
+@pytest.mark.django_db(transaction=True)
+@pytest.mark.parametrize('distribution', DISTRIBUTIONS)
+def test_batch_create_under_load(benchmark, distribution):
+    product_ids = create_catalog(100, 50, new_run_prefix(f"pytest-{distribution}"))
+    initial = snapshot_stock(product_ids)
+    plans = build_plans(SkuSampler(product_ids, distribution), WORKERS, ORDERS_PER_WORKER, CART_SIZE)
+
+    # 每轮都会消耗库存，只跑一轮，吞吐和分位数写入 extra_info
+    report = benchmark.pedantic(run_load, args=(plans, distribution), rounds=1, iterations=1)
+    benchmark.extra_info.update({
+        'throughput': report.throughput,
+        'lock_errors': report.lock_errors,
+        'retries': report.retries,
+        **{f"{name}_ms": value * 1000 for name, value in report.latency_percentiles().items()},
+    })
+
+    assert report.orders == WORKERS * ORDERS_PER_WORKER
+    assert verify_stock(initial) == []
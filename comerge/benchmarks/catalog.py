@@ -0,0 +1,160 @@
+"""
+合成商品目录
+CatalogFaker 按固定种子生成中英文混合的商品名称、关键词和描述，品牌与品类按Zipf分布出现，
+词频接近真实目录；generate_catalog 以流式分批 bulk_create 写入，可生成千万级数据而不占用大量内存。
+create_catalog 生成带本次运行前缀的小目录，供并发下单基准使用。
+"""
+
+import bisect
+import random
+import uuid
+from decimal import Decimal
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+from comerge.db_router import use_primary
+from comerge.models import Product
+
+from .stats import zipf_cum_weights
+
+CATALOG_WORDS = ['轻薄', '旗舰', 'wireless', 'pro', '高性能', 'ultra', '续航', 'camera', 'mini', '智能']
+
+# (中文名, 英文名)，按热度排列
+BRANDS: List[Tuple[str, str]] = [
+    ('苹果', 'Apple'), ('小米', 'Xiaomi'), ('华为', 'Huawei'), ('三星', 'Samsung'), ('联想', 'Lenovo'),
+    ('索尼', 'Sony'), ('戴尔', 'Dell'), ('荣耀', 'Honor'), ('OPPO', 'OPPO'), ('vivo', 'vivo'),
+    ('罗技', 'Logitech'), ('大疆', 'DJI'), ('戴森', 'Dyson'), ('美的', 'Midea'), ('海尔', 'Haier'),
+    ('惠普', 'HP'), ('华硕', 'ASUS'), ('任天堂', 'Nintendo'), ('飞利浦', 'Philips'), ('佳能', 'Canon'),
+    ('尼康', 'Nikon'), ('漫步者', 'Edifier'), ('一加', 'OnePlus'), ('微软', 'Microsoft'), ('博世', 'Bosch'),
+    ('松下', 'Panasonic'), ('格力', 'Gree'), ('TP-LINK', 'TP-LINK'), ('绿联', 'UGREEN'), ('安克', 'Anker'),
+]
+
+# (品类, 品类关键词, 价格区间)，按热度排列
+CATEGORIES: List[Tuple[str, List[str], Tuple[int, int]]] = [
+    ('手机', ['智能手机', '5G', '拍照'], (999, 12999)),
+    ('耳机', ['无线', '蓝牙', '降噪'], (99, 2999)),
+    ('笔记本', ['电脑', '轻薄本', '办公'], (2999, 19999)),
+    ('平板', ['电脑', '学习', '娱乐'], (999, 9999)),
+    ('智能手表', ['运动', '健康', '心率'], (299, 5999)),
+    ('充电器', ['快充', 'GaN', 'Type-C'], (29, 399)),
+    ('显示器', ['4K', '高刷', 'IPS'], (699, 8999)),
+    ('键盘', ['机械键盘', '无线', 'RGB'], (99, 1999)),
+    ('鼠标', ['无线', '游戏', '人体工学'], (49, 999)),
+    ('音箱', ['蓝牙', '智能', '低音'], (99, 4999)),
+    ('相机', ['微单', '4K', '防抖'], (1999, 29999)),
+    ('路由器', ['WiFi6', '千兆', 'Mesh'], (99, 1999)),
+    ('吸尘器', ['无线', '除螨', '家用'], (499, 5999)),
+    ('空调', ['变频', '一级能效', '冷暖'], (1999, 12999)),
+    ('冰箱', ['变频', '风冷', '大容量'], (1499, 19999)),
+    ('电动牙刷', ['声波', '美白', '充电'], (99, 999)),
+    ('移动电源', ['快充', '大容量', '便携'], (59, 499)),
+    ('游戏机', ['掌机', '主机', 'OLED'], (1499, 4999)),
+]
+
+SERIES = ['Pro', 'Max', 'Ultra', 'Air', 'Lite', 'Plus', 'mini', 'SE', 'Neo', 'X']
+FEATURES = ['旗舰', '轻薄', '长续航', '高性能', '降噪', '防水', '快充', 'OLED', '高刷', '护眼',
+            '静音', '大容量', '便携', '智能', 'AI', '5G', 'WiFi6', '蓝牙5.3', '4K', '2024新款']
+EDITIONS = ['标准版', '尊享版', '青春版', '典藏版', '限定版', '套装']
+DESCRIPTION_TEMPLATES = [
+    '{brand}{category}，{feature1}设计，{feature2}体验，适合日常{usage}使用。',
+    '{brand_en} {series} 系列{category}，支持{feature1}与{feature2}，{edition}。',
+    '全新{brand}{category} {model}，{feature1}，{feature2}，官方正品，全国联保。',
+    'The {brand_en} {model} {category} brings {feature1_en} and {feature2_en} for {usage_en}.',
+]
+USAGES = [('办公', 'work'), ('游戏', 'gaming'), ('学习', 'study'), ('出行', 'travel'), ('家用', 'home')]
+FEATURES_EN = ['fast charging', 'long battery life', 'noise cancelling', 'a high refresh display',
+               'water resistance', 'AI features', 'a lightweight body']
+
+BRAND_EXPONENT = 1.0
+CATEGORY_EXPONENT = 0.8
+
+
+def new_run_prefix(name: str = 'bench') -> str:
+    return f"{name}-{uuid.uuid4().hex[:8]}"
+
+
+class CatalogFaker:
+    """按种子生成可复现的商品数据；同一种子、同一序号的商品内容相同"""
+
+    def __init__(self, seed: int = 42):
+        self.rng = random.Random(seed)
+        self._brand_weights = zipf_cum_weights(len(BRANDS), BRAND_EXPONENT)
+        self._category_weights = zipf_cum_weights(len(CATEGORIES), CATEGORY_EXPONENT)
+
+    def _pick(self, items, cum_weights):
+        return items[bisect.bisect(cum_weights, self.rng.random() * cum_weights[-1]) % len(items)]
+
+    def product_fields(self) -> Dict:
+        rng = self.rng
+        brand, brand_en = self._pick(BRANDS, self._brand_weights)
+        category, category_keywords, (low, high) = self._pick(CATEGORIES, self._category_weights)
+        series = rng.choice(SERIES)
+        model = f"{series} {rng.randint(1, 20)}" if rng.random() < 0.6 else f"{brand_en[0]}{rng.randint(100, 9999)}"
+        feature1, feature2 = rng.sample(FEATURES, 2)
+        usage, usage_en = rng.choice(USAGES)
+        edition = rng.choice(EDITIONS)
+
+        display_brand = brand if rng.random() < 0.6 else brand_en
+        name = f"{display_brand} {model} {category}"
+        if rng.random() < 0.4:
+            name = f"{name} {feature1}"
+        if rng.random() < 0.2:
+            name = f"{name}（{edition}）"
+
+        keywords = ' '.join(dict.fromkeys([brand, brand_en, category, *rng.sample(category_keywords, 2), feature1]))
+        description = ''.join(
+            rng.choice(DESCRIPTION_TEMPLATES).format(
+                brand=brand, brand_en=brand_en, category=category, series=series, model=model,
+                feature1=feature1, feature2=feature2, edition=edition, usage=usage, usage_en=usage_en,
+                feature1_en=rng.choice(FEATURES_EN), feature2_en=rng.choice(FEATURES_EN),
+            )
+            for _ in range(rng.randint(1, 4))
+        )
+        return {
+            'name': name[:255],
+            'description': description,
+            'price': Decimal(rng.randint(low * 100, high * 100)) / 100,
+            'stock_quantity': rng.choice([0, rng.randint(1, 50), rng.randint(50, 2000)]),
+            'keywords': keywords[:255],
+            'status': 'active' if rng.random() < 0.95 else 'inactive',
+        }
+
+    def products(self, count: int) -> Iterator[Product]:
+        for _ in range(count):
+            yield Product(**self.product_fields())
+
+
+def generate_catalog(count: int, seed: int = 42, batch_size: int = 5000,
+                     progress: Optional[Callable[[int], None]] = None) -> int:
+    """流式生成 count 个商品并分批写入，每批一个事务；progress 在每批写入后收到累计数量"""
+    faker = CatalogFaker(seed)
+    products = faker.products(count)
+    written = 0
+    while written < count:
+        batch = [product for _, product in zip(range(min(batch_size, count - written)), products)]
+        Product.objects.bulk_create(batch)
+        written += len(batch)
+        if progress is not None:
+            progress(written)
+    return written
+
+
+def create_catalog(size: int, stock: int, prefix: Optional[str] = None, seed: int = 42,
+                   batch_size: int = 1000) -> List[int]:
+    """批量创建 size 个上架商品，每个商品库存为 stock，返回按创建顺序排列的商品ID"""
+    rng = random.Random(seed)
+    prefix = prefix or new_run_prefix()
+    products = [
+        Product(
+            name=f"{prefix}-{index:06d}",
+            price=Decimal(rng.randint(100, 99999)) / 100,
+            stock_quantity=stock,
+            keywords=','.join(rng.sample(CATALOG_WORDS, 2)),
+            status='active',
+        )
+        for index in range(size)
+    ]
+    Product.objects.bulk_create(products, batch_size=batch_size)
+    # MySQL 的 bulk_create 不回填主键，按名称前缀到主库查回
+    with use_primary():
+        return list(Product.objects.filter(name__startswith=f"{prefix}-")
+                    .order_by('name').values_list('id', flat=True))
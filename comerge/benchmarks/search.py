@@ -0,0 +1,104 @@
+"""
+商品搜索基准
+按热门词 + 长尾词的Zipf分布回放搜索关键词，分缓存未命中、缓存命中两个阶段调用
+ProductRepository.search_products，统计延迟分位数、每次搜索的查询次数与数据库耗时。
+"""
+
+import bisect
+import random
+import time
+from dataclasses import dataclass, field
+from typing import List
+
+from comerge.repositories.product_repository import ProductRepository
+from comerge.utils.request_metrics import collect_metrics
+
+from .catalog import BRANDS, CATEGORIES, EDITIONS, FEATURES, SERIES
+from .stats import latency_percentiles, zipf_cum_weights
+
+PHASES = ('miss', 'hit')
+
+
+def keyword_pool() -> List[str]:
+    """按热度排列的搜索词：品牌与品类在前，品类词、卖点、型号等长尾词在后"""
+    hot = [brand for brand, _ in BRANDS[:10]] + [category for category, _, _ in CATEGORIES[:8]]
+    tail = [brand_en for _, brand_en in BRANDS] + [brand for brand, _ in BRANDS[10:]]
+    tail += [category for category, _, _ in CATEGORIES[8:]]
+    tail += [keyword for _, keywords, _ in CATEGORIES for keyword in keywords]
+    tail += FEATURES + EDITIONS + [f"{series} {number}" for series in SERIES for number in (1, 5, 12)]
+    return list(dict.fromkeys(hot + tail))
+
+
+class KeywordWorkload:
+    """可复现的搜索词序列；no_result_ratio 比例的请求使用不存在的词，模拟无结果搜索"""
+
+    def __init__(self, seed: int = 42, exponent: float = 1.0, no_result_ratio: float = 0.02):
+        self.rng = random.Random(seed)
+        self.terms = keyword_pool()
+        self.no_result_ratio = no_result_ratio
+        self._cum_weights = zipf_cum_weights(len(self.terms), exponent)
+
+    def sample(self) -> str:
+        if self.rng.random() < self.no_result_ratio:
+            return f"zz{self.rng.getrandbits(32):08x}"
+        index = bisect.bisect(self._cum_weights, self.rng.random() * self._cum_weights[-1])
+        return self.terms[min(index, len(self.terms) - 1)]
+
+    def keywords(self, count: int) -> List[str]:
+        return [self.sample() for _ in range(count)]
+
+
+@dataclass
+class PhaseReport:
+    phase: str
+    elapsed: float = 0.0
+    latencies: List[float] = field(default_factory=list)
+    db_times: List[float] = field(default_factory=list)
+    queries: int = 0
+    empty_results: int = 0
+
+    @property
+    def calls(self) -> int:
+        return len(self.latencies)
+
+    @property
+    def throughput(self) -> float:
+        return self.calls / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def db_share(self) -> float:
+        """数据库耗时占总耗时的比例"""
+        total = sum(self.latencies)
+        return sum(self.db_times) / total if total else 0.0
+
+    def latency_percentiles(self):
+        return latency_percentiles(self.latencies)
+
+    def db_time_percentiles(self):
+        return latency_percentiles(self.db_times)
+
+
+def run_search_phase(keywords: List[str], phase: str, size: int = 20,
+                     repository: ProductRepository = None) -> PhaseReport:
+    """miss 阶段每次搜索前删除该词的缓存（删除不计时），hit 阶段先为所有词预热缓存再回放"""
+    if phase not in PHASES:
+        raise ValueError(f"不支持的阶段: {phase}")
+    repository = repository or ProductRepository()
+    if phase == 'hit':
+        for keyword in dict.fromkeys(keywords):
+            repository.warm_search(keyword, 1, size)
+
+    report = PhaseReport(phase)
+    for keyword in keywords:
+        if phase == 'miss':
+            repository.cache.delete(repository.search_cache_key(keyword, 1, size))
+        with collect_metrics() as metrics:
+            start = time.perf_counter()
+            result = repository.search_products(keyword, 1, size)
+            latency = time.perf_counter() - start
+        report.elapsed += latency
+        report.latencies.append(latency)
+        report.db_times.append(metrics.db_time)
+        report.queries += metrics.queries
+        report.empty_results += not result['total']
+    return report
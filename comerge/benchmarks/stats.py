@@ -0,0 +1,25 @@
+"""
+基准结果统计
+"""
+
+import itertools
+from typing import Dict, List, Sequence
+
+PERCENTILES = (('p50', 0.50), ('p95', 0.95), ('p99', 0.99))
+
+
+def percentile(sorted_values: Sequence[float], quantile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * quantile), len(sorted_values) - 1)]
+
+
+def latency_percentiles(latencies: Sequence[float]) -> Dict[str, float]:
+    """p50/p95/p99（单位与输入相同）"""
+    ordered = sorted(latencies)
+    return {name: percentile(ordered, quantile) for name, quantile in PERCENTILES}
+
+
+def zipf_cum_weights(size: int, exponent: float) -> List[float]:
+    """Zipf分布的累计权重，第k项（从1开始）的权重为 1/k^exponent，配合 bisect 或 random.choices 抽样"""
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, size + 1)))
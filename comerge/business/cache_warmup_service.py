@@ -0,0 +1,90 @@
+"""
+缓存预热业务服务层
+负责在发布或Redis故障切换后预先填充热点商品详情与搜索缓存
+"""
+
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from django.conf import settings
+from django.db import connections
+
+from ..repositories.order_repository import OrderRepository
+from ..repositories.product_repository import ProductRepository
+from ..utils.hot_keys import search_keyword_recorder
+
+logger = logging.getLogger(__name__)
+
+
+def get_warmup_config() -> Dict[str, Any]:
+    """读取缓存预热配置"""
+    config = {
+        'ON_STARTUP': False,
+        'TOP_PRODUCTS': 500,
+        'TOP_KEYWORDS': 100,
+        'DAYS': 7,
+        'CONCURRENCY': 4,
+        'BATCH_SIZE': 100,
+    }
+    config.update(getattr(settings, 'CACHE_WARMUP', {}))
+    return config
+
+
+class CacheWarmupService:
+    """缓存预热服务"""
+
+    def __init__(self):
+        self.product_repo = ProductRepository()
+        self.order_repo = OrderRepository()
+
+    def warm(self, top_products: int, top_keywords: int, days: int = 7,
+             concurrency: int = 4, batch_size: int = 100) -> Dict[str, Any]:
+        """预热热点商品详情和高频搜索，返回预热统计"""
+        if concurrency < 1:
+            raise ValueError("并发数必须大于0")
+
+        start = time.perf_counter()
+        since = datetime.now() - timedelta(days=days)
+
+        product_ids = self.order_repo.get_top_selling_product_ids(since, top_products) if top_products else []
+        keywords = [keyword for keyword, _ in search_keyword_recorder.top(top_keywords)] if top_keywords else []
+
+        batches = [product_ids[i:i + batch_size] for i in range(0, len(product_ids), batch_size)]
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            detail_futures = [executor.submit(self._warm_details, batch) for batch in batches]
+            search_futures = [executor.submit(self._warm_search, keyword) for keyword in keywords]
+            detail_keys = sum(future.result() for future in detail_futures)
+            search_keys = sum(future.result() for future in search_futures)
+
+        elapsed = time.perf_counter() - start
+        logger.info(f"Cache warmup done: {detail_keys} detail keys, {search_keys} search keys in {elapsed:.2f}s")
+        return {
+            'detail_keys': detail_keys,
+            'search_keys': search_keys,
+            'total_keys': detail_keys + search_keys,
+            'elapsed': elapsed,
+        }
+
+    def _warm_details(self, product_ids: List[int]) -> int:
+        try:
+            return self.product_repo.warm_details(product_ids)
+        except Exception as e:
+            logger.error(f"Warm product details error: {e}")
+            return 0
+        finally:
+            connections.close_all()
+
+    def _warm_search(self, keyword: str) -> int:
+        try:
+            # 与搜索接口默认参数一致：第1页，每页20条
+            self.product_repo.warm_search(keyword, 1, 20)
+            return 1
+        except Exception as e:
+            logger.error(f"Warm search error for keyword {keyword}: {e}")
+            return 0
+        finally:
+            connections.close_all()
@@ -0,0 +1,108 @@
+"""
+数据导出业务服务层
+负责把订单、订单明细和库存日志编码为NDJSON或CSV字节流
+"""
+
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Iterable, Iterator, Optional, Sequence, Tuple
+
+from django.utils.dateparse import parse_date, parse_datetime
+
+from ..repositories.export_repository import EXPORT_SPECS, ExportRepository
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+EXPORT_FORMATS = ('ndjson', 'csv')
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _to_json_line(record: dict) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(record, default=_json_default) + b'\n'
+    return (json.dumps(record, default=_json_default, ensure_ascii=False) + '\n').encode()
+
+
+def parse_export_time(value: Optional[str]) -> Optional[datetime]:
+    """解析导出时间范围参数，支持 YYYY-MM-DD 或 ISO 8601 日期时间"""
+    if not value:
+        return None
+    parsed = parse_datetime(value)
+    if parsed is None:
+        day = parse_date(value)
+        if day is None:
+            raise ValueError(f"无法解析的时间: {value}")
+        parsed = datetime(day.year, day.month, day.day)
+    return parsed
+
+
+class ExportService:
+    """数据导出服务"""
+
+    def __init__(self, repository: Optional[ExportRepository] = None):
+        self.repository = repository or ExportRepository()
+
+    def validate(self, kind: str, fmt: str, shard: Optional[str] = None):
+        """校验导出类型、格式与分片"""
+        if kind not in EXPORT_SPECS:
+            raise ValueError(f"不支持的导出类型: {kind}，可选: {', '.join(EXPORT_SPECS)}")
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}，可选: {', '.join(EXPORT_FORMATS)}")
+        self.repository.get_databases(kind, shard)
+
+    def stream(self, kind: str, fmt: str, start: Optional[datetime] = None,
+               end: Optional[datetime] = None, after_id: int = 0,
+               chunk_size: int = 2000, shard: Optional[str] = None) -> Iterator[bytes]:
+        """按批次生成导出字节块，游标从 after_id 之后开始"""
+        self.validate(kind, fmt, shard)
+        columns = self.repository.get_columns(kind)
+        rows = self.repository.iter_rows(kind, start, end, after_id, chunk_size, shard)
+        return self.encode(rows, columns, fmt, chunk_size)
+
+    @staticmethod
+    def encode(rows: Iterable[Tuple[Any, ...]], columns: Sequence[str], fmt: str,
+               rows_per_chunk: int = 2000) -> Iterator[bytes]:
+        """把行编码为字节块，每 rows_per_chunk 行输出一块"""
+        if fmt == 'ndjson':
+            buffer = []
+            for row in rows:
+                buffer.append(_to_json_line(dict(zip(columns, row))))
+                if len(buffer) >= rows_per_chunk:
+                    yield b''.join(buffer)
+                    buffer = []
+            if buffer:
+                yield b''.join(buffer)
+            return
+
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerow(columns)
+        pending = 0
+        for row in rows:
+            writer.writerow(row)
+            pending += 1
+            if pending >= rows_per_chunk:
+                yield text.getvalue().encode()
+                text.seek(0)
+                text.truncate()
+                pending = 0
+        if text.tell():
+            yield text.getvalue().encode()
@@ -0,0 +1,196 @@
+"""
+库存合并提交（group commit）
+同一商品在 WINDOW_MS 毫秒内到达的扣减请求由一个提交线程合并为一个事务：
+加一次行锁，按到达顺序逐个判定成功或库存不足，一条UPDATE写入合计扣减，库存日志批量插入，
+再分别唤醒各请求的调用方。热点商品上数百个并发订单的行锁排队变为每个窗口一次。
+
+扣减在提交线程自己的事务中提交，与 actor 策略相同不随订单事务回滚，订单失败时由 OrderService 写 increase 日志加回。
+调用方等待超时时，尚未开始提交的请求被取消，不会在之后的批次中扣减。
+"""
+
+import copy
+import logging
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..models import Product, StockLog
+from ..repositories.product_repository import ProductRepository
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GROUP_COMMIT = {
+    # 首个请求到达后等待合并的毫秒数，即每个请求最多增加的延迟。每个进程只有一个提交线程，
+    # 一个窗口内所有热点商品的事务在该线程中依次提交，某个商品的慢事务会推迟其他商品
+    'WINDOW_MS': 2,
+    'MAX_BATCH': 500,  # 单个事务最多合并的请求数，超过时立即提交
+    'TIMEOUT': 5.0,  # 调用方等待结果的秒数
+}
+
+
+def get_group_commit_config() -> Dict[str, Any]:
+    return {**DEFAULT_GROUP_COMMIT, **getattr(settings, 'GROUP_COMMIT', {})}
+
+
+@dataclass
+class _Request:
+    product_id: int
+    quantity: int
+    reason: str
+    order_no: str = ''
+    arrived: float = field(default_factory=time.perf_counter)
+    done: threading.Event = field(default_factory=threading.Event)
+    result: Optional[Dict[str, Any]] = None
+    # 以下两个状态在 _cond 下读写：调用方超时后取消，提交线程开始提交时认领
+    cancelled: bool = False
+    claimed: bool = False
+
+
+class GroupCommitCoordinator:
+    """进程内的合并提交协调器，请求在调用线程中等待，提交由一个后台线程完成"""
+
+    def __init__(self, window_ms: float = 2, max_batch: int = 500, timeout: float = 5.0):
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.repository = ProductRepository()
+        self._pending: List[_Request] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = defaultdict(float)
+
+    def submit(self, product_id: int, quantity: int, reason: str = '', order_no: str = '') -> Dict[str, Any]:
+        """提交一次扣减并等待所在批次提交，返回 {'ok': True, 'product': 扣减后的商品} 或失败原因"""
+        request = _Request(product_id, quantity, reason, order_no)
+        with self._cond:
+            self._ensure_thread()
+            self._pending.append(request)
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        if not request.done.wait(self.timeout):
+            with self._cond:
+                if not request.claimed:
+                    # 还没开始提交：取消后提交线程跳过该请求，超时的请求不会再扣减库存
+                    request.cancelled = True
+                    return {'ok': False, 'error': 'timeout'}
+            # 所在事务正在提交，等待真实结果
+            if not request.done.wait(self.timeout):
+                return {'ok': False, 'error': 'timeout'}
+        return request.result
+
+    def stats(self) -> Dict[str, float]:
+        """已提交的事务数、请求数、平均每个事务合并的请求数与平均排队时间"""
+        batches, requests = int(self._stats['batches']), int(self._stats['requests'])
+        return {
+            'batches': batches,
+            'requests': requests,
+            'avg_batch': round(requests / batches, 2) if batches else 0.0,
+            'avg_wait_ms': round(self._stats['wait'] / requests * 1000, 3) if requests else 0.0,
+        }
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='stock-group-commit', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                # 从首个请求到达起等满窗口，或攒够 max_batch 个请求
+                deadline = self._pending[0].arrived + self.window
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.perf_counter()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = [request for request in self._pending if not request.cancelled]
+                self._pending = []
+
+            close_old_connections()
+            by_product: Dict[int, List[_Request]] = defaultdict(list)
+            for request in batch:
+                by_product[request.product_id].append(request)
+            for product_id, requests in by_product.items():
+                self._commit_group(product_id, requests)
+
+    def _commit_group(self, product_id: int, requests: List[_Request]):
+        # 前面的商品提交期间可能有请求超时取消，开始提交前在锁内跳过已取消的请求并认领其余请求
+        with self._cond:
+            requests = [request for request in requests if not request.cancelled]
+            for request in requests:
+                request.claimed = True
+        if not requests:
+            return
+        started = time.perf_counter()
+        try:
+            results = self.commit(product_id, [(request.quantity, request.reason, request.order_no)
+                                               for request in requests])
+        except Exception as e:
+            logger.error(f"Group commit error: {e}")
+            results = [{'ok': False, 'error': 'commit_failed'}] * len(requests)
+        self._stats['batches'] += 1
+        self._stats['requests'] += len(requests)
+        self._stats['wait'] += sum(started - request.arrived for request in requests)
+        for request, result in zip(requests, results):
+            request.result = result
+            request.done.set()
+
+    def commit(self, product_id: int, items: List[Tuple[int, str, str]]) -> List[Dict[str, Any]]:
+        """一个事务内按顺序判定并提交同一商品的一组扣减，items 为 (数量, 原因, 订单号)"""
+        with transaction.atomic():
+            product = self.repository.get_with_lock(product_id)
+            if product is None:
+                current = self.repository.get_fresh(product_id)
+                return [{'ok': False, 'error': 'inactive', 'name': current.name if current else None}] * len(items)
+
+            results = []
+            logs = []
+            available = product.stock_quantity
+            for quantity, reason, order_no in items:
+                if quantity <= 0 or available < quantity:
+                    results.append({'ok': False, 'error': 'insufficient', 'name': product.name,
+                                    'available': available})
+                    continue
+                granted = copy.copy(product)
+                granted.stock_quantity = available - quantity
+                results.append({'ok': True, 'stock': granted.stock_quantity, 'product': granted})
+                logs.append(StockLog(product=product, change_type='decrease', quantity_before=available,
+                                     quantity_after=available - quantity, change_quantity=-quantity, reason=reason,
+                                     order_no=order_no))
+                available -= quantity
+
+            if logs:
+                Product.objects.filter(id=product_id).update(
+                    stock_quantity=available,
+                    version=F('version') + len(logs),
+                    updated_at=timezone.now()
+                )
+                StockLog.objects.bulk_create(logs)
+                self.repository.invalidate_product_cache(product_id)
+            return results
+
+
+_coordinator: Optional[GroupCommitCoordinator] = None
+_coordinator_key: Optional[Tuple] = None
+_coordinator_lock = threading.Lock()
+
+
+def get_group_commit_coordinator() -> GroupCommitCoordinator:
+    """按当前配置返回进程内共享的协调器，配置变化时重建"""
+    global _coordinator, _coordinator_key
+    config = get_group_commit_config()
+    key = (config['WINDOW_MS'], config['MAX_BATCH'], config['TIMEOUT'])
+    with _coordinator_lock:
+        if _coordinator is None or _coordinator_key != key:
+            _coordinator = GroupCommitCoordinator(config['WINDOW_MS'], config['MAX_BATCH'], config['TIMEOUT'])
+            _coordinator_key = key
+        return _coordinator
@@ -3,12 +3,19 @@
 负责订单相关的业务逻辑处理
 """
 
-from typing import List, Dict, Any, Optional
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
 from django.db import transaction
+from django.db.models import QuerySet
 from ..repositories.product_repository import ProductRepository
 from ..repositories.order_repository import OrderRepository
 from ..models import Order, OrderItem
+from .sales_rollup_service import SalesRollupService
+from .stock_strategies import STOCK_STRATEGIES, StockStrategy, stock_strategy_name
+from ..utils.lock_stats import lock_stats
 from ..utils.order_utils import OrderNumberGenerator
+from ..utils.sharding import get_order_shards, shard_index_for_user
+from ..utils.tracing import traced_methods
 from ..exceptions import (
     InsufficientStockException,
     ProductNotActiveException,
@@ -18,7 +25,11 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+# 订单号登记冲突时的最多生成次数
+ORDER_NO_ATTEMPTS = 5
 
+
+@traced_methods
 class OrderService:
     """订单业务服务"""
 
@@ -26,6 +37,8 @@ class OrderService:
         self.product_repo = ProductRepository()
         self.order_repo = OrderRepository()
         self.order_generator = OrderNumberGenerator()
+        self.sales_rollup = SalesRollupService()
+        self._stock_strategies = {}
 
     def create_batch_order(self, user_id: int, order_items: List[Dict]) -> Dict[str, Any]:
         """批量创建订单"""
@@ -39,12 +52,68 @@ class OrderService:
         if len(order_items) > 50:
             raise ValueError("单次最多只能下单50个商品")
 
-        # 生成订单号
-        order_no = self.order_generator.generate()
+        # 生成订单号（编码用户所在的分片）
+        order_no = self.generate_order_no(user_id)
 
         # 处理订单
         return self._process_batch_order(user_id, order_no, order_items)
 
+    def generate_order_no(self, user_id: int) -> str:
+        """为用户生成订单号，并在用户分片的 order_numbers 中登记；随机后缀冲突时重新生成"""
+        shard_index = shard_index_for_user(user_id)
+        shard = get_order_shards()[shard_index]
+        for _ in range(ORDER_NO_ATTEMPTS):
+            order_no = self.order_generator.generate(shard_index)
+            if self.order_repo.reserve_order_no(order_no, shard):
+                return order_no
+            logger.warning(f"订单号冲突，重新生成: {order_no}")
+        raise ConcurrentUpdateException("订单号生成冲突，请重试")
+
+    def purge_order_numbers(self, before: datetime) -> Dict[str, int]:
+        """清理各分片登记时间早于 before 的订单号，返回 {分片: 删除行数}"""
+        return {shard: self.order_repo.purge_order_numbers(shard, before) for shard in get_order_shards()}
+
+    def find_order_shard(self, order_no: str) -> Optional[str]:
+        """订单所在的分片"""
+        return self.order_repo.find_shard(order_no)
+
+    def order_lookup(self, order_no: str) -> Dict[str, Any]:
+        """按订单号查询订单的条件（含分区裁剪条件）"""
+        return self.order_repo.order_lookup(order_no)
+
+    def order_items_prefetch(self, order_no: str) -> List:
+        """订单详情的明细预取"""
+        return self.order_repo.items_prefetch(order_no)
+
+    def route_orders(self, queryset: QuerySet, user_id: Optional[int] = None):
+        """把订单查询路由到分片：指定用户时只查该用户的分片，否则跨分片归并"""
+        return self.order_repo.route_queryset(queryset, user_id)
+
+    async def aget_order(self, order_no: str) -> Optional[Order]:
+        """异步获取订单详情"""
+        return await self.order_repo.aget_by_order_no(order_no)
+
+    def get_order_updated_at(self, order_no: str) -> Optional[datetime]:
+        """获取订单更新时间，用于条件请求校验"""
+        return self.order_repo.get_updated_at(order_no)
+
+    async def aget_order_updated_at(self, order_no: str) -> Optional[datetime]:
+        """异步获取订单更新时间，用于条件请求校验"""
+        return await self.order_repo.aget_updated_at(order_no)
+
+    def get_stock_strategy(self, product_id: int) -> StockStrategy:
+        """商品当前使用的库存策略，热点商品路由到 STOCK_STRATEGY['HOT']"""
+        name = stock_strategy_name(product_id)
+        if name not in self._stock_strategies:
+            if name not in STOCK_STRATEGIES:
+                raise ValueError(f"未注册的库存策略: {name}")
+            self._stock_strategies[name] = STOCK_STRATEGIES[name](self.product_repo)
+        return self._stock_strategies[name]
+
+    def invalidate_order(self, order_no: str, using: Optional[str] = None):
+        """订单被修改或删除后清除相关缓存，using 为写入订单的数据库别名"""
+        self.order_repo.invalidate_order_cache(order_no, using)
+
     def _process_batch_order(self, user_id: int, order_no: str, order_items: List[Dict]) -> Dict[str, Any]:
         """处理批量订单"""
         results = {
@@ -57,11 +126,18 @@ class OrderService:
 
         # 创建订单主记录
         order = self.order_repo.create_order(order_no, user_id)
+        # 本订单已扣减的 (策略, 商品ID, 数量)，订单失败时据此补偿
+        deducted = []
+        stock_committed = []
 
         try:
-            with transaction.atomic():
+            # 订单在用户分片、库存在主库，两个事务嵌套：主库先提交，不会出现未扣库存的成功订单；
+            # 分片提交失败或订单事务回滚时，已经生效的扣减在 except 中加回；
+            # track_holds 在最外层，事务结束释放行锁后记录各商品的锁持有时间
+            with lock_stats.track_holds(), transaction.atomic(using=order._state.db), transaction.atomic():
+                transaction.on_commit(lambda: stock_committed.append(True))
                 for item_data in order_items:
-                    result = self._process_single_item(order, item_data)
+                    result = self._process_single_item(order, item_data, deducted)
 
                     if result['success']:
                         results['success_items'].append(result)
@@ -80,47 +156,45 @@ class OrderService:
                 # 更新订单
                 self.order_repo.update_order(order, results['total_amount'], status)
                 results['status'] = status
+                if results['success_items']:
+                    # on_commit 汇总方式下，分片事务提交后累加销量汇总
+                    self.sales_rollup.record_order(order)
 
         except Exception as e:
             logger.error(f"Batch order processing error: {e}")
+            # 主库事务已提交（分片提交失败）时全部扣减都已生效，否则只有不随事务回滚的策略需要补偿
+            self._compensate_stock(order, [item for item in deducted
+                                           if stock_committed or not item[0].transactional])
             self.order_repo.update_order(order, 0, 'failed')
             results['status'] = 'failed'
             results['error'] = str(e)
 
         return results
 
-    def _process_single_item(self, order: Order, item_data: Dict) -> Dict[str, Any]:
-        """处理单个订单项"""
+    def _compensate_stock(self, order: Order, deducted: List[Tuple[StockStrategy, int, int]]):
+        """订单失败后把已生效的扣减加回库存（increase 日志），单个商品失败时记录错误并继续"""
+        for _, product_id, quantity in deducted:
+            try:
+                restored = self.product_repo.restore_stock(product_id, quantity, f'订单失败回补 - {order.order_no}',
+                                                           order.order_no)
+            except Exception as e:
+                logger.error(f"Restore stock error: {e}")
+                restored = False
+            if not restored:
+                logger.error(f"库存回补失败: order={order.order_no}, product={product_id}, quantity={quantity}")
+
+    def _process_single_item(self, order: Order, item_data: Dict,
+                             deducted: Optional[List[Tuple[StockStrategy, int, int]]] = None) -> Dict[str, Any]:
+        """处理单个订单项，扣减成功时把 (策略, 商品ID, 数量) 追加到 deducted"""
         product_id = item_data['product_id']
         quantity = item_data['quantity']
 
         try:
-            # 获取商品并加锁
-            product = self.product_repo.get_with_lock(product_id)
-            if not product:
-                # 抛出商品未激活异常
-                raise ProductNotActiveException(f"商品ID: {product_id}")
-
-            # 检查商品状态
-            if product.status != 'active':
-                raise ProductNotActiveException(product.name)
-
-            # 检查库存
-            if product.stock_quantity < quantity:
-                # 抛出库存不足异常
-                raise InsufficientStockException(
-                    product.name,
-                    product.stock_quantity,
-                    quantity
-                )
-
-            # 扣减库存
-            stock_updated = self.product_repo.update_stock(
-                product, -quantity, f'订单扣减 - {order.order_no}'
-            )
-
-            if not stock_updated:
-                raise Exception("库存更新失败")
+            # 按商品的竞争情况选择库存策略：校验状态与库存并扣减，失败时抛出业务异常
+            strategy = self.get_stock_strategy(product_id)
+            product = strategy.deduct(product_id, quantity, f'订单扣减 - {order.order_no}', order.order_no)
+            if deducted is not None:
+                deducted.append((strategy, product_id, quantity))
 
             # 创建成功的订单项
             total_price = product.price * quantity
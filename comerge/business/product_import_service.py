@@ -0,0 +1,311 @@
+"""
+商品批量导入业务服务层
+负责解析流式的NDJSON、CSV或JSON数组，校验后按批次写入商品
+"""
+
+import codecs
+import csv
+import json
+import logging
+import time
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+
+from ..models import Product
+from ..repositories.product_repository import IMPORT_REQUIRED_FIELDS, ProductRepository
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+IMPORT_FORMATS = ('ndjson', 'csv', 'json')
+
+DEFAULT_PRODUCT_IMPORT = {
+    'MAX_BODY_BYTES': 20 * 1024 * 1024,  # 导入接口的请求体上限（按 Content-Length 判断）
+    'MAX_ROWS': 50000,  # 导入接口单次最多处理的行数，超出的行不导入
+}
+
+# JSON数组每次从数据源读取的字节数
+JSON_READ_SIZE = 64 * 1024
+
+# 返回结果中最多保留的错误明细条数
+MAX_ERRORS = 100
+
+MAX_PRICE = Decimal('99999999.99')
+STATUS_VALUES = {value for value, _ in Product.STATUS_CHOICES}
+
+
+def get_product_import_config() -> Dict[str, Any]:
+    return {**DEFAULT_PRODUCT_IMPORT, **getattr(settings, 'PRODUCT_IMPORT', {})}
+
+
+def _loads(data):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def detect_format(content_type: str) -> Optional[str]:
+    """根据请求的 Content-Type 判断导入格式"""
+    content_type = (content_type or '').split(';')[0].strip().lower()
+    if content_type in ('application/x-ndjson', 'application/jsonlines', 'application/x-jsonlines'):
+        return 'ndjson'
+    if content_type in ('text/csv', 'application/csv'):
+        return 'csv'
+    if content_type == 'application/json':
+        return 'json'
+    return None
+
+
+def iter_records(lines: Iterable[bytes], fmt: str) -> Iterator[Tuple[int, Any]]:
+    """逐行解析导入数据，产出 (行号, 记录)；无法解析的行以异常对象代替记录"""
+    if fmt == 'ndjson':
+        for line_no, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield line_no, _loads(line)
+            except ValueError as e:
+                yield line_no, ValueError(f"JSON格式错误: {e}")
+    elif fmt == 'csv':
+        reader = csv.DictReader(_decode_lines(lines))
+        try:
+            for record in reader:
+                # line_num 是该记录最后一行的行号，表头占第1行
+                yield reader.line_num, record
+        except csv.Error as e:
+            raise ValueError(f"CSV格式错误（第{reader.line_num}行）: {e}")
+    elif fmt == 'json':
+        yield from _iter_json_array(_read_chunks(lines))
+    else:
+        raise ValueError(f"不支持的导入格式: {fmt}，可选: {', '.join(IMPORT_FORMATS)}")
+
+
+def _read_chunks(source: Iterable[bytes]) -> Iterator[bytes]:
+    """文件或请求对象按固定大小读取，不按行读取（整个JSON数组可能只有一行）"""
+    read = getattr(source, 'read', None)
+    if read is None:
+        yield from source
+        return
+    while True:
+        chunk = read(JSON_READ_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+def _iter_json_array(chunks: Iterable[bytes]) -> Iterator[Tuple[int, Any]]:
+    """增量解析JSON数组，逐个产出 (序号, 元素)，内存只与单个元素和读取块的大小有关"""
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8-sig')()
+    chunks = iter(chunks)
+    buffer, pos, eof = '', 0, False
+
+    def fill() -> bool:
+        """读入下一块，丢弃已解析的部分；数据已读完时返回False"""
+        nonlocal buffer, pos, eof
+        if eof:
+            return False
+        chunk = next(chunks, None)
+        eof = chunk is None
+        buffer = buffer[pos:] + (text.decode(b'', final=True) if eof else text.decode(chunk))
+        pos = 0
+        return True
+
+    def peek() -> str:
+        """跳过空白，返回下一个字符，数据结束时返回空串"""
+        nonlocal pos
+        while True:
+            while pos < len(buffer) and buffer[pos] in ' \t\r\n':
+                pos += 1
+            if pos < len(buffer):
+                return buffer[pos]
+            if not fill():
+                return ''
+
+    if peek() != '[':
+        raise ValueError("JSON导入数据必须是数组")
+    pos += 1
+    index = 0
+    while True:
+        char = peek()
+        if char == ']':
+            pos += 1
+            if peek():
+                raise ValueError("JSON格式错误: 数组之后还有多余内容")
+            return
+        if index:
+            if char != ',':
+                raise ValueError(f"JSON格式错误: 第{index}个元素之后缺少逗号")
+            pos += 1
+            char = peek()
+        if not char:
+            raise ValueError("JSON格式错误: 数组不完整")
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError as e:
+                # 元素跨越读取块时补读后重试
+                if fill():
+                    continue
+                raise ValueError(f"JSON格式错误（第{index + 1}个元素）: {e}")
+            # 数字可能在块末尾被截断，补读后重新解析
+            if end == len(buffer) and fill():
+                continue
+            break
+        pos = end
+        index += 1
+        yield index, value
+
+
+def _decode_lines(lines: Iterable[bytes]) -> Iterator[str]:
+    first = True
+    for line in lines:
+        text = line.decode('utf-8-sig' if first else 'utf-8')
+        first = False
+        yield text
+
+
+def clean_record(record: Any) -> Dict[str, Any]:
+    """校验并转换单条导入记录，只保留出现过的字段；CSV中的空数值单元格视为未提供"""
+    if not isinstance(record, dict):
+        raise ValueError("记录必须是对象")
+
+    cleaned: Dict[str, Any] = {}
+    product_id = record.get('id')
+    if product_id not in (None, ''):
+        try:
+            cleaned['id'] = int(product_id)
+        except (TypeError, ValueError):
+            raise ValueError(f"商品ID无效: {product_id}")
+        if cleaned['id'] <= 0:
+            raise ValueError(f"商品ID无效: {product_id}")
+
+    if 'name' in record:
+        name = str(record['name'] or '').strip()
+        if not name:
+            raise ValueError("商品名称不能为空")
+        if len(name) > 255:
+            raise ValueError("商品名称不能超过255个字符")
+        cleaned['name'] = name
+
+    price = record.get('price')
+    if price not in (None, ''):
+        try:
+            price = Decimal(str(price)).quantize(Decimal('0.01'))
+        except InvalidOperation:
+            raise ValueError(f"价格无效: {record['price']}")
+        if price <= 0 or price > MAX_PRICE:
+            raise ValueError(f"价格超出范围: {price}")
+        cleaned['price'] = price
+
+    stock = record.get('stock_quantity')
+    if stock not in (None, ''):
+        try:
+            stock = int(stock)
+        except (TypeError, ValueError):
+            raise ValueError(f"库存数量无效: {stock}")
+        if stock < 0:
+            raise ValueError("库存数量不能为负数")
+        cleaned['stock_quantity'] = stock
+
+    status = record.get('status')
+    if status not in (None, ''):
+        if status not in STATUS_VALUES:
+            raise ValueError(f"商品状态无效: {status}")
+        cleaned['status'] = status
+
+    if record.get('description') is not None:
+        cleaned['description'] = str(record['description'])
+
+    if record.get('keywords') is not None:
+        keywords = str(record['keywords'])
+        if len(keywords) > 255:
+            raise ValueError("搜索关键词不能超过255个字符")
+        cleaned['keywords'] = keywords
+
+    if 'id' not in cleaned:
+        missing = [name for name in IMPORT_REQUIRED_FIELDS if name not in cleaned]
+        if missing:
+            raise ValueError(f"新建商品缺少字段: {', '.join(missing)}")
+    return cleaned
+
+
+class ProductImportService:
+    """商品批量导入服务"""
+
+    def __init__(self, repository: Optional[ProductRepository] = None):
+        self.repository = repository or ProductRepository()
+
+    def import_stream(self, lines: Iterable[bytes], fmt: str, chunk_size: int = 1000,
+                      max_rows: Optional[int] = None) -> Dict[str, Any]:
+        """解析并导入数据流，每 chunk_size 行一个事务；lines 为按行迭代的文件或请求对象"""
+        if fmt not in IMPORT_FORMATS:
+            raise ValueError(f"不支持的导入格式: {fmt}，可选: {', '.join(IMPORT_FORMATS)}")
+        return self.import_records(iter_records(lines, fmt), chunk_size, max_rows)
+
+    def import_records(self, records: Iterable[Tuple[int, Any]], chunk_size: int = 1000,
+                       max_rows: Optional[int] = None) -> Dict[str, Any]:
+        """校验记录并按批次写入，单行错误不影响其它行
+
+        超过 max_rows 时停止读取并在 aborted 中说明，已提交的批次保留。
+        """
+        started = time.perf_counter()
+        summary = {'total': 0, 'created': 0, 'updated': 0, 'stock_logs': 0, 'failed': 0, 'errors': [],
+                   'aborted': None}
+
+        chunk: List[Dict[str, Any]] = []
+        line_numbers: List[int] = []
+        for line_no, record in records:
+            if max_rows is not None and summary['total'] >= max_rows:
+                summary['aborted'] = f"超过单次导入行数上限{max_rows}，第{line_no}行及之后的数据未导入"
+                break
+            summary['total'] += 1
+            try:
+                if isinstance(record, Exception):
+                    raise record
+                chunk.append(clean_record(record))
+                line_numbers.append(line_no)
+            except ValueError as e:
+                self._add_error(summary, line_no, str(e))
+
+            if len(chunk) >= chunk_size:
+                self._apply_chunk(chunk, line_numbers, summary)
+                chunk, line_numbers = [], []
+
+        if chunk:
+            self._apply_chunk(chunk, line_numbers, summary)
+
+        summary['elapsed'] = round(time.perf_counter() - started, 3)
+        return summary
+
+    def _apply_chunk(self, chunk: List[Dict[str, Any]], line_numbers: List[int], summary: Dict[str, Any]):
+        try:
+            result = self.repository.bulk_upsert(chunk)
+        except Exception as e:
+            logger.error(f"Bulk upsert products error at rows {line_numbers[0]}-{line_numbers[-1]}: {e}")
+            summary['failed'] += len(chunk)
+            if len(summary['errors']) < MAX_ERRORS:
+                summary['errors'].append({
+                    'row': line_numbers[0],
+                    'message': f"第{line_numbers[0]}-{line_numbers[-1]}行写入失败: {e}",
+                })
+            return
+
+        summary['created'] += result['created']
+        summary['updated'] += result['updated']
+        summary['stock_logs'] += result['stock_logs']
+        for index in result['rejected']:
+            self._add_error(summary, line_numbers[index],
+                            f"商品ID {chunk[index]['id']} 不存在，新建商品缺少字段: "
+                            f"{', '.join(IMPORT_REQUIRED_FIELDS)}")
+
+    @staticmethod
+    def _add_error(summary: Dict[str, Any], line_no: int, message: str):
+        summary['failed'] += 1
+        if len(summary['errors']) < MAX_ERRORS:
+            summary['errors'].append({'row': line_no, 'message': message})
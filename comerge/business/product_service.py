@@ -7,11 +7,17 @@ from typing import List, Optional, Dict, Any
 from ..repositories.product_repository import ProductRepository
 from ..models import Product
 from ..exceptions import ProductNotActiveException
+from ..utils.hot_keys import search_keyword_recorder
+from ..utils.tracing import traced_methods
 import logging
 
 logger = logging.getLogger(__name__)
 
+# 批量查询单次最多的商品ID数量
+BATCH_LOOKUP_MAX_IDS = 100
 
+
+@traced_methods
 class ProductService:
     """商品业务服务"""
 
@@ -25,8 +31,42 @@ class ProductService:
         
         if size > 100:
             size = 100
-        
-        return self.repository.search_products(keyword.strip(), page, size)
+
+        keyword = keyword.strip()
+        # 记录搜索关键词，供缓存预热使用
+        search_keyword_recorder.record(keyword)
+        return self.repository.search_products(keyword, page, size)
+
+    def get_products_batch(self, product_ids: List[int]) -> List[Dict[str, Any]]:
+        """按请求顺序批量获取商品，不存在或已下架的商品标记为 found=False"""
+        if not product_ids:
+            raise ValueError("商品ID列表不能为空")
+        if len(product_ids) > BATCH_LOOKUP_MAX_IDS:
+            raise ValueError(f"单次最多查询{BATCH_LOOKUP_MAX_IDS}个商品")
+
+        # 去重后查询，结果仍按请求顺序（包括重复ID）返回
+        unique_ids = list(dict.fromkeys(product_ids))
+        products = self.repository.get_many_by_ids(unique_ids)
+        return [
+            {'id': product_id, 'found': product_id in products, 'product': products.get(product_id)}
+            for product_id in product_ids
+        ]
+
+    async def asearch_products(self, keyword: str, page: int = 1, size: int = 20) -> Dict[str, Any]:
+        """异步搜索商品"""
+        if not keyword or not keyword.strip():
+            raise ValueError("搜索关键词不能为空")
+
+        if size > 100:
+            size = 100
+
+        keyword = keyword.strip()
+        search_keyword_recorder.record(keyword)
+        return await self.repository.asearch_products(keyword, page, size)
+
+    async def aget_product(self, product_id: int) -> Optional[Product]:
+        """异步获取在售商品详情"""
+        return await self.repository.aget_by_id(product_id)
 
     def get_stock_logs(self, product_id: int, page: int = 1, size: int = 20):
         """获取商品库存日志"""
@@ -36,3 +76,11 @@ class ProductService:
             raise ProductNotActiveException(f"商品ID: {product_id}")
 
         return self.repository.get_stock_logs(product_id, page, size)
+
+    def get_product_version(self, product_id: int) -> Optional[int]:
+        """获取商品版本号，用于条件请求校验"""
+        return self.repository.get_version(product_id)
+
+    def invalidate_product(self, product_id: int):
+        """商品被修改或删除后清除相关缓存"""
+        self.repository.invalidate_product_cache(product_id)
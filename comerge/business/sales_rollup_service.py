@@ -0,0 +1,286 @@
+"""
+销量汇总业务服务层
+把成功的订单明细累加到小时/日汇总表，提供按水位增量汇总、按时间窗口回填，以及排行与时间序列查询。
+
+汇总方式由 SALES_ROLLUP['MODE'] 选择：
+- watermark：rollup_sales 定期按各分片的明细ID水位增量汇总，水位与汇总在同一个主库事务中推进，不重不漏；
+  只汇总创建超过 SAFETY_LAG 秒的明细，给仍未提交的下单事务留出时间
+- on_commit：下单事务提交后立即累加本订单的成功明细，延迟最低，但热点商品的汇总行会成为新的行锁热点，
+  提交后累加失败的增量只记录日志，需要回填修复
+"""
+
+import logging
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from ..db_router import use_primary
+from ..models import Product
+from ..repositories.sales_rollup_repository import GRAINS, Buckets, SalesRollupRepository
+from ..utils.sharding import get_order_shards
+from ..utils.tracing import traced_methods
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_MODES = ('watermark', 'on_commit', 'off')
+METRIC_CHOICES = ('units', 'revenue')
+CENT = Decimal('0.01')
+
+DEFAULT_SALES_ROLLUP = {
+    'MODE': 'watermark',
+    'CHUNK_SIZE': 5000,  # 增量汇总每个事务处理的明细数
+    'SAFETY_LAG': 60,  # 只汇总创建超过该秒数的明细
+    'MAX_HOURS': 24 * 31,  # 小时粒度查询的最大跨度
+    'MAX_DAYS': 366,  # 日粒度查询的最大跨度
+    'MAX_LIMIT': 100,  # 排行最多返回的商品数
+}
+
+
+def get_sales_rollup_config() -> Dict[str, Any]:
+    return {**DEFAULT_SALES_ROLLUP, **getattr(settings, 'SALES_ROLLUP', {})}
+
+
+def hour_of(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def day_of(value: datetime) -> date:
+    return (timezone.localtime(value) if timezone.is_aware(value) else value).date()
+
+
+def day_start(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _money(value) -> str:
+    """汇总后的金额按分输出（SQLite 的 SUM 会丢掉小数末尾的0）"""
+    return str(Decimal(value or 0).quantize(CENT))
+
+
+def _add(buckets: Buckets, key: Tuple[int, Any], units: int, revenue: Decimal, items: int):
+    values = buckets.get(key)
+    if values is None:
+        buckets[key] = [units, revenue, items]
+    else:
+        values[0] += units
+        values[1] += revenue
+        values[2] += items
+
+
+def bucket_sold_items(rows: List[Tuple]) -> Tuple[Buckets, Buckets]:
+    """把 SOLD_ITEM_FIELDS 行按 (商品, 小时) 与 (商品, 日) 合并"""
+    hourly: Buckets = {}
+    daily: Buckets = {}
+    for _, product_id, created_at, quantity, total_price in rows:
+        _add(hourly, (product_id, hour_of(created_at)), quantity, total_price, 1)
+        _add(daily, (product_id, day_of(created_at)), quantity, total_price, 1)
+    return hourly, daily
+
+
+@traced_methods
+class SalesRollupService:
+    """销量汇总服务"""
+
+    def __init__(self, repository: Optional[SalesRollupRepository] = None):
+        self.repository = repository or SalesRollupRepository()
+        self.config = get_sales_rollup_config()
+        if self.config['MODE'] not in ROLLUP_MODES:
+            raise ValueError(f"不支持的汇总方式: {self.config['MODE']}")
+
+    # ---- 写入 ----
+
+    def record_order(self, order):
+        """on_commit 方式下，在下单事务中调用：订单所在分片的事务提交后累加本订单的成功明细"""
+        if self.config['MODE'] != 'on_commit':
+            return
+        rows = self.repository.sold_items_of_order(order)
+        if rows:
+            transaction.on_commit(lambda: self._apply_committed(rows), using=order._state.db)
+
+    def _apply_committed(self, rows: List[Tuple]):
+        try:
+            self.apply(rows)
+        except Exception as e:
+            logger.error(f"Sales rollup increment error: {e}")
+
+    def apply(self, rows: List[Tuple]):
+        """在一个主库事务中把明细累加到小时与日汇总"""
+        hourly, daily = bucket_sold_items(rows)
+        with transaction.atomic():
+            self.repository.increment('hour', hourly)
+            self.repository.increment('day', daily)
+
+    def roll_up_shard(self, shard: str, chunk_size: Optional[int] = None, now: Optional[datetime] = None) -> int:
+        """按水位汇总分片上的一批明细，返回本批汇总的明细数
+
+        明细按主键升序读取，遇到创建时间在安全延迟之内的明细即停止，
+        较小ID的明细所在事务可能晚于较大ID提交，不能越过它们推进水位。
+        """
+        chunk_size = chunk_size or self.config['CHUNK_SIZE']
+        cutoff = (now or timezone.now()) - timedelta(seconds=self.config['SAFETY_LAG'])
+        with transaction.atomic():
+            watermark = self.repository.lock_watermark(shard)
+            rows = self.repository.sold_items_after(shard, watermark.last_item_id, chunk_size)
+            settled = []
+            for row in rows:
+                if row[2] > cutoff:
+                    break
+                settled.append(row)
+            if not settled:
+                return 0
+            hourly, daily = bucket_sold_items(settled)
+            self.repository.increment('hour', hourly)
+            self.repository.increment('day', daily)
+            self.repository.save_watermark(watermark, settled[-1][0])
+        return len(settled)
+
+    def catch_up(self, chunk_size: Optional[int] = None, now: Optional[datetime] = None) -> Dict[str, int]:
+        """把每个分片汇总到安全延迟之前，返回各分片本次汇总的明细数"""
+        if self.config['MODE'] != 'watermark':
+            raise ValueError(f"当前汇总方式为 {self.config['MODE']}，按水位汇总会重复累加")
+        chunk_size = chunk_size or self.config['CHUNK_SIZE']
+        processed = {}
+        for shard in get_order_shards():
+            total = 0
+            while True:
+                count = self.roll_up_shard(shard, chunk_size, now)
+                total += count
+                if count < chunk_size:
+                    break
+            processed[shard] = total
+        return processed
+
+    def initialize_watermarks(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """把从未汇总过的分片水位直接推进到安全延迟之前的最大明细ID，之前的明细交给全量回填重建"""
+        cutoff = (now or timezone.now()) - timedelta(seconds=self.config['SAFETY_LAG'])
+        initialized = {}
+        for shard in get_order_shards():
+            with transaction.atomic():
+                watermark = self.repository.lock_watermark(shard)
+                if watermark.last_item_id == 0:
+                    self.repository.save_watermark(watermark, self.repository.max_item_id(shard, cutoff))
+                initialized[shard] = watermark.last_item_id
+        return initialized
+
+    def backfill(self, start: Optional[datetime] = None, end: Optional[datetime] = None, days_per_chunk: int = 1,
+                 progress: Optional[Callable[[datetime, datetime, int], None]] = None) -> int:
+        """按自然日对齐的窗口从订单明细重建汇总，每个窗口一个事务，返回写入的小时汇总行数
+
+        不指定 start 时从最早的明细开始重建全部历史，watermark 方式下先初始化从未汇总过的分片水位。
+        watermark 方式下每个窗口锁住各分片水位，只重建水位以内的明细，水位之后的仍由增量汇总累加；
+        其它方式下只回填安全延迟之前已结束的自然日，避免与提交后的累加互相覆盖。
+        """
+        if start is None:
+            if self.config['MODE'] == 'watermark':
+                self.initialize_watermarks()
+            start = self.repository.earliest_item_created_at(get_order_shards())
+            if start is None:
+                return 0
+        elif self.config['MODE'] == 'watermark':
+            # 没有水位记录的分片从未汇总或初始化过，只重建水位以内的明细会清空它的历史
+            with use_primary():
+                watermarks = self.repository.get_watermarks()
+            pending = [shard for shard in get_order_shards()
+                       if shard not in watermarks and self.repository.earliest_item_created_at([shard]) is not None]
+            if pending:
+                raise ValueError(f"分片 {', '.join(pending)} 尚未汇总，请先不指定开始时间做全量回填")
+        end = end or timezone.now()
+        start = day_start(start)
+        end = day_start(end) + timedelta(days=1) if end != day_start(end) else end
+        if self.config['MODE'] != 'watermark':
+            end = min(end, day_start(timezone.now() - timedelta(seconds=self.config['SAFETY_LAG'])))
+        written = 0
+        window_start = start
+        while window_start < end:
+            window_end = min(window_start + timedelta(days=days_per_chunk), end)
+            written += self._rebuild_window(window_start, window_end)
+            if progress is not None:
+                progress(window_start, window_end, written)
+            window_start = window_end
+        return written
+
+    def _rebuild_window(self, start: datetime, end: datetime) -> int:
+        hourly: Buckets = {}
+        daily: Buckets = {}
+        with transaction.atomic():
+            for shard in get_order_shards():
+                upto_id = None
+                if self.config['MODE'] == 'watermark':
+                    upto_id = self.repository.lock_watermark(shard).last_item_id
+                for product_id, hour, units, revenue, items in self.repository.aggregate_sold_items(
+                        shard, start, end, upto_id):
+                    _add(hourly, (product_id, hour), units, revenue, items)
+                    _add(daily, (product_id, day_of(hour)), units, revenue, items)
+            written = self.repository.replace_range('hour', start, end, hourly)
+            self.repository.replace_range('day', start.date(), end.date(), daily)
+        return written
+
+    # ---- 查询 ----
+
+    def parse_range(self, grain: str, start: Optional[datetime], end: Optional[datetime]) -> Tuple[Any, Any]:
+        """校验粒度与时间范围，默认查询最近24小时（小时粒度）或最近7天（日粒度）"""
+        if grain not in GRAINS:
+            raise ValueError(f"不支持的汇总粒度: {grain}，可选: {', '.join(GRAINS)}")
+        now = timezone.now()
+        if grain == 'hour':
+            end = hour_of(end or now + timedelta(hours=1))
+            start = hour_of(start) if start else end - timedelta(hours=24)
+            if end - start > timedelta(hours=self.config['MAX_HOURS']):
+                raise ValueError(f"小时粒度最多查询{self.config['MAX_HOURS']}小时")
+        else:
+            end = day_of(end) if end else day_of(now) + timedelta(days=1)
+            start = day_of(start) if start else end - timedelta(days=7)
+            if (end - start).days > self.config['MAX_DAYS']:
+                raise ValueError(f"日粒度最多查询{self.config['MAX_DAYS']}天")
+        if start >= end:
+            raise ValueError("开始时间必须早于结束时间")
+        return start, end
+
+    def top_products(self, grain: str, start: Optional[datetime], end: Optional[datetime],
+                     metric: str = 'units', limit: int = 20) -> Dict[str, Any]:
+        """时间范围内销量或销售额最高的商品"""
+        if metric not in METRIC_CHOICES:
+            raise ValueError(f"不支持的排序指标: {metric}，可选: {', '.join(METRIC_CHOICES)}")
+        start, end = self.parse_range(grain, start, end)
+        limit = min(max(limit, 1), self.config['MAX_LIMIT'])
+        rows = self.repository.top_products(grain, start, end, metric, limit)
+        names = dict(Product.objects.filter(id__in=[row[0] for row in rows]).values_list('id', 'name'))
+        return {
+            'grain': grain,
+            'start': start,
+            'end': end,
+            'metric': metric,
+            'products': [
+                {'product_id': product_id, 'name': names.get(product_id), 'units': units,
+                 'revenue': _money(revenue), 'order_items': items}
+                for product_id, units, revenue, items in rows
+            ],
+        }
+
+    def time_series(self, grain: str, start: Optional[datetime], end: Optional[datetime],
+                    product_id: Optional[int] = None) -> Dict[str, Any]:
+        """时间范围内每个小时或每天的销量，没有销售的时间桶补零"""
+        start, end = self.parse_range(grain, start, end)
+        rows = {bucket: (units, revenue, items)
+                for bucket, units, revenue, items in self.repository.product_series(grain, product_id, start, end)}
+        step = timedelta(hours=1) if grain == 'hour' else timedelta(days=1)
+        points = []
+        bucket = start
+        while bucket < end:
+            units, revenue, items = rows.get(bucket, (0, 0, 0))
+            points.append({'bucket': bucket, 'units': units, 'revenue': _money(revenue), 'order_items': items})
+            bucket += step
+        return {'grain': grain, 'start': start, 'end': end, 'product_id': product_id, 'points': points}
+
+    def status(self) -> Dict[str, Any]:
+        """当前汇总方式与各分片水位（读主库）"""
+        with use_primary():
+            watermarks = self.repository.get_watermarks()
+        return {
+            'mode': self.config['MODE'],
+            'watermarks': {shard: watermarks.get(shard, 0) for shard in get_order_shards()},
+        }
@@ -0,0 +1,339 @@
+"""
+库存执行器（按商品分区的actor模型）
+库存扣减按 product_id 一致性哈希路由到固定的一组分区进程，每个分区独占其商品的内存库存，
+顺序执行扣减，成批提交到数据库后再回复调用方，热点商品不再在数据库行锁上排队。
+
+协议为本地TCP上逐行的JSON：
+    请求 {"product_id": 1, "quantity": 2, "reason": "...", "order_no": "..."}
+    回复 {"ok": true, "stock": 8, "name": "...", "price": "9.90"}
+      或 {"ok": false, "error": "insufficient", "available": 1, "name": "..."}
+
+一致性：只有成批提交成功后才回复成功，分区崩溃时未提交的扣减不会被确认，重启后从数据库重新加载库存；
+提交时要求数据库库存与内存库存完全一致，执行器之外的扣减或补货都会触发重新加载后重试。
+扣减与订单不在同一个事务中，订单事务回滚时由 OrderService 直接在数据库中加回，分区随后因库存不一致重新加载。
+"""
+
+import asyncio
+import json
+import logging
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import close_old_connections, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from ..db_router import use_primary
+from ..exceptions import StockExecutorUnavailable
+from ..models import Product, StockLog
+from ..repositories.product_repository import ProductRepository
+from ..utils.hash_ring import HashRing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STOCK_EXECUTOR = {
+    'PARTITIONS': [],  # 分区地址 "host:port"，顺序与数量决定商品归属，上线后不要随意调整
+    'TIMEOUT': 2.0,  # 客户端等待回复的秒数
+    'BATCH_SIZE': 200,  # 每批最多提交的扣减数
+    'BATCH_INTERVAL': 0.002,  # 凑批的最长等待秒数
+    'RELOAD_AFTER': 30,  # 内存库存超过该秒数后从数据库重新加载，以吸收执行器之外的补货
+}
+
+
+def get_stock_executor_config() -> Dict[str, Any]:
+    return {**DEFAULT_STOCK_EXECUTOR, **getattr(settings, 'STOCK_EXECUTOR', {})}
+
+
+def parse_address(address: str) -> Tuple[str, int]:
+    host, _, port = address.rpartition(':')
+    return host or '127.0.0.1', int(port)
+
+
+class _PersistConflict(Exception):
+    """数据库中的库存已被执行器之外的写入修改，内存库存失效"""
+
+    def __init__(self, product_ids: List[int]):
+        super().__init__(f"库存冲突: {product_ids}")
+        self.product_ids = product_ids
+
+
+@dataclass
+class _StockEntry:
+    name: str
+    price: Decimal
+    status: str
+    stock: int
+    loaded_at: float
+
+
+class StockPartition:
+    """单个分区：事件循环接收请求，单线程顺序应用并成批持久化
+
+    数据库操作放在单独的一个线程中执行，持久化一批时新请求继续排队，组成下一批。
+    """
+
+    def __init__(self, address: str = '127.0.0.1:0', batch_size: int = 200, batch_interval: float = 0.002,
+                 reload_after: float = 30):
+        self.address = address
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.reload_after = reload_after
+        self.repository = ProductRepository()
+        self._entries: Dict[int, _StockEntry] = {}
+        self._db = ThreadPoolExecutor(max_workers=1, thread_name_prefix='stock-partition-db')
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._writers = set()
+        self._ready = threading.Event()
+
+    # ---------- 运行 ----------
+
+    def run(self):
+        """在当前线程运行分区直到 stop()"""
+        asyncio.run(self._serve())
+
+    def start_in_thread(self) -> str:
+        """在后台线程运行分区（测试与单进程部署），返回实际监听的地址"""
+        threading.Thread(target=self.run, name=f'stock-partition-{self.address}', daemon=True).start()
+        self._ready.wait(5)
+        return self.address
+
+    def stop(self):
+        """停止监听并断开现有连接，等待回复的客户端会收到连接关闭"""
+        if self._loop is not None and self._server is not None:
+            self._loop.call_soon_threadsafe(self._close)
+
+    def _close(self):
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        host, port = parse_address(self.address)
+        self._server = await asyncio.start_server(self._handle_connection, host, port)
+        bound_host, bound_port = self._server.sockets[0].getsockname()[:2]
+        self.address = f"{bound_host}:{bound_port}"
+        applier = asyncio.create_task(self._apply_loop())
+        self._ready.set()
+        logger.info(f"Stock partition listening on {self.address}")
+        try:
+            await self._server.wait_closed()
+        finally:
+            applier.cancel()
+            await self._loop.run_in_executor(self._db, connections.close_all)
+            self._db.shutdown(wait=False)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    item = (int(request['product_id']), int(request['quantity']), str(request.get('reason', '')),
+                            str(request.get('order_no', '')))
+                except (ValueError, KeyError, TypeError):
+                    reply = {'ok': False, 'error': 'bad_request'}
+                else:
+                    future = self._loop.create_future()
+                    await self._queue.put((item, future))
+                    reply = await future
+                writer.write(json.dumps(reply).encode() + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _apply_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.batch_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            items = [item for item, _ in batch]
+            try:
+                replies = await self._loop.run_in_executor(self._db, self.process_batch, items)
+            except Exception as e:
+                logger.error(f"Stock partition batch error: {e}")
+                replies = [{'ok': False, 'error': 'persist_failed'}] * len(batch)
+            for (_, future), reply in zip(batch, replies):
+                if not future.done():
+                    future.set_result(reply)
+
+    # ---------- 应用与持久化（数据库线程） ----------
+
+    def process_batch(self, items: List[Tuple[int, int, str, str]]) -> List[Dict[str, Any]]:
+        """顺序应用一批扣减并提交；内存库存与数据库冲突时重新加载后重试一次"""
+        close_old_connections()
+        for attempt in range(2):
+            snapshot = {product_id: entry.stock for product_id, entry in self._entries.items()}
+            try:
+                return self._apply_and_persist(items)
+            except _PersistConflict as e:
+                self._restore(snapshot)
+                for product_id in e.product_ids:
+                    self._entries.pop(product_id, None)
+                if attempt:
+                    return [{'ok': False, 'error': 'conflict'}] * len(items)
+            except Exception:
+                # 提交失败时本批的扣减都未确认，丢弃相关商品的内存库存，下次从数据库加载
+                for product_id, *_ in items:
+                    self._entries.pop(product_id, None)
+                raise
+        return []
+
+    def _restore(self, snapshot: Dict[int, int]):
+        for product_id, stock in snapshot.items():
+            if product_id in self._entries:
+                self._entries[product_id].stock = stock
+
+    def _load(self, product_ids: List[int]):
+        now = time.monotonic()
+        stale = [product_id for product_id in dict.fromkeys(product_ids)
+                 if product_id not in self._entries or now - self._entries[product_id].loaded_at > self.reload_after]
+        if not stale:
+            return
+        for product_id in stale:
+            self._entries.pop(product_id, None)
+        with use_primary():
+            rows = list(Product.objects.filter(id__in=stale)
+                        .values_list('id', 'name', 'price', 'status', 'stock_quantity'))
+        for product_id, name, price, status, stock in rows:
+            self._entries[product_id] = _StockEntry(name, price, status, stock, now)
+
+    def _apply_and_persist(self, items: List[Tuple[int, int, str, str]]) -> List[Dict[str, Any]]:
+        self._load([product_id for product_id, *_ in items])
+        replies = []
+        accepted: Dict[int, List[Tuple[int, int, str, str]]] = {}
+        for product_id, quantity, reason, order_no in items:
+            entry = self._entries.get(product_id)
+            if entry is None:
+                replies.append({'ok': False, 'error': 'not_found'})
+            elif entry.status != 'active':
+                replies.append({'ok': False, 'error': 'inactive', 'name': entry.name})
+            elif quantity <= 0 or entry.stock < quantity:
+                replies.append({'ok': False, 'error': 'insufficient', 'name': entry.name, 'available': entry.stock})
+            else:
+                accepted.setdefault(product_id, []).append((entry.stock, quantity, reason, order_no))
+                entry.stock -= quantity
+                # 回复带上名称与价格，调用方创建订单明细时不必再读商品
+                replies.append({'ok': True, 'stock': entry.stock, 'name': entry.name, 'price': str(entry.price)})
+        if accepted:
+            self._persist(accepted)
+        return replies
+
+    def _persist(self, accepted: Dict[int, List[Tuple[int, int, str, str]]]):
+        """一个事务提交本批所有扣减：每个商品一条条件UPDATE，库存日志批量插入
+
+        条件为数据库库存等于本批第一条扣减前的内存库存，不一致说明有执行器之外的写入，
+        日志链会断开，整批回滚后由 process_batch 重新加载重试。
+        """
+        conflicts = []
+        logs = []
+        now = timezone.now()
+        with transaction.atomic():
+            for product_id, changes in accepted.items():
+                delta = sum(quantity for _, quantity, *_ in changes)
+                expected = changes[0][0]
+                updated = Product.objects.filter(id=product_id, stock_quantity=expected).update(
+                    stock_quantity=F('stock_quantity') - delta,
+                    version=F('version') + len(changes),
+                    updated_at=now
+                )
+                if not updated:
+                    conflicts.append(product_id)
+                    continue
+                logs.extend(
+                    StockLog(product_id=product_id, change_type='decrease', quantity_before=before,
+                             quantity_after=before - quantity, change_quantity=-quantity, reason=reason,
+                             order_no=order_no)
+                    for before, quantity, reason, order_no in changes
+                )
+            if conflicts:
+                raise _PersistConflict(conflicts)
+            StockLog.objects.bulk_create(logs)
+        self.repository.invalidate_products_cache(list(accepted))
+
+
+class StockExecutorClient:
+    """OrderService 侧的客户端：按一致性哈希选择分区，每个线程与每个分区保持一条长连接"""
+
+    def __init__(self, partitions: List[str], timeout: float = 2.0):
+        self.ring = HashRing(partitions)
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def partition_for(self, product_id: int) -> str:
+        return self.ring.node_for(product_id)
+
+    def deduct(self, product_id: int, quantity: int, reason: str = '', order_no: str = '') -> Dict[str, Any]:
+        address = self.partition_for(product_id)
+        request = json.dumps({'product_id': product_id, 'quantity': quantity, 'reason': reason,
+                              'order_no': order_no}).encode() + b'\n'
+        stream = self._connection(address)
+        try:
+            stream.write(request)
+            stream.flush()
+            line = stream.readline()
+            if not line:
+                raise ConnectionError('连接被分区关闭')
+            return json.loads(line)
+        except (OSError, ValueError) as e:
+            # 超时后分区仍可能提交这次扣减，只会多扣不会超卖；丢弃连接避免读到迟到的回复
+            self._close(address)
+            raise StockExecutorUnavailable(address, str(e) or type(e).__name__)
+
+    def _connection(self, address: str):
+        streams = self._local.__dict__.setdefault('streams', {})
+        if address not in streams:
+            try:
+                sock = socket.create_connection(parse_address(address), timeout=self.timeout)
+            except OSError as e:
+                raise StockExecutorUnavailable(address, str(e))
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            streams[address] = (sock, sock.makefile('rwb'))
+        return streams[address][1]
+
+    def _close(self, address: str):
+        sock, stream = self._local.__dict__.get('streams', {}).pop(address, (None, None))
+        if sock is not None:
+            stream.close()
+            sock.close()
+
+
+_client: Optional[StockExecutorClient] = None
+_client_key: Optional[Tuple] = None
+_client_lock = threading.Lock()
+
+
+def get_stock_executor_client() -> StockExecutorClient:
+    """按当前配置返回共享的客户端，配置变化时重建"""
+    global _client, _client_key
+    config = get_stock_executor_config()
+    if not config['PARTITIONS']:
+        raise StockExecutorUnavailable('-', '未配置 STOCK_EXECUTOR["PARTITIONS"]')
+    key = (tuple(config['PARTITIONS']), config['TIMEOUT'])
+    with _client_lock:
+        if _client is None or _client_key != key:
+            _client = StockExecutorClient(list(config['PARTITIONS']), config['TIMEOUT'])
+            _client_key = key
+        return _client
@@ -0,0 +1,234 @@
+"""
+库存对账
+按主键顺序分批读取 stock_logs，每批转为 NumPy 数组，向量化地累加每个商品的变更数量并检查日志链：
+同一商品相邻两条日志的 quantity_before 应等于上一条的 quantity_after，每条日志的
+quantity_before + change_quantity 应等于 quantity_after。扫描完成后按主键分批读取全部商品的库存，
+在 NumPy 中与链尾比较（没有日志的商品链尾按0计，有库存即为漂移），报告库存漂移、断链次数和
+每个商品第一条异常日志，可选写入 adjust 日志把日志链补齐到当前库存。
+
+日志ID在同一商品内与扣减顺序一致（日志在持有商品行锁或条件更新的事务中写入），因此按ID扫描即按时间重放；
+每个商品的状态保存在以商品ID为下标的数组中，内存约为 最大商品ID × 60 字节，与日志行数无关。
+"""
+
+import logging
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from ..db_router import use_primary
+from ..repositories.product_repository import ProductRepository
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - 可选依赖
+    np = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STOCK_RECONCILE = {
+    'CHUNK_SIZE': 200000,  # 每批读取的日志行数，约占 CHUNK_SIZE × 40 字节内存
+}
+
+
+def get_stock_reconcile_config() -> Dict[str, Any]:
+    return {**DEFAULT_STOCK_RECONCILE, **getattr(settings, 'STOCK_RECONCILE', {})}
+
+
+# 日志数组的列（与 RECONCILE_LOG_FIELDS 一致）
+LOG_ID, PRODUCT_ID, CHANGE, BEFORE, AFTER = range(5)
+
+
+@dataclass
+class ProductDrift:
+    """单个商品的对账结果；expected 为日志链末尾的库存，replayed 为首条日志的变更前库存加全部变更"""
+    product_id: int
+    stock_quantity: int
+    expected: int
+    replayed: int
+    logs: int
+    broken_links: int
+    bad_rows: int
+    first_bad_log_id: Optional[int]
+
+    @property
+    def drift(self) -> int:
+        return self.stock_quantity - self.expected
+
+
+@dataclass
+class ReconcileReport:
+    logs_scanned: int = 0
+    products_checked: int = 0
+    upto_log_id: int = 0
+    elapsed: float = 0.0
+    drifts: List[ProductDrift] = field(default_factory=list)
+    adjusted: int = 0
+
+    @property
+    def logs_per_second(self) -> float:
+        return self.logs_scanned / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        return {
+            'logs_scanned': self.logs_scanned,
+            'products_checked': self.products_checked,
+            'upto_log_id': self.upto_log_id,
+            'elapsed': round(self.elapsed, 3),
+            'logs_per_second': round(self.logs_per_second),
+            'problems': len(self.drifts),
+            'adjusted': self.adjusted,
+            'drifts': [{**asdict(item), 'drift': item.drift} for item in self.drifts[:limit]],
+        }
+
+
+class LogChainState:
+    """跨批次的日志链状态，以商品ID为下标；feed 每次处理一批按ID升序排列的日志"""
+
+    def __init__(self, size: int = 0):
+        self.size = 0
+        self.first_before = np.zeros(0, dtype=np.int64)
+        self.last_after = np.zeros(0, dtype=np.int64)
+        self.total_change = np.zeros(0, dtype=np.int64)
+        self.logs = np.zeros(0, dtype=np.int64)
+        self.broken = np.zeros(0, dtype=np.int64)
+        self.bad_rows = np.zeros(0, dtype=np.int64)
+        self.first_bad = np.zeros(0, dtype=np.int64)
+        self.grow(size)
+
+    def grow(self, size: int):
+        if size <= self.size:
+            return
+        size = max(size, int(self.size * 1.5))
+        for name in ('first_before', 'last_after', 'total_change', 'logs', 'broken', 'bad_rows', 'first_bad'):
+            grown = np.zeros(size, dtype=np.int64)
+            grown[:self.size] = getattr(self, name)
+            setattr(self, name, grown)
+        self.size = size
+
+    def feed(self, chunk: 'np.ndarray'):
+        """chunk 为 (n, 5) 的 int64 数组，按日志ID升序"""
+        if not len(chunk):
+            return
+        self.grow(int(chunk[:, PRODUCT_ID].max()) + 1)
+        # 稳定排序后同一商品的日志相邻且保持ID顺序
+        chunk = chunk[np.argsort(chunk[:, PRODUCT_ID], kind='stable')]
+        log_ids, products = chunk[:, LOG_ID], chunk[:, PRODUCT_ID]
+        change, before, after = chunk[:, CHANGE], chunk[:, BEFORE], chunk[:, AFTER]
+
+        group_start = np.empty(len(chunk), dtype=bool)
+        group_start[0] = True
+        np.not_equal(products[1:], products[:-1], out=group_start[1:])
+        group_end = np.empty(len(chunk), dtype=bool)
+        group_end[-1] = True
+        group_end[:-1] = group_start[1:]
+
+        # 每条日志的上一条 quantity_after：组内取前一行，组首取之前批次留下的链尾
+        starts = products[group_start]
+        seen = self.logs[starts] > 0
+        previous = np.empty(len(chunk), dtype=np.int64)
+        previous[1:] = after[:-1]
+        previous[group_start] = np.where(seen, self.last_after[starts], before[group_start])
+        self.first_before[starts[~seen]] = before[group_start][~seen]
+
+        broken = before != previous
+        bad_row = before + change != after
+        bad = broken | bad_row
+
+        counts = np.bincount(products, minlength=self.size)
+        self.logs += counts
+        self.total_change += np.bincount(products, weights=change, minlength=self.size).astype(np.int64)
+        self.broken += np.bincount(products[broken], minlength=self.size)
+        self.bad_rows += np.bincount(products[bad_row], minlength=self.size)
+        self.last_after[products[group_end]] = after[group_end]
+
+        if bad.any():
+            # 每个商品本批第一条异常日志；之前批次已有异常的保留更早的那条
+            bad_products, first_index = np.unique(products[bad], return_index=True)
+            first_ids = log_ids[bad][first_index]
+            unset = self.first_bad[bad_products] == 0
+            self.first_bad[bad_products[unset]] = first_ids[unset]
+
+
+class StockReconciler:
+    """库存对账引擎"""
+
+    def __init__(self, repository: Optional[ProductRepository] = None, chunk_size: Optional[int] = None):
+        if np is None:
+            raise RuntimeError("库存对账需要安装 numpy")
+        self.repository = repository or ProductRepository()
+        self.chunk_size = chunk_size or get_stock_reconcile_config()['CHUNK_SIZE']
+
+    def run(self, fix: bool = False, progress=None) -> ReconcileReport:
+        """扫描全部日志并与当前库存比较；fix 为True时为漂移的商品写入 adjust 日志
+
+        扫描以开始时的最大日志ID为上界，扫描期间有新写入的商品在比较前补读上界之后的日志再核对一次，
+        减少并发下单造成的误报。progress 在每批处理后收到已扫描的日志数。
+        """
+        report = ReconcileReport()
+        started = time.perf_counter()
+        with use_primary():
+            report.upto_log_id = self.repository.max_stock_log_id()
+            state = LogChainState()
+            for rows in self.repository.iter_stock_log_chunks(upto_id=report.upto_log_id,
+                                                              chunk_size=self.chunk_size):
+                state.feed(np.array(rows, dtype=np.int64))
+                report.logs_scanned += len(rows)
+                if progress is not None:
+                    progress(report.logs_scanned)
+
+            # 全部商品按主键分批读取库存，不把有日志的商品ID拼成 id IN
+            candidates = []
+            for rows in self.repository.iter_stock_quantity_chunks(chunk_size=self.chunk_size):
+                candidates.extend(self._drifted(state, rows))
+                report.products_checked += len(rows)
+            if candidates:
+                # 补读扫描开始后写入的日志，再与最新库存比较
+                for rows in self.repository.iter_stock_log_chunks(after_id=report.upto_log_id,
+                                                                  chunk_size=self.chunk_size,
+                                                                  product_ids=candidates):
+                    state.feed(np.array(rows, dtype=np.int64))
+                    report.logs_scanned += len(rows)
+            stock = dict(self.repository.get_stock_quantities(candidates)) if candidates else {}
+            report.drifts = self._problems(state, stock)
+
+            if fix:
+                # 调整值在商品行锁内重新读取，扫描时的 expected/stock_quantity 可能已被新订单改变
+                adjustments = [item.product_id for item in report.drifts if item.drift]
+                report.adjusted = self.repository.create_adjust_logs(adjustments) if adjustments else 0
+        report.elapsed = time.perf_counter() - started
+        logger.info(f"Stock reconcile: {report.logs_scanned} logs, {len(report.drifts)} problems, "
+                    f"{report.elapsed:.1f}s")
+        return report
+
+    @staticmethod
+    def _drifted(state: LogChainState, quantities) -> List[int]:
+        """链尾库存与当前库存不一致或存在异常日志的商品；没有日志的商品链尾为0"""
+        if not quantities:
+            return []
+        data = np.array(quantities, dtype=np.int64).reshape(-1, 2)
+        product_ids, stock = data[:, 0], data[:, 1]
+        state.grow(int(product_ids.max()) + 1)
+        mismatch = (state.last_after[product_ids] != stock) | (state.first_bad[product_ids] > 0)
+        return product_ids[mismatch].tolist()
+
+    @staticmethod
+    def _problems(state: LogChainState, stock: Dict[int, int]) -> List[ProductDrift]:
+        problems = []
+        for product_id, quantity in sorted(stock.items()):
+            expected = int(state.last_after[product_id])
+            first_bad = int(state.first_bad[product_id])
+            if quantity == expected and not first_bad:
+                continue
+            problems.append(ProductDrift(
+                product_id=product_id,
+                stock_quantity=quantity,
+                expected=expected,
+                replayed=int(state.first_before[product_id] + state.total_change[product_id]),
+                logs=int(state.logs[product_id]),
+                broken_links=int(state.broken[product_id]),
+                bad_rows=int(state.bad_rows[product_id]),
+                first_bad_log_id=first_bad or None,
+            ))
+        return problems
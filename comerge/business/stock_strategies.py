@@ -0,0 +1,167 @@
+"""
+库存扣减策略
+订单项的库存扣减按策略执行：默认先加行锁读取再更新（row_lock），
+行锁竞争统计识别出的热点商品改走 STOCK_STRATEGY['HOT'] 配置的高并发策略。
+新策略用 register_stock_strategy 注册后即可在配置中按名称选择。
+actor 策略把扣减交给按商品分区的库存执行器（见 stock_executor），不占用数据库行锁；
+group_commit 策略把同一商品短时间内的扣减合并为一个事务提交（见 group_commit）。
+"""
+
+import time
+from decimal import Decimal
+from typing import Any, Dict, Type
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from ..exceptions import InsufficientStockException, ProductNotActiveException
+from ..models import Product
+from ..repositories.product_repository import ProductRepository
+from ..utils.lock_stats import lock_stats
+from .group_commit import get_group_commit_coordinator
+from .stock_executor import get_stock_executor_client
+
+DEFAULT_STOCK_STRATEGY = {
+    'DEFAULT': 'row_lock',
+    'HOT': 'conditional_update',
+}
+
+STOCK_STRATEGIES: Dict[str, Type['StockStrategy']] = {}
+
+
+def get_stock_strategy_config() -> Dict[str, Any]:
+    return {**DEFAULT_STOCK_STRATEGY, **getattr(settings, 'STOCK_STRATEGY', {})}
+
+
+def register_stock_strategy(cls: Type['StockStrategy']) -> Type['StockStrategy']:
+    """注册库存策略的类装饰器"""
+    STOCK_STRATEGIES[cls.name] = cls
+    return cls
+
+
+def stock_strategy_name(product_id: int) -> str:
+    """商品当前应使用的策略名：热点商品用 HOT，其余用 DEFAULT"""
+    config = get_stock_strategy_config()
+    if config['HOT'] != config['DEFAULT'] and product_id in lock_stats.hot_product_ids():
+        return config['HOT']
+    return config['DEFAULT']
+
+
+def raise_for_failed_reply(reply: Dict[str, Any], product_id: int, quantity: int):
+    """把执行器或合并提交返回的失败原因转换为业务异常"""
+    error = reply.get('error')
+    if error == 'insufficient':
+        raise InsufficientStockException(reply['name'], reply['available'], quantity)
+    if error in ('inactive', 'not_found'):
+        raise ProductNotActiveException(reply.get('name') or f"商品ID: {product_id}")
+    raise Exception(f"库存扣减失败: {error}")
+
+
+class StockStrategy:
+    """库存扣减策略基类：为一个订单项扣减库存，返回扣减后的商品
+
+    商品不可用时抛出 ProductNotActiveException，库存不足时抛出 InsufficientStockException；
+    order_no 写入库存日志，用于从主库的日志定位分片上的订单。
+    transactional 为True的策略在调用方的事务内扣减，随订单事务回滚；为False的策略在自己的事务中提交，
+    订单失败时由 OrderService 写 increase 日志把扣减加回。
+    """
+
+    name = ''
+    transactional = True
+
+    def __init__(self, product_repo: ProductRepository):
+        self.product_repo = product_repo
+
+    def deduct(self, product_id: int, quantity: int, reason: str, order_no: str = '') -> Product:
+        raise NotImplementedError
+
+
+@register_stock_strategy
+class RowLockStrategy(StockStrategy):
+    """select_for_update 加锁读取，校验后更新；行锁从读取持有到事务结束"""
+
+    name = 'row_lock'
+
+    def deduct(self, product_id: int, quantity: int, reason: str, order_no: str = '') -> Product:
+        # 获取商品并加锁
+        product = self.product_repo.get_with_lock(product_id)
+        if not product:
+            raise ProductNotActiveException(f"商品ID: {product_id}")
+
+        # 检查商品状态
+        if product.status != 'active':
+            raise ProductNotActiveException(product.name)
+
+        # 检查库存
+        if product.stock_quantity < quantity:
+            raise InsufficientStockException(product.name, product.stock_quantity, quantity)
+
+        # 扣减库存
+        if not self.product_repo.update_stock(product, -quantity, reason, order_no):
+            raise Exception("库存更新失败")
+        return product
+
+
+@register_stock_strategy
+class ConditionalUpdateStrategy(StockStrategy):
+    """一条带库存条件的UPDATE完成校验与扣减，省去加锁读取的往返，缩短热点行的锁持有时间"""
+
+    name = 'conditional_update'
+
+    def deduct(self, product_id: int, quantity: int, reason: str, order_no: str = '') -> Product:
+        product = self.product_repo.deduct_stock(product_id, quantity, reason, order_no)
+        if product is not None:
+            return product
+
+        current = self.product_repo.get_fresh(product_id)
+        if current is None:
+            raise ProductNotActiveException(f"商品ID: {product_id}")
+        if current.status != 'active':
+            raise ProductNotActiveException(current.name)
+        raise InsufficientStockException(current.name, current.stock_quantity, quantity)
+
+
+@register_stock_strategy
+class ActorStrategy(StockStrategy):
+    """发给商品所属的执行器分区顺序扣减，分区成批提交后才回复
+
+    扣减在分区自己的事务中提交，不随订单事务回滚，订单失败时由 OrderService 补偿；补偿绕过执行器直接写库，
+    分区下一次提交发现库存不一致后重新加载。往返耗时计入行锁等待，使热点识别保持稳定。
+    分区不可用时抛出 StockExecutorUnavailable，订单项按失败处理。
+    """
+
+    name = 'actor'
+    transactional = False
+
+    def deduct(self, product_id: int, quantity: int, reason: str, order_no: str = '') -> Product:
+        start = time.perf_counter()
+        reply = get_stock_executor_client().deduct(product_id, quantity, reason, order_no)
+        lock_stats.record_wait(product_id, time.perf_counter() - start)
+
+        if not reply['ok']:
+            raise_for_failed_reply(reply, product_id, quantity)
+
+        # 分区回复扣减后的库存、名称与价格，不再回读商品（from_db 的值按模型字段顺序排列）
+        return Product.from_db(DEFAULT_DB_ALIAS, ['id', 'name', 'price', 'stock_quantity', 'status'],
+                               [product_id, reply['name'], Decimal(reply['price']), reply['stock'], 'active'])
+
+
+@register_stock_strategy
+class GroupCommitStrategy(StockStrategy):
+    """交给进程内的合并提交协调器，与同一窗口内同一商品的其他请求共用一个事务
+
+    每个请求最多增加 GROUP_COMMIT['WINDOW_MS'] 的延迟；等待耗时计入行锁等待。
+    扣减在提交线程的事务中提交，订单失败时由 OrderService 补偿。
+    """
+
+    name = 'group_commit'
+    transactional = False
+
+    def deduct(self, product_id: int, quantity: int, reason: str, order_no: str = '') -> Product:
+        start = time.perf_counter()
+        result = get_group_commit_coordinator().submit(product_id, quantity, reason, order_no)
+        lock_stats.record_wait(product_id, time.perf_counter() - start)
+
+        if not result['ok']:
+            raise_for_failed_reply(result, product_id, quantity)
+        return result['product']
@@ -0,0 +1,155 @@
+"""
+数据库路由
+订单与订单明细按 user_id 路由到订单分片；
+其余模型的只读查询分发到只读副本，写入、加锁读取以及事务内的查询留在主库；
+用户写入后在一段时间内把该用户的读取固定到主库，保证读到自己的修改。
+"""
+
+import contextvars
+import random
+from contextlib import contextmanager
+from typing import List
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .exceptions import ShardNotSpecified
+from .utils.sharding import get_order_shards, is_sharded_model, shard_for_user
+
+# 当前请求（或任务）是否固定读主库
+_pinned = contextvars.ContextVar('db_pinned_to_primary', default=False)
+# 当前请求是否发生过写入
+_wrote = contextvars.ContextVar('db_wrote_primary', default=False)
+# 当前上下文中没有实例线索的订单查询使用的分片
+_selected_shard = contextvars.ContextVar('db_order_shard', default=None)
+
+
+def get_replicas() -> List[str]:
+    """已配置的只读副本别名"""
+    return [alias for alias in getattr(settings, 'DATABASE_REPLICAS', []) if alias in settings.DATABASES]
+
+
+def pin_to_primary(pinned: bool = True) -> contextvars.Token:
+    """把当前上下文的读取固定到主库，返回用于恢复的token"""
+    return _pinned.set(pinned)
+
+
+def unpin(token: contextvars.Token):
+    _pinned.reset(token)
+
+
+def is_pinned() -> bool:
+    return _pinned.get()
+
+
+@contextmanager
+def use_primary():
+    """在代码块内强制读主库，例如写后立即回读"""
+    token = pin_to_primary()
+    try:
+        yield
+    finally:
+        unpin(token)
+
+
+@contextmanager
+def use_shard(alias: str):
+    """在代码块内把没有实例线索的订单、明细查询路由到指定分片，例如后台按分片浏览"""
+    token = _selected_shard.set(alias)
+    try:
+        yield
+    finally:
+        _selected_shard.reset(token)
+
+
+def start_write_tracking() -> contextvars.Token:
+    return _wrote.set(False)
+
+
+def stop_write_tracking(token: contextvars.Token) -> bool:
+    """结束写入跟踪，返回期间是否有写入"""
+    wrote = _wrote.get()
+    _wrote.reset(token)
+    return wrote
+
+
+class OrderShardRouter:
+    """订单分片路由，需放在 ReplicaRouter 之前
+
+    - 已从某个分片加载的实例（包括通过 order.items 访问明细）留在该分片
+    - 新建订单按 user_id 选择分片，新建明细跟随所属订单
+    - 没有实例线索的查询使用 use_shard() 指定的分片；只有一个分片时就是该分片，
+      有多个分片时抛出 ShardNotSpecified，而不是静默地只查第一个分片
+    - 跨分片或按用户查询由订单仓储显式 using()
+    - 从主库对象（如库存日志）访问订单不能确定分片，按没有线索处理
+    - 分片之间没有复制关系，订单不参与读写分离
+    """
+
+    def _shard(self, model, hints):
+        if not is_sharded_model(model):
+            return None
+        instance = hints.get('instance')
+        if instance is not None and is_sharded_model(instance):
+            if instance._state.db:
+                return instance._state.db
+            if instance._meta.model_name == 'order' and instance.user_id is not None:
+                return shard_for_user(instance.user_id)
+            if instance._meta.model_name == 'orderitem' and instance._meta.get_field('order').is_cached(instance):
+                order = instance.order
+                return order._state.db or shard_for_user(order.user_id)
+        selected = _selected_shard.get()
+        if selected is not None:
+            return selected
+        shards = get_order_shards()
+        if len(shards) > 1:
+            raise ShardNotSpecified(model._meta.object_name)
+        return shards[0]
+
+    def db_for_read(self, model, **hints):
+        return self._shard(model, hints)
+
+    def db_for_write(self, model, **hints):
+        shard = self._shard(model, hints)
+        if shard is not None:
+            _wrote.set(True)
+        return shard
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 订单明细引用主库中的商品，跨库外键不建数据库约束
+        if is_sharded_model(obj1) or is_sharded_model(obj2):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+class ReplicaRouter:
+    """主从读写分离路由
+
+    - 写入以及 select_for_update（Django按写入路由）始终走主库
+    - 主库处于事务中时，事务内的读取也走主库，避免读到副本上的旧数据
+    - 当前上下文被固定到主库时读主库
+    - 其余读取随机分发到 DATABASE_REPLICAS 中的副本，未配置副本时读主库
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if not replicas or _pinned.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 副本与主库数据相同，跨别名加载的对象之间允许建立关联
+        pool = {DEFAULT_DB_ALIAS, *get_replicas()}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # 副本的表结构由复制同步，不应对副本执行 migrate；这里不干预，交给部署流程保证
+        return None
@@ -36,3 +36,30 @@ class ConcurrentUpdateException(BusinessException):
 
     def __init__(self, message: str = "并发更新失败，请重试"):
         super().__init__(message, "CONCURRENT_UPDATE_ERROR")
+
+
+class StockExecutorUnavailable(BusinessException):
+    """库存执行器分区无法连接或响应超时"""
+
+    def __init__(self, address: str, reason: str):
+        super().__init__(f"库存执行器 {address} 不可用: {reason}", "STOCK_EXECUTOR_UNAVAILABLE")
+        self.address = address
+
+
+class QueryBudgetExceeded(Exception):
+    """请求的SQL查询次数超出预算（QUERY_BUDGET 开启 RAISE 时抛出，用于测试中发现N+1）"""
+
+    def __init__(self, view_name: str, queries: int, budget: int):
+        self.view_name = view_name
+        self.queries = queries
+        self.budget = budget
+        super().__init__(f"{view_name} 执行了 {queries} 次查询，超出预算 {budget}")
+
+
+class ShardNotSpecified(Exception):
+    """配置了多个订单分片时，订单或明细的查询没有实例线索也没有指定分片"""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        super().__init__(f"{model_name} 分布在多个订单分片上，查询需要 using() 指定分片、"
+                         f"在 use_shard() 中执行，或通过订单仓储跨分片归并")
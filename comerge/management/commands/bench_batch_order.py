@@ -0,0 +1,131 @@
+"""
+批量下单并发基准命令
+为每种SKU分布生成一份新的合成商品目录，用多个线程或进程并发调用
+OrderService.create_batch_order，输出吞吐、延迟分位数、锁冲突与重试次数，
+并核对库存守恒（当前库存 + 成功明细数量 == 初始库存），发现不一致时命令失败。
+
+会写入商品、订单和库存日志，只应在压测数据库上执行：
+    python manage.py bench_batch_order --products 500 --stock 200 --workers 16 --orders 50 \
+        --cart-size 1 --cart-max 8 --distribution uniform zipf hot
+
+--strategy 指定库存策略时，本次运行的所有商品都使用该策略（覆盖 STOCK_STRATEGY），可对比行锁与执行器：
+    python manage.py bench_batch_order --distribution hot --strategy row_lock actor --start-executor 4
+group_commit 策略可用 --group-window-ms 依次对比不同的合并窗口，并输出每个事务平均合并的请求数与排队时间：
+    python manage.py bench_batch_order --distribution hot --strategy row_lock group_commit --group-window-ms 0 2 5
+"""
+
+from contextlib import ExitStack, nullcontext
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from comerge.benchmarks.batch_order import (
+    DISTRIBUTIONS, MODES, SkuSampler, build_plans, run_load, snapshot_stock, verify_stock,
+)
+from comerge.benchmarks.catalog import create_catalog, new_run_prefix
+from comerge.business.group_commit import get_group_commit_config, get_group_commit_coordinator
+from comerge.business.stock_executor import StockPartition, get_stock_executor_config
+from comerge.business.stock_strategies import STOCK_STRATEGIES
+
+
+class Command(BaseCommand):
+    help = '并发批量下单基准测试，并校验库存不超卖'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=200, help='合成商品数量')
+        parser.add_argument('--stock', type=int, default=100, help='每个商品的初始库存')
+        parser.add_argument('--workers', type=int, default=8, help='并发线程/进程数')
+        parser.add_argument('--orders', type=int, default=50, help='每个worker的下单次数')
+        parser.add_argument('--cart-size', type=int, default=3, help='购物车商品数（下限）')
+        parser.add_argument('--cart-max', type=int, help='购物车商品数上限，指定时在区间内随机')
+        parser.add_argument('--max-quantity', type=int, default=1, help='单个商品的最大购买数量')
+        parser.add_argument('--distribution', nargs='+', choices=DISTRIBUTIONS, default=list(DISTRIBUTIONS))
+        parser.add_argument('--zipf-s', type=float, default=1.1, help='Zipf分布的指数，越大越集中')
+        parser.add_argument('--mode', choices=MODES, default='thread')
+        parser.add_argument('--max-retries', type=int, default=3, help='整单锁冲突失败时的重试次数')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--strategy', nargs='+', choices=sorted(STOCK_STRATEGIES),
+                            help='依次使用的库存策略，默认按 STOCK_STRATEGY 配置路由')
+        parser.add_argument('--start-executor', type=int, default=0, metavar='N',
+                            help='在本进程内启动N个库存执行器分区（随机端口）供 actor 策略使用')
+        parser.add_argument('--group-window-ms', type=float, nargs='+',
+                            help='group_commit 策略依次使用的合并窗口（毫秒），默认取 GROUP_COMMIT 配置')
+
+    def handle(self, *args, **options):
+        if options['cart_size'] < 1 or options['cart_size'] > 50:
+            raise CommandError('购物车商品数必须在1到50之间')
+        if options['workers'] < 1 or options['orders'] < 1:
+            raise CommandError('workers 和 orders 必须大于0')
+
+        with ExitStack() as stack:
+            if options['start_executor']:
+                stack.enter_context(self._start_executor(options['start_executor']))
+            inconsistent = False
+            for strategy in options['strategy'] or [None]:
+                routing = override_settings(STOCK_STRATEGY={'DEFAULT': strategy, 'HOT': strategy}) \
+                    if strategy else nullcontext()
+                windows = options['group_window_ms'] if strategy == 'group_commit' and options['group_window_ms'] \
+                    else [None]
+                for window in windows:
+                    if strategy:
+                        suffix = f" (window {window}ms)" if window is not None else ''
+                        self.stdout.write(f"strategy: {strategy}{suffix}")
+                    group = override_settings(GROUP_COMMIT={**get_group_commit_config(), 'WINDOW_MS': window}) \
+                        if window is not None else nullcontext()
+                    with routing, group:
+                        inconsistent |= self._run_distributions(options)
+                        if strategy == 'group_commit':
+                            stats = get_group_commit_coordinator().stats()
+                            self.stdout.write(f"  group commit: {stats['batches']} 个事务，平均合并 "
+                                              f"{stats['avg_batch']} 个请求，平均排队 {stats['avg_wait_ms']}ms")
+
+        if inconsistent:
+            raise CommandError('库存守恒校验失败：存在超卖或少扣')
+
+    def _start_executor(self, count: int) -> ExitStack:
+        config = get_stock_executor_config()
+        partitions = [
+            StockPartition('127.0.0.1:0', config['BATCH_SIZE'], config['BATCH_INTERVAL'], config['RELOAD_AFTER'])
+            for _ in range(count)
+        ]
+        addresses = [partition.start_in_thread() for partition in partitions]
+        self.stdout.write(f"库存执行器分区: {' '.join(addresses)}")
+        stack = ExitStack()
+        stack.enter_context(override_settings(STOCK_EXECUTOR={**config, 'PARTITIONS': addresses}))
+        for partition in partitions:
+            stack.callback(partition.stop)
+        return stack
+
+    def _run_distributions(self, options) -> bool:
+        """对每种分布各跑一轮，返回是否发现库存不一致"""
+        self.stdout.write(f"{'distribution':<14}{'orders':>8}{'ops/s':>9}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}"
+                          f"{'locks':>7}{'retries':>9}  statuses")
+        inconsistent = False
+        for distribution in options['distribution']:
+            prefix = new_run_prefix(f"bench-{distribution}")
+            product_ids = create_catalog(options['products'], options['stock'], prefix, options['seed'])
+            initial = snapshot_stock(product_ids)
+
+            sampler = SkuSampler(product_ids, distribution, options['zipf_s'])
+            plans = build_plans(sampler, options['workers'], options['orders'], options['cart_size'],
+                                options['cart_max'], options['max_quantity'], options['seed'])
+            report = run_load(plans, distribution, options['mode'], options['max_retries'])
+
+            percentiles = report.latency_percentiles()
+            statuses = ' '.join(f"{status}={count}" for status, count in sorted(report.statuses.items()))
+            self.stdout.write(
+                f"{distribution:<14}{report.orders:>8}{report.throughput:>9.1f}"
+                f"{percentiles['p50'] * 1000:>9.1f}{percentiles['p95'] * 1000:>9.1f}"
+                f"{percentiles['p99'] * 1000:>9.1f}{report.lock_errors:>7}{report.retries:>9}  {statuses}"
+            )
+
+            mismatches = verify_stock(initial)
+            if mismatches:
+                inconsistent = True
+                for product_id, stock, current, sold in mismatches[:20]:
+                    self.stdout.write(self.style.ERROR(
+                        f"  商品 {product_id}: 初始 {stock}，当前 {current}，已售 {sold}，差 {stock - current - sold}"
+                    ))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"  库存守恒校验通过（{prefix}，{len(initial)} 个商品）"))
+        return inconsistent
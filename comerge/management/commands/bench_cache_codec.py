@@ -0,0 +1,92 @@
+"""
+缓存编解码基准测试
+对比 pickle 与紧凑编码在商品详情、搜索结果上的存储字节数和编解码耗时
+"""
+
+import pickle
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from comerge.models import Product
+from comerge.utils.cache_codec import get_codec
+
+
+class Command(BaseCommand):
+    help = '对比缓存编解码器的存储大小与编解码耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000, help='每个场景的重复次数')
+        parser.add_argument('--description-length', type=int, default=2000, help='商品描述长度')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        description_length = options['description_length']
+        iterations = options['iterations']
+
+        scenarios = {
+            'product:detail': self._make_product(rng, 1, description_length),
+            'product:search(20)': self._make_search(rng, 20, description_length),
+            'product:search(100)': self._make_search(rng, 100, description_length),
+        }
+        codecs = {
+            'pickle': get_codec('pickle'),
+            'compact': get_codec('compact', compression=None),
+            'compact+zlib': get_codec('compact', compression='zlib'),
+            'compact+lz4': get_codec('compact', compression='lz4'),
+        }
+
+        self.stdout.write(f"{'scenario':<22}{'codec':<15}{'bytes':>10}{'encode(us)':>13}{'decode(us)':>13}")
+        for scenario, value in scenarios.items():
+            for codec_name, codec in codecs.items():
+                # django_redis 会对编码结果再做一次 pickle，这里按实际写入 Redis 的字节数统计
+                stored = pickle.dumps(codec.encode(value), pickle.HIGHEST_PROTOCOL)
+
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    pickle.dumps(codec.encode(value), pickle.HIGHEST_PROTOCOL)
+                encode_us = (time.perf_counter() - start) / iterations * 1e6
+
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    codec.decode(pickle.loads(stored))
+                decode_us = (time.perf_counter() - start) / iterations * 1e6
+
+                self.stdout.write(
+                    f"{scenario:<22}{codec_name:<15}{len(stored):>10}{encode_us:>13.1f}{decode_us:>13.1f}"
+                )
+
+    def _make_product(self, rng: random.Random, product_id: int, description_length: int) -> Product:
+        created_at = datetime(2025, 1, 1) + timedelta(seconds=rng.randint(0, 10 ** 7))
+        words = ['轻薄', '旗舰', 'wireless', 'pro', '高性能', 'ultra', '续航', 'camera']
+        description = ' '.join(rng.choice(words) for _ in range(description_length // 4))
+        return Product.from_db('default', [
+            'id', 'name', 'description', 'price', 'stock_quantity',
+            'keywords', 'status', 'version', 'created_at', 'updated_at',
+        ], [
+            product_id,
+            f"商品 {product_id} {rng.choice(words)}",
+            description[:description_length],
+            Decimal(rng.randint(100, 999999)) / 100,
+            rng.randint(0, 10000),
+            ','.join(rng.sample(words, 3)),
+            'active',
+            rng.randint(1, 50),
+            created_at,
+            created_at + timedelta(days=1),
+        ])
+
+    def _make_search(self, rng: random.Random, size: int, description_length: int) -> dict:
+        return {
+            'products': [self._make_product(rng, i, description_length) for i in range(1, size + 1)],
+            'total': size * 10,
+            'page': 1,
+            'size': size,
+            'total_pages': 10,
+            'has_next': True,
+            'has_previous': False,
+        }
@@ -0,0 +1,94 @@
+"""
+JSON响应编码基准测试
+对比DRF默认 JSONRenderer 与 ORJSONRenderer 在商品列表、搜索页、订单详情上的编码耗时
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from comerge.renderers import ORJSONRenderer, orjson
+
+
+class Command(BaseCommand):
+    help = '对比标准库与orjson渲染器的响应编码耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100, help='列表/搜索页的商品数')
+        parser.add_argument('--order-items', type=int, default=50, help='订单详情的明细数')
+        parser.add_argument('--iterations', type=int, default=500, help='重复次数')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING('orjson 未安装，ORJSONRenderer 将退回标准库'))
+
+        rng = random.Random(options['seed'])
+        products = [self._product(rng, i) for i in range(1, options['items'] + 1)]
+        payloads = {
+            'product list': {'count': 10000, 'next': 'http://testserver/products/?page=2',
+                             'previous': None, 'results': products},
+            'search page': {'count': 500, 'next': None, 'previous': None,
+                            'results': {'code': 200, 'message': '搜索成功', 'data': products}},
+            'order detail': self._order(rng, options['order_items']),
+        }
+        renderers = {'json (stdlib)': JSONRenderer(), 'orjson': ORJSONRenderer()}
+        iterations = options['iterations']
+
+        self.stdout.write(f"{'payload':<16}{'renderer':<16}{'bytes':>9}{'render(us)':>13}")
+        for payload_name, payload in payloads.items():
+            outputs = {name: renderer.render(payload) for name, renderer in renderers.items()}
+            if len(set(outputs.values())) != 1:
+                raise CommandError(f"{payload_name}: 渲染结果不一致")
+
+            for name, renderer in renderers.items():
+                start = time.perf_counter()
+                for _ in range(iterations):
+                    renderer.render(payload)
+                elapsed_us = (time.perf_counter() - start) / iterations * 1e6
+                self.stdout.write(f"{payload_name:<16}{name:<16}{len(outputs[name]):>9}{elapsed_us:>13.1f}")
+
+    @staticmethod
+    def _product(rng: random.Random, product_id: int) -> dict:
+        return {
+            'id': product_id,
+            'name': f"商品 {product_id} wireless",
+            'price': str(Decimal(rng.randint(100, 999999)) / 100),
+            'stock_quantity': rng.randint(0, 10000),
+            'status': 'active',
+        }
+
+    @staticmethod
+    def _order(rng: random.Random, item_count: int) -> dict:
+        created_at = datetime(2025, 6, 1, 12, 30, 15, 123456)
+        items = []
+        for i in range(1, item_count + 1):
+            unit_price = Decimal(rng.randint(100, 99999)) / 100
+            quantity = rng.randint(1, 5)
+            items.append({
+                'id': i,
+                'product': rng.randint(1, 10000),
+                'product_name': f"商品 {i}",
+                'quantity': quantity,
+                'unit_price': str(unit_price),
+                'total_price': str(unit_price * quantity),
+                'status': 'success',
+                'error_message': '',
+                # 原始datetime与Decimal，覆盖编码器的类型转换
+                'created_at': created_at + timedelta(milliseconds=i),
+            })
+        return {
+            'id': 1,
+            'order_no': 'ORD20250601123015ABC123',
+            'order_number': 'ORD20250601123015ABC123',
+            'user_id': 1001,
+            'total_amount': Decimal('1234.50'),
+            'status': 'completed',
+            'created_at': created_at,
+            'updated_at': created_at,
+            'items': items,
+        }
@@ -0,0 +1,47 @@
+"""
+商品搜索基准命令
+按热门词 + 长尾词的Zipf分布回放搜索，分缓存未命中与缓存命中两个阶段，
+输出延迟分位数、平均查询次数、数据库耗时及其占比、无结果比例。
+
+用法（先用 generate_catalog 生成数据）：
+    python manage.py bench_search --calls 2000 --size 20 --phases miss hit
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from comerge.benchmarks.search import PHASES, KeywordWorkload, run_search_phase
+from comerge.models import Product
+
+
+class Command(BaseCommand):
+    help = '回放搜索关键词分布，统计缓存命中/未命中时的搜索延迟与数据库耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--calls', type=int, default=1000, help='每个阶段的搜索次数')
+        parser.add_argument('--size', type=int, default=20, help='每页条数')
+        parser.add_argument('--phases', nargs='+', choices=PHASES, default=list(PHASES))
+        parser.add_argument('--zipf-s', type=float, default=1.0, help='关键词Zipf分布的指数，越大热门词越集中')
+        parser.add_argument('--no-result-ratio', type=float, default=0.02, help='无结果搜索词的比例')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options['calls'] < 1:
+            raise CommandError('calls 必须大于0')
+        workload = KeywordWorkload(options['seed'], options['zipf_s'], options['no_result_ratio'])
+        keywords = workload.keywords(options['calls'])
+        self.stdout.write(f"商品数 {Product.objects.count()}，搜索 {len(keywords)} 次，"
+                          f"不同关键词 {len(set(keywords))} 个")
+
+        self.stdout.write(f"{'phase':<7}{'calls':>7}{'ops/s':>9}{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}"
+                          f"{'queries':>9}{'db_p50':>9}{'db_p95':>9}{'db%':>7}{'empty%':>8}")
+        for phase in options['phases']:
+            report = run_search_phase(keywords, phase, options['size'])
+            latency = report.latency_percentiles()
+            db_time = report.db_time_percentiles()
+            self.stdout.write(
+                f"{phase:<7}{report.calls:>7}{report.throughput:>9.1f}"
+                f"{latency['p50'] * 1000:>9.2f}{latency['p95'] * 1000:>9.2f}{latency['p99'] * 1000:>9.2f}"
+                f"{report.queries / report.calls:>9.2f}"
+                f"{db_time['p50'] * 1000:>9.2f}{db_time['p95'] * 1000:>9.2f}"
+                f"{report.db_share * 100:>7.1f}{report.empty_results / report.calls * 100:>8.1f}"
+            )
@@ -0,0 +1,59 @@
+"""
+序列化器基准测试
+对比 ProductListSerializer 与快速序列化路径的单条耗时，输出一致性由 FastReadSerializerTests 校验
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from comerge.models import Product
+from comerge.serializer import ProductListSerializer, fast_product_list_serializer
+
+
+class Command(BaseCommand):
+    help = '对比商品列表序列化器与快速序列化路径的单条耗时'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=100, help='每页商品数')
+        parser.add_argument('--iterations', type=int, default=200, help='重复次数')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        items = options['items']
+        iterations = options['iterations']
+
+        products = [self._make_product(rng, i) for i in range(1, items + 1)]
+        rows = [tuple(getattr(p, source) for source in fast_product_list_serializer.sources)
+                for p in products]
+
+        cases = {
+            'ProductListSerializer': lambda: ProductListSerializer(products, many=True).data,
+            'fast (instances)': lambda: fast_product_list_serializer.from_instances(products),
+            'fast (values_list)': lambda: fast_product_list_serializer.from_rows(rows),
+        }
+
+        self.stdout.write(f"{'serializer':<26}{'per item(us)':>14}{'per page(us)':>14}")
+        for name, func in cases.items():
+            start = time.perf_counter()
+            for _ in range(iterations):
+                func()
+            per_page = (time.perf_counter() - start) / iterations * 1e6
+            self.stdout.write(f"{name:<26}{per_page / items:>14.2f}{per_page:>14.1f}")
+
+    @staticmethod
+    def _make_product(rng: random.Random, product_id: int) -> Product:
+        created_at = datetime(2025, 1, 1) + timedelta(seconds=rng.randint(0, 10 ** 7))
+        return Product(
+            id=product_id,
+            name=f"商品 {product_id}",
+            price=Decimal(rng.randint(100, 999999)) / 100,
+            stock_quantity=rng.randint(0, 10000),
+            status='active',
+            created_at=created_at,
+            updated_at=created_at,
+        )
@@ -0,0 +1,75 @@
+"""
+字段裁剪基准测试
+对比带与不带 ?fields= 参数时商品、订单接口的响应字节数和耗时（使用当前数据库中的数据）
+"""
+
+import statistics
+import time
+from contextlib import ExitStack
+from unittest import mock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from rest_framework.views import APIView
+
+from comerge.models import Order, Product
+from comerge.utils.sharding import get_order_shards
+
+
+class Command(BaseCommand):
+    help = '测量 ?fields= 字段裁剪对响应字节数与耗时的影响'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='每个请求的重复次数')
+        parser.add_argument('--size', type=int, default=100, help='列表接口每页条数')
+
+    def handle(self, *args, **options):
+        product_id = Product.objects.filter(status='active').values_list('id', flat=True).first()
+        # 订单查询必须指定分片，依次在各分片上找一个订单
+        order_no = next(filter(None, (Order.objects.using(shard).values_list('order_no', flat=True).first()
+                                      for shard in get_order_shards())), None)
+        if product_id is None or order_no is None:
+            raise CommandError('数据库中至少需要一个在售商品和一个订单')
+
+        size = options['size']
+        cases = [
+            ('product detail', f'/products/{product_id}/', 'name,price'),
+            ('product list', f'/products/?size={size}', 'id,name,price'),
+            ('order detail', f'/orders/{order_no}/', 'order_no,status,total_amount'),
+            ('order list', f'/orders/?size={size}', 'order_no,status,total_amount'),
+        ]
+
+        client = Client(HTTP_HOST='localhost')
+        self.stdout.write(f"{'endpoint':<16}{'fields':<32}{'bytes':>9}{'queries':>9}"
+                          f"{'p50(ms)':>10}{'p95(ms)':>10}")
+        # 基准的请求数远超匿名限额（100/hour），测量期间关闭限流；视图类在导入时已绑定限流类，
+        # 覆盖 REST_FRAMEWORK 设置不起作用，这里直接替换 APIView 的默认值
+        with mock.patch.object(APIView, 'throttle_classes', ()):
+            for name, url, fields in cases:
+                for selected in (None, fields):
+                    separator = '&' if '?' in url else '?'
+                    path = url if selected is None else f"{url}{separator}fields={selected}"
+                    self._measure(client, name, path, selected or '(all)', options['iterations'])
+
+    def _measure(self, client: Client, name: str, path: str, label: str, iterations: int):
+        # request_started 信号会重置 connection.queries，这里用执行包装器计数，订单查询在分片连接上
+        queries = []
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(
+                    lambda execute, sql, *a: queries.append(sql) or execute(sql, *a)))
+            response = client.get(path)
+        if response.status_code != 200:
+            raise CommandError(f"{path} 返回 {response.status_code}")
+
+        timings = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            client.get(path)
+            timings.append((time.perf_counter() - start) * 1000)
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+
+        self.stdout.write(f"{name:<16}{label:<32}{len(response.content):>9}{len(queries):>9}"
+                          f"{statistics.median(timings):>10.2f}{p95:>10.2f}")
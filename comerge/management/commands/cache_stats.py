@@ -0,0 +1,27 @@
+"""
+缓存统计命令
+输出各命名空间汇总后的缓存命中率、写入、失效次数与耗时分布
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from comerge.utils.cache_stats import cache_stats
+
+
+class Command(BaseCommand):
+    help = '查看或重置按命名空间汇总的缓存统计'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--namespace', action='append', help='只输出指定命名空间，可重复')
+        parser.add_argument('--reset', action='store_true', help='清空统计数据')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            cache_stats.reset()
+            self.stdout.write(self.style.SUCCESS('缓存统计已清空'))
+            return
+
+        snapshot = cache_stats.snapshot(options['namespace'])
+        self.stdout.write(json.dumps(snapshot, ensure_ascii=False, indent=2))
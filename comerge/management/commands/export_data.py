@@ -0,0 +1,47 @@
+"""
+数据导出命令
+以NDJSON或CSV流式导出订单、订单明细或库存日志，支持时间范围与断点续传
+"""
+
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from comerge.business.export_service import EXPORT_FORMATS, ExportService, parse_export_time
+from comerge.repositories.export_repository import EXPORT_SPECS
+
+
+class Command(BaseCommand):
+    help = '流式导出订单、订单明细或库存日志'
+
+    def add_arguments(self, parser):
+        parser.add_argument('kind', choices=list(EXPORT_SPECS), help='导出类型')
+        parser.add_argument('--format', choices=EXPORT_FORMATS, default='ndjson')
+        parser.add_argument('--start', help='起始时间（含），YYYY-MM-DD 或 ISO 8601')
+        parser.add_argument('--end', help='结束时间（不含），YYYY-MM-DD 或 ISO 8601')
+        parser.add_argument('--after', type=int, default=0, help='断点续传：上次导出的最后ID')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='每批查询行数')
+        parser.add_argument('--shard', help='只导出指定的订单分片（订单、订单明细），续传时需要指定')
+        parser.add_argument('--output', '-o', default='-', help='输出文件，默认标准输出')
+
+    def handle(self, *args, **options):
+        try:
+            start = parse_export_time(options['start'])
+            end = parse_export_time(options['end'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        export_service = ExportService()
+        try:
+            export_service.validate(options['kind'], options['format'], options['shard'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        output = sys.stdout.buffer if options['output'] == '-' else open(options['output'], 'wb')
+        try:
+            for chunk in export_service.stream(options['kind'], options['format'], start, end,
+                                               options['after'], options['chunk_size'], options['shard']):
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
@@ -0,0 +1,49 @@
+"""
+热点商品报告命令
+输出最近几个统计窗口内行锁等待最严重的商品：加锁次数、等待与持有时间分位数，
+并标出当前会被路由到高并发库存策略的热点商品。
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+
+from comerge.business.stock_strategies import get_stock_strategy_config
+from comerge.models import Product
+from comerge.utils.lock_stats import lock_stats
+
+
+class Command(BaseCommand):
+    help = '查看或重置库存行锁竞争统计，列出热点商品'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20, help='输出的商品数量')
+        parser.add_argument('--json', action='store_true', help='以JSON输出')
+        parser.add_argument('--reset', action='store_true', help='清空统计数据')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            lock_stats.reset()
+            self.stdout.write(self.style.SUCCESS('行锁统计已清空'))
+            return
+
+        top = lock_stats.top(options['limit'])
+        hot = lock_stats.hot_product_ids()
+        if options['json']:
+            self.stdout.write(json.dumps({
+                'hot_product_ids': sorted(hot),
+                'products': [{'product_id': product_id, **summary} for product_id, summary in top],
+            }, ensure_ascii=False, indent=2))
+            return
+
+        names = dict(Product.objects.filter(id__in=[product_id for product_id, _ in top]).values_list('id', 'name'))
+        self.stdout.write(f"热点商品使用策略: {get_stock_strategy_config()['HOT']}，当前热点 {len(hot)} 个")
+        self.stdout.write(f"{'product':>9}  {'name':<24}{'locks':>7}{'wait_total':>12}{'wait_p50':>10}"
+                          f"{'wait_p95':>10}{'wait_p99':>10}{'hold_p95':>10}  hot")
+        for product_id, summary in top:
+            wait, hold = summary['wait'], summary['hold']
+            self.stdout.write(
+                f"{product_id:>9}  {names.get(product_id, '-')[:22]:<24}{wait['count']:>7}"
+                f"{wait['total_ms']:>10.1f}ms{str(wait['p50_ms']):>10}{str(wait['p95_ms']):>10}"
+                f"{str(wait['p99_ms']):>10}{str(hold['p95_ms']):>10}  {'*' if product_id in hot else ''}"
+            )
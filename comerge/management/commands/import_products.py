@@ -0,0 +1,47 @@
+"""
+商品批量导入命令
+从NDJSON、CSV或JSON数组文件中按批次新增或更新商品
+"""
+
+import json
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from comerge.business.product_import_service import IMPORT_FORMATS, ProductImportService
+
+# 按扩展名推断导入格式
+EXTENSION_FORMATS = {'.ndjson': 'ndjson', '.jsonl': 'ndjson', '.csv': 'csv', '.json': 'json'}
+
+
+class Command(BaseCommand):
+    help = '批量导入商品（存在则更新，不存在则新建）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="导入文件路径，'-' 表示标准输入")
+        parser.add_argument('--format', choices=IMPORT_FORMATS, help='导入格式，默认按扩展名判断')
+        parser.add_argument('--chunk-size', type=int, default=1000, help='每个事务写入的行数')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or EXTENSION_FORMATS.get(os.path.splitext(path)[1].lower())
+        if fmt is None:
+            raise CommandError('无法从扩展名判断导入格式，请指定 --format')
+
+        source = sys.stdin.buffer if path == '-' else open(path, 'rb')
+        try:
+            summary = ProductImportService().import_stream(source, fmt, options['chunk_size'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if source is not sys.stdin.buffer:
+                source.close()
+
+        self.stdout.write(json.dumps(summary, ensure_ascii=False, indent=2))
+        if summary['failed']:
+            self.stderr.write(self.style.WARNING(f"{summary['failed']} 行导入失败"))
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"导入完成: 新建 {summary['created']}，更新 {summary['updated']}，耗时 {summary['elapsed']}s"
+            ))
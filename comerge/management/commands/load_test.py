@@ -0,0 +1,175 @@
+"""
+同步/异步读接口压测命令
+用asyncio原生HTTP/1.1 keep-alive客户端并发请求同一个服务，对比同步DRF接口与异步接口，
+输出吞吐、延迟分位数以及服务端平均并发处理数（按利特尔法则：总延迟 / 墙钟时间）。
+
+用法（单worker启动ASGI服务后执行）：
+    uvicorn Electronic_Commerce.asgi:application --workers 1
+    python manage.py load_test --base-url http://127.0.0.1:8000 --concurrency 64 --duration 10
+
+同步接口受DRF限流（DEFAULT_THROTTLE_RATES）约束，压测前需在被测服务的配置中调高限流。
+"""
+
+import asyncio
+import itertools
+import time
+from typing import List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+from comerge.models import Order, Product
+from comerge.utils.sharding import get_order_shards
+
+# 压测目标：名称 -> 路径模板
+TARGETS = {
+    'sync-detail': '/products/{product_id}/',
+    'async-detail': '/async/products/{product_id}/',
+    'sync-search': '/products/search/?keyword={keyword}&size=20',
+    'async-search': '/async/products/search/?keyword={keyword}&size=20',
+    'sync-order': '/orders/{order_no}/',
+    'async-order': '/async/orders/{order_no}/',
+}
+
+
+class HttpConnection:
+    """极简HTTP/1.1 keep-alive 连接，只支持GET"""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def get(self, path: str) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(
+            f"GET {path} HTTP/1.1\r\nHost: {self.host}\r\nAccept: application/json\r\n"
+            f"Connection: keep-alive\r\n\r\n".encode()
+        )
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError('连接被服务端关闭')
+        status = int(status_line.split()[1])
+
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                size = int((await self.reader.readline()).split(b';')[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif 'content-length' in headers:
+            await self.reader.readexactly(int(headers['content-length']))
+
+        if headers.get('connection', '').lower() == 'close':
+            self.close()
+        return status
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+
+async def _run_target(host: str, port: int, paths: List[str], concurrency: int,
+                      duration: float) -> Tuple[List[float], int, float]:
+    latencies: List[float] = []
+    errors = 0
+    path_cycle = itertools.cycle(paths)
+    deadline = time.perf_counter() + duration
+
+    async def worker():
+        nonlocal errors
+        connection = HttpConnection(host, port)
+        try:
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    status = await connection.get(next(path_cycle))
+                except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+                    errors += 1
+                    connection.close()
+                    continue
+                latencies.append(time.perf_counter() - start)
+                if status >= 400:
+                    errors += 1
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, errors, time.perf_counter() - started
+
+
+def _percentile(sorted_values: List[float], quantile: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(int(len(sorted_values) * quantile), len(sorted_values) - 1)]
+
+
+class Command(BaseCommand):
+    help = '并发压测同步与异步读接口'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='被测服务地址')
+        parser.add_argument('--concurrency', type=int, default=64, help='并发连接数')
+        parser.add_argument('--duration', type=float, default=10.0, help='每个目标的压测秒数')
+        parser.add_argument('--targets', nargs='+', choices=list(TARGETS), default=list(TARGETS))
+        parser.add_argument('--keyword', action='append', help='搜索关键词，可重复指定')
+        parser.add_argument('--sample', type=int, default=200, help='从数据库抽取的商品/订单数量')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['base_url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('只支持 http:// 地址')
+        host, port = url.hostname, url.port or 80
+
+        product_ids = list(Product.objects.filter(status='active')
+                           .order_by('id').values_list('id', flat=True)[:options['sample']])
+        # 订单分布在各分片上，每个分片各取一部分最近的订单
+        shards = get_order_shards()
+        per_shard = -(-options['sample'] // len(shards))
+        order_nos = [order_no for shard in shards for order_no in Order.objects.using(shard).order_by('-id')
+                     .values_list('order_no', flat=True)[:per_shard]]
+        keywords = options['keyword'] or list(Product.objects.filter(status='active')
+                                              .exclude(keywords='')
+                                              .values_list('keywords', flat=True)[:20]) or ['a']
+
+        self.stdout.write(f"{'target':<14}{'requests':>10}{'errors':>8}{'rps':>10}"
+                          f"{'p50ms':>9}{'p95ms':>9}{'p99ms':>9}{'in_flight':>11}")
+        for name in options['targets']:
+            paths = self._paths(TARGETS[name], product_ids, order_nos, keywords)
+            if not paths:
+                self.stdout.write(f"{name:<14}  跳过：没有可用的测试数据")
+                continue
+            latencies, errors, elapsed = asyncio.run(
+                _run_target(host, port, paths, options['concurrency'], options['duration'])
+            )
+            latencies.sort()
+            self.stdout.write(
+                f"{name:<14}{len(latencies):>10}{errors:>8}{len(latencies) / elapsed:>10.1f}"
+                f"{_percentile(latencies, 0.50) * 1000:>9.1f}"
+                f"{_percentile(latencies, 0.95) * 1000:>9.1f}"
+                f"{_percentile(latencies, 0.99) * 1000:>9.1f}"
+                f"{sum(latencies) / elapsed:>11.1f}"
+            )
+
+    @staticmethod
+    def _paths(template: str, product_ids: List[int], order_nos: List[str],
+               keywords: List[str]) -> List[str]:
+        if '{product_id}' in template:
+            return [template.format(product_id=product_id) for product_id in product_ids]
+        if '{order_no}' in template:
+            return [template.format(order_no=quote(order_no)) for order_no in order_nos]
+        return [template.format(keyword=quote(keyword)) for keyword in keywords]
@@ -0,0 +1,107 @@
+"""
+月分区轮转命令
+为订单、订单明细、库存日志补齐未来月份的分区，并处理超过保留期的分区：
+默认只列出过期分区；--export-dir 先导出为NDJSON再删除，--drop 直接删除。
+非MySQL数据库（如SQLite）没有分区，命令跳过；各分片 order_numbers 中超过保留天数的订单号在任何数据库上都会清理。
+
+用法（建议每天由定时任务执行）：
+    python manage.py rotate_partitions --export-dir /data/archive
+"""
+
+import os
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router
+from django.utils import timezone
+
+from comerge.business.export_service import ExportService
+from comerge.business.order_service import OrderService
+from comerge.repositories.export_repository import EXPORT_SPECS
+from comerge.utils.partitioning import PARTITIONED_TABLES, PartitionManager, get_partitioning_config
+from comerge.utils.sharding import get_order_shards, is_sharded_model
+
+
+class Command(BaseCommand):
+    help = '新增未来月份分区，导出或删除过期分区（仅MySQL）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tables', nargs='+', choices=list(PARTITIONED_TABLES),
+                            default=list(PARTITIONED_TABLES))
+        parser.add_argument('--export-dir', help='删除前把过期分区导出为NDJSON文件的目录')
+        parser.add_argument('--drop', action='store_true', help='不导出，直接删除过期分区')
+        parser.add_argument('--dry-run', action='store_true', help='只输出将执行的操作')
+
+    def handle(self, *args, **options):
+        export_dir = options['export_dir']
+        if export_dir and not os.path.isdir(export_dir):
+            raise CommandError(f"导出目录不存在: {export_dir}")
+        remove_expired = bool(export_dir) or options['drop']
+        kinds = {model._meta.db_table: kind for kind, (model, _) in EXPORT_SPECS.items()}
+
+        for table in options['tables']:
+            kind = kinds[table]
+            for database in self._databases(EXPORT_SPECS[kind][0]):
+                label = f"{table}@{database}"
+                # --dry-run 时只打印DDL，不执行
+                manager = PartitionManager(database, execute=self._printer(label) if options['dry_run'] else None)
+                if not manager.supported:
+                    self.stdout.write(f"{label}: {connections[database].vendor} 不支持分区，跳过")
+                    continue
+                if not manager.list_partitions(table):
+                    self.stdout.write(self.style.WARNING(f"{label}: 未分区，请先执行 migrate"))
+                    continue
+
+                added = manager.add_future_partitions(table)
+                if added:
+                    self.stdout.write(f"{label}: 新增分区 {', '.join(added)}")
+
+                for name, lower, upper in manager.expired_partitions(table):
+                    if not remove_expired:
+                        self.stdout.write(f"{label}: 过期分区 {name}（未指定 --export-dir 或 --drop，保留）")
+                        continue
+                    if options['dry_run']:
+                        if export_dir:
+                            self.stdout.write(f"{label}: 将导出 {name} -> {self._export_path(kind, database, name, export_dir)}")
+                        manager.drop_partition(table, name)
+                        self.stdout.write(f"{label}: 将删除分区 {name}（--dry-run，未执行）")
+                        continue
+                    if export_dir:
+                        path = self._export(kind, database, name, lower, upper, export_dir)
+                        self.stdout.write(f"{label}: 已导出 {name} -> {path}")
+                    manager.drop_partition(table, name)
+                    self.stdout.write(self.style.SUCCESS(f"{label}: 已删除分区 {name}"))
+
+        self._purge_order_numbers(options['dry_run'])
+
+    def _purge_order_numbers(self, dry_run: bool):
+        """订单号含生成时间，超过保留天数的登记记录不会再与新订单号冲突"""
+        before = timezone.now() - timedelta(days=get_partitioning_config()['ORDER_NUMBER_RETENTION_DAYS'])
+        if dry_run:
+            self.stdout.write(f"order_numbers: 将清理 {before:%Y-%m-%d %H:%M} 之前登记的订单号（--dry-run，未执行）")
+            return
+        for shard, deleted in OrderService().purge_order_numbers(before).items():
+            self.stdout.write(f"order_numbers@{shard}: 已清理 {deleted} 个过期订单号")
+
+    def _printer(self, label):
+        return lambda sql: self.stdout.write(f"{label}: {sql}")
+
+    @staticmethod
+    def _databases(model):
+        if is_sharded_model(model):
+            return get_order_shards()
+        return [router.db_for_write(model)]
+
+    @staticmethod
+    def _export_path(kind, database, name, export_dir) -> str:
+        return os.path.join(export_dir, f"{kind}-{database}-{name}.ndjson")
+
+    def _export(self, kind, database, name, lower, upper, export_dir) -> str:
+        """按分区的时间范围导出，查询条件只落在该分区上；先写临时文件，完整写出后再改名"""
+        shard = database if is_sharded_model(EXPORT_SPECS[kind][0]) else None
+        path = self._export_path(kind, database, name, export_dir)
+        with open(f"{path}.part", 'wb') as output:
+            for chunk in ExportService().stream(kind, 'ndjson', lower, upper, shard=shard):
+                output.write(chunk)
+        os.replace(f"{path}.part", path)
+        return path
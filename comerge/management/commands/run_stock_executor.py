@@ -0,0 +1,61 @@
+"""
+库存执行器启动命令
+为 STOCK_EXECUTOR['PARTITIONS'] 中的每个地址启动一个分区进程；进程崩溃后重启即可，
+分区从数据库重新加载库存，未提交的扣减不会被确认。
+
+    python manage.py run_stock_executor
+    python manage.py run_stock_executor --only 127.0.0.1:7101   # 由进程管理器逐个托管
+"""
+
+import multiprocessing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from comerge.business.stock_executor import StockPartition, get_stock_executor_config
+
+
+def _run_partition(address: str, config: dict):
+    StockPartition(address, config['BATCH_SIZE'], config['BATCH_INTERVAL'], config['RELOAD_AFTER']).run()
+
+
+class Command(BaseCommand):
+    help = '启动按商品分区的库存执行器'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--partitions', nargs='+', help='分区地址，默认取 STOCK_EXECUTOR["PARTITIONS"]')
+        parser.add_argument('--only', help='只在当前进程运行这一个分区')
+
+    def handle(self, *args, **options):
+        config = get_stock_executor_config()
+        partitions = options['partitions'] or config['PARTITIONS']
+        if options['only']:
+            if options['only'] not in partitions:
+                raise CommandError(f"{options['only']} 不在分区列表中，客户端不会把请求路由到它")
+            partitions = [options['only']]
+        if not partitions:
+            raise CommandError('未配置分区地址')
+
+        if len(partitions) == 1:
+            self.stdout.write(f"库存执行器分区 {partitions[0]} 启动")
+            _run_partition(partitions[0], config)
+            return
+
+        # 子进程不能复用父进程的数据库连接
+        connections.close_all()
+        processes = [
+            multiprocessing.Process(target=_run_partition, args=(address, config), name=f'stock-partition-{address}')
+            for address in partitions
+        ]
+        for process in processes:
+            process.start()
+            self.stdout.write(f"库存执行器分区 {process.name} 启动 (pid {process.pid})")
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+        failed = [process.name for process in processes if process.exitcode]
+        if failed:
+            raise CommandError(f"分区进程异常退出: {', '.join(failed)}")
@@ -0,0 +1,40 @@
+"""
+缓存预热命令
+按近期销量预热商品详情缓存，按运行时搜索频次预热搜索缓存
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+
+from comerge.business.cache_warmup_service import CacheWarmupService, get_warmup_config
+
+
+class Command(BaseCommand):
+    help = '预热热点商品详情与高频搜索缓存'
+
+    def add_arguments(self, parser):
+        config = get_warmup_config()
+        parser.add_argument('--top-products', type=int, default=config['TOP_PRODUCTS'],
+                            help='按近期销量预热的商品数量')
+        parser.add_argument('--top-keywords', type=int, default=config['TOP_KEYWORDS'],
+                            help='按搜索频次预热的关键词数量')
+        parser.add_argument('--days', type=int, default=config['DAYS'], help='统计销量的天数')
+        parser.add_argument('--concurrency', type=int, default=config['CONCURRENCY'], help='并发数')
+        parser.add_argument('--batch-size', type=int, default=config['BATCH_SIZE'],
+                            help='每批预热的商品数量')
+
+    def handle(self, *args, **options):
+        try:
+            stats = CacheWarmupService().warm(
+                top_products=options['top_products'],
+                top_keywords=options['top_keywords'],
+                days=options['days'],
+                concurrency=options['concurrency'],
+                batch_size=options['batch_size'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"预热完成: 商品详情 {stats['detail_keys']} 个, 搜索 {stats['search_keys']} 个, "
+            f"共 {stats['total_keys']} 个键, 耗时 {stats['elapsed']:.2f}s"
+        ))
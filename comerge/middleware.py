@@ -0,0 +1,269 @@
+"""
+中间件
+"""
+
+import logging
+import time
+from typing import Any, Dict, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+
+from .db_router import pin_to_primary, start_write_tracking, stop_write_tracking, unpin
+from .exceptions import QueryBudgetExceeded
+from .utils.admission import get_admission_controller
+from .utils.request_metrics import RequestMetrics, collect_metrics
+from .utils.sharding import get_order_shards
+from .utils.tracing import get_tracing_config, should_sample, start_trace
+
+logger = logging.getLogger(__name__)
+
+PIN_COOKIE_NAME = 'db_pin'
+
+DEFAULT_QUERY_BUDGET = {
+    'ENABLED': True,
+    'SERVER_TIMING': True,
+    'RAISE': False,
+    'DEFAULT': None,
+    'ROUTES': {},
+    'SHARD_SCALED': [],
+}
+
+
+class ReplicaPinningMiddleware:
+    """写后读一致性中间件
+
+    请求期间发生写入时，响应中下发一个 REPLICA_PIN_SECONDS 秒后过期的cookie；
+    携带该cookie的后续请求读主库，直到副本追上复制延迟。
+    非安全方法（POST/PUT/PATCH/DELETE）的请求本身也读主库。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, 'REPLICA_PIN_SECONDS', 5)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        pin_token, write_token = self._enter(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            wrote = self._exit(pin_token, write_token)
+        return self._finish(response, wrote)
+
+    async def __acall__(self, request):
+        pin_token, write_token = self._enter(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            wrote = self._exit(pin_token, write_token)
+        return self._finish(response, wrote)
+
+    def _enter(self, request):
+        pinned = request.method not in ('GET', 'HEAD', 'OPTIONS') or self._cookie_active(request)
+        return pin_to_primary(pinned), start_write_tracking()
+
+    @staticmethod
+    def _exit(pin_token, write_token) -> bool:
+        wrote = stop_write_tracking(write_token)
+        unpin(pin_token)
+        return wrote
+
+    def _finish(self, response, wrote: bool):
+        if wrote and self.pin_seconds > 0:
+            response.set_cookie(
+                PIN_COOKIE_NAME, str(int(time.time() + self.pin_seconds)),
+                max_age=self.pin_seconds, httponly=True, samesite='Lax'
+            )
+        return response
+
+    def _cookie_active(self, request) -> bool:
+        # 以cookie中的过期时间为准，不依赖浏览器按 max_age 及时删除；
+        # cookie由客户端提交，过期时间超过 now + pin_seconds 的视为伪造，不固定主库
+        try:
+            expires = int(request.COOKIES.get(PIN_COOKIE_NAME, 0))
+        except ValueError:
+            return False
+        now = time.time()
+        return now < expires <= now + self.pin_seconds + 1
+
+
+def get_query_budget_config() -> Dict[str, Any]:
+    return {**DEFAULT_QUERY_BUDGET, **getattr(settings, 'QUERY_BUDGET', {})}
+
+
+def get_route_budget(config: Dict[str, Any], method: str, view_name: str) -> Optional[int]:
+    """路由的查询预算：先找 "方法 路由名"，再找路由名，最后用 DEFAULT；
+    SHARD_SCALED 中的路由跨分片查询，预算乘以订单分片数"""
+    routes = config['ROUTES']
+    budget = config['DEFAULT']
+    for key in (f"{method} {view_name}", view_name):
+        if key in routes:
+            budget = routes[key]
+            break
+    if budget is not None and view_name in config['SHARD_SCALED']:
+        budget *= len(get_order_shards())
+    return budget
+
+
+class QueryBudgetMiddleware:
+    """请求性能指标与查询预算中间件
+
+    统计每个请求的SQL查询次数与耗时、缓存往返次数与耗时、响应渲染耗时，
+    写入 Server-Timing 响应头；查询次数超出 QUERY_BUDGET 中按路由名
+    （如 comerge:product-list）配置的预算时记录警告，RAISE 为True时抛出
+    QueryBudgetExceeded，测试中开启以便在合并前发现N+1查询。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        config = get_query_budget_config()
+        if not config['ENABLED']:
+            return self.get_response(request)
+        started = time.perf_counter()
+        with collect_metrics() as metrics:
+            response = self.get_response(request)
+        return self._finish(request, response, metrics, config, started)
+
+    async def __acall__(self, request):
+        config = get_query_budget_config()
+        if not config['ENABLED']:
+            return await self.get_response(request)
+        started = time.perf_counter()
+        with collect_metrics() as metrics:
+            response = await self.get_response(request)
+        return self._finish(request, response, metrics, config, started)
+
+    def process_template_response(self, request, response):
+        # DRF的Response在所有 process_template_response 之后才渲染，从这里开始计渲染耗时
+        request._render_started = time.perf_counter()
+        return response
+
+    def _finish(self, request, response, metrics: RequestMetrics, config: Dict[str, Any], started: float):
+        render_started = getattr(request, '_render_started', None)
+        if render_started is not None:
+            metrics.render_time = time.perf_counter() - render_started
+        if config['SERVER_TIMING']:
+            response['Server-Timing'] = metrics.server_timing(time.perf_counter() - started)
+
+        match = request.resolver_match
+        if match is None:
+            return response
+        budget = get_route_budget(config, request.method, match.view_name)
+        if budget is not None and metrics.queries > budget:
+            if config['RAISE']:
+                raise QueryBudgetExceeded(match.view_name, metrics.queries, budget)
+            logger.warning(f"Query budget exceeded: {request.method} {match.view_name} "
+                           f"{metrics.queries} queries (budget {budget}), db {metrics.db_time * 1000:.1f}ms")
+        return response
+
+
+class TracingMiddleware:
+    """链路追踪中间件：按 TRACING 的采样率为请求开启追踪
+
+    追踪名为 "方法 路由名"，完成后写入进程内环形缓冲区，由 /debug/traces/ 查看。
+    未采样的请求不创建任何追踪对象。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        config = get_tracing_config()
+        if not should_sample(config, request.META.get(config['FORCE_HEADER']) == '1'):
+            return self.get_response(request)
+        with start_trace(request.path, method=request.method) as trace:
+            response = self.get_response(request)
+            self._finish(request, response, trace)
+        return response
+
+    async def __acall__(self, request):
+        config = get_tracing_config()
+        if not should_sample(config, request.META.get(config['FORCE_HEADER']) == '1'):
+            return await self.get_response(request)
+        with start_trace(request.path, method=request.method) as trace:
+            response = await self.get_response(request)
+            self._finish(request, response, trace)
+        return response
+
+    @staticmethod
+    def _finish(request, response, trace):
+        match = request.resolver_match
+        if match is not None:
+            trace.name = f"{request.method} {match.view_name}"
+            trace.attrs['path'] = request.path
+        trace.attrs['status'] = response.status_code
+        response['X-Trace-Id'] = trace.trace_id
+
+
+class AdmissionControlMiddleware:
+    """自适应准入控制中间件：ADMISSION_CONTROL 中的路由在排队深度或p99延迟超过阈值时返回503
+
+    在 process_view 中按路由名判断是否放行（此时已完成URL解析），请求结束后归还名额并记录延迟。
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        try:
+            return self.get_response(request)
+        finally:
+            self._release(request)
+
+    async def __acall__(self, request):
+        try:
+            return await self.get_response(request)
+        finally:
+            self._release(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        controller = get_admission_controller(request.resolver_match.view_name)
+        if controller is None:
+            return None
+        retry_after = controller.try_acquire()
+        if retry_after is not None:
+            logger.warning(f"Shedding {request.method} {request.resolver_match.view_name}: {controller.snapshot()}")
+            response = JsonResponse({'code': 503, 'message': '服务繁忙，请稍后重试', 'data': None}, status=503)
+            response['Retry-After'] = str(retry_after)
+            return response
+        request._admission = (controller, time.perf_counter())
+        return None
+
+    @staticmethod
+    def _release(request):
+        admission = getattr(request, '_admission', None)
+        if admission is not None:
+            controller, started = admission
+            controller.release(time.perf_counter() - started)
+            request._admission = None
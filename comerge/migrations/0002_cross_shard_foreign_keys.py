@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-20 01:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comerge', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderitem',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='comerge.product'),
+        ),
+        migrations.AlterField(
+            model_name='stocklog',
+            name='order',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.CASCADE, to='comerge.order'),
+        ),
+    ]
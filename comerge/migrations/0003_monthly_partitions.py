@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-20 02:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+import comerge.utils.partitioning
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comerge', '0002_cross_shard_foreign_keys'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='items', to='comerge.order'),
+        ),
+        migrations.AlterField(
+            model_name='stocklog',
+            name='product',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, to='comerge.product'),
+        ),
+        # 仅MySQL生效：按 created_at 建立月分区，其它数据库保持普通表
+        comerge.utils.partitioning.PartitionByMonth('order'),
+        comerge.utils.partitioning.PartitionByMonth('orderitem'),
+        comerge.utils.partitioning.PartitionByMonth('stocklog'),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.18 on 2026-10-20 02:42
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comerge', '0003_monthly_partitions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SalesRollupWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.CharField(max_length=64, unique=True, verbose_name='订单分片')),
+                ('last_item_id', models.BigIntegerField(default=0, verbose_name='已汇总的最大明细ID')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'db_table': 'sales_rollup_watermarks',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesDaily',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='日期')),
+                ('units', models.BigIntegerField(default=0, verbose_name='销量')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='销售额')),
+                ('order_items', models.PositiveIntegerField(default=0, verbose_name='明细数')),
+                ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='comerge.product')),
+            ],
+            options={
+                'db_table': 'product_sales_daily',
+                'indexes': [models.Index(fields=['day'], name='product_sal_day_6f7743_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'day'), name='uniq_sales_daily_product_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ProductSalesHourly',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField(verbose_name='小时')),
+                ('units', models.BigIntegerField(default=0, verbose_name='销量')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16, verbose_name='销售额')),
+                ('order_items', models.PositiveIntegerField(default=0, verbose_name='明细数')),
+                ('product', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='comerge.product')),
+            ],
+            options={
+                'db_table': 'product_sales_hourly',
+                'indexes': [models.Index(fields=['hour'], name='product_sal_hour_fcc1c2_idx')],
+                'constraints': [models.UniqueConstraint(fields=('product', 'hour'), name='uniq_sales_hourly_product_hour')],
+            },
+        ),
+    ]
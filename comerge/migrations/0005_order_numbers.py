@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-19 20:10
+
+from django.db import migrations, models
+
+from comerge.utils.partitioning import PartitionManager
+
+
+def _order_no_fields(apps):
+    Order = apps.get_model('comerge', 'Order')
+    unique_field = Order._meta.get_field('order_no')
+    plain_field = models.CharField(max_length=50, verbose_name='订单号')
+    plain_field.set_attributes_from_name('order_no')
+    plain_field.model = Order
+    return Order, unique_field, plain_field
+
+
+def drop_order_no_unique(apps, schema_editor):
+    """去掉 order_no 的唯一键；MySQL分区后该唯一键已变为 (order_no, created_at)，按索引名删除"""
+    Order, unique_field, plain_field = _order_no_fields(apps)
+    table = Order._meta.db_table
+    manager = PartitionManager(schema_editor.connection.alias, execute=schema_editor.execute)
+    if not manager.list_partitions(table):
+        schema_editor.alter_field(Order, unique_field, plain_field)
+        return
+    quote = schema_editor.connection.ops.quote_name
+    for index_name, columns in manager.unique_keys(table).items():
+        if index_name != 'PRIMARY' and columns[0] == 'order_no':
+            schema_editor.execute(f"ALTER TABLE {quote(table)} DROP INDEX {quote(index_name)}")
+
+
+def restore_order_no_unique(apps, schema_editor):
+    Order, unique_field, plain_field = _order_no_fields(apps)
+    table = Order._meta.db_table
+    manager = PartitionManager(schema_editor.connection.alias, execute=schema_editor.execute)
+    if not manager.list_partitions(table):
+        schema_editor.alter_field(Order, plain_field, unique_field)
+        return
+    quote = schema_editor.connection.ops.quote_name
+    schema_editor.execute(
+        f"ALTER TABLE {quote(table)} ADD UNIQUE KEY {quote('order_no')} ({quote('order_no')}, {quote('created_at')})"
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comerge', '0004_sales_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderNumber',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_no', models.CharField(max_length=50, unique=True, verbose_name='订单号')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'db_table': 'order_numbers',
+            },
+        ),
+        # 订单号的唯一性改由 order_numbers 保证；分区表上的复合唯一键无法由 AlterField 找到，单独删除
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AlterField(
+                    model_name='order',
+                    name='order_no',
+                    field=models.CharField(max_length=50, verbose_name='订单号'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(drop_order_no_unique, restore_order_no_unique),
+            ],
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.2.18 on 2026-10-20 03:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('comerge', '0005_order_numbers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stocklog',
+            name='order_no',
+            field=models.CharField(blank=True, default='', max_length=50, verbose_name='订单号'),
+        ),
+        migrations.AddIndex(
+            model_name='stocklog',
+            index=models.Index(fields=['order_no'], name='stock_logs_order_n_9e7fab_idx'),
+        ),
+    ]
@@ -44,7 +44,8 @@ class Order(models.Model):
         ('cancelled', '已取消'),
     ]
 
-    order_no = models.CharField(max_length=50, unique=True, verbose_name='订单号')
+    # MySQL按月分区后唯一键必须包含 created_at，订单号的唯一性由同一分片的 OrderNumber 保证
+    order_no = models.CharField(max_length=50, verbose_name='订单号')
     user_id = models.PositiveIntegerField(verbose_name='用户ID')
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='总金额')
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
@@ -63,6 +64,22 @@ class Order(models.Model):
         return self.order_no
 
 
+class OrderNumber(models.Model):
+    """已分配的订单号，与订单在同一分片
+
+    orders 分区后不能单独对 order_no 建唯一键，这张表不分区：生成订单号时先插入，唯一键冲突则重新生成。
+    订单号中含生成时间，超过 ORDER_NUMBER_RETENTION_DAYS 的行不会再冲突，由 rotate_partitions 清理。
+    """
+    order_no = models.CharField(max_length=50, unique=True, verbose_name='订单号')
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        db_table = 'order_numbers'
+
+    def __str__(self):
+        return self.order_no
+
+
 class OrderItem(models.Model):
     """订单明细模型"""
     STATUS_CHOICES = [
@@ -71,8 +88,10 @@ class OrderItem(models.Model):
         ('failed', '失败'),
     ]
 
-    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items')
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
+    # MySQL分区表不支持外键，订单与明细都按月分区，不建数据库外键约束
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='items', db_constraint=False)
+    # 订单明细按用户分片存储，商品在主库，不建数据库外键约束
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_constraint=False)
     quantity = models.PositiveIntegerField(verbose_name='数量')
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='单价')
     total_price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='小计')
@@ -99,8 +118,11 @@ class StockLog(models.Model):
         ('adjust', '调整'),
     ]
 
-    product = models.ForeignKey(Product, on_delete=models.CASCADE)
-    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True)
+    # 库存日志按月分区，分区表不支持外键
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, db_constraint=False)
+    # 订单可能位于其它分片，不建数据库外键约束；各分片的自增ID可能重复，新日志不再写 order_id，用 order_no 引用订单
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, null=True, blank=True, db_constraint=False)
+    order_no = models.CharField(max_length=50, blank=True, default='', verbose_name='订单号')
     change_type = models.CharField(max_length=20, choices=CHANGE_TYPE_CHOICES)
     quantity_before = models.PositiveIntegerField(verbose_name='变更前库存')
     quantity_after = models.PositiveIntegerField(verbose_name='变更后库存')
@@ -113,8 +135,65 @@ class StockLog(models.Model):
         indexes = [
             models.Index(fields=['product']),
             models.Index(fields=['order']),
+            models.Index(fields=['order_no']),
             models.Index(fields=['created_at']),
         ]
 
     def __str__(self):
         return f"{self.product.name} - {self.change_type}"
+
+
+class ProductSalesHourly(models.Model):
+    """商品小时销量汇总（只统计成功的订单明细），由 rollup_sales 或下单提交后增量累加"""
+    # 汇总是历史数据，删除商品时保留
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False)
+    hour = models.DateTimeField(verbose_name='小时')
+    units = models.BigIntegerField(default=0, verbose_name='销量')
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name='销售额')
+    order_items = models.PositiveIntegerField(default=0, verbose_name='明细数')
+
+    class Meta:
+        db_table = 'product_sales_hourly'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'hour'], name='uniq_sales_hourly_product_hour'),
+        ]
+        indexes = [
+            models.Index(fields=['hour']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.hour:%Y-%m-%d %H}:00"
+
+
+class ProductSalesDaily(models.Model):
+    """商品日销量汇总，与小时汇总同步累加"""
+    product = models.ForeignKey(Product, on_delete=models.DO_NOTHING, db_constraint=False)
+    day = models.DateField(verbose_name='日期')
+    units = models.BigIntegerField(default=0, verbose_name='销量')
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0, verbose_name='销售额')
+    order_items = models.PositiveIntegerField(default=0, verbose_name='明细数')
+
+    class Meta:
+        db_table = 'product_sales_daily'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'day'], name='uniq_sales_daily_product_day'),
+        ]
+        indexes = [
+            models.Index(fields=['day']),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} @ {self.day}"
+
+
+class SalesRollupWatermark(models.Model):
+    """销量汇总的水位：每个订单分片已汇总到的订单明细ID"""
+    shard = models.CharField(max_length=64, unique=True, verbose_name='订单分片')
+    last_item_id = models.BigIntegerField(default=0, verbose_name='已汇总的最大明细ID')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'sales_rollup_watermarks'
+
+    def __str__(self):
+        return f"{self.shard}: {self.last_item_id}"
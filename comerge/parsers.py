@@ -0,0 +1,42 @@
+"""
+高性能JSON解析器
+基于orjson解析请求体，orjson未安装或请求编码不是UTF-8时退回标准库
+"""
+
+import json
+
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+
+from .renderers import ORJSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+
+class ORJSONParser(JSONParser):
+    """orjson解析器"""
+
+    renderer_class = ORJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        if orjson is None or encoding.lower().replace('-', '') != 'utf8':
+            return super().parse(stream, media_type, parser_context)
+
+        body = stream.read()
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError as exc:
+            if self.strict:
+                raise ParseError('JSON parse error - %s' % str(exc))
+
+        # orjson 不接受 NaN/Infinity，非严格模式下交给标准库以保持兼容
+        try:
+            return json.loads(body.decode(encoding))
+        except ValueError as exc:
+            raise ParseError('JSON parse error - %s' % str(exc))
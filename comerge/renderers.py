@@ -0,0 +1,82 @@
+"""
+高性能JSON渲染器
+基于orjson输出，与DRF默认 JSONRenderer 的输出格式保持一致；orjson未安装时退回标准库
+"""
+
+import math
+import re
+
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 可选依赖
+    orjson = None
+
+# 与DRF一致：datetime交给DRF编码器处理（UTC输出为 Z 结尾），非字符串键转为字符串
+ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+_LINE_SEPARATOR = '\u2028'.encode()
+_PARAGRAPH_SEPARATOR = '\u2029'.encode()
+
+# orjson 的浮点数格式与 repr 不同（1e16 / 1e+16，0.00001 / 1e-05），输出中可能有这类数字时逐个改写；
+# 字符串整体匹配后原样保留，避免改写字符串里的内容
+_FLOAT_CANDIDATE = re.compile(rb'[0-9]e|0\.0000')
+_STRING_OR_FLOAT = re.compile(rb'"(?:[^"\\]|\\.)*"|-?[0-9]+(?:\.[0-9]+)?(?:e[-+]?[0-9]+)?')
+
+
+def _repr_float(match) -> bytes:
+    token = match.group()
+    if token[:1] == b'"' or (b'.' not in token and b'e' not in token):
+        return token
+    return repr(float(token)).encode()
+
+
+def _has_non_finite(data) -> bool:
+    """数据中是否有 NaN/Infinity（orjson 输出为 null，DRF 严格模式下抛出 ValueError）"""
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
+
+
+class ORJSONRenderer(JSONRenderer):
+    """orjson渲染器
+
+    只在紧凑、非ASCII转义的默认输出下使用orjson；需要缩进（如可浏览API）、
+    ensure_ascii，或遇到orjson无法编码的值（如超过64位的整数、NaN/Infinity）时交给父类处理，
+    与DRF一样抛出错误。浮点数按 repr 格式改写，输出与DRF逐字节一致。
+    """
+
+    _encoder = JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+
+        try:
+            ret = orjson.dumps(data, default=self._encoder.default, option=ORJSON_OPTIONS)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # 只有输出含 null 时才可能有非有限浮点数，此时才遍历数据
+        if b'null' in ret and _has_non_finite(data):
+            return super().render(data, accepted_media_type, renderer_context)
+        if _FLOAT_CANDIDATE.search(ret):
+            ret = _STRING_OR_FLOAT.sub(_repr_float, ret)
+
+        # 与DRF一致，转义 U+2028 和 U+2029 以保证输出是合法的JavaScript
+        if _LINE_SEPARATOR in ret or _PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(_LINE_SEPARATOR, b'\\u2028').replace(_PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
@@ -0,0 +1,78 @@
+"""
+数据导出访问层
+负责按主键游标分批读取订单、订单明细和库存日志
+"""
+
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from django.db import models
+
+from ..models import Order, OrderItem, StockLog
+from ..utils.sharding import get_order_shards, is_sharded_model
+
+# 可导出的数据类型：模型与导出列
+EXPORT_SPECS: Dict[str, Tuple[type, Sequence[str]]] = {
+    'orders': (Order, (
+        'id', 'order_no', 'user_id', 'total_amount', 'status', 'created_at', 'updated_at',
+    )),
+    'order_items': (OrderItem, (
+        'id', 'order_id', 'product_id', 'quantity', 'unit_price', 'total_price',
+        'status', 'error_message', 'created_at',
+    )),
+    'stock_logs': (StockLog, (
+        'id', 'product_id', 'order_id', 'change_type', 'quantity_before', 'quantity_after',
+        'change_quantity', 'reason', 'created_at',
+    )),
+}
+
+
+class ExportRepository:
+    """数据导出访问类"""
+
+    def get_columns(self, kind: str) -> Sequence[str]:
+        """获取导出列"""
+        return EXPORT_SPECS[kind][1]
+
+    def get_databases(self, kind: str, shard: Optional[str] = None) -> List[Optional[str]]:
+        """导出需要读取的数据库：订单类数据逐个分片读取，其余数据交给路由（None）"""
+        if not is_sharded_model(EXPORT_SPECS[kind][0]):
+            return [None]
+        shards = get_order_shards()
+        if shard is not None:
+            if shard not in shards:
+                raise ValueError(f"未知的订单分片: {shard}，可选: {', '.join(shards)}")
+            return [shard]
+        return shards
+
+    def iter_rows(self, kind: str, start: Optional[datetime] = None, end: Optional[datetime] = None,
+                  after_id: int = 0, chunk_size: int = 2000,
+                  shard: Optional[str] = None) -> Iterator[Tuple[Any, ...]]:
+        """按主键升序分批读取，每批以上一批最后的ID为游标（keyset），不使用OFFSET
+
+        MySQL驱动不支持服务端游标，单个大查询会把结果集整体读入内存，
+        因此按批次发起查询，内存占用只与 chunk_size 有关。
+        订单类数据按分片依次导出；各分片的ID独立自增，断点续传需要同时指定分片。
+        """
+        for database in self.get_databases(kind, shard):
+            yield from self._iter_database(kind, database, start, end, after_id, chunk_size)
+
+    def _iter_database(self, kind: str, database: Optional[str], start: Optional[datetime],
+                       end: Optional[datetime], after_id: int, chunk_size: int) -> Iterator[Tuple[Any, ...]]:
+        model, columns = EXPORT_SPECS[kind]
+        queryset: models.QuerySet = model.objects.using(database) if database else model.objects.all()
+        if start is not None:
+            queryset = queryset.filter(created_at__gte=start)
+        if end is not None:
+            queryset = queryset.filter(created_at__lt=end)
+
+        last_id = after_id
+        while True:
+            batch = queryset.filter(id__gt=last_id).order_by('id').values_list(*columns)[:chunk_size]
+            count = 0
+            for row in batch.iterator(chunk_size=chunk_size):
+                count += 1
+                last_id = row[0]
+                yield row
+            if count < chunk_size:
+                return
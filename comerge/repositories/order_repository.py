@@ -3,25 +3,52 @@
 负责订单相关的数据库操作
 """
 
-from typing import List, Optional, Dict, Any
-from django.db.models import QuerySet
+from collections import Counter
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Union
+from django.db.models import Prefetch, QuerySet, Sum
 from django.core.paginator import Paginator
-from ..models import Order, OrderItem
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, transaction
+from django.utils import timezone
+from ..models import Order, OrderItem, OrderNumber
 from ..utils.cache_manager import cache_manager
+from ..utils.partitioning import created_range_filter
+from ..utils.sharding import ScatterGatherList, get_order_shards, shard_for_order_no, shard_for_user
+from ..utils.tracing import traced_methods
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+@traced_methods
 class OrderRepository:
     """订单数据访问类"""
 
     def __init__(self):
         self.cache = cache_manager
 
+    def reserve_order_no(self, order_no: str, shard: str) -> bool:
+        """在分片的 order_numbers 中登记订单号，已被占用时返回False"""
+        try:
+            with transaction.atomic(using=shard):
+                OrderNumber.objects.using(shard).create(order_no=order_no)
+        except IntegrityError:
+            return False
+        return True
+
+    def purge_order_numbers(self, shard: str, before: datetime, batch_size: int = 10000) -> int:
+        """删除分片上登记时间早于 before 的订单号，按主键分批删除，返回删除的行数"""
+        deleted = 0
+        while True:
+            ids = list(OrderNumber.objects.using(shard).filter(created_at__lt=before)
+                       .order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            deleted += OrderNumber.objects.using(shard).filter(id__in=ids).delete()[0]
+
     def create_order(self, order_no: str, user_id: int) -> Order:
-        """创建订单"""
-        return Order.objects.create(
+        """创建订单，写入用户所在的分片"""
+        return Order.objects.using(shard_for_user(user_id)).create(
             order_no=order_no,
             user_id=user_id,
             total_amount=0,
@@ -29,14 +56,17 @@ class OrderRepository:
         )
 
     def update_order(self, order: Order, total_amount: float, status: str) -> bool:
-        """更新订单"""
+        """更新订单，按主键加创建时间定位，分区表上只访问订单所在的月分区"""
         try:
             order.total_amount = total_amount
             order.status = status
-            order.save()
+            order.updated_at = timezone.now()
+            Order.objects.using(order._state.db).filter(pk=order.pk, created_at=order.created_at).update(
+                total_amount=total_amount, status=status, updated_at=order.updated_at
+            )
 
             # 清除相关缓存
-            self._invalidate_order_cache(order.order_no)
+            self.invalidate_order_cache(order.order_no, order._state.db)
             return True
         except Exception as e:
             logger.error(f"Update order error: {e}")
@@ -45,10 +75,10 @@ class OrderRepository:
     def create_order_item(self, order: Order, product, quantity: int,
                           unit_price: float, status: str = 'success',
                           error_message: str = "") -> OrderItem:
-        """创建订单项"""
+        """创建订单项，与订单写入同一分片"""
         total_price = unit_price * quantity if status == 'success' else 0
 
-        return OrderItem.objects.create(
+        return OrderItem.objects.using(order._state.db).create(
             order=order,
             product=product,
             quantity=quantity,
@@ -58,8 +88,91 @@ class OrderRepository:
             error_message=error_message
         )
 
-    def _invalidate_order_cache(self, order_no: str):
-        """清除订单相关缓存"""
+    def get_top_selling_product_ids(self, since: datetime, limit: int) -> List[int]:
+        """获取指定时间以来成功下单数量最多的商品ID，多个分片的销量合并后排序"""
+        shards = get_order_shards()
+        totals = Counter()
+        for shard in shards:
+            rows = (
+                OrderItem.objects.using(shard).filter(status='success', created_at__gte=since)
+                .values('product_id')
+                .annotate(total_quantity=Sum('quantity'))
+                .order_by('-total_quantity')
+                .values_list('product_id', 'total_quantity')
+            )
+            # 单个分片时直接在数据库中截取，多个分片需要完整的分片内销量才能合并出准确排名
+            for product_id, quantity in (rows[:limit] if len(shards) == 1 else rows):
+                totals[product_id] += quantity
+        return [product_id for product_id, _ in totals.most_common(limit)]
+
+    def order_lookup(self, order_no: str) -> Dict[str, Any]:
+        """按订单号查询的条件，附带由订单号时间戳推出的 created_at 范围用于分区裁剪"""
+        return {'order_no': order_no, **created_range_filter(order_no)}
+
+    def items_prefetch(self, order_no: str) -> List[Union[Prefetch, str]]:
+        """订单详情预取明细及商品，明细同样按订单号时间戳限定 created_at 范围"""
+        return [
+            Prefetch('items', queryset=OrderItem.objects.filter(**created_range_filter(order_no))),
+            'items__product',
+        ]
+
+    def _candidate_shards(self, order_no: str) -> List[str]:
+        """订单可能所在的分片：新订单号直接解析出分片，旧订单号需要逐个分片查找"""
+        shard = shard_for_order_no(order_no)
+        return [shard] if shard is not None else get_order_shards()
+
+    def find_shard(self, order_no: str) -> Optional[str]:
+        """订单所在的分片，不存在时返回None"""
+        shards = self._candidate_shards(order_no)
+        if len(shards) == 1:
+            return shards[0]
+        for shard in shards:
+            if Order.objects.using(shard).filter(**self.order_lookup(order_no)).exists():
+                return shard
+        return None
+
+    def route_queryset(self, queryset: QuerySet, user_id: Optional[int] = None) -> Union[QuerySet, ScatterGatherList]:
+        """按 user_id 把订单查询落到单个分片，否则跨分片归并"""
+        shards = get_order_shards()
+        if user_id is not None:
+            return queryset.using(shard_for_user(user_id))
+        if len(shards) == 1:
+            return queryset.using(shards[0])
+        return ScatterGatherList({shard: queryset.using(shard) for shard in shards}, queryset.query.order_by)
+
+    async def aget_by_order_no(self, order_no: str) -> Optional[Order]:
+        """异步根据订单号获取订单，预取订单明细及商品"""
+        for shard in self._candidate_shards(order_no):
+            try:
+                return await Order.objects.using(shard).prefetch_related(
+                    *self.items_prefetch(order_no)
+                ).aget(**self.order_lookup(order_no))
+            except Order.DoesNotExist:
+                continue
+        return None
+
+    def get_updated_at(self, order_no: str) -> Optional[datetime]:
+        """只查询订单的更新时间（唯一索引查询，用于ETag校验）"""
+        for shard in self._candidate_shards(order_no):
+            updated_at = Order.objects.using(shard).filter(
+                **self.order_lookup(order_no)
+            ).values_list('updated_at', flat=True).first()
+            if updated_at is not None:
+                return updated_at
+        return None
+
+    async def aget_updated_at(self, order_no: str) -> Optional[datetime]:
+        """异步查询订单的更新时间"""
+        for shard in self._candidate_shards(order_no):
+            updated_at = await Order.objects.using(shard).filter(
+                **self.order_lookup(order_no)
+            ).values_list('updated_at', flat=True).afirst()
+            if updated_at is not None:
+                return updated_at
+        return None
+
+    def invalidate_order_cache(self, order_no: str, using: Optional[str] = None):
+        """清除订单相关缓存；代数在订单所在分片的事务提交后递增，using 未指定时由订单号解析分片"""
         cache_keys = [
             f"order:detail:{order_no}",
         ]
@@ -69,3 +182,5 @@ class OrderRepository:
 
         # 清除列表缓存
         self.cache.delete_pattern("order:list")
+        using = using or shard_for_order_no(order_no) or DEFAULT_DB_ALIAS
+        transaction.on_commit(lambda: self.cache.bump_generation("order"), using=using)
@@ -3,22 +3,38 @@
 负责商品相关的数据库操作
 """
 
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator, Iterable, Tuple
 from django.db.models import Q, QuerySet, F
 from django.core.paginator import Paginator
-from django.db import transaction
+from django.db import connections, transaction
+from django.utils import timezone
 from ..models import Product, StockLog
 from ..utils.cache_manager import cache_manager
+from ..utils.lock_stats import lock_stats
+from ..utils.partitioning import retention_start
+from ..utils.tracing import span, traced_methods
 from ..exceptions import (
     InsufficientStockException,
     ProductNotActiveException,
     ConcurrentUpdateException
 )
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
+# 搜索结果只用于列表输出，不查询（也不缓存）商品描述等大字段
+SEARCH_RESULT_FIELDS = ('id', 'name', 'price', 'stock_quantity', 'status', 'version', 'created_at')
 
+# 批量导入可写入的字段，新建商品时必须提供名称和价格
+IMPORT_FIELDS = ('name', 'description', 'price', 'stock_quantity', 'keywords', 'status')
+IMPORT_REQUIRED_FIELDS = ('name', 'price')
+
+# 库存对账读取的日志列，顺序与对账引擎的数组列一致
+RECONCILE_LOG_FIELDS = ('id', 'product_id', 'change_quantity', 'quantity_before', 'quantity_after')
+
+
+@traced_methods
 class ProductRepository:
     """商品数据访问类"""
 
@@ -40,98 +56,418 @@ class ProductRepository:
 
         return self.cache.get_or_set(cache_key, _get_product, timeout=3600)
 
+    def get_many_by_ids(self, product_ids: List[int]) -> Dict[int, Product]:
+        """批量获取在售商品：先从详情缓存批量读取，未命中的ID合并为一次查询并回填缓存"""
+        keys = {product_id: f"product:detail:{product_id}" for product_id in product_ids}
+        cached = self.cache.get_many(list(keys.values()))
+        products = {
+            product_id: cached[key] for product_id, key in keys.items() if key in cached
+        }
+
+        missing = [product_id for product_id in product_ids if product_id not in products]
+        if missing:
+            fetched = {
+                product.id: product
+                for product in Product.objects.filter(id__in=missing, status='active')
+            }
+            if fetched:
+                self.cache.set_many(
+                    {keys[product_id]: product for product_id, product in fetched.items()},
+                    timeout=3600
+                )
+            products.update(fetched)
+        return products
+
+    @staticmethod
+    def search_cache_key(keyword: str, page: int = 1, size: int = 20) -> str:
+        return f"product:search:{keyword}:{page}:{size}"
+
     def search_products(self, keyword: str, page: int = 1, size: int = 20) -> Dict[str, Any]:
         """搜索商品"""
-        cache_key = f"product:search:{keyword}:{page}:{size}"
+        return self.cache.get_or_set(
+            self.search_cache_key(keyword, page, size), lambda: self._query_search(keyword, page, size), timeout=1800
+        )
+
+    def warm_search(self, keyword: str, page: int = 1, size: int = 20) -> Dict[str, Any]:
+        """查询搜索结果并直接写入缓存（缓存预热）"""
+        result = self._query_search(keyword, page, size)
+        self.cache.set(self.search_cache_key(keyword, page, size), result, timeout=1800)
+        return result
 
-        def _search_products():
+    def warm_details(self, product_ids: List[int]) -> int:
+        """批量查询商品详情并写入缓存（缓存预热），返回写入的键数量"""
+        products = Product.objects.filter(id__in=product_ids, status='active')
+        mapping = {f"product:detail:{product.id}": product for product in products}
+        if mapping:
+            self.cache.set_many(mapping, timeout=3600)
+        return len(mapping)
+
+    def _query_search(self, keyword: str, page: int, size: int) -> Dict[str, Any]:
+        """执行搜索查询"""
+        try:
+            queryset = Product.objects.filter(
+                Q(name__icontains=keyword) |
+                Q(keywords__icontains=keyword) |
+                Q(description__icontains=keyword),
+                status='active'
+            ).order_by('-created_at').only(*SEARCH_RESULT_FIELDS)
+
+            paginator = Paginator(queryset, size)
+            page_obj = paginator.get_page(page)
+
+            return {
+                'products': list(page_obj),
+                'total': paginator.count,
+                'page': page,
+                'size': size,
+                'total_pages': paginator.num_pages,
+                'has_next': page_obj.has_next(),
+                'has_previous': page_obj.has_previous(),
+            }
+        except Exception as e:
+            logger.error(f"Search products error: {e}")
+            return {
+                'products': [],
+                'total': 0,
+                'page': page,
+                'size': size,
+                'total_pages': 0,
+                'has_next': False,
+                'has_previous': False,
+            }
+
+    async def aget_by_id(self, product_id: int) -> Optional[Product]:
+        """异步根据ID获取商品"""
+        async def _get_product():
             try:
-                queryset = Product.objects.filter(
-                    Q(name__icontains=keyword) |
-                    Q(keywords__icontains=keyword) |
-                    Q(description__icontains=keyword),
-                    status='active'
-                ).order_by('-created_at')
-
-                paginator = Paginator(queryset, size)
-                page_obj = paginator.get_page(page)
-
-                return {
-                    'products': list(page_obj),
-                    'total': paginator.count,
-                    'page': page,
-                    'size': size,
-                    'total_pages': paginator.num_pages,
-                    'has_next': page_obj.has_next(),
-                    'has_previous': page_obj.has_previous(),
-                }
-            except Exception as e:
-                logger.error(f"Search products error: {e}")
-                return {
-                    'products': [],
-                    'total': 0,
-                    'page': page,
-                    'size': size,
-                    'total_pages': 0,
-                    'has_next': False,
-                    'has_previous': False,
-                }
-
-        return self.cache.get_or_set(cache_key, _search_products, timeout=1800)
+                return await Product.objects.aget(id=product_id, status='active')
+            except Product.DoesNotExist:
+                return None
+
+        return await self.cache.aget_or_set(f"product:detail:{product_id}", _get_product, timeout=3600)
+
+    async def asearch_products(self, keyword: str, page: int = 1, size: int = 20) -> Dict[str, Any]:
+        """异步搜索商品，与 search_products 共用缓存键和结果格式"""
+        return await self.cache.aget_or_set(
+            self.search_cache_key(keyword, page, size),
+            lambda: self._aquery_search(keyword, page, size),
+            timeout=1800
+        )
+
+    async def _aquery_search(self, keyword: str, page: int, size: int) -> Dict[str, Any]:
+        """异步执行搜索查询，分页规则与 Paginator.get_page 一致（页码越界时取末页）"""
+        try:
+            queryset = Product.objects.filter(
+                Q(name__icontains=keyword) |
+                Q(keywords__icontains=keyword) |
+                Q(description__icontains=keyword),
+                status='active'
+            ).order_by('-created_at').only(*SEARCH_RESULT_FIELDS)
+
+            total = await queryset.acount()
+            total_pages = max((total + size - 1) // size, 1)
+            if page < 1 or page > total_pages:
+                page = total_pages
+            offset = (page - 1) * size
+
+            return {
+                'products': [product async for product in queryset[offset:offset + size]],
+                'total': total,
+                'page': page,
+                'size': size,
+                'total_pages': total_pages,
+                'has_next': page < total_pages,
+                'has_previous': page > 1,
+            }
+        except Exception as e:
+            logger.error(f"Async search products error: {e}")
+            return {
+                'products': [],
+                'total': 0,
+                'page': page,
+                'size': size,
+                'total_pages': 0,
+                'has_next': False,
+                'has_previous': False,
+            }
 
     def get_with_lock(self, product_id: int) -> Optional[Product]:
-        """获取商品并加锁（用于库存操作）"""  # 使用select_for_update来加锁
+        """获取商品并加锁（用于库存操作），记录等待行锁的时间"""  # 使用select_for_update来加锁
+        start = time.perf_counter()
         try:
-            return Product.objects.select_for_update().get(
+            product = Product.objects.select_for_update().get(
                 id=product_id,
                 status='active'
             )
         except Product.DoesNotExist:
             return None
+        finally:
+            lock_stats.record_wait(product_id, time.perf_counter() - start)
+        lock_stats.lock_acquired(product_id)
+        return product
+
+    @transaction.atomic
+    def deduct_stock(self, product_id: int, quantity: int, reason: str = "", order_no: str = "") -> Optional[Product]:
+        """条件更新扣减库存：一条UPDATE在库存充足时扣减，不先加锁读取，行锁只从UPDATE持有到事务结束
+
+        商品不存在、已下架或库存不足时不做修改，返回None。
+        """
+        start = time.perf_counter()
+        with span('Product.conditional_update', product_id=product_id):
+            updated = Product.objects.filter(
+                id=product_id, status='active', stock_quantity__gte=quantity
+            ).update(
+                stock_quantity=F('stock_quantity') - quantity,
+                version=F('version') + 1,
+                updated_at=timezone.now()
+            )
+        lock_stats.record_wait(product_id, time.perf_counter() - start)
+        if not updated:
+            return None
+        lock_stats.lock_acquired(product_id)
+
+        product = Product.objects.get(id=product_id)
+        with span('StockLog.insert', product_id=product_id):
+            StockLog.objects.create(
+                product=product,
+                change_type='decrease',
+                quantity_before=product.stock_quantity + quantity,
+                quantity_after=product.stock_quantity,
+                change_quantity=-quantity,
+                reason=reason,
+                order_no=order_no
+            )
+        self.invalidate_product_cache(product_id)
+        return product
+
+    def get_fresh(self, product_id: int) -> Optional[Product]:
+        """不经缓存读取商品当前状态（用于扣减失败后给出准确的库存信息）"""
+        return Product.objects.filter(id=product_id).first()
 
     # 使用事务来确保库存更新的原子性
     @transaction.atomic
-    def update_stock(self, product: Product, quantity_change: int, reason: str = "") -> bool:
-        """更新库存"""
+    @transaction.atomic
+    def restore_stock(self, product_id: int, quantity: int, reason: str = "", order_no: str = "") -> bool:
+        """加锁后把已提交的扣减加回库存并记录 increase 日志，用于订单失败时的补偿；商品已下架也照常加回"""
+        product = Product.objects.select_for_update().filter(id=product_id).first()
+        if product is None:
+            return False
+        return self.update_stock(product, quantity, reason, order_no)
+
+    def update_stock(self, product: Product, quantity_change: int, reason: str = "", order_no: str = "") -> bool:
+        """更新库存，order_no 为引起变更的订单号"""
         try:
             old_stock = product.stock_quantity
             product.stock_quantity += quantity_change
             product.version += 1
-            product.save()
+            with span('Product.save', product_id=product.id):
+                product.save()
 
             # 记录库存日志
-            StockLog.objects.create(
-                product=product,
-                change_type='decrease' if quantity_change < 0 else 'increase',
-                quantity_before=old_stock,
-                quantity_after=product.stock_quantity,
-                change_quantity=quantity_change,
-                reason=reason
-            )
+            with span('StockLog.insert', product_id=product.id):
+                StockLog.objects.create(
+                    product=product,
+                    change_type='decrease' if quantity_change < 0 else 'increase',
+                    quantity_before=old_stock,
+                    quantity_after=product.stock_quantity,
+                    change_quantity=quantity_change,
+                    reason=reason,
+                    order_no=order_no
+                )
 
             # 清除相关缓存
-            self._invalidate_product_cache(product.id)
+            self.invalidate_product_cache(product.id)
             return True
 
         except Exception as e:
             logger.error(f"Update stock error: {e}")
             return False
 
+    @transaction.atomic
+    def bulk_upsert(self, rows: List[Dict[str, Any]], reason: str = "批量导入") -> Dict[str, Any]:
+        """批量新增或更新商品
+
+        带ID且已存在的商品按主键顺序加锁，在内存中合并字段并记录库存变化；
+        与带ID的新商品一起通过 bulk_create(update_conflicts=True) 写入
+        （MySQL 为 INSERT ... ON DUPLICATE KEY UPDATE），不带ID的行直接 bulk_create。
+        新商品的初始库存和已有商品的库存变化都写入库存日志，日志批量写入，整批只清除一次缓存。
+        返回的 rejected 为不存在且缺少必填字段、无法新建的行下标。
+        """
+        ids = sorted({row['id'] for row in rows if row.get('id') is not None})
+        existing = {
+            product.id: product
+            for product in Product.objects.select_for_update().filter(id__in=ids).order_by('id')
+        }
+
+        now = timezone.now()
+        upserts: Dict[int, Product] = {}
+        to_create = []
+        logs = []
+        rejected = []
+        written_fields = set()
+        updated = 0
+        for index, row in enumerate(rows):
+            fields = {name: row[name] for name in IMPORT_FIELDS if name in row}
+            product_id = row.get('id')
+            product = existing.get(product_id)
+            if product is None:
+                if any(name not in fields for name in IMPORT_REQUIRED_FIELDS):
+                    rejected.append(index)
+                elif product_id is None:
+                    to_create.append(Product(**fields))
+                else:
+                    # 同一批中重复的ID以最后一行为准
+                    upserts[product_id] = Product(id=product_id, **fields)
+                    written_fields.update(fields)
+                continue
+
+            old_stock = product.stock_quantity
+            for name, value in fields.items():
+                setattr(product, name, value)
+            written_fields.update(fields)
+            if product_id not in upserts:
+                product.version += 1
+                updated += 1
+            product.updated_at = now
+            upserts[product_id] = product
+            if product.stock_quantity != old_stock:
+                logs.append(StockLog(
+                    product=product,
+                    change_type='adjust',
+                    quantity_before=old_stock,
+                    quantity_after=product.stock_quantity,
+                    change_quantity=product.stock_quantity - old_stock,
+                    reason=reason,
+                ))
+
+        features = connections[Product.objects.db].features
+        if upserts:
+            # 只覆盖本批出现过的字段；bulk_update 逐字段生成 CASE WHEN，大批量时远慢于 upsert
+            update_fields = [name for name in IMPORT_FIELDS if name in written_fields]
+            Product.objects.bulk_create(
+                list(upserts.values()),
+                update_conflicts=True,
+                unique_fields=['id'] if features.supports_update_conflicts_with_target else None,
+                update_fields=update_fields + ['version', 'updated_at'],
+            )
+        if to_create:
+            if features.can_return_rows_from_bulk_insert:
+                Product.objects.bulk_create(to_create)
+            else:
+                # MySQL 批量插入不返回自增ID，有初始库存的商品逐条插入以便写库存日志
+                stocked = [product for product in to_create if product.stock_quantity]
+                Product.objects.bulk_create([product for product in to_create if not product.stock_quantity])
+                for product in stocked:
+                    product.save(force_insert=True)
+        new_products = to_create + [product for product_id, product in upserts.items()
+                                    if product_id not in existing]
+        logs.extend(
+            StockLog(product=product, change_type='increase', quantity_before=0,
+                     quantity_after=product.stock_quantity, change_quantity=product.stock_quantity,
+                     reason=f"{reason}初始库存")
+            for product in new_products if product.stock_quantity
+        )
+        if logs:
+            StockLog.objects.bulk_create(logs)
+
+        if upserts or to_create:
+            self.invalidate_products_cache(list(upserts))
+
+        return {
+            'created': len(to_create) + len(upserts) - updated,
+            'updated': updated,
+            'stock_logs': len(logs),
+            'rejected': rejected,
+        }
+
     def get_stock_logs(self, product_id: int, page: int = 1, size: int = 20) -> QuerySet:
-        """获取商品库存日志"""
+        """获取商品库存日志，只查询保留期内的月分区"""
+        # 商品与日志同库可以JOIN；订单可能在其它分片，日志上的 order_no 直接输出，不加载订单
         return StockLog.objects.filter(
-            product_id=product_id
-        ).order_by('-created_at')
+            product_id=product_id,
+            created_at__gte=retention_start()
+        ).select_related('product').order_by('-created_at')
+
+    def max_stock_log_id(self) -> int:
+        """当前最大的库存日志ID，对账以此为本次扫描的上界"""
+        return StockLog.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+    def iter_stock_log_chunks(self, after_id: int = 0, upto_id: Optional[int] = None, chunk_size: int = 100000,
+                              product_ids: Optional[List[int]] = None) -> Iterator[List[Tuple[int, ...]]]:
+        """按主键升序分批读取库存日志（RECONCILE_LOG_FIELDS），每批以上一批最后的ID为游标，不使用OFFSET"""
+        queryset = StockLog.objects.all()
+        if upto_id is not None:
+            queryset = queryset.filter(id__lte=upto_id)
+        if product_ids is not None:
+            queryset = queryset.filter(product_id__in=product_ids)
+        last_id = after_id
+        while True:
+            rows = list(queryset.filter(id__gt=last_id).order_by('id')
+                        .values_list(*RECONCILE_LOG_FIELDS)[:chunk_size])
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1][0]
+
+    def iter_stock_quantity_chunks(self, chunk_size: int = 100000) -> Iterator[List[Tuple[int, int]]]:
+        """按主键升序分批读取全部商品的 (ID, 当前库存)，以上一批最后的ID为游标，不使用 id IN"""
+        last_id = 0
+        while True:
+            rows = list(Product.objects.filter(id__gt=last_id).order_by('id')
+                        .values_list('id', 'stock_quantity')[:chunk_size])
+            if rows:
+                yield rows
+            if len(rows) < chunk_size:
+                return
+            last_id = rows[-1][0]
+
+    def get_stock_quantities(self, product_ids: Optional[Iterable[int]] = None) -> List[Tuple[int, int]]:
+        """商品的 (ID, 当前库存)，不指定时返回全部商品"""
+        queryset = Product.objects.all()
+        if product_ids is not None:
+            queryset = queryset.filter(id__in=list(product_ids))
+        return list(queryset.values_list('id', 'stock_quantity').iterator(chunk_size=10000))
+
+    def create_adjust_logs(self, product_ids: List[int], reason: str = "库存对账调整") -> int:
+        """为商品写入 adjust 日志，把日志链末尾补齐到当前库存，不修改库存，返回写入的条数
+
+        每个商品单独一个事务：先锁商品行，再读取最新一条日志的 quantity_after 与当前库存，
+        对账扫描之后提交的扣减已在日志链中，调整日志接在它后面，不会用扫描时的旧值。
+        """
+        created = 0
+        for product_id in product_ids:
+            with transaction.atomic():
+                stock = (Product.objects.select_for_update().filter(id=product_id)
+                         .values_list('stock_quantity', flat=True).first())
+                if stock is None:
+                    continue
+                before = (StockLog.objects.filter(product_id=product_id).order_by('-id')
+                          .values_list('quantity_after', flat=True).first()) or 0
+                if before == stock:
+                    continue
+                StockLog.objects.create(product_id=product_id, change_type='adjust', quantity_before=before,
+                                        quantity_after=stock, change_quantity=stock - before, reason=reason)
+                created += 1
+        return created
+
+    def get_version(self, product_id: int) -> Optional[int]:
+        """只查询在售商品的版本号（主键索引查询，用于ETag校验）"""
+        return Product.objects.filter(
+            id=product_id,
+            status='active'
+        ).values_list('version', flat=True).first()
 
-    def _invalidate_product_cache(self, product_id: int):
+    def invalidate_product_cache(self, product_id: int):
         """清除商品相关缓存"""
-        cache_keys = [
-            f"product:detail:{product_id}",
-        ]
+        self.invalidate_products_cache([product_id])
 
-        for key in cache_keys:
-            self.cache.delete(key)
+    def invalidate_products_cache(self, product_ids: List[int]):
+        """批量清除商品相关缓存，列表和搜索缓存只清除一次"""
+        self.cache.delete_many([f"product:detail:{product_id}" for product_id in product_ids])
 
         # 清除列表和搜索缓存
         self.cache.delete_pattern("product:list")
         self.cache.delete_pattern("product:search")
+        # 事务提交后再递增代数，避免并发读取在提交前拿到新代数与旧数据
+        transaction.on_commit(lambda: self.cache.bump_generation("product"))
@@ -0,0 +1,155 @@
+"""
+销量汇总数据访问层
+负责小时/日销量汇总表的累加与重建、各分片的汇总水位，以及从订单明细读取成功的销售记录
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Count, Max, Sum
+from django.db.models.functions import TruncHour
+
+from ..models import OrderItem, ProductSalesDaily, ProductSalesHourly, SalesRollupWatermark
+from ..utils.tracing import traced_methods
+
+# 汇总的度量列：销量、销售额、明细数
+METRICS = ('units', 'revenue', 'order_items')
+
+# 汇总粒度 -> (模型, 时间列)
+GRAINS = {
+    'hour': (ProductSalesHourly, 'hour'),
+    'day': (ProductSalesDaily, 'day'),
+}
+
+# 订单明细读取的列：ID、商品ID、创建时间、数量、小计
+SOLD_ITEM_FIELDS = ('id', 'product_id', 'created_at', 'quantity', 'total_price')
+
+# 汇总键 (商品ID, 时间桶) -> [销量, 销售额, 明细数]
+Buckets = Dict[Tuple[int, Any], List]
+
+UPSERT_BATCH_SIZE = 500
+
+
+def _increment_sql(connection, table: str, bucket_column: str, rows: int) -> str:
+    """多行 INSERT，唯一键冲突时把度量累加到已有行（MySQL ON DUPLICATE KEY，其它数据库 ON CONFLICT）"""
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(name) for name in ('product_id', bucket_column, *METRICS))
+    values = ', '.join(['(%s, %s, %s, %s, %s)'] * rows)
+    sql = f"INSERT INTO {quote(table)} ({columns}) VALUES {values}"
+    if connection.vendor == 'mysql':
+        updates = ', '.join(f"{quote(name)} = {quote(name)} + VALUES({quote(name)})" for name in METRICS)
+        return f"{sql} ON DUPLICATE KEY UPDATE {updates}"
+    updates = ', '.join(f"{quote(name)} = {quote(table)}.{quote(name)} + excluded.{quote(name)}" for name in METRICS)
+    return f"{sql} ON CONFLICT ({quote('product_id')}, {quote(bucket_column)}) DO UPDATE SET {updates}"
+
+
+@traced_methods
+class SalesRollupRepository:
+    """销量汇总数据访问类，汇总表与水位都在主库"""
+
+    def increment(self, grain: str, buckets: Buckets):
+        """把一批增量累加到汇总表，按键排序写入，并发的累加以相同顺序加行锁"""
+        model, column = GRAINS[grain]
+        connection = connections[DEFAULT_DB_ALIAS]
+        adapt = connection.ops.adapt_datetimefield_value if grain == 'hour' else connection.ops.adapt_datefield_value
+        keys = sorted(buckets)
+        for start in range(0, len(keys), UPSERT_BATCH_SIZE):
+            batch = keys[start:start + UPSERT_BATCH_SIZE]
+            params = []
+            for product_id, bucket in batch:
+                units, revenue, items = buckets[(product_id, bucket)]
+                params.extend([product_id, adapt(bucket), units,
+                               connection.ops.adapt_decimalfield_value(revenue, 16, 2), items])
+            with connection.cursor() as cursor:
+                cursor.execute(_increment_sql(connection, model._meta.db_table, column, len(batch)), params)
+
+    def replace_range(self, grain: str, start, end, buckets: Buckets) -> int:
+        """删除 [start, end) 内的汇总行并写入重建结果"""
+        model, column = GRAINS[grain]
+        model.objects.filter(**{f'{column}__gte': start, f'{column}__lt': end}).delete()
+        rows = [
+            model(product_id=product_id, **{column: bucket}, **dict(zip(METRICS, values)))
+            for (product_id, bucket), values in sorted(buckets.items())
+        ]
+        model.objects.bulk_create(rows, batch_size=UPSERT_BATCH_SIZE)
+        return len(rows)
+
+    def lock_watermark(self, shard: str) -> SalesRollupWatermark:
+        """加锁读取分片的汇总水位（需在主库事务中调用），同一分片的汇总任务与回填由此串行"""
+        SalesRollupWatermark.objects.get_or_create(shard=shard)
+        return SalesRollupWatermark.objects.select_for_update().get(shard=shard)
+
+    def save_watermark(self, watermark: SalesRollupWatermark, last_item_id: int):
+        watermark.last_item_id = last_item_id
+        watermark.save(update_fields=['last_item_id', 'updated_at'])
+
+    def get_watermarks(self) -> Dict[str, int]:
+        return dict(SalesRollupWatermark.objects.values_list('shard', 'last_item_id'))
+
+    def sold_items_after(self, shard: str, after_id: int, limit: int) -> List[Tuple]:
+        """分片上主键大于 after_id 的成功明细（SOLD_ITEM_FIELDS），按主键升序"""
+        return list(
+            OrderItem.objects.using(shard).filter(id__gt=after_id, status='success')
+            .order_by('id').values_list(*SOLD_ITEM_FIELDS)[:limit]
+        )
+
+    def max_item_id(self, shard: str, created_before: datetime) -> int:
+        """分片上创建时间不晚于 created_before 的最大明细ID"""
+        return OrderItem.objects.using(shard).filter(created_at__lte=created_before).aggregate(
+            max_id=Max('id'))['max_id'] or 0
+
+    def earliest_item_created_at(self, shards: List[str]) -> Optional[datetime]:
+        """各分片中最早一条明细的创建时间（按主键取第一行，不扫描 created_at）"""
+        values = [
+            OrderItem.objects.using(shard).order_by('id').values_list('created_at', flat=True).first()
+            for shard in shards
+        ]
+        values = [value for value in values if value is not None]
+        return min(values) if values else None
+
+    def sold_items_of_order(self, order) -> List[Tuple]:
+        """订单的成功明细（SOLD_ITEM_FIELDS），与订单在同一分片"""
+        return list(
+            OrderItem.objects.using(order._state.db).filter(order=order, status='success')
+            .values_list(*SOLD_ITEM_FIELDS)
+        )
+
+    def aggregate_sold_items(self, shard: str, start: datetime, end: datetime,
+                             upto_id: Optional[int] = None) -> List[Tuple]:
+        """分片上 [start, end) 内成功明细按商品和小时分组的 (商品ID, 小时, 销量, 销售额, 明细数)"""
+        queryset = OrderItem.objects.using(shard).filter(status='success', created_at__gte=start, created_at__lt=end)
+        if upto_id is not None:
+            queryset = queryset.filter(id__lte=upto_id)
+        return list(
+            queryset.annotate(hour=TruncHour('created_at'))
+            .values('product_id', 'hour')
+            .annotate(units=Sum('quantity'), revenue=Sum('total_price'), items=Count('id'))
+            .order_by()
+            .values_list('product_id', 'hour', 'units', 'revenue', 'items')
+        )
+
+    def top_products(self, grain: str, start, end, metric: str, limit: int) -> List[Tuple]:
+        """时间范围内按 metric（units 或 revenue）排序的前 limit 个 (商品ID, 销量, 销售额, 明细数)"""
+        model, column = GRAINS[grain]
+        return list(
+            model.objects.filter(**{f'{column}__gte': start, f'{column}__lt': end})
+            .values('product_id')
+            .annotate(total_units=Sum('units'), total_revenue=Sum('revenue'), total_items=Sum('order_items'))
+            .order_by(f'-total_{metric}', 'product_id')
+            .values_list('product_id', 'total_units', 'total_revenue', 'total_items')[:limit]
+        )
+
+    def product_series(self, grain: str, product_id: Optional[int], start, end) -> List[Tuple]:
+        """时间范围内每个时间桶的 (时间桶, 销量, 销售额, 明细数)，不指定商品时为全部商品的合计"""
+        model, column = GRAINS[grain]
+        queryset = model.objects.filter(**{f'{column}__gte': start, f'{column}__lt': end})
+        if product_id is not None:
+            queryset = queryset.filter(product_id=product_id)
+        return list(
+            queryset.values(column)
+            .annotate(total_units=Sum('units'), total_revenue=Sum('revenue'), total_items=Sum('order_items'))
+            .order_by(column)
+            .values_list(column, 'total_units', 'total_revenue', 'total_items')
+        )
+
@@ -1,8 +1,51 @@
+from operator import attrgetter
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from django.db.models import QuerySet
 from rest_framework import serializers
 from .models import Product, Order, OrderItem, StockLog
-
-
-class ProductSerializer(serializers.ModelSerializer):
+from .utils.sharding import shard_for_user
+
+
+def parse_fields_param(raw: Optional[str], allowed: Iterable[str]) -> Optional[List[str]]:
+    """解析 ?fields= 参数，返回按请求顺序去重后的字段名，未传时返回None"""
+    if not raw:
+        return None
+    allowed = set(allowed)
+    names = list(dict.fromkeys(name.strip() for name in raw.split(',') if name.strip()))
+    unknown = [name for name in names if name not in allowed]
+    if unknown:
+        raise serializers.ValidationError({'fields': [f"未知字段: {', '.join(unknown)}"]})
+    return names or None
+
+
+class DynamicFieldsMixin:
+    """支持通过 fields 参数裁剪输出字段的序列化器"""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+    @classmethod
+    def model_columns(cls, field_names: Iterable[str]) -> List[str]:
+        """返回输出这些字段所需查询的模型列，嵌套序列化器对应的关联不计入"""
+        serializer = cls()
+        model_fields = {field.name for field in cls.Meta.model._meta.concrete_fields}
+        columns = []
+        for name in field_names:
+            field = serializer.fields[name]
+            if isinstance(field, serializers.BaseSerializer):
+                continue
+            source = field.source.split('.')[0]
+            if source in model_fields and source not in columns:
+                columns.append(source)
+        return columns
+
+
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """商品序列化器"""
 
     class Meta:
@@ -32,6 +75,82 @@ class ProductListSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'price', 'stock_quantity', 'status']
 
 
+class FastReadSerializer:
+    """只读快速序列化器
+
+    启动时从DRF序列化器预编译字段名与转换函数，序列化时直接由 values_list
+    元组或模型实例构造字典，跳过逐对象的字段内省。只有输出与DRF不同的字段
+    （如DecimalField转字符串、DateTimeField格式化）才调用对应字段的
+    to_representation，保证结果与原序列化器完全一致。
+    """
+
+    # 对数据库取出的值原样输出即与DRF一致的字段类型
+    PASSTHROUGH_FIELDS = (serializers.IntegerField, serializers.CharField,
+                          serializers.ChoiceField, serializers.BooleanField)
+
+    def __init__(self, serializer_class, field_names: Optional[Sequence[str]] = None):
+        self.serializer_class = serializer_class
+        self._narrowed = {}
+        fields = serializer_class().fields
+        if field_names is not None:
+            fields = {name: field for name, field in fields.items() if name in field_names}
+        self.field_names: List[str] = []
+        self.sources: List[str] = []
+        self.converters = []
+        for name, field in fields.items():
+            if field.write_only:
+                continue
+            if '.' in field.source or field.source == '*':
+                raise ValueError(f"字段 {name} 的 source 不是模型字段，不支持快速序列化")
+            self.field_names.append(name)
+            self.sources.append(field.source)
+            self.converters.append(None if isinstance(field, self.PASSTHROUGH_FIELDS)
+                                   else field.to_representation)
+        self._conversions = [(index, converter) for index, converter in enumerate(self.converters)
+                             if converter is not None]
+        getter = attrgetter(*self.sources)
+        self._getter = getter if len(self.sources) > 1 else (lambda obj: (getter(obj),))
+
+    def narrow(self, field_names: Optional[Sequence[str]]) -> 'FastReadSerializer':
+        """返回只输出指定字段的快速序列化器（按字段组合缓存）"""
+        if not field_names:
+            return self
+        key = tuple(sorted(field_names))
+        narrowed = self._narrowed.get(key)
+        if narrowed is None:
+            narrowed = self._narrowed[key] = FastReadSerializer(self.serializer_class, key)
+        return narrowed
+
+    def values_list(self, queryset: QuerySet) -> QuerySet:
+        """只查询输出需要的列"""
+        return queryset.values_list(*self.sources)
+
+    def from_rows(self, rows: Iterable[Sequence[Any]]) -> List[Dict[str, Any]]:
+        """由 values_list 元组构造输出字典"""
+        field_names = self.field_names
+        conversions = self._conversions
+        if not conversions:
+            return [dict(zip(field_names, row)) for row in rows]
+
+        data = []
+        for row in rows:
+            row = list(row)
+            for index, converter in conversions:
+                value = row[index]
+                if value is not None:
+                    row[index] = converter(value)
+            data.append(dict(zip(field_names, row)))
+        return data
+
+    def from_instances(self, instances: Iterable[Any]) -> List[Dict[str, Any]]:
+        """由模型实例构造输出字典"""
+        return self.from_rows(self._getter(instance) for instance in instances)
+
+
+# 商品列表与搜索结果的快速序列化器
+fast_product_list_serializer = FastReadSerializer(ProductListSerializer)
+
+
 class ProductSearchSerializer(serializers.Serializer):
     """商品搜索参数序列化器"""
     keyword = serializers.CharField(required=True, min_length=1, max_length=100)
@@ -57,7 +176,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         return value
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     """订单序列化器"""
     items = OrderItemSerializer(many=True, read_only=True)
     order_number = serializers.CharField(source='order_no', read_only=True)
@@ -68,6 +187,16 @@ class OrderSerializer(serializers.ModelSerializer):
                   'created_at', 'updated_at', 'items']
         read_only_fields = ['id', 'order_no', 'order_number', 'total_amount', 'created_at', 'updated_at']
 
+    def create(self, validated_data):
+        # 订单号编码了用户所在的分片，新订单写入同一分片
+        return Order.objects.using(shard_for_user(validated_data['user_id'])).create(**validated_data)
+
+    def validate_user_id(self, value):
+        """订单按 user_id 分片且订单号编码了分片，创建后不能修改用户"""
+        if self.instance is not None and value != self.instance.user_id:
+            raise serializers.ValidationError("订单创建后不能修改用户")
+        return value
+
 
 # 用来输入校验
 class BatchOrderItemSerializer(serializers.Serializer):
@@ -75,15 +204,6 @@ class BatchOrderItemSerializer(serializers.Serializer):
     product_id = serializers.IntegerField()
     quantity = serializers.IntegerField(min_value=1)
 
-    def validate_product_id(self, value):
-        """验证商品ID是否存在"""
-        from .models import Product
-        try:
-            Product.objects.get(id=value, status='active')
-        except Product.DoesNotExist:
-            raise serializers.ValidationError(f"商品ID {value} 不存在或已下架")
-        return value
-
 
 class BatchOrderSerializer(serializers.Serializer):
     """批量下单序列化器"""
@@ -96,13 +216,22 @@ class BatchOrderSerializer(serializers.Serializer):
             raise serializers.ValidationError("订单项不能为空")
         if len(value) > 50:  # 限制单次最多50个商品
             raise serializers.ValidationError("单次最多只能下单50个商品")
+
+        # 一次查询校验全部商品，而不是每个明细各查一次；错误仍按明细位置返回
+        product_ids = {item['product_id'] for item in value}
+        active_ids = set(Product.objects.filter(id__in=product_ids, status='active').values_list('id', flat=True))
+        errors = [
+            {'product_id': [f"商品ID {item['product_id']} 不存在或已下架"]} if item['product_id'] not in active_ids else {}
+            for item in value
+        ]
+        if any(errors):
+            raise serializers.ValidationError(errors)
         return value
 
 
 class StockLogSerializer(serializers.ModelSerializer):
     """库存日志序列化器"""
     product_name = serializers.CharField(source='product.name', read_only=True)
-    order_no = serializers.CharField(source='order.order_no', read_only=True)
 
     class Meta:
         model = StockLog
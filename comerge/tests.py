@@ -1,3 +1,2100 @@
-from django.test import TestCase
+import asyncio
+import gc
+import heapq
+import io
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+import unittest
+from collections import Counter
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import RequestFactory, SimpleTestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+from django.utils import timezone
+from rest_framework.exceptions import ParseError, ValidationError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from .benchmarks.batch_order import SkuSampler, build_plans, run_load, snapshot_stock, verify_stock
+from .benchmarks.catalog import CatalogFaker, create_catalog, generate_catalog
+from .benchmarks.search import KeywordWorkload, run_search_phase
+from .admin import OrderItemAdmin
+from .apps import ComergeConfig
+from .business.export_service import ExportService
+from .business.order_service import OrderService
+from .business.product_import_service import iter_records
+from .business.sales_rollup_service import SalesRollupService
+from .business.group_commit import GroupCommitCoordinator
+from .business.stock_executor import StockPartition
+from .business.stock_reconcile import LogChainState, StockReconciler, np
+from .business.stock_strategies import (
+    ActorStrategy, ConditionalUpdateStrategy, GroupCommitStrategy, RowLockStrategy,
+)
+from .db_router import ReplicaRouter, use_primary, use_shard
+from .exceptions import ConcurrentUpdateException, QueryBudgetExceeded, ShardNotSpecified
+from .parsers import ORJSONParser
+from .renderers import ORJSONRenderer
+from .middleware import PIN_COOKIE_NAME, ReplicaPinningMiddleware, get_query_budget_config, get_route_budget
+from .models import Order, OrderItem, OrderNumber, Product, ProductSalesDaily, ProductSalesHourly, StockLog
+from .repositories.export_repository import EXPORT_SPECS
+from .repositories.order_repository import OrderRepository
+from .repositories.product_repository import ProductRepository
+from .serializer import (
+    BatchOrderSerializer, OrderSerializer, ProductListSerializer, ProductSerializer, fast_product_list_serializer,
+    parse_fields_param,
+)
+from .throttling import AnonBucketThrottle, FixedWindowBackend, TokenBucketBackend
+from .utils.admission import AdmissionController, get_admission_config, get_admission_controller
+from .utils.order_utils import OrderNumberGenerator
+from .utils.partitioning import PartitionManager, add_months, created_range_filter, order_no_created_range
+from .utils.sharding import get_order_shards, shard_for_order_no, shard_for_user
+from .utils.cache_stats import CacheStats, cache_stats, get_namespace
+from .utils.cache_codec import FLAG_MSGPACK, FLAG_ZLIB, CompactCodec, PickleCodec
+from .utils.cache_manager import cache_manager
+from .utils import redis_client
+from .utils.hash_ring import HashRing
+from .utils.hot_keys import SearchKeywordRecorder
+from .utils.lock_stats import LockStats, lock_stats
+from .utils.redis_client import get_async_redis_client
+from .utils.tracing import _NOOP_SPAN, span, trace_buffer
+
+
+class CacheCodecTests(TransactionTestCase):
+    """紧凑编解码：模型、查询集与字典往返一致，按阈值压缩，未知版本按未命中处理，兼容旧格式"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.codec = CompactCodec(compression='zlib', compress_threshold=256)
+        self.product = Product(id=7, name='codec', description='d' * 10, price=Decimal('9.90'), stock_quantity=3,
+                               keywords='k', status='active', version=2, created_at=datetime(2025, 1, 1, 8),
+                               updated_at=datetime(2025, 1, 2, 9, 30))
+
+    def _fields(self, product):
+        return [getattr(product, name) for name in ('id', 'name', 'price', 'stock_quantity', 'version',
+                                                    'created_at', 'updated_at')]
+
+    def test_round_trips(self):
+        self.assertEqual(self._fields(self.codec.decode(self.codec.encode(self.product))), self._fields(self.product))
+
+        products = [self.product, Product(id=8, name='other', price=Decimal('1.00'))]
+        decoded = self.codec.decode(self.codec.encode(products))
+        self.assertEqual([self._fields(item) for item in decoded], [self._fields(item) for item in products])
+
+        search = {'total': 1, 'page': 1, 'size': 20, 'total_pages': 1, 'has_next': False,
+                  'has_previous': False, 'products': [self.product]}
+        decoded = self.codec.decode(self.codec.encode(search))
+        self.assertEqual(decoded['total'], 1)
+        self.assertEqual(self._fields(decoded['products'][0]), self._fields(self.product))
+
+        plain = {'ids': [1, 2], 'price': Decimal('3.50'), 'at': datetime(2025, 1, 1)}
+        self.assertEqual(self.codec.decode(self.codec.encode(plain)), plain)
+
+        with use_primary():
+            Product.objects.create(name='qs', price=Decimal('2.00'))
+            queryset = Product.objects.filter(name='qs')
+            decoded = self.codec.decode(self.codec.encode(queryset))
+        self.assertEqual([item.name for item in decoded], ['qs'])
+
+    def test_deferred_fields_stay_deferred(self):
+        product = Product.from_db('default', ['id', 'name', 'price'], [1, 'partial', Decimal('1.00')])
+        decoded = self.codec.decode(self.codec.encode(product))
+        self.assertEqual(decoded.get_deferred_fields(), product.get_deferred_fields())
+
+    def test_compression_threshold(self):
+        small = self.codec.encode({'a': 1})
+        self.assertFalse(small[1] & FLAG_ZLIB)
+        large = self.codec.encode({'a': 'x' * 1000})
+        self.assertTrue(large[1] & FLAG_ZLIB)
+        self.assertLess(len(large), 1000)
+        self.assertEqual(self.codec.decode(large), {'a': 'x' * 1000})
+        uncompressed = CompactCodec(compression=None).encode({'a': 'x' * 1000})
+        self.assertEqual(uncompressed[1] & ~FLAG_MSGPACK, 0)
+
+    def test_unknown_version_and_corrupt_payload_are_misses(self):
+        encoded = self.codec.encode(self.product)
+        self.assertIsNone(self.codec.decode(bytes((99,)) + encoded[1:]))
+        self.assertIsNone(self.codec.decode(encoded[:2] + b'garbage'))
+
+    def test_legacy_values_pass_through(self):
+        self.assertIs(self.codec.decode(self.product), self.product)
+        self.assertEqual(self.codec.decode({'legacy': True}), {'legacy': True})
+        self.assertIsNone(self.codec.decode(None))
+
+    def test_pickle_codec_reads_compact_entries(self):
+        # NAME 回退为 pickle 或滚动发布期间，旧进程读到新格式的值
+        decoded = PickleCodec().decode(self.codec.encode(self.product))
+        self.assertEqual(self._fields(decoded), self._fields(self.product))
+        self.assertIs(PickleCodec().decode(self.product), self.product)
+
+
+@unittest.skipUnless(os.environ.get('RUN_SLOW_TESTS'), '耗时约一分半，设置 RUN_SLOW_TESTS=1 后运行')
+class ExportMemoryTests(SimpleTestCase):
+    """流式导出：百万行合成数据的内存占用保持平稳"""
+
+    ROWS = 1_000_000
+    # 峰值内存增量上限；如果把全部行或输出缓存在内存中，增量会远超该值
+    RSS_BUDGET_MB = 64
+
+    def _synthetic_rows(self):
+        created_at = datetime(2025, 1, 1)
+        for i in range(1, self.ROWS + 1):
+            yield (i, i % 50_000 + 1, i % 3_000 + 1, 'decrease', 100, 99, -1,
+                   f'订单扣减 - ORD{i:020d}', created_at + timedelta(seconds=i))
+
+    def _assert_streams_within_budget(self, fmt):
+        columns = EXPORT_SPECS['stock_logs'][1]
+        baseline_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        tracemalloc.start()
+        try:
+            total_bytes = 0
+            for chunk in ExportService.encode(self._synthetic_rows(), columns, fmt, 5000):
+                total_bytes += len(chunk)
+            # ru_maxrss 是进程生命周期内的峰值，之前的测试可能已经抬高它，另用 tracemalloc 记录本次导出的峰值
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        growth_mb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_kb) / 1024
+        self.assertGreater(total_bytes, self.ROWS * 50)
+        self.assertLess(growth_mb, self.RSS_BUDGET_MB)
+        self.assertLess(peak / 1024 / 1024, self.RSS_BUDGET_MB)
+
+    def test_ndjson_export_memory_is_flat(self):
+        self._assert_streams_within_budget('ndjson')
+
+    def test_csv_export_memory_is_flat(self):
+        self._assert_streams_within_budget('csv')
+
+
+class ExportStreamingTests(TransactionTestCase):
+    """流式导出：按主键游标分批读取，可从上次的最后ID续传，接口仅管理员可访问"""
+
+    databases = {'default', *get_order_shards()}
+
+    def setUp(self):
+        product = Product.objects.create(name='export', price=Decimal('1.00'), stock_quantity=1000)
+        StockLog.objects.bulk_create([
+            StockLog(product=product, change_type='decrease', quantity_before=1000 - i,
+                     quantity_after=999 - i, change_quantity=-1, reason=f'export {i}')
+            for i in range(250)
+        ])
+        with use_primary():
+            self.log_ids = list(StockLog.objects.order_by('id').values_list('id', flat=True))
+
+    def _stream_ids(self, **kwargs):
+        with use_primary():
+            chunks = list(ExportService().stream('stock_logs', 'ndjson', chunk_size=100, **kwargs))
+        return chunks, [json.loads(line)['id'] for chunk in chunks for line in chunk.splitlines()]
+
+    def test_reads_in_keyset_chunks(self):
+        with CaptureQueriesContext(connection) as queries:
+            chunks, ids = self._stream_ids()
+        self.assertEqual(ids, self.log_ids)
+        self.assertEqual([len(chunk.splitlines()) for chunk in chunks], [100, 100, 50])
+        selects = [query['sql'] for query in queries.captured_queries if 'stock_logs' in query['sql']]
+        self.assertEqual(len(selects), 3)
+        for sql in selects:
+            self.assertIn('LIMIT 100', sql)
+            self.assertNotIn('OFFSET', sql)
+
+    def test_resumes_after_last_id(self):
+        chunks, ids = self._stream_ids()
+        cursor = json.loads(chunks[0].splitlines()[-1])['id']
+        _, resumed = self._stream_ids(after_id=cursor)
+        self.assertEqual(resumed, self.log_ids[100:])
+        self.assertEqual(self._stream_ids(after_id=self.log_ids[-1])[1], [])
+
+    def test_orders_are_exported_from_every_shard(self):
+        product = Product.objects.create(name='export-order', price=Decimal('2.00'), stock_quantity=10)
+        order_nos = {OrderService().create_batch_order(user_id, [{'product_id': product.id, 'quantity': 1}])['order_no']
+                     for user_id in range(1, 7)}
+        rows = b''.join(ExportService().stream('orders', 'ndjson', chunk_size=100)).splitlines()
+        self.assertEqual({json.loads(row)['order_no'] for row in rows}, order_nos)
+
+        shard = shard_for_user(1)
+        rows = b''.join(ExportService().stream('orders', 'csv', chunk_size=100, shard=shard)).decode().splitlines()
+        self.assertEqual(len(rows) - 1, sum(shard_for_user(user_id) == shard for user_id in range(1, 7)))
+
+    def test_endpoint_requires_admin(self):
+        # 配置了副本时用读写一致cookie让请求读主库
+        self.client.cookies[PIN_COOKIE_NAME] = str(int(time.time()) + 5)
+        self.assertEqual(self.client.get('/export/stock_logs/').status_code, 403)
+
+        with use_primary():
+            self.client.force_login(get_user_model().objects.create_user('exporter', password='x', is_staff=True))
+        response = self.client.get('/export/stock_logs/', {'after': self.log_ids[199], 'chunk_size': 100})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        # 响应体在请求处理结束后才生成，读库不受读写一致cookie影响
+        with use_primary():
+            lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], self.log_ids[200:])
+
+        response = self.client.get('/export/stock_logs/', {'format': 'csv', 'after': self.log_ids[-2]})
+        with use_primary():
+            header = b''.join(response.streaming_content).decode().splitlines()[0]
+        self.assertEqual(header, ','.join(EXPORT_SPECS['stock_logs'][1]))
+        response = self.client.get('/export/stock_logs/', {'format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['code'], 400)
+        self.assertEqual(self.client.get('/export/users/').status_code, 400)
+
+    def test_ndjson_encodes_decimal_and_datetime(self):
+        columns = ('id', 'total_amount', 'created_at')
+        rows = [(1, Decimal('12.50'), datetime(2025, 1, 1, 8, 30))]
+        output = b''.join(ExportService.encode(rows, columns, 'ndjson'))
+        self.assertEqual(output, b'{"id":1,"total_amount":"12.50","created_at":"2025-01-01T08:30:00"}\n')
+
+    def test_csv_writes_header_once(self):
+        columns = ('id', 'status')
+        rows = [(i, 'success') for i in range(5)]
+        output = b''.join(ExportService.encode(rows, columns, 'csv', rows_per_chunk=2)).decode()
+        self.assertEqual(output.splitlines()[0], 'id,status')
+        self.assertEqual(len(output.splitlines()), 6)
+
+
+class ProductImportTests(TransactionTestCase):
+    """商品批量导入：三种格式按ID拆分新建与更新，单行错误不影响其它行，新商品的初始库存写入日志"""
+
+    def setUp(self):
+        self.product = Product.objects.create(name='existing', price=Decimal('5.00'), stock_quantity=5)
+
+    def _post(self, body, content_type, **params):
+        query = ''.join(f'&{key}={value}' for key, value in params.items())
+        return self.client.post(f'/products/bulk_upsert/?chunk_size=2{query}', body, content_type=content_type)
+
+    def _logs(self, product_id):
+        with use_primary():
+            return list(StockLog.objects.filter(product_id=product_id).order_by('id').values_list(
+                'change_type', 'quantity_before', 'quantity_after'))
+
+    def test_ndjson_splits_updates_and_inserts(self):
+        body = '\n'.join([
+            json.dumps({'id': self.product.id, 'price': '6.50', 'stock_quantity': 8}),
+            json.dumps({'name': 'new', 'price': 3, 'stock_quantity': 4}),
+            '{"name": broken',
+            '',
+            json.dumps({'name': 'no price'}),
+            json.dumps({'id': 999999, 'price': '1.00'}),
+            json.dumps({'id': 888888, 'name': 'with id', 'price': '2.00'}),
+        ])
+        response = self._post(body, 'application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual((data['total'], data['created'], data['updated'], data['failed']), (6, 2, 1, 3))
+        self.assertEqual([error['row'] for error in data['errors']], [3, 5, 6])
+        self.assertEqual(data['stock_logs'], 2)
+
+        with use_primary():
+            self.product.refresh_from_db()
+            created = Product.objects.get(name='new')
+            self.assertTrue(Product.objects.filter(id=888888, name='with id').exists())
+        self.assertEqual((self.product.price, self.product.stock_quantity, self.product.version),
+                         (Decimal('6.50'), 8, 2))
+        self.assertEqual(self._logs(self.product.id), [('adjust', 5, 8)])
+        self.assertEqual(self._logs(created.id), [('increase', 0, 4)])
+        self.assertEqual(self._logs(888888), [])
+
+    def test_csv_with_bom_and_empty_cells(self):
+        body = '\ufeffid,name,price,stock_quantity,status\n' \
+               f'{self.product.id},renamed,,,inactive\n' \
+               ',csv new,9.99,,\n' \
+               ',bad price,abc,1,\n'
+        data = self._post(body.encode(), 'text/csv').json()['data']
+        self.assertEqual((data['created'], data['updated'], data['failed']), (1, 1, 1))
+        self.assertEqual(data['errors'][0]['row'], 4)
+        with use_primary():
+            self.product.refresh_from_db()
+            self.assertEqual(Product.objects.get(name='csv new').stock_quantity, 0)
+        self.assertEqual((self.product.name, self.product.status, self.product.stock_quantity),
+                         ('renamed', 'inactive', 5))
+
+    def test_json_array_is_parsed_incrementally(self):
+        records = [{'name': f'json {i}', 'price': 1.25 + i, 'stock_quantity': 10 ** i} for i in range(6)]
+        records.insert(2, ['not', 'an', 'object'])
+        body = json.dumps(records, ensure_ascii=False).encode()
+        # 按很小的块读取，元素和数字会跨越块边界
+        for size in (1, 7, len(body)):
+            chunks = [body[i:i + size] for i in range(0, len(body), size)]
+            self.assertEqual([value for _, value in iter_records(chunks, 'json')], records)
+
+        response = self._post(body, 'application/json')
+        data = response.json()['data']
+        self.assertEqual((data['created'], data['failed'], data['stock_logs']), (6, 1, 6))
+        self.assertEqual(data['errors'][0]['row'], 3)
+
+        for bad in (b'{"name": "x"}', b'[{"a": 1} {"b": 2}]', b'[{"a": 1}] []', b'[{"a": 1},', b'[1,]'):
+            with self.subTest(body=bad):
+                with self.assertRaises(ValueError):
+                    list(iter_records([bad], 'json'))
+        self.assertEqual(self._post(b'{"name": "x"}', 'application/json').status_code, 400)
+
+    def test_limits(self):
+        body = '\n'.join(json.dumps({'name': f'limit {i}', 'price': '1.00'}) for i in range(5))
+        with override_settings(PRODUCT_IMPORT={'MAX_ROWS': 3}):
+            response = self._post(body, 'application/x-ndjson')
+        self.assertEqual(response.status_code, 413)
+        self.assertEqual(response.json()['data']['created'], 3)
+
+        with override_settings(PRODUCT_IMPORT={'MAX_BODY_BYTES': 10}):
+            response = self._post(body, 'application/x-ndjson')
+        self.assertEqual(response.status_code, 413)
+        with use_primary():
+            self.assertEqual(Product.objects.filter(name__startswith='limit').count(), 3)
+
+    def test_command_imports_json_file(self):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as source:
+            json.dump([{'name': '命令导入', 'price': '2.00', 'stock_quantity': 2}], source, ensure_ascii=False)
+        self.addCleanup(os.remove, source.name)
+        call_command('import_products', source.name, stdout=io.StringIO())
+        with use_primary():
+            self.assertEqual(Product.objects.get(name='命令导入').stock_quantity, 2)
+
+
+class ProductBatchLookupTests(TransactionTestCase):
+    """批量获取商品：按请求顺序返回，缺失和下架的商品标记为未找到，最多100个ID，命中缓存时不查库"""
+
+    def setUp(self):
+        cache.clear()
+        # 配置了副本时用读写一致cookie让请求读主库
+        self.client.cookies[PIN_COOKIE_NAME] = str(int(time.time()) + 5)
+        self.products = [Product.objects.create(name=f'batch {i}', price=Decimal('1.00'), stock_quantity=i)
+                         for i in range(3)]
+        self.inactive = Product.objects.create(name='inactive', price=Decimal('1.00'), status='inactive')
+
+    def test_order_and_missing_ids(self):
+        a, b, c = (product.id for product in self.products)
+        ids = [c, 999999, a, self.inactive.id, c, b]
+        for response in (self.client.get('/products/batch/', {'ids': ','.join(map(str, ids))}),
+                         self.client.post('/products/batch/', {'ids': ids}, content_type='application/json')):
+            data = response.json()['data']
+            self.assertEqual([entry['id'] for entry in data], ids)
+            self.assertEqual([entry['found'] for entry in data], [True, False, True, False, True, True])
+            self.assertEqual([entry['product']['name'] if entry['product'] else None for entry in data],
+                             ['batch 2', None, 'batch 0', None, 'batch 2', 'batch 1'])
+
+        data = self.client.get('/products/batch/', {'ids': f'{a},{b}', 'fields': 'id,stock_quantity'}).json()['data']
+        self.assertEqual([entry['product'] for entry in data], [{'id': a, 'stock_quantity': 0},
+                                                                {'id': b, 'stock_quantity': 1}])
+
+    def test_rejects_invalid_requests(self):
+        self.assertEqual(self.client.get('/products/batch/', {'ids': ','.join(['1'] * 100)}).status_code, 200)
+        response = self.client.post('/products/batch/', {'ids': list(range(1, 102))}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('100', response.json()['message'])
+        for params in ({}, {'ids': '1,x'}, {'ids': '1', 'fields': 'secret'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get('/products/batch/', params).status_code, 400)
+        self.assertEqual(self.client.post('/products/batch/', {'ids': '1,2'},
+                                          content_type='application/json').status_code, 400)
+
+    def test_cache_hit_skips_database(self):
+        ids = ','.join(str(product.id) for product in self.products)
+        first = self.client.get('/products/batch/', {'ids': ids}).json()
+        with CaptureQueriesContext(connection) as queries:
+            second = self.client.get('/products/batch/', {'ids': ids}).json()
+        self.assertEqual(second, first)
+        self.assertEqual(len(queries), 0)
+
+        # 部分命中时只查询未命中的ID
+        extra = Product.objects.create(name='batch extra', price=Decimal('1.00'))
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get('/products/batch/', {'ids': f'{ids},{extra.id}'}).json()['data']
+        self.assertTrue(data[-1]['found'])
+        self.assertEqual(len(queries), 1)
+        self.assertIn(f'({extra.id})', queries[0]['sql'])
+
+
+class TwoPerMinuteAnonThrottle(AnonBucketThrottle):
+    """测试用：异步接口沿用 DEFAULT_THROTTLE_CLASSES"""
+    rate = '2/min'
+
+
+class AsyncViewTests(TransactionTestCase):
+    """异步接口：缓存的异步读写、与同步接口一致的输出、同样的认证与限流，异步Redis客户端按事件循环缓存"""
+
+    databases = {'default', *get_order_shards()}
+
+    def setUp(self):
+        cache.clear()
+        # 配置了副本时用读写一致cookie让请求读主库
+        self.async_client.cookies[PIN_COOKIE_NAME] = str(int(time.time()) + 5)
+        self.client.cookies[PIN_COOKIE_NAME] = self.async_client.cookies[PIN_COOKIE_NAME].value
+        self.product = Product.objects.create(name='async 商品', price=Decimal('8.80'), stock_quantity=3,
+                                              keywords='async')
+
+    async def test_cache_manager_async_methods(self):
+        self.assertTrue(await cache_manager.aset('test:async:1', {'a': 1}))
+        self.assertEqual(await cache_manager.aget('test:async:1'), {'a': 1})
+        self.assertIsNone(await cache_manager.aget('test:async:missing'))
+
+        calls = []
+
+        async def load():
+            calls.append(1)
+            return len(calls) if len(calls) > 1 else None
+
+        self.assertIsNone(await cache_manager.aget_or_set('test:async:2', load))
+        self.assertEqual(await cache_manager.aget_or_set('test:async:2', load), 2)
+        self.assertEqual(await cache_manager.aget_or_set('test:async:2', load), 2)
+        self.assertEqual(len(calls), 2)
+        # 同步与异步路径共用缓存键
+        self.assertEqual(await sync_to_async(cache_manager.get)('test:async:2'), 2)
+
+    async def test_endpoints_match_sync_views(self):
+        product_id = self.product.id
+        response = await self.async_client.get(f'/async/products/{product_id}/')
+        self.assertEqual(response.status_code, 200)
+        sync_response = await sync_to_async(self.client.get)(f'/products/{product_id}/')
+        self.assertEqual(response.json(), sync_response.json())
+        self.assertEqual(response['ETag'], sync_response['ETag'])
+        response = await self.async_client.get(f'/async/products/{product_id}/',
+                                               headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual((await self.async_client.get('/async/products/999999/')).status_code, 404)
+        self.assertEqual((await self.async_client.get(f'/async/products/{product_id}/?fields=x')).status_code, 400)
+
+        data = (await self.async_client.get('/async/products/search/', {'keyword': 'async'})).json()['data']
+        self.assertEqual([item['id'] for item in data['products']], [product_id])
+        self.assertEqual(data['total'], 1)
+        self.assertEqual((await self.async_client.get('/async/products/search/')).status_code, 400)
+
+        result = await sync_to_async(OrderService().create_batch_order)(3, [{'product_id': product_id, 'quantity': 1}])
+        response = await self.async_client.get(f"/async/orders/{result['order_no']}/")
+        self.assertEqual(response.json()['items'][0]['product_name'], 'async 商品')
+        self.assertEqual((await self.async_client.get('/async/orders/NOPE/')).status_code, 404)
+
+    @override_settings(THROTTLE_BACKEND={'MODE': 'fixed_window'})
+    async def test_endpoints_apply_drf_throttles_and_auth(self):
+        path = f'/async/products/{self.product.id}/'
+        rest_framework = {**settings.REST_FRAMEWORK,
+                          'DEFAULT_THROTTLE_CLASSES': ['comerge.tests.TwoPerMinuteAnonThrottle']}
+        with override_settings(REST_FRAMEWORK=rest_framework):
+            statuses = [(await self.async_client.get(path)).status_code for _ in range(3)]
+            response = await self.async_client.get(path)
+        self.assertEqual(statuses, [200, 200, 429])
+        self.assertEqual(response.json()['code'], 429)
+        self.assertTrue(0 < int(response['Retry-After']) <= 60)
+
+        # 与同步接口一致：首个认证类为 SessionAuthentication，认证失败返回403
+        headers = {'Authorization': 'Basic bm9ib2R5Ondyb25n'}
+        response = await self.async_client.get(path, headers=headers)
+        sync_response = await sync_to_async(self.client.get)(f'/products/{self.product.id}/', headers=headers)
+        self.assertEqual(response.status_code, sync_response.status_code)
+        self.assertEqual(response.status_code, 403)
+
+    def test_async_clients_are_cached_per_loop(self):
+        fake = mock.Mock()
+        fake.Redis.from_url.side_effect = lambda *args, **kwargs: object()
+        caches = {'default': {'BACKEND': 'django_redis.cache.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'}}
+
+        async def fetch():
+            return get_async_redis_client(), get_async_redis_client()
+
+        with mock.patch.object(redis_client, 'redis_asyncio', fake), override_settings(CACHES=caches):
+            results = [asyncio.run(fetch()) for _ in range(3)]
+            self.assertLessEqual(len(redis_client._async_clients), 1)
+        for first, second in results:
+            self.assertIs(first, second)
+        self.assertEqual(len({id(first) for first, _ in results}), 3)
+        gc.collect()
+        self.assertEqual(len(redis_client._async_clients), 0)
+
+
+class ConditionalGetTests(TransactionTestCase):
+    """商品与订单的条件GET：ETag 未变时返回304，增删改后版本号或命名空间代数递增"""
+
+    databases = {'default', *get_order_shards()}
+
+    def setUp(self):
+        cache.clear()
+        # 配置了副本时用读写一致cookie让请求读主库
+        self.client.cookies[PIN_COOKIE_NAME] = str(int(time.time()) + 5)
+        self.product = Product.objects.create(name='etag', price=Decimal('10.00'), stock_quantity=10)
+
+    def _assert_not_modified(self, path, etag, if_none_match=None):
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=if_none_match or etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_product_detail_etag_follows_version(self):
+        path = f'/products/{self.product.id}/'
+        response = self.client.get(path)
+        etag = response['ETag']
+        self._assert_not_modified(path, etag)
+        self._assert_not_modified(path, etag, f'W/{etag}, "other"')
+        self.assertNotEqual(self.client.get(f'{path}?fields=id,name')['ETag'], etag)
+
+        for expected_version in (2, 3):
+            response = self.client.patch(path, {'name': f'etag-{expected_version}'}, content_type='application/json')
+            self.assertEqual(response.json()['version'], expected_version)
+        with use_primary():
+            self.product.refresh_from_db()
+        self.assertEqual(self.product.version, 3)
+
+        response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['name'], 'etag-3')
+        self._assert_not_modified(path, response['ETag'])
+
+    def _count_queries(self, path, **headers):
+        with ExitStack() as stack:
+            captured = [stack.enter_context(CaptureQueriesContext(connections[alias])) for alias in self.databases]
+            self.assertEqual(self.client.get(path, **headers).status_code, 200)
+        return sum(len(queries) for queries in captured)
+
+    def test_unconditional_detail_skips_validator_query(self):
+        order_no = OrderService().create_batch_order(4, [{'product_id': self.product.id, 'quantity': 1}])['order_no']
+        for path in (f'/products/{self.product.id}/', f'/orders/{order_no}/'):
+            with self.subTest(path=path):
+                plain = self._count_queries(path)
+                conditional = self._count_queries(path, HTTP_IF_NONE_MATCH='"stale"')
+                # 普通GET不预查版本号或更新时间，只有条件GET多一次校验查询
+                self.assertEqual(conditional, plain + 1)
+
+    def test_product_writes_bump_list_generation(self):
+        etag = self.client.get('/products/')['ETag']
+        self._assert_not_modified('/products/', etag)
+
+        response = self.client.post('/products/', {'name': 'new', 'price': '1.00', 'stock_quantity': 1},
+                                    content_type='application/json')
+        created_id = response.json()['id']
+        writes = [
+            lambda: self.client.patch(f'/products/{self.product.id}/', {'price': '2.00'},
+                                      content_type='application/json'),
+            lambda: self.client.delete(f'/products/{created_id}/'),
+        ]
+        seen = {etag}
+        for write in [None, *writes]:
+            if write is not None:
+                write()
+            response = self.client.get('/products/', HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn(response['ETag'], seen)
+            etag = response['ETag']
+            seen.add(etag)
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.product.id])
+
+    def test_order_writes_bump_generation_after_shard_commit(self):
+        order_no = OrderService().create_batch_order(4, [{'product_id': self.product.id, 'quantity': 1}])['order_no']
+        shard = shard_for_user(4)
+        etag = self.client.get('/orders/')['ETag']
+        self._assert_not_modified('/orders/', etag)
+        detail = self.client.get(f'/orders/{order_no}/')['ETag']
+        self._assert_not_modified(f'/orders/{order_no}/', detail)
+
+        generation = cache_manager.get_generation('order')
+        with transaction.atomic(using=shard):
+            OrderService().invalidate_order(order_no, using=shard)
+            self.assertEqual(cache_manager.get_generation('order'), generation)
+        self.assertEqual(cache_manager.get_generation('order'), generation + 1)
+
+        self.client.patch(f'/orders/{order_no}/', {'status': 'cancelled'}, content_type='application/json')
+        self.assertEqual(cache_manager.get_generation('order'), generation + 2)
+        self.assertEqual(self.client.get('/orders/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        self.assertEqual(self.client.get(f'/orders/{order_no}/', HTTP_IF_NONE_MATCH=detail).status_code, 200)
+
+        self.client.delete(f'/orders/{order_no}/')
+        self.assertEqual(cache_manager.get_generation('order'), generation + 3)
+
+
+class ReplicaRouterTests(SimpleTestCase):
+    """主从路由：读写分离与固定读主库（只校验路由决策，不访问副本）"""
+
+    databases = {'default'}
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    @staticmethod
+    def _with_replica():
+        return mock.patch('comerge.db_router.get_replicas', return_value=['replica'])
+
+    def _middleware(self, view):
+        return ReplicaPinningMiddleware(view)
+
+    def test_reads_go_to_replica_and_writes_to_primary(self):
+        with self._with_replica():
+            self.assertEqual(self.router.db_for_read(Product), 'replica')
+            self.assertEqual(self.router.db_for_write(Product), 'default')
+
+    def test_without_replicas_reads_go_to_primary(self):
+        with override_settings(DATABASE_REPLICAS=[]):
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_unknown_replica_alias_is_ignored(self):
+        with override_settings(DATABASE_REPLICAS=['missing']):
+            self.assertEqual(self.router.db_for_read(Product), 'default')
+
+    def test_pinned_context_and_atomic_block_read_primary(self):
+        with self._with_replica():
+            with use_primary():
+                self.assertEqual(self.router.db_for_read(Product), 'default')
+            with transaction.atomic():
+                self.assertEqual(self.router.db_for_read(Product), 'default')
+            self.assertEqual(self.router.db_for_read(Product), 'replica')
+
+    def test_write_sets_pin_cookie(self):
+        def view(request):
+            ReplicaRouter().db_for_write(Product)
+            return HttpResponse()
+
+        response = self._middleware(view)(self.factory.post('/products/'))
+        self.assertIn(PIN_COOKIE_NAME, response.cookies)
+        self.assertEqual(response.cookies[PIN_COOKIE_NAME]['max-age'], settings.REPLICA_PIN_SECONDS)
+
+    def test_read_only_request_does_not_set_cookie(self):
+        response = self._middleware(lambda request: HttpResponse())(self.factory.get('/products/'))
+        self.assertNotIn(PIN_COOKIE_NAME, response.cookies)
+
+    def test_cookie_pins_reads_until_expiry(self):
+        seen = []
+
+        def view(request):
+            seen.append(ReplicaRouter().db_for_read(Product))
+            return HttpResponse()
+
+        middleware = self._middleware(view)
+        with self._with_replica():
+            fresh = self.factory.get('/products/')
+            fresh.COOKIES[PIN_COOKIE_NAME] = str(int(time.time()) + 5)
+            expired = self.factory.get('/products/')
+            expired.COOKIES[PIN_COOKIE_NAME] = str(int(time.time()) - 1)
+            # 客户端伪造的远期过期时间不能让请求一直读主库
+            forged = self.factory.get('/products/')
+            forged.COOKIES[PIN_COOKIE_NAME] = str(int(time.time()) + 10 ** 9)
+            for request in (fresh, expired, forged, self.factory.post('/products/')):
+                middleware(request)
+            # 请求结束后恢复为不固定
+            self.assertEqual(self.router.db_for_read(Product), 'replica')
+        self.assertEqual(seen, ['default', 'replica', 'replica', 'default'])
+
+
+REPLICA_CONFIGURED = 'replica' in settings.DATABASES and 'replica' in settings.DATABASE_REPLICAS
+
+
+@unittest.skipUnless(REPLICA_CONFIGURED, '需要 --settings=Electronic_Commerce.settings_replica_test')
+class ReplicaReadYourWritesTests(TransactionTestCase):
+    """两个互不复制的SQLite库模拟复制延迟：写入后副本读不到，固定读主库后可以读到"""
+
+    databases = {'default', 'replica'} if REPLICA_CONFIGURED else {'default'}
+
+    def test_write_then_read(self):
+        product = Product.objects.create(name='replica-test', price=Decimal('9.90'), stock_quantity=1)
+
+        self.assertFalse(Product.objects.filter(id=product.id).exists())
+        with use_primary():
+            self.assertTrue(Product.objects.filter(id=product.id).exists())
+
+    def test_client_is_pinned_after_write(self):
+        response = self.client.post('/products/', {'name': 'pinned', 'price': '5.00', 'stock_quantity': 3},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE_NAME, response.cookies)
+
+        product_id = response.json()['id']
+        self.assertEqual(self.client.get(f'/products/{product_id}/').status_code, 200)
+
+        self.client.cookies.pop(PIN_COOKIE_NAME)
+        self.assertEqual(self.client.get(f'/products/{product_id}/').status_code, 404)
+
+
+@override_settings(ORDER_SHARDS=['orders_0', 'orders_1', 'orders_2'])
+class OrderShardMapTests(SimpleTestCase):
+    """订单分片映射：user_id 取模与订单号中的分片序号"""
+
+    def test_user_maps_by_modulo(self):
+        self.assertEqual(shard_for_user(3), 'orders_0')
+        self.assertEqual(shard_for_user(5), 'orders_2')
+
+    def test_order_no_encodes_shard(self):
+        order_no = OrderNumberGenerator.generate(2)
+        self.assertEqual(len(order_no), 25)
+        self.assertEqual(shard_for_order_no(order_no), 'orders_2')
+
+    def test_legacy_or_unknown_order_no(self):
+        self.assertIsNone(shard_for_order_no('ORD20250101120000ABC123'))
+        self.assertIsNone(shard_for_order_no(OrderNumberGenerator.generate(7)))
+
+
+class OrderNumberReservationTests(TransactionTestCase):
+    """订单号在用户分片的 order_numbers 中登记，随机后缀冲突时重新生成"""
+    databases = '__all__'
+
+    def test_collision_regenerates_order_no(self):
+        service = OrderService()
+        with mock.patch.object(OrderNumberGenerator, 'generate',
+                               side_effect=['ORD20261019120000000AAAAA', 'ORD20261019120000000AAAAA',
+                                            'ORD20261019120000000BBBBB']):
+            first = service.generate_order_no(3)
+            second = service.generate_order_no(3)
+        self.assertEqual((first, second), ('ORD20261019120000000AAAAA', 'ORD20261019120000000BBBBB'))
+        self.assertEqual(OrderNumber.objects.using(shard_for_user(3)).filter(order_no__in=[first, second]).count(), 2)
+
+        with mock.patch.object(OrderNumberGenerator, 'generate', return_value=first):
+            with self.assertRaises(ConcurrentUpdateException):
+                service.generate_order_no(3)
+
+    def test_rotate_purges_expired_order_numbers(self):
+        shard = shard_for_user(3)
+        stale = OrderNumber.objects.using(shard).create(order_no='ORD20260101120000000AAAAA')
+        OrderNumber.objects.using(shard).filter(pk=stale.pk).update(created_at=timezone.now() - timedelta(days=30))
+        fresh = OrderService().generate_order_no(3)
+
+        call_command('rotate_partitions', stdout=io.StringIO())
+        self.assertEqual(list(OrderNumber.objects.using(shard).values_list('order_no', flat=True)), [fresh])
+
+
+SHARDS_CONFIGURED = len(get_order_shards()) > 1
+
+
+@unittest.skipUnless(SHARDS_CONFIGURED, '需要 --settings=Electronic_Commerce.settings_shard_test')
+class OrderShardingTests(TransactionTestCase):
+    """多个SQLite库充当订单分片：下单落到用户分片，按订单号直达分片，跨分片列表归并"""
+
+    databases = {'default', *get_order_shards()}
+    # 每个测试的分片自增ID都从1开始，与各分片独立建库时一样会重复
+    reset_sequences = True
+
+    def setUp(self):
+        self.product = Product.objects.create(name='shard-test', price=Decimal('10.00'), stock_quantity=100)
+
+    def _place_order(self, user_id: int) -> str:
+        result = OrderService().create_batch_order(user_id, [{'product_id': self.product.id, 'quantity': 1}])
+        self.assertEqual(result['status'], 'completed')
+        return result['order_no']
+
+    def test_order_and_items_stored_on_user_shard(self):
+        order_no = self._place_order(4)
+        shard = shard_for_user(4)
+        self.assertEqual(shard_for_order_no(order_no), shard)
+        for alias in get_order_shards():
+            self.assertEqual(Order.objects.using(alias).filter(order_no=order_no).exists(), alias == shard)
+        self.assertEqual(OrderItem.objects.using(shard).filter(order__order_no=order_no).count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock_quantity, 99)
+
+    def test_retrieve_goes_to_encoded_shard(self):
+        order_no = self._place_order(5)
+        response = self.client.get(f'/orders/{order_no}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['items'][0]['product_name'], 'shard-test')
+        self.assertEqual(self.client.get(f'/orders/{order_no[:-1]}X/').status_code, 404)
+
+    def test_list_merges_shards_by_created_at(self):
+        order_nos = [self._place_order(user_id) for user_id in range(1, 8)]
+
+        first = self.client.get('/orders/?size=4&fields=order_no').json()
+        second = self.client.get('/orders/?size=4&page=2&fields=order_no').json()
+        self.assertEqual(first['count'], 7)
+        listed = [row['order_no'] for row in first['results'] + second['results']]
+        self.assertEqual(listed, order_nos[::-1])
+
+        ascending = self.client.get('/orders/?size=10&ordering=created_at&fields=order_no').json()
+        self.assertEqual([row['order_no'] for row in ascending['results']], order_nos)
+
+    def test_user_filter_reads_single_shard(self):
+        own = [self._place_order(1), self._place_order(1)]
+        self._place_order(4)  # 同一分片的其他用户
+        self._place_order(2)
+        response = self.client.get('/orders/?user_id=1&fields=order_no,user_id').json()
+        self.assertEqual(response['count'], 2)
+        self.assertEqual([row['order_no'] for row in response['results']], own[::-1])
+
+    def test_create_writes_user_shard(self):
+        response = self.client.post('/orders/', {'user_id': 5, 'status': 'pending'}, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        order_no = response.json()['order_no']
+        self.assertEqual(shard_for_order_no(order_no), shard_for_user(5))
+        self.assertTrue(Order.objects.using(shard_for_user(5)).filter(order_no=order_no).exists())
+
+    def test_unhinted_query_requires_shard(self):
+        order_no = self._place_order(5)
+        with self.assertRaises(ShardNotSpecified):
+            Order.objects.filter(order_no=order_no).exists()
+        with use_shard(shard_for_user(5)):
+            self.assertEqual(Order.objects.get(order_no=order_no).items.count(), 1)
+
+    def test_update_cannot_move_order_to_another_user(self):
+        order_no = self._place_order(5)
+        response = self.client.patch(f'/orders/{order_no}/', {'user_id': 6}, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f'/orders/{order_no}/', {'user_id': 5, 'status': 'completed'},
+                                     content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(Order.objects.using(shard_for_user(5)).get(order_no=order_no).status, 'completed')
+
+    def test_stock_logs_reference_orders_by_order_no(self):
+        order_nos = [self._place_order(3), self._place_order(4)]
+        # SQLite分片的自增ID都从1开始，不同分片上的订单ID重复，日志不能靠 order_id 定位订单
+        ids = {Order.objects.using(shard_for_user(user_id)).get(order_no=order_no).id
+               for user_id, order_no in zip((3, 4), order_nos)}
+        self.assertEqual(ids, {1})
+
+        response = self.client.get(f'/products/{self.product.id}/stock_logs/')
+        rows = response.json()['results']['data']
+        self.assertEqual([row['order_no'] for row in rows], order_nos[::-1])
+        self.assertEqual([row['order'] for row in rows], [None, None])
+
+    def test_admin_browses_selected_shard(self):
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin_user)
+        order_nos = {user_id: self._place_order(user_id) for user_id in (3, 4, 5)}
+        shard = shard_for_user(5)
+
+        response = self.client.get('/admin/comerge/order/', {'shard': shard})
+        self.assertEqual([order.order_no for order in response.context['cl'].result_list], [order_nos[5]])
+        self.assertContains(response, f'?shard={shard}')
+        response = self.client.get('/admin/comerge/orderitem/', {'shard': shard})
+        self.assertEqual([item.order.order_no for item in response.context['cl'].result_list], [order_nos[5]])
+        self.assertEqual(self.client.get('/admin/comerge/stocklog/').status_code, 200)
+
+        order = Order.objects.using(shard).get(order_no=order_nos[5])
+        response = self.client.get(f'/admin/comerge/order/{order.pk}/change/',
+                                   {'_changelist_filters': f'shard={shard}'})
+        self.assertContains(response, order_nos[5])
+
+    def test_admin_search_routes_to_order_shard(self):
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin_user)
+        order_nos = {user_id: self._place_order(user_id) for user_id in (3, 4, 5)}
+
+        # 未指定 ?shard= 时默认第一个分片，搜索订单号或用户ID直接到所在分片
+        response = self.client.get('/admin/comerge/order/', {'q': order_nos[5]})
+        self.assertEqual([order.order_no for order in response.context['cl'].result_list], [order_nos[5]])
+        response = self.client.get('/admin/comerge/order/', {'q': '4'})
+        self.assertEqual([order.order_no for order in response.context['cl'].result_list], [order_nos[4]])
+        response = self.client.get('/admin/comerge/orderitem/', {'q': order_nos[5]})
+        self.assertEqual([item.order.order_no for item in response.context['cl'].result_list], [order_nos[5]])
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/admin/comerge/stocklog/', {'q': order_nos[5]})
+        self.assertEqual(len(response.context['cl'].result_list), 1)
+        self.assertFalse([query for query in queries if '"orders"' in query['sql']])
+        response = self.client.get('/admin/comerge/stocklog/', {'q': 'ORD000'})
+        self.assertEqual(list(response.context['cl'].result_list), [])
+
+
+class PartitionHelperTests(SimpleTestCase):
+    """月分区：订单号推出的裁剪范围与分区轮转的DDL"""
+
+    def test_order_no_created_range(self):
+        lower, upper = order_no_created_range('ORD20261031235959011A2B3C')
+        self.assertLessEqual(lower, datetime(2026, 10, 31, 23, 59, 59))
+        self.assertGreater(upper, datetime(2026, 11, 1))
+        self.assertEqual(set(created_range_filter('ORD20261031235959011A2B3C')), {'created_at__gte', 'created_at__lt'})
+        self.assertEqual(created_range_filter('not-an-order'), {})
+
+    def test_add_months_across_year(self):
+        self.assertEqual(add_months(datetime(2026, 11, 1), 3), datetime(2027, 2, 1))
+        self.assertEqual(add_months(datetime(2026, 1, 1), -1), datetime(2025, 12, 1))
+
+    def _manager(self, partitions):
+        statements = []
+        manager = PartitionManager(execute=statements.append)
+        patches = [
+            mock.patch.object(PartitionManager, 'supported', new_callable=mock.PropertyMock, return_value=True),
+            mock.patch.object(manager, 'list_partitions', return_value=partitions),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        return manager, statements
+
+    @override_settings(PARTITIONING={'FUTURE_MONTHS': 2})
+    def test_add_future_partitions_splits_maxvalue(self):
+        manager, statements = self._manager([('p202609', datetime(2026, 10, 1)), ('pmax', None)])
+        added = manager.add_future_partitions('orders', now=datetime(2026, 10, 15))
+        self.assertEqual(added, ['p202610', 'p202611', 'p202612'])
+        self.assertIn('REORGANIZE PARTITION pmax INTO', statements[0])
+        self.assertIn("PARTITION p202612 VALUES LESS THAN ('2027-01-01 00:00:00')", statements[0])
+        self.assertTrue(statements[0].endswith('PARTITION pmax VALUES LESS THAN (MAXVALUE))'))
+
+    @override_settings(PARTITIONING={'RETENTION_MONTHS': 1})
+    def test_expired_partitions(self):
+        manager, _ = self._manager([
+            ('p202608', datetime(2026, 9, 1)), ('p202609', datetime(2026, 10, 1)),
+            ('p202610', datetime(2026, 11, 1)), ('pmax', None),
+        ])
+        self.assertEqual(manager.expired_partitions('orders', now=datetime(2026, 10, 15)),
+                         [('p202608', None, datetime(2026, 9, 1))])
+
+    @override_settings(PARTITIONING={'RETENTION_MONTHS': 1})
+    def test_rotate_dry_run_reports_planned_drops(self):
+        expired = [('p202608', None, datetime(2026, 9, 1))]
+        out = io.StringIO()
+        with tempfile.TemporaryDirectory() as export_dir, \
+                mock.patch.object(PartitionManager, 'supported', new_callable=mock.PropertyMock, return_value=True), \
+                mock.patch.object(PartitionManager, 'list_partitions', return_value=[('pmax', None)]), \
+                mock.patch.object(PartitionManager, 'add_future_partitions', return_value=[]), \
+                mock.patch.object(PartitionManager, 'expired_partitions', return_value=expired), \
+                mock.patch.object(ExportService, 'stream') as stream:
+            call_command('rotate_partitions', tables=['stock_logs'], export_dir=export_dir, dry_run=True, stdout=out)
+            self.assertEqual(os.listdir(export_dir), [])
+        stream.assert_not_called()
+        output = out.getvalue()
+        self.assertIn('将导出 p202608 ->', output)
+        self.assertIn('DROP PARTITION "p202608"', output)
+        self.assertIn('将删除分区 p202608（--dry-run，未执行）', output)
+        self.assertNotIn('已删除', output)
+
+    def test_sqlite_is_noop(self):
+        statements = []
+        manager = PartitionManager(execute=statements.append)
+        if manager.supported:
+            self.skipTest('MySQL')
+        manager.partition_table('orders')
+        self.assertEqual(manager.add_future_partitions('orders'), [])
+        self.assertEqual(statements, [])
+
+
+class QueryBudgetAssertionsMixin:
+    """按 QUERY_BUDGET 断言接口的查询次数：开启 RAISE，超出预算时中间件直接抛出异常"""
+
+    def assertWithinQueryBudget(self, method: str, path: str, data=None, content_type='application/json'):
+        config = get_query_budget_config()
+        view_name = resolve(path.split('?')[0]).view_name
+        self.assertTrue(f"{method} {view_name}" in config['ROUTES'] or view_name in config['ROUTES'],
+                        f"{method} {view_name} 未在 QUERY_BUDGET['ROUTES'] 中配置预算")
+        if data is not None and not isinstance(data, (bytes, str)):
+            data = json.dumps(data)
+        with override_settings(QUERY_BUDGET={**config, 'RAISE': True}):
+            response = self.client.generic(method, path, data or '', content_type=content_type)
+        self.assertLess(response.status_code, 400, response.content[:500])
+        self.assertIn('queries', response['Server-Timing'])
+        return response
+
+
+@unittest.skipIf(REPLICA_CONFIGURED, '测试用的副本没有复制数据，接口读不到 setUp 中写入的商品与订单')
+class QueryBudgetTests(QueryBudgetAssertionsMixin, TransactionTestCase):
+    """ProductViewSet 与 OrderViewSet 每个接口都在查询预算内（配置了订单分片时按分片数放大的预算）"""
+
+    databases = {'default', *get_order_shards()}
+
+    def setUp(self):
+        self.products = [
+            Product.objects.create(name=f'budget-{i}', price=Decimal('9.90'), stock_quantity=100, keywords='budget')
+            for i in range(5)
+        ]
+        items = [{'product_id': product.id, 'quantity': 1} for product in self.products]
+        self.order_nos = [OrderService().create_batch_order(user_id, items)['order_no'] for user_id in (1, 2, 3)]
+
+    def test_product_list_and_create(self):
+        self.assertWithinQueryBudget('GET', '/products/')
+        self.assertWithinQueryBudget('POST', '/products/', {'name': 'new', 'price': '1.00', 'stock_quantity': 1})
+
+    def test_product_detail_actions(self):
+        product = self.products[0]
+        self.assertWithinQueryBudget('GET', f'/products/{product.id}/')
+        self.assertWithinQueryBudget('PUT', f'/products/{product.id}/',
+                                     {'name': 'renamed', 'price': '2.00', 'stock_quantity': 5})
+        self.assertWithinQueryBudget('PATCH', f'/products/{product.id}/', {'price': '3.00'})
+        self.assertWithinQueryBudget('DELETE', f'/products/{product.id}/')
+
+    def test_product_collection_actions(self):
+        ids = ','.join(str(product.id) for product in self.products)
+        self.assertWithinQueryBudget('GET', '/products/search/?keyword=budget')
+        self.assertWithinQueryBudget('GET', f'/products/{self.products[0].id}/stock_logs/')
+        self.assertWithinQueryBudget('GET', f'/products/batch/?ids={ids}')
+        self.assertWithinQueryBudget('POST', '/products/batch/', {'ids': [product.id for product in self.products]})
+        self.assertWithinQueryBudget('POST', '/products/bulk_upsert/?import_format=ndjson',
+                                     '{"name": "imported", "price": "5.00"}\n', 'application/x-ndjson')
+
+    def test_order_list_and_create(self):
+        self.assertWithinQueryBudget('GET', '/orders/')
+        self.assertWithinQueryBudget('POST', '/orders/', {'user_id': 7, 'status': 'pending'})
+
+    def test_order_detail_actions(self):
+        self.assertWithinQueryBudget('GET', f'/orders/{self.order_nos[0]}/')
+        response = self.assertWithinQueryBudget('PATCH', f'/orders/{self.order_nos[0]}/', {'status': 'cancelled'})
+        self.assertEqual(len(response.json()['items']), len(self.products))
+        self.assertWithinQueryBudget('PUT', f'/orders/{self.order_nos[1]}/', {'user_id': 2, 'status': 'cancelled'})
+        self.assertWithinQueryBudget('DELETE', f'/orders/{self.order_nos[2]}/')
+
+    def test_order_batch_create(self):
+        items = [{'product_id': product.id, 'quantity': 1} for product in self.products]
+        self.assertWithinQueryBudget('POST', '/orders/batch_create/', {'user_id': 9, 'order_items': items})
+
+    def test_batch_order_validation_is_single_query(self):
+        items = [{'product_id': product.id, 'quantity': 1} for product in self.products] + [
+            {'product_id': 999999, 'quantity': 1}
+        ]
+        with self.assertNumQueries(1):
+            serializer = BatchOrderSerializer(data={'user_id': 1, 'order_items': items})
+            self.assertFalse(serializer.is_valid())
+        errors = serializer.errors['order_items']
+        self.assertEqual(errors[-1]['product_id'][0], '商品ID 999999 不存在或已下架')
+        self.assertFalse(any(errors[:-1]))
+
+    def test_shard_scaled_budget(self):
+        config = {**get_query_budget_config(), 'ROUTES': {'comerge:order-list': 5},
+                  'SHARD_SCALED': ['comerge:order-list']}
+        with override_settings(ORDER_SHARDS=['orders_0', 'orders_1', 'orders_2']):
+            self.assertEqual(get_route_budget(config, 'GET', 'comerge:order-list'), 15)
+            self.assertEqual(get_route_budget(config, 'GET', 'comerge:order-detail'), config['DEFAULT'])
+        with override_settings(ORDER_SHARDS=[]):
+            self.assertEqual(get_route_budget(config, 'GET', 'comerge:order-list'), 5)
+
+    @override_settings(QUERY_BUDGET={'RAISE': True, 'ROUTES': {'comerge:product-list': 0}})
+    def test_exceeding_budget_raises(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get('/products/')
+
+
+class TracingTests(TransactionTestCase):
+    """链路追踪：未开启时为空操作，强制追踪的请求记录服务、仓储、缓存的嵌套span"""
+    databases = '__all__'
+
+    def setUp(self):
+        trace_buffer.clear()
+        self.product = Product.objects.create(name='traced', price=Decimal('5.00'), stock_quantity=10)
+
+    def _batch_create(self, **extra):
+        return self.client.post('/orders/batch_create/', json.dumps({
+            'user_id': 3, 'order_items': [{'product_id': self.product.id, 'quantity': 2}]
+        }), content_type='application/json', **extra)
+
+    def test_disabled_tracing_is_noop(self):
+        self.assertIs(span('noop'), _NOOP_SPAN)
+        response = self._batch_create(HTTP_X_DEBUG_TRACE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Trace-Id', response)
+        self.assertEqual(trace_buffer.recent(), [])
+
+    @override_settings(TRACING={'ENABLED': True, 'SAMPLE_RATE': 0})
+    def test_forced_trace_records_nested_spans(self):
+        self._batch_create()
+        self.assertEqual(trace_buffer.recent(), [])
+
+        response = self._batch_create(HTTP_X_DEBUG_TRACE='1')
+        self.assertEqual(response.status_code, 200)
+        trace, = trace_buffer.recent()
+        self.assertEqual(response['X-Trace-Id'], trace.trace_id)
+        self.assertEqual(trace.name, 'POST comerge:order-batch-create')
+        self.assertEqual(trace.attrs['status'], 200)
+
+        spans = {span.name: span for span in trace.spans}
+        root = spans['OrderService.create_batch_order']
+        self.assertIsNone(root.parent_id)
+        for name in ('ProductRepository.get_with_lock', 'ProductRepository.update_stock',
+                     'StockLog.insert', 'CacheManager.delete_many'):
+            self.assertIn(name, spans)
+        parents = {span.span_id: span.parent_id for span in trace.spans}
+        ancestor = spans['StockLog.insert'].span_id
+        while parents.get(ancestor) is not None:
+            ancestor = parents[ancestor]
+        self.assertEqual(ancestor, root.span_id)
+        self.assertEqual(spans['StockLog.insert'].parent_id, spans['ProductRepository.update_stock'].span_id)
+
+    @override_settings(TRACING={'ENABLED': True, 'SAMPLE_RATE': 1})
+    def test_debug_endpoint_dumps_slowest_traces(self):
+        self._batch_create()
+        self.client.get(f'/products/{self.product.id}/')
+        self.assertEqual(self.client.get('/debug/traces/').status_code, 403)
+
+        from django.contrib.auth import get_user_model
+        admin = get_user_model().objects.create_user('ops', password='x', is_staff=True)
+        self.client.force_login(admin)
+        data = self.client.get('/debug/traces/').json()['data']
+        durations = [trace['duration_ms'] for trace in data['traces']]
+        self.assertEqual(durations, sorted(durations, reverse=True))
+        self.assertIn('POST comerge:order-batch-create', [trace['name'] for trace in data['traces']])
+        self.assertEqual(len(self.client.get('/debug/traces/?limit=1').json()['data']['traces']), 1)
+
+        events = self.client.get('/debug/traces/?output=chrome').json()['traceEvents']
+        complete = [event for event in events if event['ph'] == 'X']
+        self.assertTrue(any(event['name'] == 'ProductRepository.update_stock' for event in complete))
+        self.assertTrue(all(event['dur'] >= 0 and 'ts' in event for event in complete))
+        self.assertEqual(self.client.get('/debug/traces/?output=xml').status_code, 400)
+
+
+class SkuSamplerTests(SimpleTestCase):
+
+    def test_distributions(self):
+        rng = random.Random(1)
+        product_ids = list(range(1, 101))
+        self.assertEqual({SkuSampler(product_ids, 'hot').sample(rng) for _ in range(50)}, {1})
+
+        zipf = Counter(SkuSampler(product_ids, 'zipf', zipf_s=1.2).sample(rng) for _ in range(5000))
+        self.assertGreater(zipf[1], zipf[10] * 5)
+        self.assertTrue(set(zipf) <= set(product_ids))
+
+        cart = SkuSampler(product_ids, 'hot').cart(rng, 4, max_quantity=2)
+        self.assertEqual(len(cart), 1)
+        self.assertTrue(4 <= cart[0]['quantity'] <= 8)
+        with self.assertRaises(ValueError):
+            SkuSampler(product_ids, 'pareto')
+
+
+class BatchOrderLoadTests(TransactionTestCase):
+    """并发下单后库存守恒：当前库存 + 成功明细数量 == 初始库存"""
+    databases = '__all__'
+
+    def test_concurrent_hot_sku_does_not_oversell(self):
+        product_ids = create_catalog(5, 6, 'load-test')
+        initial = snapshot_stock(product_ids)
+        plans = build_plans(SkuSampler(product_ids, 'hot'), workers=3, orders_per_worker=4, cart_size=1)
+
+        report = run_load(plans, 'hot')
+
+        self.assertEqual(report.orders, 12)
+        self.assertLessEqual(report.statuses['completed'], 6)
+        self.assertEqual(verify_stock(initial), [])
+        self.assertEqual(set(report.latency_percentiles()), {'p50', 'p95', 'p99'})
+
+
+class SearchBenchmarkTests(TransactionTestCase):
+    """合成目录可复现，搜索基准的未命中阶段查库、命中阶段不查库"""
+
+    def test_catalog_is_reproducible(self):
+        self.assertEqual(CatalogFaker(7).product_fields(), CatalogFaker(7).product_fields())
+        self.assertNotEqual(CatalogFaker(7).product_fields(), CatalogFaker(8).product_fields())
+        self.assertEqual(KeywordWorkload(3).keywords(50), KeywordWorkload(3).keywords(50))
+
+    @unittest.skipIf(REPLICA_CONFIGURED, '测试用的副本没有复制数据，搜索读不到新写入的商品')
+    def test_search_phases(self):
+        progress = []
+        self.assertEqual(generate_catalog(250, seed=1, batch_size=100, progress=progress.append), 250)
+        self.assertEqual(progress, [100, 200, 250])
+        self.assertEqual(Product.objects.count(), 250)
+
+        keywords = KeywordWorkload(5, no_result_ratio=0).keywords(30)
+        miss = run_search_phase(keywords, 'miss')
+        hit = run_search_phase(keywords, 'hit')
+        self.assertEqual(miss.calls, hit.calls)
+        self.assertGreaterEqual(miss.queries, len(keywords))
+        self.assertEqual(hit.queries, 0)
+        self.assertLess(miss.empty_results, len(keywords))
+
+
+class SearchKeywordRecorderTests(SimpleTestCase):
+    """搜索关键词记录：过长的关键词不记录，写入后只保留频次最高的若干个；启动预热只在Web服务进程中运行"""
+
+    def setUp(self):
+        self.recorder = SearchKeywordRecorder(key='test:search:keywords', flush_every=1000,
+                                              max_length=8, max_keywords=3)
+        cache.delete(self.recorder.key)
+        self.addCleanup(cache.delete, self.recorder.key)
+
+    def test_overlong_and_blank_keywords_are_skipped(self):
+        for keyword in ('phone', ' phone ', 'x' * 9, '   '):
+            self.recorder.record(keyword)
+        self.recorder.flush()
+        self.assertEqual(self.recorder.top(10), [('phone', 2)])
+
+    def test_flush_keeps_top_keywords(self):
+        for keyword, times in (('a', 5), ('b', 4), ('c', 3), ('d', 2), ('e', 1)):
+            for _ in range(times):
+                self.recorder.record(keyword)
+        self.recorder.flush()
+        self.assertEqual(self.recorder.top(10), [('a', 5), ('b', 4), ('c', 3)])
+
+        for _ in range(6):
+            self.recorder.record('f')
+        self.recorder.flush()
+        self.assertEqual(self.recorder.top(10), [('f', 6), ('a', 5), ('b', 4)])
+
+    def test_is_serving(self):
+        cases = [
+            (['manage.py', 'runserver'], {'RUN_MAIN': 'true'}, True),
+            (['manage.py', 'runserver'], {}, False),
+            (['manage.py', 'migrate'], {'RUN_MAIN': 'true'}, False),
+            (['/usr/bin/gunicorn', 'Electronic_Commerce.wsgi'], {}, True),
+            (['/venv/bin/uvicorn', 'Electronic_Commerce.asgi:application'], {}, True),
+            (['/venv/bin/celery', '-A', 'Electronic_Commerce', 'worker'], {}, False),
+            (['scripts/import.py'], {}, False),
+            (['/venv/bin/pytest'], {}, False),
+        ]
+        for argv, environ, expected in cases:
+            with self.subTest(argv=argv), mock.patch.object(sys, 'argv', argv), \
+                    mock.patch.dict(os.environ, environ, clear=False):
+                if 'RUN_MAIN' not in environ:
+                    os.environ.pop('RUN_MAIN', None)
+                self.assertIs(ComergeConfig._is_serving(), expected)
+
+
+class FastReadSerializerTests(TransactionTestCase):
+    """快速序列化路径的输出与 ProductListSerializer 完全一致（商品列表与搜索接口）"""
+
+    def setUp(self):
+        cache.clear()
+        rng = random.Random(3)
+        for index in range(12):
+            Product.objects.create(
+                name=f'parity 商品 {index}', description='parity',
+                price=Decimal(rng.randint(1, 999999)) / 100, stock_quantity=rng.randint(0, 500),
+                keywords='' if index % 3 else 'parity,测试',
+            )
+
+    def _expected(self, product_ids):
+        products = Product.objects.in_bulk(product_ids)
+        return [dict(item) for item in ProductListSerializer([products[pk] for pk in product_ids], many=True).data]
+
+    def test_instances_and_rows_match_drf(self):
+        with use_primary():
+            products = list(Product.objects.order_by('id'))
+            expected = [dict(item) for item in ProductListSerializer(products, many=True).data]
+            rows = fast_product_list_serializer.values_list(Product.objects.order_by('id'))
+            self.assertEqual(fast_product_list_serializer.from_instances(products), expected)
+            self.assertEqual(fast_product_list_serializer.from_rows(rows), expected)
+
+    def test_list_and_search_payloads_match_drf(self):
+        # 配置了副本时用读写一致cookie让请求读主库
+        self.client.cookies[PIN_COOKIE_NAME] = str(int(time.time()) + 5)
+        with use_primary():
+            items = self.client.get('/products/', {'size': 50}).json()['results']
+            self.assertEqual(len(items), 12)
+            self.assertEqual(items, self._expected([item['id'] for item in items]))
+
+            data = self.client.get('/products/search/', {'keyword': 'parity', 'size': 50}).json()['results']['data']
+            self.assertEqual(len(data), 12)
+            self.assertEqual(data, self._expected([item['id'] for item in data]))
+
+
+class ORJSONParityTests(SimpleTestCase):
+    """orjson 渲染器和解析器的结果与DRF默认实现一致"""
+
+    def test_renderer_matches_drf(self):
+        payloads = [
+            {'price': Decimal('19.90'), 'created_at': datetime(2025, 1, 2, 3, 4, 5), 'name': '商品 \u2028'},
+            [1e16, 1e-7, 0.00001, 1.5e-05, 0.1, 2.5e22, -1e-10, 1000000000000000.0, 5e-324],
+            {'1e5': '0.00001 1e5', 'nested': [{'x': 0.3333333333333333, 'y': None, 'z': True}]},
+            {1: 'non-str key', 'big': 2 ** 70},
+            None,
+        ]
+        rng = random.Random(5)
+        payloads.append([rng.random() * 10 ** rng.randint(-30, 30) for _ in range(2000)])
+        for data in payloads:
+            with self.subTest(data=str(data)[:60]):
+                self.assertEqual(ORJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(ORJSONRenderer().render({'a': 1}, 'application/json; indent=2'),
+                         JSONRenderer().render({'a': 1}, 'application/json; indent=2'))
+
+    def test_renderer_rejects_non_finite_floats(self):
+        for value in (float('nan'), float('inf'), {'a': [None, -float('inf')]}):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    JSONRenderer().render(value)
+                with self.assertRaises(ValueError):
+                    ORJSONRenderer().render(value)
+
+    def test_parser_matches_drf(self):
+        for body in (b'{"a": [1, 2.5, "\xe5\x95\x86\xe5\x93\x81"], "b": null}', b'[]', b'1e16'):
+            with self.subTest(body=body):
+                self.assertEqual(ORJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)))
+        for body in (b'{"a": NaN}', b'{"a": 1,}', b'', b'\xff'):
+            with self.subTest(body=body):
+                with self.assertRaises(ParseError):
+                    JSONParser().parse(io.BytesIO(body))
+                with self.assertRaises(ParseError):
+                    ORJSONParser().parse(io.BytesIO(body))
+
+    def test_parser_falls_back_for_other_encodings(self):
+        body = '{"name": "商品"}'.encode('gbk')
+        context = {'encoding': 'gbk'}
+        self.assertEqual(ORJSONParser().parse(io.BytesIO(body), parser_context=context), {'name': '商品'})
+
+
+class SparseFieldsTests(TransactionTestCase):
+    """?fields= 字段裁剪：参数解析、序列化器裁剪、快速序列化器按字段组合缓存"""
+
+    databases = {'default', *get_order_shards()}
+
+    def setUp(self):
+        self.product = Product.objects.create(name='sparse', price=Decimal('3.50'), stock_quantity=7)
+
+    def test_parse_fields_param(self):
+        allowed = ProductListSerializer.Meta.fields
+        self.assertIsNone(parse_fields_param(None, allowed))
+        self.assertIsNone(parse_fields_param('', allowed))
+        self.assertIsNone(parse_fields_param(' , ,', allowed))
+        self.assertEqual(parse_fields_param('price, id,price,,name', allowed), ['price', 'id', 'name'])
+        with self.assertRaises(ValidationError) as caught:
+            parse_fields_param('id,secret,other', allowed)
+        self.assertEqual(caught.exception.detail['fields'], ['未知字段: secret, other'])
+
+    def test_dynamic_fields_serializer(self):
+        self.assertEqual(set(ProductSerializer(self.product, fields=['name', 'id']).data), {'id', 'name'})
+        self.assertEqual(set(ProductSerializer(self.product).data), set(ProductSerializer.Meta.fields))
+        self.assertEqual(OrderSerializer.model_columns(['items', 'order_number', 'order_no', 'status']),
+                         ['order_no', 'status'])
+
+    def test_fast_serializer_narrow(self):
+        self.assertIs(fast_product_list_serializer.narrow(None), fast_product_list_serializer)
+        narrowed = fast_product_list_serializer.narrow(['price', 'id'])
+        self.assertIs(fast_product_list_serializer.narrow(['id', 'price']), narrowed)
+        self.assertEqual(narrowed.field_names, ['id', 'price'])
+        self.assertEqual(narrowed.sources, ['id', 'price'])
+        self.assertEqual(narrowed.from_instances([self.product]), [{'id': self.product.id, 'price': '3.50'}])
+
+    def test_list_endpoint_fields(self):
+        self.client.cookies[PIN_COOKIE_NAME] = str(int(time.time()) + 5)
+        response = self.client.get('/products/', {'fields': 'name,id'})
+        self.assertEqual(response.json()['results'], [{'id': self.product.id, 'name': 'sparse'}])
+        self.assertEqual(self.client.get('/products/', {'fields': 'id,secret'}).status_code, 400)
+
+    @unittest.skipIf(REPLICA_CONFIGURED, '基准命令的请求不带读写一致cookie，测试用的副本没有复制数据')
+    def test_bench_command_is_not_throttled(self):
+        # 订单不在第一个分片上时基准命令也要能找到
+        OrderService().create_batch_order(2, [{'product_id': self.product.id, 'quantity': 1}])
+        out = io.StringIO()
+        # 8 个请求各重复 20 次，超过匿名用户每小时 100 次的限额
+        call_command('bench_sparse_fields', iterations=20, size=5, stdout=out)
+        self.assertEqual(len(out.getvalue().splitlines()), 9)
+
+
+class CacheStatsTests(TransactionTestCase):
+    """缓存统计：按命名空间汇总计数与耗时直方图，统计接口仅管理员可访问"""
+
+    def setUp(self):
+        self.stats = CacheStats(key_prefix='test:stats:cache', flush_every=1000)
+        self.addCleanup(self.stats.reset)
+        cache_stats.reset()
+        self.addCleanup(cache_stats.reset)
+
+    def test_namespace(self):
+        self.assertEqual(get_namespace('product:detail:1'), 'product:detail')
+        self.assertEqual(get_namespace('product:search:a:b'), 'product:search')
+        self.assertEqual(get_namespace('misc'), 'misc')
+
+    def test_snapshot_summarizes_counters_and_latency(self):
+        for _ in range(3):
+            self.stats.record_get('product:detail:1', True, 0.0004)
+        self.stats.record_get('product:detail:2', False, 0.02)
+        self.stats.record_set('product:detail:2', 0.003)
+        self.stats.record_invalidation('product:list:page1')
+
+        snapshot = self.stats.snapshot()
+        self.assertEqual(sorted(snapshot), ['product:detail', 'product:list'])
+        detail = snapshot['product:detail']
+        self.assertEqual((detail['hits'], detail['misses'], detail['sets']), (3, 1, 1))
+        self.assertEqual(detail['hit_rate'], 0.75)
+        self.assertEqual(detail['latency']['get']['count'], 4)
+        self.assertEqual(detail['latency']['get']['p50_ms'], '0.5')
+        self.assertEqual(detail['latency']['get']['p99_ms'], '25')
+        self.assertEqual(detail['latency']['set']['buckets_ms']['5'], 1)
+        self.assertIsNone(snapshot['product:list']['hit_rate'])
+        self.assertEqual(list(self.stats.snapshot(['product:list'])), ['product:list'])
+
+        self.stats.reset()
+        self.assertEqual(self.stats.snapshot(), {})
+
+    @unittest.skipIf(REPLICA_CONFIGURED, '登录用户从副本读取，测试用的副本没有复制数据')
+    def test_endpoint_requires_admin(self):
+        cache_stats.record_get('product:detail:1', True, 0.001)
+        self.assertEqual(self.client.get('/stats/cache/').status_code, 403)
+
+        self.client.force_login(get_user_model().objects.create_user('ops', password='x', is_staff=True))
+        response = self.client.get('/stats/cache/', {'namespace': 'product:detail'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()['data']
+        self.assertEqual(list(data), ['product:detail'])
+        self.assertEqual(data['product:detail']['hits'], 1)
+
+
+class FakeRedisPipeline:
+    """测试用：按调用顺序执行命令，execute 返回各命令的结果"""
+
+    def __init__(self, redis):
+        self.redis = redis
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        calls, self.calls = self.calls, []
+        return [getattr(self.redis, name)(*args, **kwargs) for name, args, kwargs in calls]
+
+
+class FakeRedis:
+    """测试用：行锁统计用到的哈希、有序集合命令，并记录每个命令的调用次数"""
+
+    def __init__(self):
+        self.data = {}
+        self.commands = Counter()
+
+    def pipeline(self, transaction=True):
+        return FakeRedisPipeline(self)
+
+    def _call(self, name):
+        self.commands[name] += 1
+
+    def hincrby(self, key, field, value):
+        self._call('hincrby')
+        fields = self.data.setdefault(key, {})
+        fields[field.encode()] = fields.get(field.encode(), 0) + value
+
+    def zincrby(self, key, value, member):
+        self._call('zincrby')
+        members = self.data.setdefault(key, {})
+        members[str(member).encode()] = members.get(str(member).encode(), 0) + value
+
+    def expire(self, key, ttl):
+        self._call('expire')
+
+    def hgetall(self, key):
+        self._call('hgetall')
+        return {field: str(value).encode() for field, value in self.data.get(key, {}).items()}
+
+    def zrange(self, key, start, stop):
+        self._call('zrange')
+        return sorted(self.data.get(key, {}), key=self.data.get(key, {}).get)
+
+    def zunionstore(self, dest, keys):
+        self._call('zunionstore')
+        union = Counter()
+        for key in keys:
+            union.update(self.data.get(key, {}))
+        self.data[dest] = dict(union)
+        return len(union)
+
+    def zrevrange(self, key, start, stop):
+        self._call('zrevrange')
+        members = sorted(self.data.get(key, {}).items(), key=lambda item: (-item[1], item[0]))
+        return [member for member, _ in members][start:None if stop == -1 else stop + 1]
+
+    def delete(self, *keys):
+        self._call('delete')
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, pattern):
+        return [key for key in list(self.data) if key.startswith(pattern.rstrip('*'))]
+
+
+class LockStatsTests(TransactionTestCase):
+    """行锁统计：按等待总时长排序，按直方图估算分位数，达到阈值的商品判为热点"""
+
+    def setUp(self):
+        self.stats = LockStats(key_prefix='test:stats:lock', flush_every=10 ** 6, flush_interval=3600)
+        self.addCleanup(self.stats.reset)
+
+    def test_top_and_hot_products(self):
+        for _ in range(30):
+            self.stats.record_wait(1, 0.080)
+            self.stats.record_wait(2, 0.001)
+        self.stats.record_wait(3, 0.300)
+
+        top = self.stats.top()
+        self.assertEqual([product_id for product_id, _ in top], [1, 3, 2])
+        self.assertEqual(top[0][1]['wait']['count'], 30)
+        self.assertEqual(top[0][1]['wait']['p95_ms'], '100')
+        self.assertEqual(top[2][1]['wait']['p50_ms'], '1')
+
+        with override_settings(LOCK_STATS={'HOT_MIN_LOCKS': 20, 'HOT_WAIT_P95_MS': 50}):
+            self.assertEqual(self.stats.hot_product_ids(), frozenset({1}))
+
+    def test_hold_time_is_recorded_when_tracking_ends(self):
+        self.stats.lock_acquired(9)  # 不在跟踪范围内，忽略
+        with self.stats.track_holds():
+            self.stats.lock_acquired(7)
+            time.sleep(0.003)
+        hold = dict(self.stats.top())[7]['hold']
+        self.assertEqual(hold['count'], 1)
+        self.assertGreaterEqual(hold['total_ms'], 3)
+        self.assertNotIn(9, dict(self.stats.top()))
+
+    def test_redis_top_reads_only_top_products(self):
+        redis = FakeRedis()
+        with mock.patch('comerge.utils.lock_stats.get_redis_client', return_value=redis):
+            for product_id in range(1, 51):
+                self.stats.record_wait(product_id, product_id / 1000)
+            self.stats.flush()
+            # 跨窗口的记录按商品合并
+            with mock.patch.object(self.stats, '_current_window', return_value=self.stats._current_window() - 1):
+                self.stats.record_wait(1, 1.0)
+                self.stats.flush()
+            redis.commands.clear()
+
+            top = self.stats.top(3)
+        self.assertEqual([product_id for product_id, _ in top], [1, 50, 49])
+        self.assertEqual(top[0][1]['wait']['count'], 2)
+        self.assertEqual(redis.commands['zunionstore'], 1)
+        self.assertEqual(redis.commands['zrange'], 0)
+        self.assertEqual(redis.commands['hgetall'], 3 * self.stats.windows)
+        self.assertFalse(any(key.endswith(':union') for key in redis.data))
+
+    @unittest.skipIf(REPLICA_CONFIGURED, '登录用户从副本读取，测试用的副本没有复制数据')
+    def test_endpoint_requires_admin(self):
+        self.stats.record_wait(1, 0.01)
+        self.assertEqual(self.client.get('/stats/locks/').status_code, 403)
+        self.client.force_login(get_user_model().objects.create_user('ops', password='x', is_staff=True))
+        response = self.client.get('/stats/locks/', {'limit': 5})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('hot_product_ids', response.json()['data'])
+
+
+class StockStrategyRoutingTests(TransactionTestCase):
+    """热点商品路由到 STOCK_STRATEGY['HOT']，两种策略扣减结果一致"""
+    databases = '__all__'
+
+    def setUp(self):
+        lock_stats.reset()
+        self.product = Product.objects.create(name='hot-sku', price=Decimal('10.00'), stock_quantity=5)
+
+    def _order(self, quantity):
+        return OrderService().create_batch_order(1, [{'product_id': self.product.id, 'quantity': quantity}])
+
+    def test_cold_product_uses_row_lock_and_records_lock_times(self):
+        service = OrderService()
+        self.assertIsInstance(service.get_stock_strategy(self.product.id), RowLockStrategy)
+        self.assertEqual(self._order(2)['status'], 'completed')
+        summary = dict(lock_stats.top())[self.product.id]
+        self.assertEqual(summary['wait']['count'], 1)
+        self.assertEqual(summary['hold']['count'], 1)
+
+    def test_hot_product_uses_configured_strategy(self):
+        with mock.patch.object(lock_stats, 'hot_product_ids', return_value=frozenset({self.product.id})):
+            self.assertIsInstance(OrderService().get_stock_strategy(self.product.id), ConditionalUpdateStrategy)
+            self.assertEqual(self._order(3)['status'], 'completed')
+            failed = self._order(3)
+            with override_settings(STOCK_STRATEGY={'HOT': 'missing'}):
+                unknown = self._order(1)
+
+        self.assertEqual(failed['status'], 'failed')
+        self.assertEqual(failed['failed_items'][0]['available_stock'], 2)
+        self.assertEqual(unknown['failed_items'][0]['error_message'], '未注册的库存策略: missing')
+        with use_primary():
+            self.product.refresh_from_db()
+            log = self.product.stocklog_set.get()
+        self.assertEqual((self.product.stock_quantity, self.product.version), (2, 2))
+        self.assertEqual((log.quantity_before, log.quantity_after, log.change_quantity), (5, 2, -3))
+
+
+class HashRingTests(SimpleTestCase):
+    """键在节点间分布均匀，增加节点时只有少部分键迁移"""
+
+    def test_distribution_and_stability(self):
+        nodes = [f"127.0.0.1:{7100 + index}" for index in range(4)]
+        ring = HashRing(nodes)
+        owners = {key: ring.node_for(key) for key in range(4000)}
+        self.assertEqual(set(owners.values()), set(nodes))
+        self.assertGreater(min(Counter(owners.values()).values()), 500)
+
+        grown = HashRing(nodes + ['127.0.0.1:7104'])
+        moved = [key for key, node in owners.items() if grown.node_for(key) != node]
+        self.assertLess(len(moved), 1400)
+        self.assertTrue(all(grown.node_for(key) == '127.0.0.1:7104' for key in moved))
+        with self.assertRaises(ValueError):
+            HashRing([])
+
+
+def fail_order_completion():
+    """让订单完成时的 update_order 抛出异常（标记失败的调用照常执行），模拟订单事务回滚"""
+    update_order = OrderRepository.update_order
+
+    def side_effect(repository, order, total_amount, status):
+        if status != 'failed':
+            raise RuntimeError('order commit failed')
+        return update_order(repository, order, total_amount, status)
+    return mock.patch.object(OrderRepository, 'update_order', autospec=True, side_effect=side_effect)
+
+
+class StockExecutorTests(TransactionTestCase):
+    """actor 策略：分区顺序扣减并提交后才回复，提交失败不确认，分区重启后从数据库恢复"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.partition = StockPartition(batch_interval=0.001)
+        self._use_partitions(self.partition.start_in_thread())
+        self.addCleanup(lambda: self.partition.stop())
+        self.product = Product.objects.create(name='actor-sku', price=Decimal('10.00'), stock_quantity=5)
+
+    def _use_partitions(self, *addresses):
+        override = override_settings(STOCK_STRATEGY={'DEFAULT': 'actor', 'HOT': 'actor'},
+                                     STOCK_EXECUTOR={'PARTITIONS': list(addresses), 'TIMEOUT': 2.0})
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _order(self, quantity):
+        return OrderService().create_batch_order(1, [{'product_id': self.product.id, 'quantity': quantity}])
+
+    def _stock(self):
+        with use_primary():
+            return Product.objects.get(id=self.product.id).stock_quantity
+
+    def test_actor_orders_conserve_stock(self):
+        self.assertIsInstance(OrderService().get_stock_strategy(self.product.id), ActorStrategy)
+        completed = self._order(2)
+        failed = self._order(4)
+
+        self.assertEqual(completed['status'], 'completed')
+        self.assertEqual(completed['success_items'][0]['unit_price'], '10.00')
+        self.assertEqual(failed['failed_items'][0]['available_stock'], 3)
+        self.assertEqual(self._stock(), 3)
+        self.assertEqual(verify_stock({self.product.id: 5}), [])
+        with use_primary():
+            log = self.product.stocklog_set.get()
+        self.assertEqual((log.quantity_before, log.quantity_after, log.order_no), (5, 3, completed['order_no']))
+
+    def test_concurrent_hot_sku_does_not_oversell(self):
+        product_ids = create_catalog(3, 6, 'actor-load')
+        initial = snapshot_stock(product_ids)
+        report = run_load(build_plans(SkuSampler(product_ids, 'hot'), workers=3, orders_per_worker=4, cart_size=1))
+
+        self.assertEqual(report.orders, 12)
+        self.assertLessEqual(report.statuses['completed'], 6)
+        # 扣减先于订单提交，订单事务失败（SQLite并发写）时加回；回补本身也可能因并发写失败，这里只断言不超卖
+        for _, stock, current, sold in verify_stock(initial):
+            self.assertLessEqual(current + sold, stock)
+
+    def test_rolled_back_order_restores_stock(self):
+        with fail_order_completion():
+            result = self._order(2)
+        self.assertEqual(result['status'], 'failed')
+        self.assertEqual(self._stock(), 5)
+        with use_primary():
+            changes = list(self.product.stocklog_set.order_by('id')
+                           .values_list('change_type', 'quantity_before', 'quantity_after'))
+        self.assertEqual(changes, [('decrease', 5, 3), ('increase', 3, 5)])
+        self.assertFalse(OrderItem.objects.using(shard_for_user(1)).exists())
+
+        # 回补绕过执行器写库，分区提交冲突后重新加载，继续扣减
+        self.assertEqual(self._order(1)['status'], 'completed')
+        self.assertEqual(self._stock(), 4)
+
+    def test_failed_commit_is_not_acknowledged(self):
+        with mock.patch.object(StockPartition, '_persist', side_effect=RuntimeError('disk full')):
+            failed = self._order(2)
+        self.assertEqual(failed['status'], 'failed')
+        self.assertIn('persist_failed', failed['failed_items'][0]['error_message'])
+        self.assertEqual(self._stock(), 5)
+
+        # 执行器之外的扣减或补货使内存库存失效，提交冲突后重新加载再扣减，日志链与数据库一致
+        self.assertEqual(self._order(1)['status'], 'completed')
+        Product.objects.filter(id=self.product.id).update(stock_quantity=10)
+        self.assertEqual(self._order(2)['status'], 'completed')
+        self.assertEqual(self._stock(), 8)
+        Product.objects.filter(id=self.product.id).update(stock_quantity=3)
+        self.assertEqual(self._order(2)['status'], 'completed')
+        self.assertEqual(self._stock(), 1)
+        with use_primary():
+            logs = list(self.product.stocklog_set.order_by('id')
+                        .values_list('quantity_before', 'quantity_after', 'change_quantity'))
+        self.assertEqual(logs, [(5, 4, -1), (10, 8, -2), (3, 1, -2)])
+
+    def test_strategy_uses_reply_without_reading_product(self):
+        with mock.patch.object(ProductRepository, 'get_fresh') as get_fresh:
+            product = ActorStrategy(ProductRepository()).deduct(self.product.id, 2, 'test')
+        get_fresh.assert_not_called()
+        self.assertEqual((product.id, product.name, product.price, product.stock_quantity),
+                         (self.product.id, 'actor-sku', Decimal('10.00'), 3))
+
+    def test_restarted_partition_reloads_from_database(self):
+        self.assertEqual(self._order(1)['status'], 'completed')
+        self.partition.stop()
+        time.sleep(0.05)
+        unavailable = self._order(1)
+        self.assertEqual(unavailable['status'], 'failed')
+        self.assertIn('不可用', unavailable['failed_items'][0]['error_message'])
+        self.assertEqual(self._stock(), 4)
+
+        self.partition = StockPartition()
+        self._use_partitions(self.partition.start_in_thread())
+        self.assertEqual(self._order(4)['status'], 'completed')
+        self.assertEqual(self._order(1)['status'], 'failed')
+        self.assertEqual(self._stock(), 0)
+
+
+class GroupCommitTests(TransactionTestCase):
+    """同一窗口内的扣减合并为一个事务，按到达顺序判定，库存日志逐个记录"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.product = Product.objects.create(name='group-sku', price=Decimal('10.00'), stock_quantity=5)
+
+    def _refresh(self):
+        with use_primary():
+            self.product.refresh_from_db()
+            return list(self.product.stocklog_set.order_by('id').values_list('quantity_before', 'quantity_after'))
+
+    def test_commit_grants_in_arrival_order(self):
+        results = GroupCommitCoordinator().commit(self.product.id, [(2, 'a', ''), (4, 'b', ''), (3, 'c', ''),
+                                                                    (1, 'd', '')])
+
+        self.assertEqual([result['ok'] for result in results], [True, False, True, False])
+        self.assertEqual(results[1]['available'], 3)
+        self.assertEqual(results[2]['product'].stock_quantity, 0)
+        self.assertEqual(self._refresh(), [(5, 3), (3, 0)])
+        self.assertEqual((self.product.stock_quantity, self.product.version), (0, 3))
+
+    def test_concurrent_requests_share_one_transaction(self):
+        coordinator = GroupCommitCoordinator(window_ms=100)
+        with ThreadPoolExecutor(max_workers=6) as executor:
+            results = list(executor.map(lambda _: coordinator.submit(self.product.id, 1, 'group'), range(6)))
+
+        self.assertEqual(sum(result['ok'] for result in results), 5)
+        self.assertEqual(coordinator.stats()['batches'], 1)
+        self.assertEqual(coordinator.stats()['requests'], 6)
+        self.assertEqual(len(self._refresh()), 5)
+        self.assertEqual(self.product.stock_quantity, 0)
+
+    def test_timed_out_request_is_not_committed(self):
+        coordinator = GroupCommitCoordinator(window_ms=300, timeout=0.05)
+        self.assertEqual(coordinator.submit(self.product.id, 2, 'late'), {'ok': False, 'error': 'timeout'})
+        # 窗口结束后提交线程跳过已取消的请求，下一个请求正常提交
+        time.sleep(0.4)
+        self.assertEqual(self._refresh(), [])
+        coordinator.timeout = 2.0
+        self.assertTrue(coordinator.submit(self.product.id, 1, 'next')['ok'])
+        self.assertEqual(self._refresh(), [(5, 4)])
+        self.assertEqual(coordinator.stats()['requests'], 1)
+
+    def test_order_through_group_commit_strategy(self):
+        with override_settings(STOCK_STRATEGY={'DEFAULT': 'group_commit', 'HOT': 'group_commit'},
+                               GROUP_COMMIT={'WINDOW_MS': 0}):
+            self.assertIsInstance(OrderService().get_stock_strategy(self.product.id), GroupCommitStrategy)
+            completed = OrderService().create_batch_order(1, [{'product_id': self.product.id, 'quantity': 2}])
+            failed = OrderService().create_batch_order(1, [{'product_id': self.product.id, 'quantity': 4}])
+
+        self.assertEqual(completed['status'], 'completed')
+        self.assertEqual(failed['failed_items'][0]['available_stock'], 3)
+        self.assertEqual(verify_stock({self.product.id: 5}), [])
+        with use_primary():
+            self.assertEqual(list(self.product.stocklog_set.values_list('order_no', flat=True)), [completed['order_no']])
+
+    def test_rolled_back_order_restores_stock(self):
+        with override_settings(STOCK_STRATEGY={'DEFAULT': 'group_commit', 'HOT': 'group_commit'},
+                               GROUP_COMMIT={'WINDOW_MS': 0}), fail_order_completion():
+            result = OrderService().create_batch_order(1, [{'product_id': self.product.id, 'quantity': 2}])
+
+        self.assertEqual(result['status'], 'failed')
+        self.assertEqual(self._refresh(), [(5, 3), (3, 5)])
+        self.assertEqual(self.product.stock_quantity, 5)
+        self.assertEqual(verify_stock({self.product.id: 5}), [])
+
+
+class ThrottlingTests(SimpleTestCase):
+    """令牌桶在本地限流并通过共享计数约束其它进程，固定窗口限额精确"""
+
+    def setUp(self):
+        self.key = f"test-{random.getrandbits(32)}"
+
+    def test_token_bucket_local_and_shared_limit(self):
+        local = TokenBucketBackend(sync_every=100)
+        self.assertTrue(all(local.consume(self.key, 5, 60)[0] for _ in range(5)))
+        allowed, wait = local.consume(self.key, 5, 60)
+        self.assertFalse(allowed)
+        self.assertTrue(0 < wait <= 60)
+
+        # 另一个进程的令牌桶是满的，同步一次后即看到本窗口的限额已被用完
+        shared_key = f"{self.key}-shared"
+        first, second = TokenBucketBackend(sync_every=1), TokenBucketBackend(sync_every=1)
+        self.assertTrue(all(first.consume(shared_key, 5, 60)[0] for _ in range(5)))
+        self.assertTrue(second.consume(shared_key, 5, 60)[0])
+        allowed, wait = second.consume(shared_key, 5, 60)
+        self.assertFalse(allowed)
+        self.assertTrue(0 < wait <= 60)
+
+    def test_fixed_window_is_exact(self):
+        backend = FixedWindowBackend()
+        results = [backend.consume(self.key, 3, 60) for _ in range(5)]
+        self.assertEqual([allowed for allowed, _ in results], [True, True, True, False, False])
+        self.assertTrue(0 < results[-1][1] <= 60)
+
+    def test_drf_throttle_uses_backend(self):
+        class TwoPerMinute(AnonBucketThrottle):
+            rate = '2/min'
+
+        request = RequestFactory().get('/products/', REMOTE_ADDR=f"10.{random.randint(0, 255)}.0.1")
+        request.user = mock.Mock(is_authenticated=False)
+        with override_settings(THROTTLE_BACKEND={'MODE': 'fixed_window'}):
+            results = [TwoPerMinute().allow_request(request, None) for _ in range(3)]
+            throttle = TwoPerMinute()
+            throttle.allow_request(request, None)
+        self.assertEqual(results, [True, True, False])
+        self.assertGreater(throttle.wait(), 0)
+
+
+class AdmissionControlTests(SimpleTestCase):
+    """排队深度超限时拒绝，p99超过阈值时按比例拒绝，下单接口返回503和 Retry-After"""
+
+    def test_queue_depth_and_latency_shedding(self):
+        controller = AdmissionController(max_in_flight=2, p99_ms=10, min_samples=5, retry_after=1, p99_refresh_ms=0)
+        self.assertEqual([controller.try_acquire() for _ in range(3)], [None, None, 1])
+        controller.release(0.001)
+        self.assertIsNone(controller.try_acquire())
+
+        for _ in range(5):
+            controller.release(1.5)
+        with mock.patch('comerge.utils.admission.random.random', return_value=0.5):
+            self.assertEqual(controller.try_acquire(), 2)
+        with mock.patch('comerge.utils.admission.random.random', return_value=0.001):
+            self.assertIsNone(controller.try_acquire())
+        self.assertEqual(controller.snapshot()['shed'], 2)
+
+    def test_p99_is_recomputed_at_most_every_refresh_interval(self):
+        controller = AdmissionController(p99_ms=10, window_seconds=3600, min_samples=100, p99_refresh_ms=60000)
+        for latency in range(1, 201):
+            controller.release(latency / 1000)
+        with mock.patch('comerge.utils.admission.heapq.nlargest', wraps=heapq.nlargest) as nlargest:
+            self.assertEqual(controller.p99_latency(), 0.198)
+            controller.release(5.0)
+            self.assertEqual(controller.p99_latency(), 0.198)
+        self.assertEqual(nlargest.call_count, 1)
+        with mock.patch('comerge.utils.admission.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertEqual(controller.p99_latency(), 0.199)
+
+    def test_controller_config_read_once(self):
+        with override_settings(ADMISSION_CONTROL={'MAX_IN_FLIGHT': 7}):
+            with mock.patch('comerge.utils.admission.get_admission_config',
+                            wraps=get_admission_config) as get_config:
+                controller = get_admission_controller('comerge:order-batch-create')
+                self.assertIs(get_admission_controller('comerge:order-batch-create'), controller)
+                self.assertIsNone(get_admission_controller('comerge:product-list'))
+            self.assertLessEqual(get_config.call_count, 1)
+            self.assertEqual(controller.max_in_flight, 7)
+        self.assertEqual(get_admission_controller('comerge:order-batch-create').max_in_flight,
+                         get_admission_config()['MAX_IN_FLIGHT'])
+
+    def test_batch_create_returns_503_when_overloaded(self):
+        with override_settings(ADMISSION_CONTROL={'MAX_IN_FLIGHT': 0, 'RETRY_AFTER': 3}):
+            response = self.client.post('/orders/batch_create/', {}, content_type='application/json')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '3')
+        self.assertEqual(response.json()['code'], 503)
+
+
+@unittest.skipIf(np is None, '库存对账需要 numpy')
+class StockReconcileTests(TransactionTestCase):
+    """按日志ID分批重放库存日志：跨批次保持日志链，报告漂移、断链与首条异常日志"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.products = [Product.objects.create(name=f'reconcile-{i}', price=Decimal('3.00'), stock_quantity=20)
+                         for i in range(2)]
+        for quantity in (1, 2, 3):
+            for product in self.products:
+                OrderService().create_batch_order(1, [{'product_id': product.id, 'quantity': quantity}])
+
+    def test_consistent_logs_across_chunks(self):
+        with use_primary(), CaptureQueriesContext(connection) as queries:
+            report = StockReconciler(chunk_size=2).run()
+        self.assertEqual(report.logs_scanned, 6)
+        self.assertEqual(report.products_checked, 2)
+        self.assertEqual(report.drifts, [])
+        # 商品库存按主键分批流式读取，不按日志中的商品ID拼 id IN
+        self.assertFalse([query for query in queries if ' IN (' in query['sql']])
+
+    def test_stock_without_logs_is_drift(self):
+        stocked = Product.objects.create(name='reconcile-unlogged', price=Decimal('3.00'), stock_quantity=7)
+        Product.objects.create(name='reconcile-empty', price=Decimal('3.00'), stock_quantity=0)
+
+        report = StockReconciler(chunk_size=3).run(fix=True)
+        self.assertEqual(report.products_checked, 4)
+        self.assertEqual([(item.product_id, item.drift, item.expected, item.logs) for item in report.drifts],
+                         [(stocked.id, 7, 0, 0)])
+        self.assertEqual(report.adjusted, 1)
+        self.assertEqual(StockReconciler().run().drifts, [])
+
+    def test_chain_state_carries_between_chunks(self):
+        # 列：日志ID、商品ID、变更数量、变更前、变更后
+        rows = np.array([[1, 1, -2, 10, 8], [2, 2, -1, 5, 4], [3, 1, -3, 8, 5],
+                         [4, 1, -1, 6, 5], [5, 2, -1, 4, 2], [6, 1, 2, 5, 7]], dtype=np.int64)
+        state = LogChainState()
+        for start in range(0, len(rows), 4):
+            state.feed(rows[start:start + 4])
+
+        self.assertEqual(state.last_after[[1, 2]].tolist(), [7, 2])
+        self.assertEqual((state.first_before + state.total_change)[[1, 2]].tolist(), [6, 3])
+        self.assertEqual(state.broken[[1, 2]].tolist(), [1, 0])
+        self.assertEqual(state.bad_rows[[1, 2]].tolist(), [0, 1])
+        self.assertEqual(state.first_bad[[1, 2]].tolist(), [4, 5])
+
+    def test_reports_drift_and_broken_chain_then_fix(self):
+        drifted, broken = self.products
+        with use_primary():
+            Product.objects.filter(id=drifted.id).update(stock_quantity=F('stock_quantity') - 4)
+            last = StockLog.objects.filter(product_id=broken.id).order_by('-id').first()
+            StockLog.objects.filter(id=last.id).update(quantity_before=last.quantity_before + 1)
+
+        report = StockReconciler(chunk_size=4).run(fix=True)
+        problems = {item.product_id: item for item in report.drifts}
+        self.assertEqual(problems[drifted.id].drift, -4)
+        self.assertIsNone(problems[drifted.id].first_bad_log_id)
+        self.assertEqual((problems[broken.id].drift, problems[broken.id].broken_links), (0, 1))
+        self.assertEqual(problems[broken.id].first_bad_log_id, last.id)
+        self.assertEqual(report.adjusted, 1)
+
+        rerun = StockReconciler().run()
+        self.assertEqual([item.product_id for item in rerun.drifts], [broken.id])
+        with use_primary():
+            self.assertEqual(StockLog.objects.filter(product_id=drifted.id, change_type='adjust').count(), 1)
+
+    def test_fix_rereads_chain_under_row_lock(self):
+        drifted = self.products[0]
+        with use_primary():
+            Product.objects.filter(id=drifted.id).update(stock_quantity=F('stock_quantity') - 4)
+        create_adjust_logs = ProductRepository.create_adjust_logs
+
+        def order_then_adjust(repository, product_ids, *args, **kwargs):
+            # 扫描之后、写调整日志之前又有订单提交并发生一次库外修改
+            OrderService().create_batch_order(1, [{'product_id': drifted.id, 'quantity': 1}])
+            Product.objects.filter(id=drifted.id).update(stock_quantity=F('stock_quantity') - 1)
+            return create_adjust_logs(repository, product_ids, *args, **kwargs)
+
+        with mock.patch.object(ProductRepository, 'create_adjust_logs', autospec=True, side_effect=order_then_adjust):
+            report = StockReconciler().run(fix=True)
+        self.assertEqual(report.adjusted, 1)
+        with use_primary():
+            last = StockLog.objects.filter(product_id=drifted.id).order_by('-id').first()
+        self.assertEqual((last.change_type, last.quantity_before, last.quantity_after), ('adjust', 9, 8))
+        rerun = StockReconciler().run()
+        self.assertEqual([item.drift for item in rerun.drifts if item.product_id == drifted.id], [0])
+
+
+@override_settings(SALES_ROLLUP={'SAFETY_LAG': 0})
+class SalesRollupTests(TransactionTestCase):
+    """销量汇总：按水位增量汇总不重不漏，回填按窗口重建，提交后累加，排行与时间序列从汇总表查询"""
+    databases = '__all__'
+
+    def setUp(self):
+        self.products = [Product.objects.create(name=f'rollup-{i}', price=Decimal('2.50'), stock_quantity=50)
+                         for i in range(2)]
+        self._order(1, [(0, 3), (1, 1)])
+        self._order(2, [(0, 2), (1, 100)])
+
+    def _order(self, user_id, items):
+        return OrderService().create_batch_order(user_id, [
+            {'product_id': self.products[index].id, 'quantity': quantity} for index, quantity in items
+        ])
+
+    def _totals(self, model=ProductSalesDaily):
+        with use_primary():
+            return {product_id: (units, revenue, items) for product_id, units, revenue, items
+                    in model.objects.values_list('product_id', 'units', 'revenue', 'order_items')}
+
+    def _expected(self):
+        return {self.products[0].id: (5, Decimal('12.50'), 2), self.products[1].id: (1, Decimal('2.50'), 1)}
+
+    def test_watermark_rollup_is_incremental(self):
+        with override_settings(SALES_ROLLUP={'SAFETY_LAG': 60}):
+            self.assertEqual(sum(SalesRollupService().catch_up().values()), 0)
+
+        self.assertEqual(sum(SalesRollupService().catch_up(chunk_size=2).values()), 3)
+        self.assertEqual(self._totals(), self._expected())
+        self.assertEqual(self._totals(ProductSalesHourly), self._expected())
+
+        self._order(3, [(1, 4)])
+        self.assertEqual(sum(SalesRollupService().catch_up().values()), 1)
+        self.assertEqual(self._totals()[self.products[1].id], (5, Decimal('12.50'), 2))
+
+    def test_backfill_rebuilds_windows_up_to_watermark(self):
+        self.assertGreater(SalesRollupService().backfill(), 0)
+        self.assertEqual(self._totals(), self._expected())
+        # 全量回填时水位已推进到现有明细之后
+        self.assertEqual(sum(SalesRollupService().catch_up().values()), 0)
+
+        # 水位之后的明细留给增量汇总，重建不会重复计入
+        self._order(3, [(0, 1)])
+        with use_primary():
+            ProductSalesDaily.objects.update(units=0)
+        SalesRollupService().backfill(start=datetime.now() - timedelta(days=1))
+        self.assertEqual(self._totals(), self._expected())
+        SalesRollupService().catch_up()
+        self.assertEqual(self._totals()[self.products[0].id], (6, Decimal('15.00'), 3))
+
+    def test_on_commit_mode_updates_after_order_commits(self):
+        with override_settings(SALES_ROLLUP={'MODE': 'on_commit'}):
+            self._order(5, [(0, 1), (1, 1)])
+            with self.assertRaises(ValueError):
+                SalesRollupService().catch_up()
+        self.assertEqual(self._totals(), {self.products[0].id: (1, Decimal('2.50'), 1),
+                                          self.products[1].id: (1, Decimal('2.50'), 1)})
+
+    @unittest.skipIf(REPLICA_CONFIGURED, '汇总查询读副本，测试用的副本没有复制数据')
+    def test_analytics_api(self):
+        SalesRollupService().catch_up()
+        self.client.force_login(get_user_model().objects.create_superuser('analyst', 'a@example.com', 'pw'))
+
+        response = self.client.get('/analytics/sales/top/', {'grain': 'hour', 'metric': 'revenue'})
+        self.assertEqual(response.status_code, 200)
+        products = response.json()['data']['products']
+        self.assertEqual([(item['product_id'], item['revenue']) for item in products],
+                         [(self.products[0].id, '12.50'), (self.products[1].id, '2.50')])
+
+        response = self.client.get('/analytics/sales/series/', {'grain': 'day', 'product_id': self.products[0].id})
+        points = response.json()['data']['points']
+        self.assertEqual(len(points), 7)
+        self.assertEqual(points[-1]['units'], 5)
+        self.assertEqual(self.client.get('/analytics/sales/top/', {'grain': 'week'}).status_code, 400)
+        self.client.logout()
+        self.assertEqual(self.client.get('/analytics/sales/top/').status_code, 403)
+
+
+@unittest.skipIf(SHARDS_CONFIGURED, '查询计数只统计主库连接，分片上的订单后台由 OrderShardingTests 覆盖')
+@unittest.skipIf(REPLICA_CONFIGURED, '测试用的副本没有复制数据，后台列表读不到 setUp 中写入的订单')
+class LargeTableAdminTests(TransactionTestCase):
+    """大表后台：列表查询数不随行数增长，键集翻页，编号精确搜索，估算计数"""
+
+    def setUp(self):
+        admin_user = get_user_model().objects.create_superuser('admin', 'admin@example.com', 'pw')
+        self.client.force_login(admin_user)
+        self.product = Product.objects.create(name='admin-sku', price=Decimal('5.00'), stock_quantity=100)
+
+    def _orders(self, count, user_id=1):
+        for _ in range(count):
+            OrderService().create_batch_order(user_id, [{'product_id': self.product.id, 'quantity': 1}])
+
+    def _changelist(self, model, **params):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(f"/admin/comerge/{model}/", params)
+        self.assertEqual(response.status_code, 200)
+        return response, queries
+
+    def test_changelists_do_not_query_per_row(self):
+        self._orders(2)
+        small = {model: len(self._changelist(model)[1]) for model in ('orderitem', 'stocklog', 'order', 'product')}
+        self._orders(6)
+        large = {model: len(self._changelist(model)[1]) for model in ('orderitem', 'stocklog', 'order', 'product')}
+        self.assertEqual(small, large)
+
+    def test_keyset_pagination(self):
+        self._orders(5)
+        with mock.patch.object(OrderItemAdmin, 'list_per_page', 2):
+            first, _ = self._changelist('orderitem')
+            second, queries = self._changelist('orderitem', cursor=first.context['cl'].result_list[1].pk)
+            last, _ = self._changelist('orderitem', cursor=second.context['cl'].result_list[1].pk)
+
+        pages = [[item.pk for item in response.context['cl'].result_list] for response in (first, second, last)]
+        self.assertEqual(sorted(sum(pages, []), reverse=True), sum(pages, []))
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertIn('cursor=', first.context['cl'].next_cursor_url)
+        self.assertIsNone(last.context['cl'].next_cursor_url)
+        self.assertFalse(any('OFFSET' in query['sql'] for query in queries.captured_queries))
+
+    def test_exact_search_and_estimated_count(self):
+        self._orders(2, user_id=7)
+        self._orders(1, user_id=8)
+        response, queries = self._changelist('order', q='7')
+        self.assertEqual({order.user_id for order in response.context['cl'].result_list}, {7})
+        self.assertFalse(any('LIKE' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(self._changelist('order', q='not-an-id')[0].context['cl'].result_count, 0)
+
+        order_no = Order.objects.filter(user_id=8).values_list('order_no', flat=True).get()
+        self.assertEqual(self._changelist('order', q=order_no)[0].context['cl'].result_count, 1)
+
+        with mock.patch('comerge.admin_mixins.estimate_row_count', return_value=2500000):
+            response, _ = self._changelist('order')
+        self.assertEqual(response.context['cl'].result_count, 2500000)
+        self.assertContains(response, '约 2500000')
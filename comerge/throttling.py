@@ -0,0 +1,194 @@
+"""
+请求限流
+DRF 自带的 UserRateThrottle/AnonRateThrottle 每个请求都要读写缓存中的时间戳列表，
+往返次数和列表长度随限额增长。这里提供两种后端，由 THROTTLE_BACKEND['MODE'] 选择：
+
+- token_bucket：每个进程在内存中维护令牌桶，已消耗的令牌按条数或秒数批量 INCRBY 到
+  Redis 的窗口计数，多个进程据此共享限额；绝大多数请求不访问Redis，
+  代价是限额可能被超出约 进程数 × SYNC_EVERY 次
+- fixed_window：每个请求一次 INCR 固定窗口计数，限额精确
+"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
+
+from .utils.redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+THROTTLE_MODES = ('token_bucket', 'fixed_window')
+
+DEFAULT_THROTTLE_BACKEND = {
+    'MODE': 'token_bucket',
+    'SYNC_EVERY': 20,  # 令牌桶模式下，单个键本地消耗多少个令牌后同步到Redis
+    'SYNC_INTERVAL': 1.0,  # 或距上次同步超过该秒数
+    'MAX_KEYS': 10000,  # 每个进程最多保留的令牌桶数，超出后淘汰最久未用的
+}
+
+KEY_PREFIX = 'ecommerce:throttle'
+
+
+def get_throttle_backend_config() -> Dict[str, Any]:
+    return {**DEFAULT_THROTTLE_BACKEND, **getattr(settings, 'THROTTLE_BACKEND', {})}
+
+
+def _window_key(key: str, window: int) -> str:
+    return f"{KEY_PREFIX}:{key}:{window}"
+
+
+def _incr_window(key: str, window: int, amount: int, ttl: int) -> int:
+    """窗口计数加 amount 并返回加后的值；没有Redis时用Django缓存（add + incr）"""
+    redis = get_redis_client()
+    if redis is not None:
+        pipe = redis.pipeline(transaction=False)
+        pipe.incrby(_window_key(key, window), amount)
+        pipe.expire(_window_key(key, window), ttl)
+        return pipe.execute()[0]
+    cache.add(_window_key(key, window), 0, ttl)
+    return cache.incr(_window_key(key, window), amount)
+
+
+@dataclass
+class _Bucket:
+    tokens: float
+    updated: float
+    window: int
+    unsynced: int = 0
+    shared_used: int = 0  # 最近一次同步得到的本窗口全局消耗
+    last_sync: float = 0.0
+
+
+class TokenBucketBackend:
+    """进程内令牌桶，按 limit/duration 匀速补充，容量为 limit
+
+    同时按同步到的全局窗口计数限制本窗口的总消耗，桶在窗口边界补满时也不会突破全局限额。
+    """
+
+    def __init__(self, sync_every: int = 20, sync_interval: float = 1.0, max_keys: int = 10000):
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self.max_keys = max_keys
+        self._buckets: 'OrderedDict[str, _Bucket]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def consume(self, key: str, limit: int, duration: int) -> Tuple[bool, float]:
+        """取一个令牌，返回 (是否放行, 需要等待的秒数)"""
+        now = time.monotonic()
+        window = int(time.time() // duration)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = _Bucket(float(limit), now, window, last_sync=now)
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            rate = limit / duration
+            bucket.tokens = min(float(limit), bucket.tokens + (now - bucket.updated) * rate)
+            bucket.updated = now
+            if bucket.window != window:
+                bucket.window, bucket.shared_used = window, 0
+
+            if bucket.shared_used + bucket.unsynced >= limit:
+                # 各进程合计已用完本窗口的限额
+                allowed, wait = False, (window + 1) * duration - time.time()
+            elif bucket.tokens >= 1:
+                bucket.tokens -= 1
+                bucket.unsynced += 1
+                allowed, wait = True, 0.0
+            else:
+                allowed, wait = False, (1 - bucket.tokens) / rate
+
+            delta = 0
+            if bucket.unsynced >= self.sync_every or (bucket.unsynced and now - bucket.last_sync >= self.sync_interval):
+                delta, bucket.unsynced, bucket.last_sync = bucket.unsynced, 0, now
+        if delta:
+            self._sync(key, bucket, window, delta, duration)
+        return allowed, wait
+
+    def _sync(self, key: str, bucket: _Bucket, window: int, delta: int, duration: int):
+        try:
+            total = _incr_window(key, window, delta, duration + 1)
+        except Exception as e:
+            logger.error(f"Sync throttle bucket error: {e}")
+            return
+        with self._lock:
+            if bucket.window == window:
+                bucket.shared_used = max(bucket.shared_used, total)
+
+    def reset(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+class FixedWindowBackend:
+    """每个请求 INCR 当前窗口的计数，超过 limit 即拒绝，直到窗口结束"""
+
+    def consume(self, key: str, limit: int, duration: int) -> Tuple[bool, float]:
+        now = time.time()
+        window = int(now // duration)
+        try:
+            count = _incr_window(key, window, 1, duration + 1)
+        except Exception as e:
+            # 计数存储不可用时放行，不因限流故障拒绝正常请求
+            logger.error(f"Fixed window throttle error: {e}")
+            return True, 0.0
+        if count <= limit:
+            return True, 0.0
+        return False, (window + 1) * duration - now
+
+    def reset(self):
+        pass
+
+
+_backends: Dict[Tuple, Any] = {}
+_backends_lock = threading.Lock()
+
+
+def get_throttle_backend():
+    """按当前配置返回进程内共享的限流后端"""
+    config = get_throttle_backend_config()
+    if config['MODE'] not in THROTTLE_MODES:
+        raise ValueError(f"不支持的限流模式: {config['MODE']}")
+    key = (config['MODE'], config['SYNC_EVERY'], config['SYNC_INTERVAL'], config['MAX_KEYS'])
+    with _backends_lock:
+        if key not in _backends:
+            if config['MODE'] == 'token_bucket':
+                _backends[key] = TokenBucketBackend(config['SYNC_EVERY'], config['SYNC_INTERVAL'], config['MAX_KEYS'])
+            else:
+                _backends[key] = FixedWindowBackend()
+        return _backends[key]
+
+
+class BackendRateThrottleMixin:
+    """替换 SimpleRateThrottle 的时间戳列表实现，沿用其限额配置（DEFAULT_THROTTLE_RATES）与缓存键"""
+
+    _wait: Optional[float] = None
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        allowed, self._wait = get_throttle_backend().consume(key, self.num_requests, self.duration)
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class UserBucketThrottle(BackendRateThrottleMixin, UserRateThrottle):
+    """登录用户按用户ID、匿名用户按IP限流，使用 'user' 限额"""
+
+
+class AnonBucketThrottle(BackendRateThrottleMixin, AnonRateThrottle):
+    """匿名用户按IP限流，使用 'anon' 限额"""
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from . import views
+from . import views, async_views
 
 app_name = 'comerge'
 
@@ -11,4 +11,14 @@ router.register(r'orders', views.OrderViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('stats/cache/', views.CacheStatsView.as_view(), name='cache-stats'),
+    path('stats/locks/', views.LockStatsView.as_view(), name='lock-stats'),
+    path('debug/traces/', views.TraceDebugView.as_view(), name='debug-traces'),
+    path('export/<str:kind>/', views.ExportView.as_view(), name='export'),
+    path('analytics/sales/top/', views.SalesTopView.as_view(), name='sales-top'),
+    path('analytics/sales/series/', views.SalesSeriesView.as_view(), name='sales-series'),
+    # 异步只读接口（ASGI部署时不占用同步线程）
+    path('async/products/search/', async_views.product_search, name='async-product-search'),
+    path('async/products/<int:pk>/', async_views.product_detail, name='async-product-detail'),
+    path('async/orders/<str:order_no>/', async_views.order_detail, name='async-order-detail'),
 ]
@@ -0,0 +1,139 @@
+"""
+自适应准入控制
+按路由统计进程内正在处理的请求数（排队深度）与最近一段时间的p99延迟，
+超过阈值时直接返回503并附带 Retry-After，不让过载的下单路径继续堆积请求。
+"""
+
+import heapq
+import math
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+DEFAULT_ADMISSION_CONTROL = {
+    'ENABLED': True,
+    'ROUTES': ['comerge:order-batch-create'],  # 受控的路由名
+    'MAX_IN_FLIGHT': 64,  # 单个进程内同一路由同时处理的请求数上限
+    'P99_MS': 2000,  # 最近 WINDOW_SECONDS 内的p99延迟超过该值时按比例拒绝
+    'WINDOW_SECONDS': 10,
+    'MIN_SAMPLES': 50,  # 样本数不足时不按延迟拒绝
+    'P99_REFRESH_MS': 100,  # p99 最多每隔该毫秒数重新计算一次，其余请求使用上次的结果
+    'RETRY_AFTER': 1,  # 503 响应的 Retry-After 秒数下限
+}
+
+
+def get_admission_config() -> Dict[str, Any]:
+    return {**DEFAULT_ADMISSION_CONTROL, **getattr(settings, 'ADMISSION_CONTROL', {})}
+
+
+class AdmissionController:
+    """单个路由的准入控制器
+
+    排队深度超过上限时全部拒绝；p99延迟超过阈值时按 1 - 阈值/p99 的比例随机拒绝，
+    仍有部分请求进入并产生新的延迟样本，负载下降后自动恢复放行。
+    """
+
+    def __init__(self, max_in_flight: int = 64, p99_ms: float = 2000, window_seconds: float = 10,
+                 min_samples: int = 50, retry_after: int = 1, p99_refresh_ms: float = 100):
+        self.max_in_flight = max_in_flight
+        self.p99 = p99_ms / 1000
+        self.window_seconds = window_seconds
+        self.min_samples = min_samples
+        self.retry_after = retry_after
+        self.p99_refresh = p99_refresh_ms / 1000
+        self.in_flight = 0
+        self.shed = 0
+        self._samples = deque()
+        self._lock = threading.Lock()
+        self._p99: Optional[float] = None
+        self._p99_expires = 0.0
+
+    def try_acquire(self) -> Optional[int]:
+        """放行时占用一个名额并返回None，拒绝时返回建议的 Retry-After 秒数"""
+        with self._lock:
+            if self.in_flight >= self.max_in_flight:
+                self.shed += 1
+                return self.retry_after
+            p99 = self._current_p99()
+            if p99 is not None and p99 > self.p99 and random.random() > self.p99 / p99:
+                self.shed += 1
+                return max(self.retry_after, math.ceil(p99))
+            self.in_flight += 1
+            return None
+
+    def release(self, latency: float):
+        with self._lock:
+            self.in_flight -= 1
+            self._samples.append((time.monotonic(), latency))
+
+    def p99_latency(self) -> Optional[float]:
+        with self._lock:
+            return self._current_p99()
+
+    def _current_p99(self) -> Optional[float]:
+        """在锁内调用；每 p99_refresh 秒才淘汰过期样本并重新计算，只取最大的1%而不排序全部样本"""
+        now = time.monotonic()
+        if now < self._p99_expires:
+            return self._p99
+        self._p99_expires = now + self.p99_refresh
+        expired = now - self.window_seconds
+        while self._samples and self._samples[0][0] < expired:
+            self._samples.popleft()
+        count = len(self._samples)
+        if count < self.min_samples:
+            self._p99 = None
+        else:
+            # 升序第 ceil(0.99n) 个即降序第 n - ceil(0.99n) + 1 个
+            largest = count - min(count - 1, math.ceil(count * 0.99) - 1)
+            self._p99 = heapq.nlargest(largest, (latency for _, latency in self._samples))[-1]
+        return self._p99
+
+    def snapshot(self) -> Dict[str, Any]:
+        p99 = self.p99_latency()
+        return {
+            'in_flight': self.in_flight,
+            'shed': self.shed,
+            'p99_ms': round(p99 * 1000, 3) if p99 is not None else None,
+        }
+
+
+_controllers: Dict[str, AdmissionController] = {}
+_controllers_config: Optional[Dict[str, Any]] = None
+_controllers_lock = threading.Lock()
+
+
+@receiver(setting_changed)
+def _reset_controllers(setting, **kwargs):
+    """ADMISSION_CONTROL 变化（如测试中的 override_settings）时丢弃缓存的配置与控制器"""
+    global _controllers_config
+    if setting == 'ADMISSION_CONTROL':
+        with _controllers_lock:
+            _controllers.clear()
+            _controllers_config = None
+
+
+def get_admission_controller(view_name: str) -> Optional[AdmissionController]:
+    """路由的准入控制器，未开启或路由不受控时返回None；配置只读取一次，每个请求不再合并与比较"""
+    global _controllers_config
+    config = _controllers_config
+    if config is None:
+        with _controllers_lock:
+            config = _controllers_config = _controllers_config or get_admission_config()
+    if not config['ENABLED'] or view_name not in config['ROUTES']:
+        return None
+    controller = _controllers.get(view_name)
+    if controller is None:
+        with _controllers_lock:
+            controller = _controllers.get(view_name)
+            if controller is None:
+                controller = _controllers[view_name] = AdmissionController(
+                    config['MAX_IN_FLIGHT'], config['P99_MS'], config['WINDOW_SECONDS'],
+                    config['MIN_SAMPLES'], config['RETRY_AFTER'], config['P99_REFRESH_MS'],
+                )
+    return controller
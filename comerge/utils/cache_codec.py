@@ -0,0 +1,273 @@
+"""
+缓存编解码工具
+负责缓存值的紧凑序列化、压缩以及格式版本管理
+"""
+
+import logging
+import pickle
+import zlib
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+
+from ..models import Product
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - 可选依赖
+    msgpack = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # pragma: no cover - 可选依赖
+    lz4_frame = None
+
+logger = logging.getLogger(__name__)
+
+# 编码格式版本号，写在每个缓存值的第一个字节
+FORMAT_VERSION = 1
+
+# 第二个字节的标志位
+FLAG_ZLIB = 0x01
+FLAG_LZ4 = 0x02
+FLAG_MSGPACK = 0x04
+
+# 载荷类型标签
+TAG_PRODUCT = 0
+TAG_PRODUCT_LIST = 1
+TAG_SEARCH = 2
+TAG_PICKLE = 3
+
+# 商品紧凑元组的字段顺序，调整顺序或增删字段时必须提升 FORMAT_VERSION
+PRODUCT_FIELDS = (
+    'id', 'name', 'description', 'price', 'stock_quantity',
+    'keywords', 'status', 'version', 'created_at', 'updated_at',
+)
+_DECIMAL_FIELDS = {'price'}
+_DATETIME_FIELDS = {'created_at', 'updated_at'}
+
+# 搜索结果字典中除 products 以外的元信息字段
+SEARCH_META_FIELDS = ('total', 'page', 'size', 'total_pages', 'has_next', 'has_previous')
+_SEARCH_KEYS = frozenset(SEARCH_META_FIELDS + ('products',))
+
+
+class CacheCodec:
+    """缓存编解码器基类"""
+
+    name = None
+
+    def encode(self, value: Any) -> Any:
+        """把业务对象编码为写入缓存的值"""
+        raise NotImplementedError
+
+    def decode(self, raw: Any) -> Any:
+        """把缓存中读出的值还原为业务对象"""
+        raise NotImplementedError
+
+
+class PickleCodec(CacheCodec):
+    """原样交给缓存后端（django_redis默认pickle）
+
+    读取时识别紧凑格式的值并解码：NAME 从 compact 回退到 pickle 或滚动发布期间，
+    缓存中仍有新格式写入的条目，不能把字节串原样交给业务代码。
+    """
+
+    name = 'pickle'
+
+    def encode(self, value: Any) -> Any:
+        return value
+
+    def decode(self, raw: Any) -> Any:
+        if is_compact(raw):
+            return _decode_compact(raw)
+        return raw
+
+
+class CompactCodec(CacheCodec):
+    """紧凑编解码器
+
+    商品以字段元组存储，搜索结果以元信息元组加商品元组列表存储，
+    其余值退回pickle。载荷优先使用msgpack，超过阈值时按配置压缩。
+    """
+
+    name = 'compact'
+
+    def __init__(self, compression: Optional[str] = 'zlib', compress_threshold: int = 1024,
+                 compress_level: int = 6, use_msgpack: bool = True):
+        if compression == 'lz4' and lz4_frame is None:
+            logger.warning("lz4 is not installed, falling back to zlib compression")
+            compression = 'zlib'
+        if compression not in (None, 'zlib', 'lz4'):
+            raise ValueError(f"不支持的压缩算法: {compression}")
+        self.compression = compression
+        self.compress_threshold = compress_threshold
+        self.compress_level = compress_level
+        self.use_msgpack = use_msgpack and msgpack is not None
+
+    # ---------- 编码 ----------
+
+    def encode(self, value: Any) -> bytes:
+        flags = 0
+        body = self._to_structure(value)
+        if self.use_msgpack:
+            payload = msgpack.packb(body, use_bin_type=True)
+            flags |= FLAG_MSGPACK
+        else:
+            payload = pickle.dumps(body, pickle.HIGHEST_PROTOCOL)
+
+        if self.compression and len(payload) >= self.compress_threshold:
+            if self.compression == 'lz4':
+                payload = lz4_frame.compress(payload)
+                flags |= FLAG_LZ4
+            else:
+                payload = zlib.compress(payload, self.compress_level)
+                flags |= FLAG_ZLIB
+
+        return bytes((FORMAT_VERSION, flags)) + payload
+
+    def _to_structure(self, value: Any) -> list:
+        if isinstance(value, Product):
+            return [TAG_PRODUCT, _pack_product(value)]
+        if isinstance(value, list) and value and all(isinstance(v, Product) for v in value):
+            return [TAG_PRODUCT_LIST, [_pack_product(v) for v in value]]
+        if (isinstance(value, dict) and value.keys() == _SEARCH_KEYS
+                and all(isinstance(v, Product) for v in value['products'])):
+            meta = [value[k] for k in SEARCH_META_FIELDS]
+            return [TAG_SEARCH, meta, [_pack_product(v) for v in value['products']]]
+        return [TAG_PICKLE, pickle.dumps(value, pickle.HIGHEST_PROTOCOL)]
+
+    # ---------- 解码 ----------
+
+    def decode(self, raw: Any) -> Any:
+        if raw is None:
+            return None
+        if not isinstance(raw, (bytes, bytearray)) or len(raw) < 2:
+            # 旧格式（直接pickle的模型实例等），原样返回以兼容发布期间的存量数据
+            return raw
+
+        if raw[0] not in _DECODERS:
+            logger.warning(f"Unknown cache format version {raw[0]}, treating as miss")
+            return None
+        return _decode_compact(raw)
+
+
+def is_compact(raw: Any) -> bool:
+    """是否为 CompactCodec 写入的值（首字节为已知的格式版本号）"""
+    return isinstance(raw, (bytes, bytearray)) and len(raw) >= 2 and raw[0] in _DECODERS
+
+
+def _decode_compact(raw: bytes) -> Any:
+    """按版本号解码，载荷损坏时按未命中处理"""
+    try:
+        return _DECODERS[raw[0]](raw)
+    except Exception as e:
+        logger.warning(f"Decode cache entry error: {e}, treating as miss")
+        return None
+
+
+def _pack_product(product: Product) -> list:
+    """把商品实例打包为 [已加载字段掩码, 字段值...]，不触发延迟字段的查询"""
+    deferred = product.get_deferred_fields()
+    mask = 0
+    values = []
+    for index, field in enumerate(PRODUCT_FIELDS):
+        if field in deferred:
+            continue
+        mask |= 1 << index
+        value = getattr(product, field)
+        if value is not None:
+            if field in _DECIMAL_FIELDS:
+                value = str(value)
+            elif field in _DATETIME_FIELDS:
+                value = value.isoformat()
+        values.append(value)
+    return [mask] + values
+
+
+def _unpack_product(row: List[Any]) -> Product:
+    """从打包的字段元组还原商品实例"""
+    mask = row[0]
+    field_names = []
+    values = []
+    position = 1
+    for index, field in enumerate(PRODUCT_FIELDS):
+        if not mask & (1 << index):
+            continue
+        value = row[position]
+        position += 1
+        if value is not None:
+            if field in _DECIMAL_FIELDS:
+                value = Decimal(value)
+            elif field in _DATETIME_FIELDS:
+                value = datetime.fromisoformat(value)
+        field_names.append(field)
+        values.append(value)
+    return Product.from_db('default', field_names, values)
+
+
+def _decode_v1(raw: bytes) -> Any:
+    flags = raw[1]
+    payload = bytes(raw[2:])
+
+    if flags & FLAG_LZ4:
+        if lz4_frame is None:
+            logger.warning("Cache entry is lz4 compressed but lz4 is not installed")
+            return None
+        payload = lz4_frame.decompress(payload)
+    elif flags & FLAG_ZLIB:
+        payload = zlib.decompress(payload)
+
+    if flags & FLAG_MSGPACK:
+        if msgpack is None:
+            logger.warning("Cache entry is msgpack encoded but msgpack is not installed")
+            return None
+        body = msgpack.unpackb(payload, raw=False)
+    else:
+        body = pickle.loads(payload)
+
+    tag = body[0]
+    if tag == TAG_PRODUCT:
+        return _unpack_product(body[1])
+    if tag == TAG_PRODUCT_LIST:
+        return [_unpack_product(row) for row in body[1]]
+    if tag == TAG_SEARCH:
+        result = dict(zip(SEARCH_META_FIELDS, body[1]))
+        result['products'] = [_unpack_product(row) for row in body[2]]
+        return result
+    return pickle.loads(body[1])
+
+
+# 各格式版本的解码函数，新增版本时保留旧版本解码以便滚动发布
+_DECODERS = {
+    1: _decode_v1,
+}
+
+CODECS = {
+    PickleCodec.name: PickleCodec,
+    CompactCodec.name: CompactCodec,
+}
+
+
+def get_codec(name: Optional[str] = None, **options) -> CacheCodec:
+    """按名称创建编解码器，未指定时读取 settings.CACHE_CODEC"""
+    config: Dict[str, Any] = dict(getattr(settings, 'CACHE_CODEC', {}))
+    if name is None:
+        name = config.get('NAME', 'pickle')
+        options = {
+            'compression': config.get('COMPRESSION', 'zlib'),
+            'compress_threshold': config.get('COMPRESS_THRESHOLD', 1024),
+            'compress_level': config.get('COMPRESS_LEVEL', 6),
+            'use_msgpack': config.get('USE_MSGPACK', True),
+            **options,
+        }
+
+    try:
+        codec_class = CODECS[name]
+    except KeyError:
+        raise ValueError(f"未知的缓存编解码器: {name}")
+
+    if codec_class is PickleCodec:
+        return codec_class()
+    return codec_class(**options)
@@ -4,18 +4,31 @@
 """
 
 import logging
-from typing import Any, Optional, Callable
-from django.core.cache import cache
+import time
+from typing import Any, Optional, Callable, Awaitable, Dict, List
+from django.core.cache import cache as default_cache
 from django.conf import settings
+from .cache_codec import CacheCodec, get_codec
+from .cache_stats import CacheStats, cache_stats
+from .redis_client import get_async_redis_client, decode_django_redis_value, encode_django_redis_value
+from .request_metrics import InstrumentedCache, record_cache_call
+from .tracing import traced_methods
 
 logger = logging.getLogger(__name__)
 
+# 经过代理的缓存后端，每次网络往返计入当前请求的性能指标
+cache = InstrumentedCache(default_cache)
 
+
+@traced_methods
 class CacheManager:
     """缓存管理器"""
     
-    def __init__(self, prefix: str = "ecommerce"):
+    def __init__(self, prefix: str = "ecommerce", codec: Optional[CacheCodec] = None,
+                 stats: Optional[CacheStats] = None):
         self.prefix = prefix
+        self.codec = codec or get_codec()
+        self.stats = stats or cache_stats
     
     def _make_key(self, key: str) -> str:
         """生成缓存键"""
@@ -25,46 +38,185 @@ class CacheManager:
         """获取缓存"""
         try:
             cache_key = self._make_key(key)
-            return cache.get(cache_key)
+            start = time.perf_counter()
+            value = self.codec.decode(cache.get(cache_key))
+            self.stats.record_get(key, value is not None, time.perf_counter() - start)
+            return value
         except Exception as e:
             logger.error(f"Cache get error for key {key}: {e}")
+            self.stats.record_error(key)
             return None
     
+    def get_many(self, keys: List[str]) -> Dict[str, Any]:
+        """批量获取缓存（一次网络往返），只返回命中的键"""
+        try:
+            start = time.perf_counter()
+            raw = cache.get_many([self._make_key(key) for key in keys])
+            elapsed = (time.perf_counter() - start) / max(len(keys), 1)
+            values = {}
+            for key in keys:
+                value = self.codec.decode(raw.get(self._make_key(key)))
+                self.stats.record_get(key, value is not None, elapsed)
+                if value is not None:
+                    values[key] = value
+            return values
+        except Exception as e:
+            logger.error(f"Cache get_many error for {len(keys)} keys: {e}")
+            return {}
+
     def set(self, key: str, value: Any, timeout: int = 3600) -> bool:
         """设置缓存"""
         try:
             cache_key = self._make_key(key)
-            cache.set(cache_key, value, timeout)
+            start = time.perf_counter()
+            cache.set(cache_key, self.codec.encode(value), timeout)
+            self.stats.record_set(key, time.perf_counter() - start)
             return True
         except Exception as e:
             logger.error(f"Cache set error for key {key}: {e}")
+            self.stats.record_error(key)
             return False
-    
+
+    def set_many(self, mapping: Dict[str, Any], timeout: int = 3600) -> bool:
+        """批量设置缓存"""
+        try:
+            start = time.perf_counter()
+            cache.set_many(
+                {self._make_key(key): self.codec.encode(value) for key, value in mapping.items()},
+                timeout
+            )
+            elapsed = (time.perf_counter() - start) / max(len(mapping), 1)
+            for key in mapping:
+                self.stats.record_set(key, elapsed)
+            return True
+        except Exception as e:
+            logger.error(f"Cache set_many error for {len(mapping)} keys: {e}")
+            return False
+
     def delete(self, key: str) -> bool:
         """删除缓存"""
         try:
             cache_key = self._make_key(key)
             cache.delete(cache_key)
+            self.stats.record_invalidation(key)
             return True
         except Exception as e:
             logger.error(f"Cache delete error for key {key}: {e}")
+            self.stats.record_error(key)
             return False
     
+    def delete_many(self, keys: List[str]) -> bool:
+        """批量删除缓存"""
+        try:
+            cache.delete_many([self._make_key(key) for key in keys])
+            for key in keys:
+                self.stats.record_invalidation(key)
+            return True
+        except Exception as e:
+            logger.error(f"Cache delete_many error for {len(keys)} keys: {e}")
+            return False
+
     def get_or_set(self, key: str, callback: Callable, timeout: int = 3600) -> Any:
         """获取缓存，不存在则调用回调函数设置"""
         try:
             cache_key = self._make_key(key)
-            value = cache.get(cache_key)
+            start = time.perf_counter()
+            value = self.codec.decode(cache.get(cache_key))
+            self.stats.record_get(key, value is not None, time.perf_counter() - start)
             if value is None:
                 value = callback()
                 if value is not None:
-                    cache.set(cache_key, value, timeout)
+                    start = time.perf_counter()
+                    cache.set(cache_key, self.codec.encode(value), timeout)
+                    self.stats.record_set(key, time.perf_counter() - start)
             return value
         except Exception as e:
             logger.error(f"Cache get_or_set error for key {key}: {e}")
+            self.stats.record_error(key)
             # 缓存失败时直接调用回调函数
             return callback()
     
+    # ---------- 异步接口（异步视图使用） ----------
+
+    async def _araw_get(self, cache_key: str) -> Any:
+        redis = get_async_redis_client()
+        if redis is None:
+            return await cache.aget(cache_key)
+        start = time.perf_counter()
+        try:
+            return decode_django_redis_value(await redis.get(cache.make_key(cache_key)))
+        finally:
+            record_cache_call(time.perf_counter() - start)
+
+    async def _araw_set(self, cache_key: str, value: Any, timeout: int):
+        redis = get_async_redis_client()
+        if redis is None:
+            await cache.aset(cache_key, value, timeout)
+            return
+        start = time.perf_counter()
+        try:
+            await redis.set(cache.make_key(cache_key), encode_django_redis_value(value), ex=timeout)
+        finally:
+            record_cache_call(time.perf_counter() - start)
+
+    async def aget(self, key: str) -> Optional[Any]:
+        """异步获取缓存"""
+        try:
+            start = time.perf_counter()
+            value = self.codec.decode(await self._araw_get(self._make_key(key)))
+            self.stats.record_get(key, value is not None, time.perf_counter() - start)
+            return value
+        except Exception as e:
+            logger.error(f"Cache aget error for key {key}: {e}")
+            self.stats.record_error(key)
+            return None
+
+    async def aset(self, key: str, value: Any, timeout: int = 3600) -> bool:
+        """异步设置缓存"""
+        try:
+            start = time.perf_counter()
+            await self._araw_set(self._make_key(key), self.codec.encode(value), timeout)
+            self.stats.record_set(key, time.perf_counter() - start)
+            return True
+        except Exception as e:
+            logger.error(f"Cache aset error for key {key}: {e}")
+            self.stats.record_error(key)
+            return False
+
+    async def aget_or_set(self, key: str, callback: Callable[[], Awaitable[Any]], timeout: int = 3600) -> Any:
+        """异步获取缓存，不存在则等待回调协程并设置"""
+        value = await self.aget(key)
+        if value is None:
+            value = await callback()
+            if value is not None:
+                await self.aset(key, value, timeout)
+        return value
+
+    def get_generation(self, namespace: str) -> int:
+        """获取命名空间的代数，命名空间内数据变更时递增，用于列表ETag等派生缓存"""
+        cache_key = self._make_key(f"gen:{namespace}")
+        try:
+            generation = cache.get(cache_key)
+            if generation is None:
+                # 以毫秒时间戳初始化，避免键被淘汰后代数回退到旧值
+                cache.add(cache_key, int(time.time() * 1000), None)
+                generation = cache.get(cache_key)
+            return int(generation)
+        except Exception as e:
+            logger.error(f"Cache get_generation error for namespace {namespace}: {e}")
+            return int(time.time() * 1000)
+
+    def bump_generation(self, namespace: str):
+        """递增命名空间的代数"""
+        cache_key = self._make_key(f"gen:{namespace}")
+        try:
+            cache.incr(cache_key)
+        except ValueError:
+            # 键不存在
+            cache.add(cache_key, int(time.time() * 1000), None)
+        except Exception as e:
+            logger.error(f"Cache bump_generation error for namespace {namespace}: {e}")
+
     def delete_pattern(self, pattern: str):
         """删除匹配模式的缓存"""
         try:
@@ -0,0 +1,215 @@
+"""
+缓存统计工具
+负责按键命名空间统计缓存命中、未命中、写入、失效次数与耗时分布
+"""
+
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# 耗时直方图的桶上界（毫秒），最后一个桶收集超过上界的请求
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 25, 50, 100, 250)
+
+COUNTER_FIELDS = ('hits', 'misses', 'sets', 'invalidations', 'errors')
+LATENCY_OPS = ('get', 'set')
+
+
+def get_namespace(key: str) -> str:
+    """取缓存键的前两段作为命名空间，如 product:detail:1 -> product:detail"""
+    parts = key.split(':', 2)
+    if len(parts) < 3:
+        return parts[0]
+    return f"{parts[0]}:{parts[1]}"
+
+
+def _bucket_field(op: str, elapsed_ms: float) -> str:
+    for bound in LATENCY_BUCKETS_MS:
+        if elapsed_ms <= bound:
+            return f"{op}_le_{bound}"
+    return f"{op}_le_inf"
+
+
+class CacheStats:
+    """缓存统计收集器
+
+    每个进程先在内存中累加，达到条数或时间阈值后通过Redis HINCRBY
+    批量合并到共享哈希中，多个worker的数据由此汇总。
+    """
+
+    def __init__(self, key_prefix: str = "ecommerce:stats:cache", enabled: bool = True,
+                 flush_every: int = 200, flush_interval: float = 10.0):
+        self.key_prefix = key_prefix
+        self.enabled = enabled
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._pending = defaultdict(lambda: defaultdict(int))
+        self._pending_events = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    # ---------- 记录 ----------
+
+    def record_get(self, key: str, hit: bool, elapsed: float):
+        self._record(key, 'hits' if hit else 'misses', 'get', elapsed)
+
+    def record_set(self, key: str, elapsed: float):
+        self._record(key, 'sets', 'set', elapsed)
+
+    def record_invalidation(self, key: str):
+        self._record(key, 'invalidations')
+
+    def record_error(self, key: str):
+        self._record(key, 'errors')
+
+    def _record(self, key: str, counter: str, op: Optional[str] = None, elapsed: float = 0.0):
+        if not self.enabled:
+            return
+        namespace = get_namespace(key)
+        with self._lock:
+            fields = self._pending[namespace]
+            fields[counter] += 1
+            if op is not None:
+                fields[_bucket_field(op, elapsed * 1000)] += 1
+                fields[f"{op}_time_us"] += int(elapsed * 1e6)
+            self._pending_events += 1
+            should_flush = (self._pending_events >= self.flush_every or
+                            time.monotonic() - self._last_flush >= self.flush_interval)
+        if should_flush:
+            self.flush()
+
+    # ---------- 汇总 ----------
+
+    def flush(self):
+        """把进程内计数合并到共享存储"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+            self._pending_events = 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+
+        try:
+            redis = get_redis_client()
+            if redis is not None:
+                pipe = redis.pipeline(transaction=False)
+                for namespace, fields in pending.items():
+                    pipe.sadd(self._namespaces_key, namespace)
+                    for field, value in fields.items():
+                        pipe.hincrby(self._hash_key(namespace), field, value)
+                pipe.execute()
+            else:
+                namespaces = set(cache.get(self._namespaces_key) or ())
+                for namespace, fields in pending.items():
+                    namespaces.add(namespace)
+                    stored = cache.get(self._hash_key(namespace)) or {}
+                    for field, value in fields.items():
+                        stored[field] = stored.get(field, 0) + value
+                    cache.set(self._hash_key(namespace), stored, None)
+                cache.set(self._namespaces_key, namespaces, None)
+        except Exception as e:
+            logger.error(f"Flush cache stats error: {e}")
+
+    def snapshot(self, namespaces: Optional[List[str]] = None) -> Dict[str, Any]:
+        """读取所有worker汇总后的统计数据"""
+        self.flush()
+        raw = self._read_all()
+        if namespaces:
+            raw = {ns: fields for ns, fields in raw.items() if ns in namespaces}
+        return {namespace: self._summarize(fields) for namespace, fields in sorted(raw.items())}
+
+    def reset(self):
+        """清空统计数据"""
+        with self._lock:
+            self._pending = defaultdict(lambda: defaultdict(int))
+            self._pending_events = 0
+        try:
+            namespaces = self._read_all().keys()
+            cache_keys = [self._hash_key(ns) for ns in namespaces] + [self._namespaces_key]
+            redis = get_redis_client()
+            if redis is not None:
+                redis.delete(*cache_keys)
+            else:
+                cache.delete_many(cache_keys)
+        except Exception as e:
+            logger.error(f"Reset cache stats error: {e}")
+
+    def _read_all(self) -> Dict[str, Dict[str, int]]:
+        redis = get_redis_client()
+        if redis is not None:
+            namespaces = [ns.decode() for ns in redis.smembers(self._namespaces_key)]
+            pipe = redis.pipeline(transaction=False)
+            for namespace in namespaces:
+                pipe.hgetall(self._hash_key(namespace))
+            return {
+                namespace: {field.decode(): int(value) for field, value in fields.items()}
+                for namespace, fields in zip(namespaces, pipe.execute())
+            }
+        return {
+            namespace: cache.get(self._hash_key(namespace)) or {}
+            for namespace in cache.get(self._namespaces_key) or ()
+        }
+
+    @staticmethod
+    def _summarize(fields: Dict[str, int]) -> Dict[str, Any]:
+        summary = {counter: fields.get(counter, 0) for counter in COUNTER_FIELDS}
+        lookups = summary['hits'] + summary['misses']
+        summary['hit_rate'] = round(summary['hits'] / lookups, 4) if lookups else None
+
+        latency = {}
+        for op in LATENCY_OPS:
+            bounds = [str(bound) for bound in LATENCY_BUCKETS_MS] + ['inf']
+            buckets = {bound: fields.get(f"{op}_le_{bound}", 0) for bound in bounds}
+            count = sum(buckets.values())
+            latency[op] = {
+                'count': count,
+                'avg_ms': round(fields.get(f"{op}_time_us", 0) / count / 1000, 3) if count else None,
+                'p50_ms': _percentile(buckets, count, 0.50),
+                'p95_ms': _percentile(buckets, count, 0.95),
+                'p99_ms': _percentile(buckets, count, 0.99),
+                'buckets_ms': buckets,
+            }
+        summary['latency'] = latency
+        return summary
+
+    @property
+    def _namespaces_key(self) -> str:
+        return f"{self.key_prefix}:namespaces"
+
+    def _hash_key(self, namespace: str) -> str:
+        return f"{self.key_prefix}:{namespace}"
+
+
+def _percentile(buckets: Dict[str, int], count: int, quantile: float) -> Optional[str]:
+    """按直方图估算分位数，返回所在桶的上界"""
+    if not count:
+        return None
+    threshold = count * quantile
+    cumulative = 0
+    for bound, value in buckets.items():
+        cumulative += value
+        if cumulative >= threshold:
+            return bound
+    return 'inf'
+
+
+def _build_cache_stats() -> CacheStats:
+    config = {'ENABLED': True, 'FLUSH_EVERY': 200, 'FLUSH_INTERVAL': 10.0}
+    config.update(getattr(settings, 'CACHE_STATS', {}))
+    return CacheStats(
+        enabled=config['ENABLED'],
+        flush_every=config['FLUSH_EVERY'],
+        flush_interval=config['FLUSH_INTERVAL'],
+    )
+
+
+# 全局缓存统计实例
+cache_stats = _build_cache_stats()
@@ -0,0 +1,38 @@
+"""
+ETag工具
+负责条件GET请求的ETag生成与 If-None-Match 校验
+"""
+
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(*parts) -> str:
+    """由若干部分拼接生成强ETag"""
+    return quote_etag('-'.join(str(part) for part in parts))
+
+
+def fields_etag_part(fields) -> str:
+    """把 ?fields= 选择编入ETag，不同字段组合的响应体不同"""
+    return '.'.join(sorted(fields)) if fields else 'all'
+
+
+def etag_matches(request, etag: str) -> bool:
+    """判断请求的 If-None-Match 是否与ETag匹配（弱比较）"""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    client_etags = parse_etags(header)
+    if '*' in client_etags:
+        return True
+    return any(_strip_weak(client_etag) == etag for client_etag in client_etags)
+
+
+def not_modified(etag: str) -> Response:
+    """返回304响应"""
+    return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+
+
+def _strip_weak(etag: str) -> str:
+    return etag[2:] if etag.startswith('W/') else etag
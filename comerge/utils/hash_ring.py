@@ -0,0 +1,30 @@
+"""
+一致性哈希环
+把键（如商品ID）映射到固定的一组节点，增删节点时只有约 1/N 的键改变归属
+"""
+
+import bisect
+import hashlib
+from typing import Any, Iterable, List, Tuple
+
+
+class HashRing:
+    """每个节点在环上放 replicas 个虚拟节点，使键的分布更均匀"""
+
+    def __init__(self, nodes: Iterable[str], replicas: int = 64):
+        self.nodes = list(dict.fromkeys(nodes))
+        if not self.nodes:
+            raise ValueError("哈希环至少需要一个节点")
+        points: List[Tuple[int, str]] = sorted(
+            (self._hash(f"{node}#{index}"), node) for node in self.nodes for index in range(replicas)
+        )
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.md5(value.encode()).digest()[:8], 'big')
+
+    def node_for(self, key: Any) -> str:
+        index = bisect.bisect(self._hashes, self._hash(str(key))) % len(self._hashes)
+        return self._owners[index]
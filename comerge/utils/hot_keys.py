@@ -0,0 +1,97 @@
+"""
+热点键统计工具
+负责记录运行时的搜索关键词频次，供缓存预热使用
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from typing import List, Tuple
+
+from django.core.cache import cache
+
+from .redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+
+class SearchKeywordRecorder:
+    """搜索关键词频次记录器
+
+    进程内先累加计数，达到条数或时间阈值后批量写入Redis有序集合，
+    避免每次搜索都产生一次额外的网络往返。关键词来自用户输入，超过 max_length 的不记录，
+    每次写入后只保留频次最高的 max_keywords 个，有序集合不会无限增长。
+    """
+
+    def __init__(self, key: str = "ecommerce:search:keywords", flush_every: int = 100,
+                 flush_interval: float = 30.0, ttl: int = 7 * 24 * 3600,
+                 max_length: int = 64, max_keywords: int = 10000):
+        self.key = key
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.ttl = ttl
+        self.max_length = max_length
+        self.max_keywords = max_keywords
+        self._pending = Counter()
+        self._pending_total = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, keyword: str):
+        """记录一次搜索"""
+        keyword = keyword.strip()
+        if not keyword or len(keyword) > self.max_length:
+            return
+        with self._lock:
+            self._pending[keyword] += 1
+            self._pending_total += 1
+            should_flush = (self._pending_total >= self.flush_every or
+                            time.monotonic() - self._last_flush >= self.flush_interval)
+        if should_flush:
+            self.flush()
+
+    def flush(self):
+        """把进程内计数写入共享存储"""
+        with self._lock:
+            pending, self._pending = self._pending, Counter()
+            self._pending_total = 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+
+        try:
+            redis = get_redis_client()
+            if redis is not None:
+                pipe = redis.pipeline()
+                for keyword, count in pending.items():
+                    pipe.zincrby(self.key, count, keyword)
+                # 按分数升序删除排名在 max_keywords 之外的低频关键词
+                pipe.zremrangebyrank(self.key, 0, -self.max_keywords - 1)
+                pipe.expire(self.key, self.ttl)
+                pipe.execute()
+            else:
+                counts = Counter(cache.get(self.key) or {})
+                counts.update(pending)
+                cache.set(self.key, dict(counts.most_common(self.max_keywords)), self.ttl)
+        except Exception as e:
+            logger.error(f"Flush search keywords error: {e}")
+
+    def top(self, limit: int) -> List[Tuple[str, int]]:
+        """获取搜索频次最高的关键词"""
+        self.flush()
+        try:
+            redis = get_redis_client()
+            if redis is not None:
+                return [
+                    (keyword.decode() if isinstance(keyword, bytes) else keyword, int(score))
+                    for keyword, score in redis.zrevrange(self.key, 0, limit - 1, withscores=True)
+                ]
+            return Counter(cache.get(self.key) or {}).most_common(limit)
+        except Exception as e:
+            logger.error(f"Get top search keywords error: {e}")
+            return []
+
+
+# 全局搜索关键词记录器实例
+search_keyword_recorder = SearchKeywordRecorder()
@@ -0,0 +1,288 @@
+"""
+行锁竞争统计工具
+按商品记录库存行锁的等待时间（加锁查询耗时）与持有时间（加锁到事务结束），
+按时间窗口汇总，提供最近几个窗口内等待最严重的热点商品，供库存策略路由使用。
+"""
+
+import contextvars
+import logging
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, FrozenSet, Iterator, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .redis_client import get_redis_client
+
+logger = logging.getLogger(__name__)
+
+# 等待/持有时间直方图的桶上界（毫秒），最后一个桶收集超过上界的记录
+LOCK_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+LOCK_OPS = ('wait', 'hold')
+
+DEFAULT_LOCK_STATS = {
+    'ENABLED': True,
+    'FLUSH_EVERY': 200,
+    'FLUSH_INTERVAL': 10,
+    'WINDOW_SECONDS': 60,  # 每个统计窗口的秒数
+    'WINDOWS': 5,  # 热点统计覆盖最近几个窗口
+    'TOP_K': 20,
+    'HOT_MIN_LOCKS': 20,  # 窗口内加锁次数不少于该值
+    'HOT_WAIT_P95_MS': 50,  # 且等待时间p95不低于该值，视为热点商品
+    'HOT_REFRESH': 10,  # 进程内缓存热点商品集合的秒数
+}
+
+# 当前事务内已加锁的商品：[(商品ID, 加锁时刻)]，None 表示不在跟踪范围内
+_held_locks = contextvars.ContextVar('held_stock_locks', default=None)
+
+
+def get_lock_stats_config() -> Dict[str, Any]:
+    return {**DEFAULT_LOCK_STATS, **getattr(settings, 'LOCK_STATS', {})}
+
+
+def _bucket_field(op: str, elapsed_ms: float) -> str:
+    for bound in LOCK_BUCKETS_MS:
+        if elapsed_ms <= bound:
+            return f"{op}_le_{bound}"
+    return f"{op}_le_inf"
+
+
+def _percentile(buckets: Dict[str, int], count: int, quantile: float) -> Optional[str]:
+    """按直方图估算分位数，返回所在桶的上界"""
+    if not count:
+        return None
+    threshold = count * quantile
+    cumulative = 0
+    for bound, value in buckets.items():
+        cumulative += value
+        if cumulative >= threshold:
+            return bound
+    return 'inf'
+
+
+class LockStats:
+    """行锁竞争统计收集器
+
+    与 CacheStats 相同，进程内先累加，再批量合并到Redis；数据按 WINDOW_SECONDS 分窗口存放，
+    每个窗口一个按等待总时长排序的有序集合，过期窗口自动淘汰，由此得到滚动的Top-K。
+    """
+
+    def __init__(self, key_prefix: str = "ecommerce:stats:lock", enabled: bool = True,
+                 flush_every: int = 200, flush_interval: float = 10.0,
+                 window_seconds: int = 60, windows: int = 5):
+        self.key_prefix = key_prefix
+        self.enabled = enabled
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.window_seconds = window_seconds
+        self.windows = windows
+        self._pending = defaultdict(lambda: defaultdict(int))
+        self._pending_events = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._hot: FrozenSet[int] = frozenset()
+        self._hot_expires = 0.0
+
+    # ---------- 记录 ----------
+
+    def record_wait(self, product_id: int, elapsed: float):
+        self._record(product_id, 'wait', elapsed)
+
+    def record_hold(self, product_id: int, elapsed: float):
+        self._record(product_id, 'hold', elapsed)
+
+    def lock_acquired(self, product_id: int):
+        """记录加锁时刻，持有时间在 track_holds 结束（事务提交或回滚之后）时计算"""
+        held = _held_locks.get()
+        if held is not None:
+            held.append((product_id, time.perf_counter()))
+
+    @contextmanager
+    def track_holds(self) -> Iterator[None]:
+        """包在事务外层：块内加的锁在块结束时才释放，据此记录持有时间"""
+        token = _held_locks.set([])
+        try:
+            yield
+        finally:
+            held = _held_locks.get()
+            _held_locks.reset(token)
+            released = time.perf_counter()
+            for product_id, acquired in held:
+                self.record_hold(product_id, released - acquired)
+
+    def _record(self, product_id: int, op: str, elapsed: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            fields = self._pending[product_id]
+            fields[f"{op}_count"] += 1
+            fields[f"{op}_time_us"] += int(elapsed * 1e6)
+            fields[_bucket_field(op, elapsed * 1000)] += 1
+            self._pending_events += 1
+            should_flush = (self._pending_events >= self.flush_every or
+                            time.monotonic() - self._last_flush >= self.flush_interval)
+        if should_flush:
+            self.flush()
+
+    # ---------- 汇总 ----------
+
+    def flush(self):
+        """把进程内计数合并到当前窗口"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(lambda: defaultdict(int))
+            self._pending_events = 0
+            self._last_flush = time.monotonic()
+        if not pending:
+            return
+
+        window = self._current_window()
+        ttl = self.window_seconds * (self.windows + 1)
+        try:
+            redis = get_redis_client()
+            if redis is not None:
+                pipe = redis.pipeline(transaction=False)
+                for product_id, fields in pending.items():
+                    hash_key = self._hash_key(window, product_id)
+                    for field, value in fields.items():
+                        pipe.hincrby(hash_key, field, value)
+                    pipe.expire(hash_key, ttl)
+                    pipe.zincrby(self._rank_key(window), fields.get('wait_time_us', 0), product_id)
+                pipe.expire(self._rank_key(window), ttl)
+                pipe.execute()
+            else:
+                stored = cache.get(self._window_key(window)) or {}
+                for product_id, fields in pending.items():
+                    merged = stored.setdefault(product_id, {})
+                    for field, value in fields.items():
+                        merged[field] = merged.get(field, 0) + value
+                cache.set(self._window_key(window), stored, ttl)
+        except Exception as e:
+            logger.error(f"Flush lock stats error: {e}")
+
+    def top(self, limit: Optional[int] = None) -> List[Tuple[int, Dict[str, Any]]]:
+        """最近 windows 个窗口内等待总时长最高的商品及其统计"""
+        self.flush()
+        try:
+            raw = self._read_windows(limit)
+        except Exception as e:
+            logger.error(f"Read lock stats error: {e}")
+            return []
+        ranked = sorted(raw.items(), key=lambda item: item[1].get('wait_time_us', 0), reverse=True)
+        return [(product_id, self._summarize(fields)) for product_id, fields in ranked[:limit]]
+
+    def hot_product_ids(self) -> FrozenSet[int]:
+        """当前的热点商品集合，进程内缓存 HOT_REFRESH 秒，避免每个订单项都读取共享存储"""
+        now = time.monotonic()
+        if now < self._hot_expires:
+            return self._hot
+        config = get_lock_stats_config()
+        hot = set()
+        for product_id, summary in self.top(config['TOP_K']):
+            wait = summary['wait']
+            if wait['count'] and wait['count'] >= config['HOT_MIN_LOCKS'] \
+                    and float(wait['p95_ms']) >= config['HOT_WAIT_P95_MS']:
+                hot.add(product_id)
+        self._hot = frozenset(hot)
+        self._hot_expires = now + config['HOT_REFRESH']
+        return self._hot
+
+    def reset(self):
+        """清空统计数据"""
+        with self._lock:
+            self._pending = defaultdict(lambda: defaultdict(int))
+            self._pending_events = 0
+        self._hot, self._hot_expires = frozenset(), 0.0
+        try:
+            redis = get_redis_client()
+            if redis is not None:
+                keys = list(redis.scan_iter(f"{self.key_prefix}:*"))
+                if keys:
+                    redis.delete(*keys)
+            else:
+                cache.delete_many([self._window_key(window) for window in self._recent_windows()])
+        except Exception as e:
+            logger.error(f"Reset lock stats error: {e}")
+
+    def _read_windows(self, limit: Optional[int] = None) -> Dict[int, Dict[str, int]]:
+        """合并最近窗口的统计；Redis 上先用 ZUNIONSTORE 合并各窗口排名，只读取前 limit 个商品的明细"""
+        merged: Dict[int, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        windows = self._recent_windows()
+        redis = get_redis_client()
+        if redis is None:
+            for window in windows:
+                for product_id, fields in (cache.get(self._window_key(window)) or {}).items():
+                    for field, value in fields.items():
+                        merged[product_id][field] += value
+            return merged
+
+        # 合并、取排名、删除临时键在一个事务中执行，并发读取互不干扰
+        union_key = f"{self.key_prefix}:union"
+        pipe = redis.pipeline()
+        pipe.zunionstore(union_key, [self._rank_key(window) for window in windows])
+        pipe.zrevrange(union_key, 0, -1 if limit is None else limit - 1)
+        pipe.delete(union_key)
+        product_ids = [int(member) for member in pipe.execute()[1]]
+        if not product_ids:
+            return merged
+
+        pipe = redis.pipeline(transaction=False)
+        for window in windows:
+            for product_id in product_ids:
+                pipe.hgetall(self._hash_key(window, product_id))
+        rows = iter(pipe.execute())
+        for _ in windows:
+            for product_id in product_ids:
+                for field, value in next(rows).items():
+                    merged[product_id][field.decode()] += int(value)
+        return merged
+
+    @staticmethod
+    def _summarize(fields: Dict[str, int]) -> Dict[str, Any]:
+        summary = {}
+        bounds = [str(bound) for bound in LOCK_BUCKETS_MS] + ['inf']
+        for op in LOCK_OPS:
+            buckets = {bound: fields.get(f"{op}_le_{bound}", 0) for bound in bounds}
+            count = fields.get(f"{op}_count", 0)
+            summary[op] = {
+                'count': count,
+                'total_ms': round(fields.get(f"{op}_time_us", 0) / 1000, 3),
+                'avg_ms': round(fields.get(f"{op}_time_us", 0) / count / 1000, 3) if count else None,
+                'p50_ms': _percentile(buckets, count, 0.50),
+                'p95_ms': _percentile(buckets, count, 0.95),
+                'p99_ms': _percentile(buckets, count, 0.99),
+            }
+        return summary
+
+    def _current_window(self) -> int:
+        return int(time.time() // self.window_seconds)
+
+    def _recent_windows(self) -> List[int]:
+        current = self._current_window()
+        return list(range(current - self.windows + 1, current + 1))
+
+    def _window_key(self, window: int) -> str:
+        return f"{self.key_prefix}:{window}"
+
+    def _rank_key(self, window: int) -> str:
+        return f"{self.key_prefix}:{window}:rank"
+
+    def _hash_key(self, window: int, product_id: int) -> str:
+        return f"{self.key_prefix}:{window}:{product_id}"
+
+
+def _build_lock_stats() -> LockStats:
+    config = get_lock_stats_config()
+    return LockStats(
+        enabled=config['ENABLED'],
+        flush_every=config['FLUSH_EVERY'],
+        flush_interval=config['FLUSH_INTERVAL'],
+        window_seconds=config['WINDOW_SECONDS'],
+        windows=config['WINDOWS'],
+    )
+
+
+# 全局行锁统计实例
+lock_stats = _build_lock_stats()
@@ -12,11 +12,11 @@ class OrderNumberGenerator:
     """订单号生成器"""
 
     @staticmethod
-    def generate() -> str:
-        """生成订单号"""
+    def generate(shard_index: int = 0) -> str:
+        """生成订单号，时间戳后的两位数字为订单所在分片的序号"""
         timestamp = datetime.now().strftime('%Y%m%d%H%M%S')
         unique_suffix = str(uuid.uuid4())[:6].upper()
-        return f"ORD{timestamp}{unique_suffix}"
+        return f"ORD{timestamp}{shard_index:02d}{unique_suffix}"
 
 
 class CustomPageNumberPagination(PageNumberPagination):
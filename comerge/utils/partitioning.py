@@ -0,0 +1,262 @@
+"""
+按月分区工具
+订单、订单明细和库存日志在MySQL上按 created_at 做 RANGE COLUMNS 月分区，
+过期月份整块 DROP PARTITION，不再逐行DELETE；
+SQLite等不支持分区的数据库上所有操作都是空操作，表保持普通表。
+"""
+
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.migrations.operations.base import Operation
+
+# 分区表及分区列
+PARTITIONED_TABLES = {
+    'orders': 'created_at',
+    'order_items': 'created_at',
+    'stock_logs': 'created_at',
+}
+MAXVALUE_PARTITION = 'pmax'
+
+DEFAULT_PARTITIONING = {
+    'FUTURE_MONTHS': 3,
+    'RETENTION_MONTHS': 24,
+    'ORDER_NUMBER_RETENTION_DAYS': 7,  # 已分配订单号（order_numbers）的保留天数
+}
+
+# 订单号中的时间戳是生成订单号的时刻，订单与明细的 created_at 只会稍晚于它
+_ORDER_NO_TIMESTAMP = slice(3, 17)
+_CREATED_BEFORE_SLACK = timedelta(hours=1)
+_CREATED_AFTER_SLACK = timedelta(days=1)
+
+
+def get_partitioning_config() -> Dict[str, int]:
+    return {**DEFAULT_PARTITIONING, **getattr(settings, 'PARTITIONING', {})}
+
+
+def month_start(value: datetime) -> datetime:
+    return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value: datetime, months: int) -> datetime:
+    """月初时间加减月份"""
+    index = value.year * 12 + value.month - 1 + months
+    return value.replace(year=index // 12, month=index % 12 + 1)
+
+
+def partition_name(month: datetime) -> str:
+    return month.strftime('p%Y%m')
+
+
+def retention_start(now: Optional[datetime] = None) -> datetime:
+    """保留期的起点，早于该时间的分区视为过期"""
+    return add_months(month_start(now or datetime.now()), -get_partitioning_config()['RETENTION_MONTHS'])
+
+
+def order_no_created_range(order_no: str) -> Optional[Tuple[datetime, datetime]]:
+    """由订单号中的时间戳推出订单及明细 created_at 的范围，无法解析时返回None"""
+    try:
+        generated_at = datetime.strptime(order_no[_ORDER_NO_TIMESTAMP], '%Y%m%d%H%M%S')
+    except ValueError:
+        return None
+    return generated_at - _CREATED_BEFORE_SLACK, generated_at + _CREATED_AFTER_SLACK
+
+
+def created_range_filter(order_no: str, field: str = 'created_at') -> Dict[str, datetime]:
+    """按订单号查询时附加的分区裁剪条件，使查询只落在一两个月分区上"""
+    created_range = order_no_created_range(order_no)
+    if created_range is None:
+        return {}
+    return {f'{field}__gte': created_range[0], f'{field}__lt': created_range[1]}
+
+
+class PartitionManager:
+    """单个数据库上的月分区管理
+
+    分区 pYYYYMM 存放该月的数据（VALUES LESS THAN 下月1日），
+    末尾的 pmax 兜底接收未来数据，新增月份通过拆分 pmax 完成。
+    """
+
+    def __init__(self, using: str = DEFAULT_DB_ALIAS, execute: Optional[Callable[[str], None]] = None):
+        self.using = using
+        self.connection = connections[using]
+        self._execute = execute
+
+    @property
+    def supported(self) -> bool:
+        return self.connection.vendor == 'mysql'
+
+    def execute(self, sql: str):
+        if self._execute is not None:
+            self._execute(sql)
+            return
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql)
+
+    def _fetch(self, sql: str, params) -> List[Tuple]:
+        with self.connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return list(cursor.fetchall())
+
+    def list_partitions(self, table: str) -> List[Tuple[str, Optional[datetime]]]:
+        """表的分区及上界（pmax 上界为None），未分区的表返回空列表"""
+        if not self.supported:
+            return []
+        rows = self._fetch(
+            "SELECT PARTITION_NAME, PARTITION_DESCRIPTION FROM information_schema.PARTITIONS "
+            "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND PARTITION_NAME IS NOT NULL "
+            "ORDER BY PARTITION_ORDINAL_POSITION",
+            [table]
+        )
+        partitions = []
+        for name, description in rows:
+            bound = None if description == 'MAXVALUE' else datetime.fromisoformat(description.strip("'"))
+            partitions.append((name, bound))
+        return partitions
+
+    def unique_keys(self, table: str) -> Dict[str, List[str]]:
+        """表的主键和唯一索引：{索引名: [列名]}"""
+        unique_keys: Dict[str, List[str]] = {}
+        for index_name, column_name in self._fetch(
+                "SELECT INDEX_NAME, COLUMN_NAME FROM information_schema.STATISTICS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND NON_UNIQUE = 0 "
+                "ORDER BY INDEX_NAME, SEQ_IN_INDEX",
+                [table]):
+            unique_keys.setdefault(index_name, []).append(column_name)
+        return unique_keys
+
+    def partition_table(self, table: str, column: str = 'created_at', now: Optional[datetime] = None):
+        """把普通表改为按月分区：从最早数据所在月份到未来 FUTURE_MONTHS 个月，外加 pmax
+
+        MySQL要求分区列出现在每个唯一键中，主键和唯一索引会补上分区列；
+        分区表不能有外键，也不能被外键引用，相关字段需先设置 db_constraint=False。
+        大表上该操作会整表重建，应在维护窗口或借助在线DDL工具执行。
+        """
+        if not self.supported or self.list_partitions(table):
+            return
+        quote = self.connection.ops.quote_name
+
+        foreign_keys = self._fetch(
+            "SELECT CONSTRAINT_NAME FROM information_schema.REFERENTIAL_CONSTRAINTS "
+            "WHERE CONSTRAINT_SCHEMA = DATABASE() AND (TABLE_NAME = %s OR REFERENCED_TABLE_NAME = %s)",
+            [table, table]
+        )
+        if foreign_keys:
+            names = ', '.join(row[0] for row in foreign_keys)
+            raise ValueError(f"表 {table} 存在外键约束（{names}），无法分区")
+
+        clauses = []
+        for index_name, columns in self.unique_keys(table).items():
+            if column in columns:
+                continue
+            column_list = ', '.join(quote(name) for name in [*columns, column])
+            if index_name == 'PRIMARY':
+                clauses.append(f"DROP PRIMARY KEY, ADD PRIMARY KEY ({column_list})")
+            else:
+                clauses.append(f"DROP INDEX {quote(index_name)}, ADD UNIQUE KEY {quote(index_name)} ({column_list})")
+        if clauses:
+            self.execute(f"ALTER TABLE {quote(table)} {', '.join(clauses)}")
+
+        earliest = self._fetch(f"SELECT MIN({quote(column)}) FROM {quote(table)}", [])[0][0]
+        current = month_start(now or datetime.now())
+        first = month_start(earliest) if earliest is not None else current
+        last = add_months(current, get_partitioning_config()['FUTURE_MONTHS'])
+        self.execute(
+            f"ALTER TABLE {quote(table)} PARTITION BY RANGE COLUMNS({quote(column)}) "
+            f"({self._definitions(first, last)})"
+        )
+
+    def remove_partitioning(self, table: str):
+        if self.supported and self.list_partitions(table):
+            self.execute(f"ALTER TABLE {self.connection.ops.quote_name(table)} REMOVE PARTITIONING")
+
+    def add_future_partitions(self, table: str, now: Optional[datetime] = None) -> List[str]:
+        """拆分 pmax，补齐到未来 FUTURE_MONTHS 个月，返回新增的分区名"""
+        partitions = self.list_partitions(table)
+        bounds = [bound for _, bound in partitions if bound is not None]
+        if not bounds:
+            return []
+        first = bounds[-1]  # 最后一个月分区的上界即第一个待建月份
+        last = add_months(month_start(now or datetime.now()), get_partitioning_config()['FUTURE_MONTHS'])
+        if first > last:
+            return []
+        self.execute(
+            f"ALTER TABLE {self.connection.ops.quote_name(table)} REORGANIZE PARTITION {MAXVALUE_PARTITION} "
+            f"INTO ({self._definitions(first, last)})"
+        )
+        return [partition_name(add_months(first, offset)) for offset in range(self._months_between(first, last) + 1)]
+
+    def expired_partitions(self, table: str, now: Optional[datetime] = None
+                           ) -> List[Tuple[str, Optional[datetime], datetime]]:
+        """早于保留期的分区：(分区名, 下界, 上界)，第一个分区的下界为None"""
+        cutoff = retention_start(now)
+        expired = []
+        lower = None
+        for name, bound in self.list_partitions(table):
+            if bound is None or bound > cutoff:
+                break
+            expired.append((name, lower, bound))
+            lower = bound
+        return expired
+
+    def drop_partition(self, table: str, name: str):
+        self.execute(
+            f"ALTER TABLE {self.connection.ops.quote_name(table)} DROP PARTITION {self.connection.ops.quote_name(name)}"
+        )
+
+    def _definitions(self, first: datetime, last: datetime) -> str:
+        """first 到 last（含）每月一个分区，加上 pmax"""
+        definitions = []
+        for offset in range(self._months_between(first, last) + 1):
+            month = add_months(first, offset)
+            bound = add_months(month, 1).strftime('%Y-%m-%d %H:%M:%S')
+            definitions.append(f"PARTITION {partition_name(month)} VALUES LESS THAN ('{bound}')")
+        definitions.append(f"PARTITION {MAXVALUE_PARTITION} VALUES LESS THAN (MAXVALUE)")
+        return ', '.join(definitions)
+
+    @staticmethod
+    def _months_between(first: datetime, last: datetime) -> int:
+        return (last.year - first.year) * 12 + last.month - first.month
+
+
+class PartitionByMonth(Operation):
+    """迁移操作：把模型的表改为按月分区，非MySQL数据库上不做任何事"""
+
+    reversible = True
+    reduces_to_sql = False
+
+    def __init__(self, model_name: str, field: str = 'created_at'):
+        self.model_name = model_name
+        self.field = field
+
+    def deconstruct(self):
+        kwargs = {} if self.field == 'created_at' else {'field': self.field}
+        return self.__class__.__qualname__, [self.model_name], kwargs
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def _manager(self, app_label, schema_editor, state):
+        model = state.apps.get_model(app_label, self.model_name)
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return None, model
+        return PartitionManager(schema_editor.connection.alias, execute=schema_editor.execute), model
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        manager, model = self._manager(app_label, schema_editor, to_state)
+        if manager is not None:
+            manager.partition_table(model._meta.db_table, model._meta.get_field(self.field).column)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        manager, model = self._manager(app_label, schema_editor, from_state)
+        if manager is not None:
+            manager.remove_partitioning(model._meta.db_table)
+
+    def describe(self):
+        return f"Partition {self.model_name} by month on {self.field}"
+
+    @property
+    def migration_name_fragment(self):
+        return f"partition_{self.model_name}"
@@ -0,0 +1,82 @@
+"""
+Redis连接工具
+负责在django_redis可用时获取原生Redis连接，以及异步视图使用的异步Redis连接
+"""
+
+import asyncio
+import pickle
+import threading
+import weakref
+from typing import Any, Dict, Optional
+
+from django.conf import settings
+
+try:
+    from django_redis import get_redis_connection
+except ImportError:  # pragma: no cover - 可选依赖
+    get_redis_connection = None
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:  # pragma: no cover - 可选依赖
+    redis_asyncio = None
+
+# 异步连接池绑定事件循环，按事件循环分别创建：事件循环 -> {别名: 客户端}。
+# WSGI 下 async_to_sync 每次调用都新建事件循环，用完即关闭；以弱引用为键，并在创建新客户端时
+# 丢弃已关闭事件循环的客户端（客户端的连接引用着事件循环，只靠弱引用无法回收）
+_async_clients: 'weakref.WeakKeyDictionary[Any, Dict[str, Any]]' = weakref.WeakKeyDictionary()
+_async_clients_lock = threading.Lock()
+
+
+def get_redis_client(alias: str = "default"):
+    """获取原生Redis连接，缓存后端不是django_redis时返回None"""
+    if get_redis_connection is None:
+        return None
+    try:
+        return get_redis_connection(alias)
+    except (NotImplementedError, AttributeError):
+        return None
+
+
+def get_async_redis_client(alias: str = "default"):
+    """获取当前事件循环的异步Redis连接，缓存后端不是django_redis或未安装redis时返回None"""
+    if redis_asyncio is None:
+        return None
+    config = settings.CACHES.get(alias, {})
+    if not config.get('BACKEND', '').startswith('django_redis.'):
+        return None
+
+    loop = asyncio.get_running_loop()
+    clients = _async_clients.get(loop)
+    if clients is None:
+        with _async_clients_lock:
+            for closed in [other for other in _async_clients if other.is_closed()]:
+                del _async_clients[closed]
+            clients = _async_clients.setdefault(loop, {})
+    client = clients.get(alias)
+    if client is None:
+        location = config['LOCATION']
+        if isinstance(location, (list, tuple)):
+            # 主从配置时第一个地址为主库
+            location = location[0]
+        client = clients[alias] = redis_asyncio.Redis.from_url(
+            location, password=config.get('OPTIONS', {}).get('PASSWORD')
+        )
+    return client
+
+
+def decode_django_redis_value(raw: Optional[bytes]) -> Any:
+    """按django_redis默认客户端的格式解码：整数以明文存储，其余为pickle"""
+    if raw is None:
+        return None
+    try:
+        return int(raw)
+    except (ValueError, TypeError):
+        return pickle.loads(raw)
+
+
+def encode_django_redis_value(value: Any) -> bytes:
+    """按django_redis默认客户端的格式编码，保证同步与异步路径读写的值可以互通"""
+    if isinstance(value, int) and not isinstance(value, bool):
+        return str(value).encode()
+    return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
@@ -0,0 +1,119 @@
+"""
+请求级性能指标
+收集单个请求内的SQL查询次数与耗时、缓存往返次数与耗时以及响应渲染耗时，
+由 QueryBudgetMiddleware 输出到 Server-Timing 响应头并检查查询预算。
+"""
+
+import contextvars
+import inspect
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Iterator, Optional
+
+
+@dataclass
+class RequestMetrics:
+    """单个请求的性能指标，耗时单位为秒"""
+    queries: int = 0
+    db_time: float = 0.0
+    cache_calls: int = 0
+    cache_time: float = 0.0
+    render_time: float = 0.0
+
+    def server_timing(self, total: float) -> str:
+        """Server-Timing 响应头的值（毫秒）"""
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f'cache;dur={self.cache_time * 1000:.1f};desc="{self.cache_calls} calls"',
+            f'render;dur={self.render_time * 1000:.1f}',
+            f'total;dur={total * 1000:.1f}',
+        ])
+
+
+_current = contextvars.ContextVar('request_metrics', default=None)
+
+
+def current_metrics() -> Optional[RequestMetrics]:
+    return _current.get()
+
+
+def record_cache_call(elapsed: float):
+    """记录一次缓存往返，不在请求内时忽略"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.cache_calls += 1
+        metrics.cache_time += elapsed
+
+
+def record_query(execute, sql, params, many, context):
+    """数据库 execute_wrapper：把查询次数与耗时计入当前请求的指标
+
+    数据库连接按线程隔离，异步视图的查询在 sync_to_async 的线程中执行，
+    因此在每个连接建立时常驻安装，通过上下文变量（会随 sync_to_async 传递）找到当前请求。
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.queries += 1
+        metrics.db_time += time.perf_counter() - start
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created 信号处理：为新连接安装查询记录
+
+    放在列表最前面：execute_wrapper() 上下文退出时弹出的是最后一个包装器，不会误删这里安装的。
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+@contextmanager
+def collect_metrics() -> Iterator[RequestMetrics]:
+    """在代码块内收集指标，覆盖所有数据库别名（主库、副本、订单分片）
+
+    StreamingHttpResponse 的内容在中间件返回之后才生成，其中的查询不计入。
+    """
+    metrics = RequestMetrics()
+    token = _current.set(metrics)
+    try:
+        yield metrics
+    finally:
+        _current.reset(token)
+
+
+class InstrumentedCache:
+    """缓存后端代理：把网络往返计入当前请求的指标，其余属性原样转发"""
+
+    ROUND_TRIP_METHODS = frozenset({
+        'get', 'get_many', 'set', 'set_many', 'add', 'delete', 'delete_many',
+        'incr', 'decr', 'touch', 'has_key', 'get_or_set', 'aget', 'aset',
+    })
+
+    def __init__(self, backend):
+        self._backend = backend
+
+    def __getattr__(self, name):
+        attr = getattr(self._backend, name)
+        if name not in self.ROUND_TRIP_METHODS:
+            return attr
+        if inspect.iscoroutinefunction(attr):
+            async def timed_async(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await attr(*args, **kwargs)
+                finally:
+                    record_cache_call(time.perf_counter() - start)
+            return timed_async
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return attr(*args, **kwargs)
+            finally:
+                record_cache_call(time.perf_counter() - start)
+        return timed
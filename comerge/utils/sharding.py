@@ -0,0 +1,126 @@
+"""
+订单分片工具
+负责订单分片映射：按 user_id 取模选择分片，订单号中编码分片序号，以及跨分片的归并查询
+"""
+
+import heapq
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import QuerySet
+
+# 按 user_id 分片的模型（model_name）
+SHARDED_MODELS = frozenset({'order', 'orderitem', 'ordernumber'})
+
+# 订单号格式：ORD + 14位时间戳 + 2位分片序号 + 6位随机后缀
+ORDER_NO_PREFIX = 'ORD'
+ORDER_NO_LENGTH = 25
+_SHARD_DIGITS = slice(17, 19)
+MAX_SHARDS = 100
+
+
+def get_order_shards() -> List[str]:
+    """订单分片的数据库别名列表，未配置时只有主库一个分片
+
+    分片数量决定 user_id 的映射，上线后不能随意增减，扩容需要迁移数据。
+    """
+    shards = list(getattr(settings, 'ORDER_SHARDS', None) or [DEFAULT_DB_ALIAS])
+    if len(shards) > MAX_SHARDS:
+        raise ValueError(f"订单分片数量不能超过{MAX_SHARDS}")
+    return shards
+
+
+def is_sharded_model(model) -> bool:
+    return model._meta.app_label == 'comerge' and model._meta.model_name in SHARDED_MODELS
+
+
+def shard_index_for_user(user_id: int) -> int:
+    return int(user_id) % len(get_order_shards())
+
+
+def shard_for_user(user_id: int) -> str:
+    """用户订单所在的分片"""
+    return get_order_shards()[shard_index_for_user(user_id)]
+
+
+def shard_for_order_no(order_no: str) -> Optional[str]:
+    """从订单号解析分片；旧格式订单号（不含分片序号）返回None"""
+    if (len(order_no) != ORDER_NO_LENGTH or not order_no.startswith(ORDER_NO_PREFIX)
+            or not order_no[_SHARD_DIGITS].isdigit()):
+        return None
+    shards = get_order_shards()
+    index = int(order_no[_SHARD_DIGITS])
+    return shards[index] if index < len(shards) else None
+
+
+class ScatterGatherList(Sequence):
+    """跨分片查询结果，供 Paginator 分页使用
+
+    count() 为各分片计数之和；切片时分两阶段：先在每个分片按排序字段只取主键
+    的前 stop 行并用 heapq.merge 归并，再按主键到各分片取出窗口内的完整对象
+    （保留原查询集的 only/prefetch_related），按归并顺序返回。
+    翻页越深每个分片读取的主键越多，大翻页应带上 user_id 过滤落到单个分片。
+    """
+
+    ordered = True
+
+    def __init__(self, querysets: Dict[str, QuerySet], ordering: Sequence[str]):
+        self.querysets = querysets
+        self.ordering = list(ordering) or ['-pk']
+        self._count = None
+
+    def count(self) -> int:
+        if self._count is None:
+            self._count = sum(queryset.count() for queryset in self.querysets.values())
+        return self._count
+
+    def __len__(self) -> int:
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[0:self.count()])
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, _ = index.indices(self.count())
+            return self._window(start, stop)
+        items = self._window(index, index + 1)
+        if not items:
+            raise IndexError(index)
+        return items[0]
+
+    def _window(self, start: int, stop: int) -> List[Any]:
+        if stop <= start:
+            return []
+        fields = [name.lstrip('-') for name in self.ordering]
+        descending = [name.startswith('-') for name in self.ordering]
+
+        streams = []
+        for alias, queryset in self.querysets.items():
+            rows = queryset.prefetch_related(None).order_by(*self.ordering, '-pk' if descending[0] else 'pk')
+            streams.append([
+                (row[:-1], alias, row[-1]) for row in rows.values_list(*fields, 'pk')[:stop]
+            ])
+
+        if len(set(descending)) == 1:
+            merged = heapq.merge(*streams, key=lambda row: row[0], reverse=descending[0])
+            window = list(merged)[start:stop]
+        else:
+            # 多个排序字段方向不一致时无法用单一键归并，退回到稳定排序
+            window = _sort_rows([row for stream in streams for row in stream], descending)[start:stop]
+
+        by_shard: Dict[str, List[Any]] = {}
+        for _, alias, pk in window:
+            by_shard.setdefault(alias, []).append(pk)
+        objects: Dict[Tuple[str, Any], Any] = {}
+        for alias, pks in by_shard.items():
+            for obj in self.querysets[alias].filter(pk__in=pks):
+                objects[(alias, obj.pk)] = obj
+        return [objects[(alias, pk)] for _, alias, pk in window if (alias, pk) in objects]
+
+
+def _sort_rows(rows: List[Tuple], descending: List[bool]) -> List[Tuple]:
+    for position in reversed(range(len(descending))):
+        rows.sort(key=lambda row: row[0][position], reverse=descending[position])
+    return rows
@@ -0,0 +1,246 @@
+"""
+轻量级链路追踪
+请求按采样率开启追踪，视图、服务、仓储与缓存的方法调用记录为嵌套的span，
+完成的追踪保存在进程内环形缓冲区中，可导出为JSON或Chrome trace格式
+（chrome://tracing、Perfetto可直接打开）。
+未开启追踪的请求中，span() 与被装饰方法只多一次上下文变量读取。
+"""
+
+import contextvars
+import functools
+import inspect
+import itertools
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from django.conf import settings
+
+DEFAULT_TRACING = {
+    'ENABLED': False,
+    'SAMPLE_RATE': 0.01,  # 请求采样比例
+    'BUFFER_SIZE': 200,  # 环形缓冲区保留的追踪条数
+    'FORCE_HEADER': 'HTTP_X_DEBUG_TRACE',  # 请求带 X-Debug-Trace: 1 时强制追踪
+}
+
+_trace = contextvars.ContextVar('trace', default=None)
+_parent_span = contextvars.ContextVar('trace_parent_span', default=None)
+
+_NOOP_SPAN = nullcontext()
+
+
+def get_tracing_config() -> Dict[str, Any]:
+    return {**DEFAULT_TRACING, **getattr(settings, 'TRACING', {})}
+
+
+@dataclass
+class Span:
+    name: str
+    span_id: int
+    parent_id: Optional[int]
+    start: float
+    thread_id: int
+    duration: float = 0.0
+    attrs: Dict[str, Any] = field(default_factory=dict)
+
+
+class Trace:
+    """一次请求（或任务）的追踪，start 为 perf_counter 时刻，started_at 为墙钟时间"""
+
+    def __init__(self, name: str, **attrs):
+        self.trace_id = uuid.uuid4().hex[:16]
+        self.name = name
+        self.attrs = attrs
+        self.thread_id = threading.get_ident()
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = 0.0
+        self.spans: List[Span] = []
+        self._ids = itertools.count(1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': round(self.duration * 1000, 3),
+            'attrs': self.attrs,
+            'spans': [
+                {
+                    'id': span.span_id,
+                    'parent_id': span.parent_id,
+                    'name': span.name,
+                    'offset_ms': round((span.start - self.start) * 1000, 3),
+                    'duration_ms': round(span.duration * 1000, 3),
+                    'attrs': span.attrs,
+                }
+                for span in sorted(self.spans, key=lambda span: span.start)
+            ],
+        }
+
+
+class _SpanContext:
+    __slots__ = ('trace', 'span', 'token')
+
+    def __init__(self, trace: Trace, name: str, attrs: Dict[str, Any]):
+        self.trace = trace
+        self.span = Span(name, next(trace._ids), _parent_span.get(), 0.0, threading.get_ident(), attrs=attrs)
+
+    def __enter__(self) -> Span:
+        self.token = _parent_span.set(self.span.span_id)
+        self.span.start = time.perf_counter()
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        self.span.duration = time.perf_counter() - self.span.start
+        _parent_span.reset(self.token)
+        if exc_type is not None:
+            self.span.attrs['error'] = exc_type.__name__
+        self.trace.spans.append(self.span)
+        return False
+
+
+def span(name: str, **attrs):
+    """记录一段代码的span；当前不在追踪中时返回空上下文"""
+    trace = _trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return _SpanContext(trace, name, attrs)
+
+
+def current_trace() -> Optional[Trace]:
+    return _trace.get()
+
+
+def traced(name: Optional[str] = None) -> Callable:
+    """把函数调用记录为span的装饰器，支持同步与异步函数"""
+    def decorator(func):
+        span_name = name or func.__qualname__
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                trace = _trace.get()
+                if trace is None:
+                    return await func(*args, **kwargs)
+                with _SpanContext(trace, span_name, {}):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            trace = _trace.get()
+            if trace is None:
+                return func(*args, **kwargs)
+            with _SpanContext(trace, span_name, {}):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def traced_methods(cls):
+    """类装饰器：为类中定义的公开方法（不含生成器）加上 traced"""
+    for attr_name, attr in list(vars(cls).items()):
+        if attr_name.startswith('_') or not inspect.isfunction(attr):
+            continue
+        if inspect.isgeneratorfunction(attr) or inspect.isasyncgenfunction(attr):
+            continue
+        setattr(cls, attr_name, traced(f"{cls.__name__}.{attr_name}")(attr))
+    return cls
+
+
+class TraceBuffer:
+    """最近完成的追踪，按条数滚动淘汰"""
+
+    def __init__(self, size: int):
+        self._traces = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, trace: Trace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def recent(self) -> List[Trace]:
+        with self._lock:
+            return list(self._traces)
+
+    def slowest(self, limit: int = 20) -> List[Trace]:
+        return sorted(self.recent(), key=lambda trace: trace.duration, reverse=True)[:limit]
+
+    def clear(self):
+        with self._lock:
+            self._traces.clear()
+
+
+trace_buffer = TraceBuffer(get_tracing_config()['BUFFER_SIZE'])
+
+
+class _TraceContext:
+
+    def __init__(self, name: str, buffer: Optional[TraceBuffer] = None, **attrs):
+        self.name = name
+        self.attrs = attrs
+        self.buffer = buffer or trace_buffer
+        self.trace: Optional[Trace] = None
+
+    def __enter__(self) -> Trace:
+        outer = _trace.get()
+        if outer is not None:
+            return outer
+        self.trace = Trace(self.name, **self.attrs)
+        self._tokens = (_trace.set(self.trace), _parent_span.set(None))
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.trace is None:
+            return False
+        self.trace.duration = time.perf_counter() - self.trace.start
+        if exc_type is not None:
+            self.trace.attrs['error'] = exc_type.__name__
+        _trace.reset(self._tokens[0])
+        _parent_span.reset(self._tokens[1])
+        self.buffer.add(self.trace)
+        return False
+
+
+def start_trace(name: str, buffer: Optional[TraceBuffer] = None, **attrs) -> _TraceContext:
+    """开启一次追踪，结束时写入环形缓冲区；已经处于追踪中时沿用外层追踪"""
+    return _TraceContext(name, buffer, **attrs)
+
+
+def should_sample(config: Dict[str, Any], forced: bool = False) -> bool:
+    if not config['ENABLED']:
+        return False
+    return forced or random.random() < config['SAMPLE_RATE']
+
+
+def to_json(traces: List[Trace]) -> List[Dict[str, Any]]:
+    return [trace.to_dict() for trace in traces]
+
+
+def to_chrome_trace(traces: List[Trace]) -> Dict[str, Any]:
+    """Chrome trace event 格式：每条追踪一个 pid，线程各占一行，时间单位为微秒"""
+    events = []
+    for pid, trace in enumerate(traces, 1):
+        base_us = trace.started_at * 1_000_000
+        events.append({'name': 'process_name', 'ph': 'M', 'pid': pid,
+                       'args': {'name': f"{trace.name} ({trace.duration * 1000:.1f}ms)"}})
+        events.append({'name': trace.name, 'cat': 'request', 'ph': 'X', 'pid': pid, 'tid': trace.thread_id,
+                       'ts': base_us, 'dur': trace.duration * 1_000_000,
+                       'args': {'trace_id': trace.trace_id, **trace.attrs}})
+        for span in trace.spans:
+            events.append({
+                'name': span.name,
+                'cat': span.name.split('.')[0],
+                'ph': 'X',
+                'pid': pid,
+                'tid': span.thread_id,
+                'ts': base_us + (span.start - trace.start) * 1_000_000,
+                'dur': span.duration * 1_000_000,
+                'args': span.attrs,
+            })
+    return {'traceEvents': events, 'displayTimeUnit': 'ms'}
@@ -1,17 +1,34 @@
+from django.db.models import F, prefetch_related_objects
+from django.http import Http404, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny
+from rest_framework.views import APIView
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny, IsAdminUser
 from comerge.utils.order_utils import CustomPageNumberPagination
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
 from .models import Product, Order, OrderItem, StockLog
 from .serializer import (
     ProductSerializer, ProductListSerializer, ProductSearchSerializer,
-    OrderSerializer, BatchOrderSerializer, StockLogSerializer
+    OrderSerializer, BatchOrderSerializer, StockLogSerializer,
+    fast_product_list_serializer, parse_fields_param
 )
 from .business.product_service import ProductService
 from .business.order_service import OrderService
+from .business.export_service import ExportService, CONTENT_TYPES, parse_export_time
+from .business.sales_rollup_service import SalesRollupService
+from .business.product_import_service import (
+    ProductImportService, IMPORT_FORMATS, detect_format, get_product_import_config
+)
+from .utils.cache_stats import cache_stats
+from .utils.lock_stats import lock_stats
+from .utils.cache_manager import cache_manager
+from .utils.tracing import get_tracing_config, to_chrome_trace, to_json, trace_buffer
+from .utils.etag import make_etag, etag_matches, not_modified, fields_etag_part
+from .renderers import ORJSONRenderer
 from .exceptions import (
     BusinessException,
     InsufficientStockException,
@@ -33,6 +50,7 @@ class ProductViewSet(viewsets.ModelViewSet):
     filterset_fields = ['status', 'price']
     ordering_fields = ['price', 'created_at', 'stock_quantity']
     ordering = ['-created_at']  # 默认按创建时间降序
+    requested_fields = None  # ?fields= 指定的输出字段
 
     def get_serializer_class(self):
         """根据action选择不同的序列化器"""
@@ -41,8 +59,127 @@ class ProductViewSet(viewsets.ModelViewSet):
         return ProductSerializer
 
     def get_queryset(self):
-        """获取查询集，只返回活跃商品"""
-        return Product.objects.filter(status='active')
+        """获取查询集，只返回活跃商品；指定了输出字段时只查询对应的列"""
+        queryset = Product.objects.filter(status='active')
+        if self.requested_fields:
+            # 版本号用于生成ETag，始终查询
+            columns = ProductSerializer.model_columns(self.requested_fields)
+            queryset = queryset.only('id', 'version', *columns)
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.requested_fields and self.get_serializer_class() is ProductSerializer:
+            kwargs.setdefault('fields', self.requested_fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        """商品列表 - 只查询输出字段，使用快速序列化；支持基于命名空间代数的条件GET"""
+        fields = parse_fields_param(request.query_params.get('fields'), ProductListSerializer.Meta.fields)
+        etag = make_etag('products', request.accepted_renderer.format, fields_etag_part(fields),
+                         cache_manager.get_generation('product'))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        fast_serializer = fast_product_list_serializer.narrow(fields)
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = fast_serializer.values_list(queryset)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            response = self.get_paginated_response(fast_serializer.from_rows(page))
+        else:
+            response = Response(fast_serializer.from_rows(rows))
+        response['ETag'] = etag
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        """商品详情 - 支持 ?fields= 裁剪与基于版本号的条件GET，命中时只做一次主键查询"""
+        self.requested_fields = parse_fields_param(request.query_params.get('fields'),
+                                                   ProductSerializer.Meta.fields)
+        fields_tag = fields_etag_part(self.requested_fields)
+
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        # 只有带 If-None-Match 的请求才预先查询版本号，普通请求直接取对象
+        if request.headers.get('If-None-Match') and str(pk).isdigit():
+            version = ProductService().get_product_version(int(pk))
+            if version is not None:
+                etag = make_etag('product', request.accepted_renderer.format, fields_tag, pk, version)
+                if etag_matches(request, etag):
+                    return not_modified(etag)
+
+        instance = self.get_object()
+        serializer = self.get_serializer(instance)
+        response = Response(serializer.data)
+        response['ETag'] = make_etag('product', request.accepted_renderer.format, fields_tag,
+                                     instance.pk, instance.version)
+        return response
+
+    def perform_create(self, serializer):
+        product = serializer.save()
+        ProductService().invalidate_product(product.id)
+
+    def perform_update(self, serializer):
+        # 每次修改在数据库中原子地递增版本号，保证ETag随内容变化，并发修改也不会得到相同版本号
+        product = serializer.save(version=F('version') + 1)
+        product.refresh_from_db(fields=['version'])
+        ProductService().invalidate_product(product.id)
+
+    def perform_destroy(self, instance):
+        product_id = instance.id
+        instance.delete()
+        ProductService().invalidate_product(product_id)
+
+    @action(detail=False, methods=['get', 'post'])
+    def batch(self, request):
+        """批量获取商品详情API - GET ?ids=1,2,3 或 POST {"ids": [1, 2, 3]}
+
+        按请求顺序返回，不存在或已下架的商品返回 found=false，支持 ?fields= 裁剪。
+        """
+        try:
+            self.requested_fields = parse_fields_param(request.query_params.get('fields'),
+                                                       ProductSerializer.Meta.fields)
+            if request.method == 'POST':
+                raw_ids = request.data.get('ids') if hasattr(request.data, 'get') else None
+                if not isinstance(raw_ids, list):
+                    raise ValueError("ids 必须是数组")
+            else:
+                raw_ids = [part for value in request.query_params.getlist('ids')
+                           for part in value.split(',') if part.strip()]
+            try:
+                product_ids = [int(product_id) for product_id in raw_ids]
+            except (TypeError, ValueError):
+                raise ValueError("商品ID必须是整数")
+
+            entries = ProductService().get_products_batch(product_ids)
+
+            found = {entry['id']: entry['product'] for entry in entries if entry['found']}
+            serialized = dict(zip(found, self.get_serializer(list(found.values()), many=True).data))
+            return Response({
+                'code': 200,
+                'message': '获取成功',
+                'data': [
+                    {'id': entry['id'], 'found': entry['found'], 'product': serialized.get(entry['id'])}
+                    for entry in entries
+                ]
+            })
+
+        except ValidationError as e:
+            return Response({
+                'code': 400,
+                'message': '参数错误',
+                'errors': e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except ValueError as e:
+            return Response({
+                'code': 400,
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Batch get products error: {e}")
+            return Response({
+                'code': 500,
+                'message': '服务器内部错误'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
     @action(detail=False, methods=['get'])
     def search(self, request):
@@ -57,6 +194,10 @@ class ProductViewSet(viewsets.ModelViewSet):
                     'errors': serializer.errors
                 }, status=status.HTTP_400_BAD_REQUEST)
 
+            fields = parse_fields_param(request.query_params.get('fields'),
+                                        ProductListSerializer.Meta.fields)
+            fast_serializer = fast_product_list_serializer.narrow(fields)
+
             validated_data = serializer.validated_data
             result = product_service.search_products(
                 validated_data['keyword'],
@@ -68,19 +209,17 @@ class ProductViewSet(viewsets.ModelViewSet):
             paginator = self.pagination_class()
             page_obj = paginator.paginate_queryset(result['products'], request)
             if page_obj is not None:
-                product_serializer = ProductListSerializer(page_obj, many=True)
                 return paginator.get_paginated_response({
                     'code': 200,
                     'message': '搜索成功',
-                    'data': product_serializer.data
+                    'data': fast_serializer.from_instances(page_obj)
                 })
 
-            product_serializer = ProductListSerializer(result['products'], many=True)
             return Response({
                 'code': 200,
                 'message': '搜索成功',
                 'data': {
-                    'products': product_serializer.data,
+                    'products': fast_serializer.from_instances(result['products']),
                     'total': result['total'],
                     'page': result['page'],
                     'size': result['size'],
@@ -90,6 +229,12 @@ class ProductViewSet(viewsets.ModelViewSet):
                 }
             })
 
+        except ValidationError as e:
+            return Response({
+                'code': 400,
+                'message': '参数错误',
+                'errors': e.detail
+            }, status=status.HTTP_400_BAD_REQUEST)
         except ProductNotActiveException as e:
             return Response({
                 'code': 404,
@@ -154,6 +299,59 @@ class ProductViewSet(viewsets.ModelViewSet):
                 'message': '服务器内部错误'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+    @action(detail=False, methods=['post'])
+    def bulk_upsert(self, request):
+        """批量导入商品API - 逐行读取请求体（NDJSON/CSV/JSON数组），按批次新增或更新
+
+        POST /products/bulk_upsert/?import_format=ndjson|csv|json&chunk_size=1000
+        未指定 import_format 时按 Content-Type 判断（?format= 被DRF用于选择响应渲染器，不能使用）。
+        请求体大小与行数受 PRODUCT_IMPORT 限制，超出行数上限时已提交的批次保留，返回413。
+        """
+        fmt = request.query_params.get('import_format') or detect_format(request.content_type)
+        if fmt not in IMPORT_FORMATS:
+            return Response({
+                'code': 400,
+                'message': f"不支持的导入格式，可选: {', '.join(IMPORT_FORMATS)}"
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        config = get_product_import_config()
+        try:
+            content_length = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            content_length = 0
+        if content_length > config['MAX_BODY_BYTES']:
+            return Response({
+                'code': 413,
+                'message': f"请求体不能超过{config['MAX_BODY_BYTES']}字节"
+            }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        try:
+            chunk_size = min(max(int(request.query_params.get('chunk_size', 1000)), 1), 5000)
+            # 直接迭代底层请求体，不经过DRF解析器，避免整体读入内存
+            summary = ProductImportService().import_stream(request._request, fmt, chunk_size, config['MAX_ROWS'])
+            if summary['aborted']:
+                return Response({
+                    'code': 413,
+                    'message': summary['aborted'],
+                    'data': summary
+                }, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            return Response({
+                'code': 200,
+                'message': '导入完成' if not summary['failed'] else '导入完成，部分行失败',
+                'data': summary
+            })
+        except ValueError as e:
+            return Response({
+                'code': 400,
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Bulk upsert products error: {e}")
+            return Response({
+                'code': 500,
+                'message': '服务器内部错误'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
 
 class OrderViewSet(viewsets.ModelViewSet):
     """订单ViewSet - 只负责HTTP请求处理"""
@@ -167,11 +365,120 @@ class OrderViewSet(viewsets.ModelViewSet):
     ordering = ['-created_at']
     lookup_field = 'order_no'
     lookup_url_kwarg = 'order_no'
+    requested_fields = None  # ?fields= 指定的输出字段
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.order_service = OrderService()
 
+    def get_queryset(self):
+        """获取查询集；只在输出订单明细时预取明细和商品，指定了输出字段时只查询对应的列"""
+        queryset = Order.objects.all()
+        if self.requested_fields:
+            # 订单号和更新时间用于生成ETag，始终查询
+            columns = OrderSerializer.model_columns(self.requested_fields)
+            queryset = queryset.only('id', 'order_no', 'updated_at', *columns)
+        if self.requested_fields is None or 'items' in self.requested_fields:
+            queryset = queryset.prefetch_related('items__product')
+        return queryset
+
+    def get_serializer(self, *args, **kwargs):
+        if self.requested_fields and self.get_serializer_class() is OrderSerializer:
+            kwargs.setdefault('fields', self.requested_fields)
+        return super().get_serializer(*args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        """订单列表 - 支持 ?fields= 裁剪与基于命名空间代数的条件GET"""
+        self.requested_fields = parse_fields_param(request.query_params.get('fields'),
+                                                   OrderSerializer.Meta.fields)
+        etag = make_etag('orders', request.accepted_renderer.format,
+                         fields_etag_part(self.requested_fields),
+                         cache_manager.get_generation('order'))
+        if etag_matches(request, etag):
+            return not_modified(etag)
+
+        # 带 user_id 过滤时只查询该用户所在的分片，否则跨分片按排序字段归并
+        queryset = self.order_service.route_orders(
+            self.filter_queryset(self.get_queryset()), request.query_params.get('user_id') or None
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            response = self.get_paginated_response(self.get_serializer(page, many=True).data)
+        else:
+            response = Response(self.get_serializer(queryset, many=True).data)
+        response['ETag'] = etag
+        return response
+
+    def get_object(self):
+        """根据订单号中编码的分片直接到对应分片查询，并附带订单号时间戳推出的分区裁剪条件"""
+        order_no = self.kwargs[self.lookup_url_kwarg]
+        shard = self.order_service.find_order_shard(order_no)
+        if shard is None:
+            raise Http404
+        queryset = self.get_queryset().using(shard)
+        if self.requested_fields is None or 'items' in self.requested_fields:
+            # 明细按订单号时间戳限定 created_at，分区表上只扫描对应月份
+            queryset = queryset.prefetch_related(None).prefetch_related(
+                *self.order_service.order_items_prefetch(order_no)
+            )
+        instance = get_object_or_404(queryset, **self.order_service.order_lookup(order_no))
+        self.check_object_permissions(self.request, instance)
+        return instance
+
+    def retrieve(self, request, *args, **kwargs):
+        """订单详情 - 支持 ?fields= 裁剪与基于更新时间的条件GET，命中时只做一次唯一索引查询"""
+        self.requested_fields = parse_fields_param(request.query_params.get('fields'),
+                                                   OrderSerializer.Meta.fields)
+        order_no = kwargs[self.lookup_url_kwarg]
+        updated_at = None
+        if request.headers.get('If-None-Match'):
+            updated_at = self.order_service.get_order_updated_at(order_no)
+        if updated_at is not None:
+            etag = self._order_etag(request, order_no, updated_at)
+            if etag_matches(request, etag):
+                return not_modified(etag)
+
+        instance = self.get_object()
+        serializer = self.get_serializer(instance)
+        response = Response(serializer.data)
+        response['ETag'] = self._order_etag(request, instance.order_no, instance.updated_at)
+        return response
+
+    def _order_etag(self, request, order_no, updated_at) -> str:
+        return make_etag('order', request.accepted_renderer.format, fields_etag_part(self.requested_fields),
+                         order_no, updated_at.strftime('%Y%m%d%H%M%S%f'))
+
+    def perform_create(self, serializer):
+        # 订单号编码用户所在分片，序列化器按 user_id 写入同一分片
+        # 总金额为只读字段，新建订单从0开始，与批量下单创建订单一致
+        order_no = self.order_service.generate_order_no(serializer.validated_data['user_id'])
+        order = serializer.save(order_no=order_no, total_amount=0)
+        self.order_service.invalidate_order(order.order_no, using=order._state.db)
+
+    def update(self, request, *args, **kwargs):
+        """更新订单 - 保存后重新批量预取明细
+
+        DRF在更新后会清空预取缓存，输出明细时每条明细再单独查询商品（N+1）。
+        """
+        partial = kwargs.pop('partial', False)
+        instance = self.get_object()
+        serializer = self.get_serializer(instance, data=request.data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        self.perform_update(serializer)
+        if getattr(instance, '_prefetched_objects_cache', None):
+            instance._prefetched_objects_cache = {}
+            prefetch_related_objects([instance], *self.order_service.order_items_prefetch(instance.order_no))
+        return Response(serializer.data)
+
+    def perform_update(self, serializer):
+        order = serializer.save()
+        self.order_service.invalidate_order(order.order_no, using=order._state.db)
+
+    def perform_destroy(self, instance):
+        order_no, using = instance.order_no, instance._state.db
+        instance.delete()
+        self.order_service.invalidate_order(order_no, using=using)
+
     @action(detail=False, methods=['post'])
     def batch_create(self, request):
         """批量创建订单API"""
@@ -228,3 +535,174 @@ class OrderViewSet(viewsets.ModelViewSet):
                 'code': 500,
                 'message': '服务器内部错误'
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class CacheStatsView(APIView):
+    """缓存统计API - 只读，按命名空间返回各worker汇总后的缓存指标，仅管理员可访问"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        namespaces = request.query_params.getlist('namespace') or None
+        try:
+            return Response({
+                'code': 200,
+                'message': '获取成功',
+                'data': cache_stats.snapshot(namespaces)
+            })
+        except Exception as e:
+            logger.error(f"Get cache stats error: {e}")
+            return Response({
+                'code': 500,
+                'message': '服务器内部错误'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class LockStatsView(APIView):
+    """行锁竞争统计API - 只读，返回最近窗口内等待最严重的商品及当前热点商品，仅管理员可访问"""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 200)
+        except ValueError:
+            return Response({'code': 400, 'message': 'limit必须为整数'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            return Response({
+                'code': 200,
+                'message': '获取成功',
+                'data': {
+                    'hot_product_ids': sorted(lock_stats.hot_product_ids()),
+                    'products': [
+                        {'product_id': product_id, **summary} for product_id, summary in lock_stats.top(limit)
+                    ],
+                }
+            })
+        except Exception as e:
+            logger.error(f"Get lock stats error: {e}")
+            return Response({
+                'code': 500,
+                'message': '服务器内部错误'
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class TraceDebugView(APIView):
+    """链路追踪调试API - 仅管理员，返回缓冲区中最慢的追踪
+
+    GET /debug/traces/?limit=20&output=json|chrome
+    output=chrome 时直接返回 Chrome trace 格式，可保存为文件后在 chrome://tracing 或 Perfetto 中打开。
+    """
+    permission_classes = [IsAdminUser]
+    MAX_LIMIT = 200
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), self.MAX_LIMIT)
+        except ValueError:
+            return Response({'code': 400, 'message': 'limit必须为整数'}, status=status.HTTP_400_BAD_REQUEST)
+        output = request.query_params.get('output', 'json')
+        if output not in ('json', 'chrome'):
+            return Response({'code': 400, 'message': 'output只支持json或chrome'}, status=status.HTTP_400_BAD_REQUEST)
+
+        traces = trace_buffer.slowest(limit)
+        if output == 'chrome':
+            return Response(to_chrome_trace(traces))
+        config = get_tracing_config()
+        return Response({
+            'code': 200,
+            'message': '获取成功',
+            'data': {
+                'enabled': config['ENABLED'],
+                'sample_rate': config['SAMPLE_RATE'],
+                'traces': to_json(traces),
+            }
+        })
+
+
+class ExportView(APIView):
+    """流式导出API - 仅管理员，按主键游标分批查询，以NDJSON或CSV流式输出
+
+    GET /export/<kind>/?format=ndjson|csv&start=2025-01-01&end=2025-02-01&after=<上次导出的最后ID>&shard=<订单分片>
+    """
+    permission_classes = [IsAdminUser]
+    renderer_classes = [ORJSONRenderer]
+
+    def perform_content_negotiation(self, request, force=False):
+        # ?format= 是导出格式而不是DRF的渲染格式，错误响应固定以JSON输出
+        renderer = self.get_renderers()[0]
+        return renderer, renderer.media_type
+
+    def get(self, request, kind):
+        export_service = ExportService()
+        try:
+            fmt = request.query_params.get('format', 'ndjson')
+            shard = request.query_params.get('shard') or None
+            export_service.validate(kind, fmt, shard)
+            start = parse_export_time(request.query_params.get('start'))
+            end = parse_export_time(request.query_params.get('end'))
+            after_id = int(request.query_params.get('after', 0))
+            chunk_size = min(max(int(request.query_params.get('chunk_size', 2000)), 100), 10000)
+        except ValueError as e:
+            return Response({
+                'code': 400,
+                'message': str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(
+            export_service.stream(kind, fmt, start, end, after_id, chunk_size, shard),
+            content_type=CONTENT_TYPES[fmt]
+        )
+        response['Content-Disposition'] = f'attachment; filename="{kind}.{fmt}"'
+        return response
+
+
+class SalesTopView(APIView):
+    """销量排行API - 仅管理员，从小时/日销量汇总表查询时间范围内销量或销售额最高的商品
+
+    GET /analytics/sales/top/?grain=hour|day&start=2026-10-01&end=2026-10-08&metric=units|revenue&limit=20
+    end 不含；不指定时间时查询最近24小时（hour）或最近7天（day）
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            limit = int(params.get('limit', 20))
+        except ValueError:
+            return Response({'code': 400, 'message': 'limit必须为整数'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            data = SalesRollupService().top_products(
+                params.get('grain', 'day'),
+                parse_export_time(params.get('start')),
+                parse_export_time(params.get('end')),
+                params.get('metric', 'units'),
+                limit,
+            )
+        except ValueError as e:
+            return Response({'code': 400, 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'code': 200, 'message': '获取成功', 'data': data})
+
+
+class SalesSeriesView(APIView):
+    """销量时间序列API - 仅管理员，返回每个小时或每天的销量、销售额，没有销售的时间桶补零
+
+    GET /analytics/sales/series/?grain=hour|day&start=...&end=...&product_id=1
+    不指定 product_id 时为全部商品的合计
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            product_id = int(params['product_id']) if params.get('product_id') else None
+        except ValueError:
+            return Response({'code': 400, 'message': 'product_id必须为整数'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            data = SalesRollupService().time_series(
+                params.get('grain', 'day'),
+                parse_export_time(params.get('start')),
+                parse_export_time(params.get('end')),
+                product_id,
+            )
+        except ValueError as e:
+            return Response({'code': 400, 'message': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'code': 200, 'message': '获取成功', 'data': data})
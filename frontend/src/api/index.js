@@ -12,6 +12,11 @@ export const productAPI = {
     return api.get(`/products/${id}/`)
   },
 
+  // 批量获取商品详情（按ID顺序返回，found=false 表示商品不存在或已下架）
+  getProductsBatch(ids, params = {}) {
+    return api.post('/products/batch/', { ids }, { params })
+  },
+
   // 搜索商品
   searchProducts(params = {}) {
     return api.get('/products/search/', { params })
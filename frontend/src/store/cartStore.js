@@ -1,5 +1,6 @@
 import { defineStore } from 'pinia'
 import { ref, computed, watch } from 'vue'
+import { productAPI } from '../api'
 
 export const useCartStore = defineStore('cart', () => {
   // 购物车商品列表
@@ -63,6 +64,31 @@ export const useCartStore = defineStore('cart', () => {
     items.value = []
   }
 
+  // 用批量接口刷新购物车中商品的价格和库存，移除已下架或已售罄的商品
+  async function refreshItems() {
+    if (items.value.length === 0) return
+    try {
+      const response = await productAPI.getProductsBatch(items.value.map(item => item.id))
+      const entries = new Map(response.data.data.map(entry => [entry.id, entry]))
+      items.value = items.value
+        .filter(item => entries.get(item.id)?.found !== false)
+        .map(item => {
+          const product = entries.get(item.id)?.product
+          if (!product) return item
+          return {
+            ...item,
+            name: product.name,
+            price: product.price,
+            stock_quantity: product.stock_quantity,
+            quantity: Math.min(item.quantity, product.stock_quantity)
+          }
+        })
+        .filter(item => item.quantity > 0)
+    } catch (error) {
+      console.error('刷新购物车商品失败:', error)
+    }
+  }
+
   // 购物车商品总数
   const totalCount = computed(() => items.value.reduce((sum, item) => sum + item.quantity, 0))
 
@@ -77,6 +103,7 @@ export const useCartStore = defineStore('cart', () => {
     addToCart,
     removeFromCart,
     clearCart,
+    refreshItems,
     totalCount,
     totalAmount
   }